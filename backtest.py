@@ -9,9 +9,15 @@ import time # Para converter datas
 import config
 # Removido import do BinanceHandler, não precisamos mais dele aqui
 from redis_client import RedisHandler # Importa RedisHandler
-import quantstats as qs
-import matplotlib.pyplot as plt
+from indicator_cache import IndicatorMatrix
+from backtest_store import BacktestResultStore, combination_key, data_fingerprint
 import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+# matplotlib é importado só na geração de gráficos; quantstats (relatório HTML, desabilitado) deve ser
+# importado sob demanda se o relatório for reativado.
 
 # --- Configuração do Logging (mantém igual) ---
 LOG_FILE_BACKTEST = "backtest_run.log"
@@ -20,7 +26,8 @@ def setup_backtest_logging(level=logging.INFO):
     bt_logger = logging.getLogger('backtester'); # ... (limpeza e handlers como antes) ...
     for handler in bt_logger.handlers[:]: bt_logger.removeHandler(handler); handler.close()
     bt_logger.setLevel(level); formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-    try: fh = logging.FileHandler(LOG_FILE_BACKTEST, mode='w', encoding='utf-8'); fh.setFormatter(formatter); bt_logger.addHandler(fh)
+    log_mode = 'w' if multiprocessing.parent_process() is None else 'a' # Workers do pool (spawn/forkserver) não truncam o log do processo principal
+    try: fh = logging.FileHandler(LOG_FILE_BACKTEST, mode=log_mode, encoding='utf-8'); fh.setFormatter(formatter); bt_logger.addHandler(fh)
     except Exception as e: print(f"Erro config FileHandler backtest: {e}")
     ch = logging.StreamHandler(sys.stdout); ch.setFormatter(formatter); bt_logger.addHandler(ch); bt_logger.propagate = False
     bt_logger.info("--- Logging do Backtester configurado ---"); return bt_logger
@@ -30,6 +37,7 @@ logger = setup_backtest_logging(level=logging.INFO)
 # --- Parâmetros do Backtest ---
 SYMBOL = "BTCUSDT"
 INTERVAL = "1h"
+INTERVALS = [INTERVAL] # Vários intervalos (ex: ["15m", "1h", "4h"]) entram na mesma varredura paralela
 # Define o período do backtest com datas específicas ou relativas
 # IMPORTANTE: Certifique-se que populate_history.py cobriu este range!
 START_DATE_STR = "1 Nov, 2024" # Exemplo: Início fixo
@@ -44,9 +52,59 @@ param_combinations = [(fast, slow) for fast, slow in itertools.product(SMA_FAST_
 INITIAL_CASH = 1000.0
 COMMISSION_RATE = 0.001
 
-# --- Função de Simulação (mantém igual) ---
-def simulate_strategy(data_with_signals: pd.DataFrame, initial_cash: float, commission_rate: float) -> tuple[float, float, list, pd.DataFrame]:
-    # ... (código da função simulate_strategy como antes) ...
+# Paralelismo da Otimização
+MAX_WORKERS = None # None = os.cpu_count(); 1 = roda no processo principal (sem pool)
+
+# --- Cache de Resultados ---
+RESULT_STORE_PATH = "backtest_results.db" # SQLite com um resultado por combinação; None = sem cache (recalcula tudo)
+STRATEGY_NAME = "sma_crossover/v1" # Entra na chave do cache: trocar a versão ao mudar a lógica de sinais/simulação
+
+# --- Funções de Simulação ---
+# simulate_strategy (vetorizada) é a usada pelo otimizador; simulate_strategy_loop é a versão original vela a vela,
+# mantida como referência de paridade (benchmark_backtest.py confere que as saídas são idênticas).
+def simulate_strategy(data_with_signals: pd.DataFrame, initial_cash: float, commission_rate: float) -> tuple[float, float, float, int, list, pd.DataFrame]:
+    """
+    Simulação all-in/all-out sobre a coluna 'Signal' (1 compra, -1 venda) com arrays NumPy.
+
+    O estado em posição é o último sinal não nulo (ffill); os trades são as velas onde ele muda. Só a cadeia
+    caixa -> BTC -> caixa dos trades é sequencial (um passo por trade, não por vela), com as mesmas operações da
+    versão vela a vela, então valores, trades e curva de capital saem idênticos bit a bit.
+    """
+    logger.debug("Iniciando simulação (vetorizada)...")
+    signal = data_with_signals['Signal'].to_numpy(); close = data_with_signals['Close'].to_numpy(dtype=np.float64); index = data_with_signals.index
+    events = np.where(signal == 1, 1.0, np.where(signal == -1, 0.0, np.nan))
+    in_position_after = pd.Series(events).ffill().fillna(0.0).to_numpy() == 1.0 # Estado ao fim de cada vela
+    in_position_before = np.concatenate(([False], in_position_after[:-1])) # Estado ao abrir a vela (o que o valor da vela usa)
+    trade_rows = np.flatnonzero(in_position_after != in_position_before)
+
+    # Cadeia sequencial só nos trades (mesmas contas e ordem de operações do loop original)
+    cash = initial_cash; holding = 0.0; trades_log = []
+    cash_after = np.empty(len(trade_rows)); holding_after = np.empty(len(trade_rows))
+    for k, row in enumerate(trade_rows):
+        close_price = close[row]; timestamp = index[row]
+        if in_position_after[row]:
+            amount_to_buy_gross = cash / close_price; commission = amount_to_buy_gross * commission_rate
+            amount_to_buy_net = amount_to_buy_gross - commission; holding = amount_to_buy_net; cash = 0.0
+            trades_log.append({'Timestamp': timestamp, 'Type': 'BUY', 'Price': close_price,'Amount_BTC': holding, 'Cost_USDT': initial_cash if not trades_log else trades_log[-1]['Cash_After'],'Commission_BTC': commission, 'Cash_After': cash, 'Portfolio_Value_After': holding * close_price})
+        else:
+            cash_received_gross = holding * close_price; commission = cash_received_gross * commission_rate
+            cash_received_net = cash_received_gross - commission
+            trades_log.append({'Timestamp': timestamp, 'Type': 'SELL', 'Price': close_price, 'Amount_BTC': holding, 'Received_USDT': cash_received_net, 'Commission_USDT': commission, 'Cash_After': cash_received_net, 'Portfolio_Value_After': cash_received_net})
+            cash = cash_received_net; holding = 0.0
+        cash_after[k] = cash; holding_after[k] = holding
+
+    # Curva de capital: caixa/quantidade vigentes ao abrir cada vela = as do último trade anterior a ela
+    last_trade = np.searchsorted(trade_rows, np.arange(len(close)), side='left') - 1
+    cash_after = np.concatenate(([initial_cash], cash_after)); holding_after = np.concatenate(([0.0], holding_after)) # Posição 0 = antes do 1º trade
+    cash_before = cash_after[last_trade + 1]; holding_before = holding_after[last_trade + 1]
+    values = np.where(in_position_before, holding_before * close, cash_before)
+    portfolio_df = pd.DataFrame({'Timestamp': index, 'Value': values}).set_index(pd.DatetimeIndex(pd.to_datetime(index), freq=None).rename(None))
+    final_portfolio_value = portfolio_df['Value'].iloc[-1]
+    total_pnl = final_portfolio_value - initial_cash; total_return_pct = (total_pnl / initial_cash) * 100; num_trades = len(trades_log)
+    logger.debug("Simulação concluída."); return final_portfolio_value, total_pnl, total_return_pct, num_trades, trades_log, portfolio_df
+
+def simulate_strategy_loop(data_with_signals: pd.DataFrame, initial_cash: float, commission_rate: float) -> tuple[float, float, float, int, list, pd.DataFrame]:
+    """Versão original vela a vela (iterrows). Referência de paridade para simulate_strategy."""
     logger.debug("Iniciando simulação..."); cash = initial_cash; holding = 0.0; in_position = False; trades_log = []; portfolio_values = []
     for index, row in data_with_signals.iterrows():
         signal = row['Signal']; close_price = row['Close']
@@ -68,11 +126,162 @@ def simulate_strategy(data_with_signals: pd.DataFrame, initial_cash: float, comm
     logger.debug("Simulação concluída."); return final_portfolio_value, total_pnl, total_return_pct, num_trades, trades_log, portfolio_df
 
 
+# --- Dados de Preço e Indicadores em Memória Compartilhada ---
+# O processo principal copia uma vez para um bloco SharedMemory o índice de tempo, Close/High/Low e a matriz de
+# indicadores pré-calculados (IndicatorMatrix); os workers mapeiam o bloco como arrays NumPy sem cópia. Cada
+# tarefa recebe só o descritor (nome + formas), não os dados.
+SHARED_COLUMNS = ('Close', 'High', 'Low')
+_attached_segments: dict[str, tuple[SharedMemory, pd.DataFrame, IndicatorMatrix]] = {} # Por worker: nome do bloco -> (bloco, preços, indicadores)
+
+def share_price_data(data: pd.DataFrame, indicators: IndicatorMatrix) -> tuple[SharedMemory, dict]:
+    """Copia índice (datetime64 como int64), SHARED_COLUMNS e indicadores (float64) para um novo bloco SharedMemory. Quem cria faz close()/unlink()."""
+    rows = len(data); n_indicators = len(indicators.columns)
+    shm = SharedMemory(create=True, size=max(1, rows * 8 * (1 + len(SHARED_COLUMNS) + n_indicators)))
+    index_values = data.index.values # datetime64 na unidade do índice (UTC se o índice tiver timezone)
+    np.ndarray((rows,), dtype=np.int64, buffer=shm.buf)[:] = index_values.view(np.int64)
+    values = np.ndarray((len(SHARED_COLUMNS), rows), dtype=np.float64, buffer=shm.buf, offset=rows * 8)
+    for i, column in enumerate(SHARED_COLUMNS): values[i] = data[column].to_numpy(dtype=np.float64)
+    np.ndarray((rows, n_indicators), dtype=np.float64, buffer=shm.buf, offset=rows * 8 * (1 + len(SHARED_COLUMNS)))[:] = indicators.values
+    tz = getattr(data.index, 'tz', None)
+    return shm, {'name': shm.name, 'rows': rows, 'index_dtype': str(index_values.dtype), 'tz': str(tz) if tz is not None else None, 'index_name': data.index.name,
+                 'indicator_columns': indicators.columns}
+
+def attach_price_data(descriptor: dict) -> tuple[pd.DataFrame, IndicatorMatrix]:
+    """Preços (DataFrame) e indicadores apoiados no bloco compartilhado; anexado uma vez por processo."""
+    cached = _attached_segments.get(descriptor['name'])
+    if cached is not None: return cached[1], cached[2]
+    shm = SharedMemory(name=descriptor['name']); rows = descriptor['rows']
+    index = pd.DatetimeIndex(np.ndarray((rows,), dtype=np.int64, buffer=shm.buf).view(descriptor['index_dtype']), name=descriptor['index_name'])
+    if descriptor['tz']: index = index.tz_localize('UTC').tz_convert(descriptor['tz'])
+    values = np.ndarray((len(SHARED_COLUMNS), rows), dtype=np.float64, buffer=shm.buf, offset=rows * 8)
+    data = pd.DataFrame({column: values[i] for i, column in enumerate(SHARED_COLUMNS)}, index=index, copy=False)
+    indicators = IndicatorMatrix(descriptor['indicator_columns'], np.ndarray((rows, len(descriptor['indicator_columns'])), dtype=np.float64, buffer=shm.buf,
+                                                                              offset=rows * 8 * (1 + len(SHARED_COLUMNS))))
+    _attached_segments[descriptor['name']] = (shm, data, indicators)
+    return data, indicators
+
+# --- Avaliação de Uma Combinação ---
+def sweep_sma_lengths(combinations) -> list[int]:
+    """Comprimentos de SMA distintos usados pela varredura (cada um é calculado uma única vez por dataset)."""
+    return sorted({length for pair in combinations for length in pair})
+
+def evaluate_combination(base_data: pd.DataFrame, sma_fast: int, sma_slow: int, indicators: IndicatorMatrix | None = None) -> tuple[dict, list, pd.DataFrame] | None:
+    """
+    Sinais de crossover + simulação para um par (fast, slow), lendo as SMAs da matriz pré-calculada. None se não sobrar dado.
+
+    Equivale ao cálculo anterior por combinação (rolling + dropna + shift + iloc[1:]): as velas avaliadas começam em
+    max(fast, slow), a primeira com as duas SMAs e a posição da vela anterior definidas.
+    """
+    if indicators is None or ('SMA', sma_fast) not in indicators or ('SMA', sma_slow) not in indicators:
+        indicators = IndicatorMatrix.from_close(base_data['Close'].to_numpy(), (sma_fast, sma_slow))
+    start = max(sma_fast, sma_slow)
+    if len(base_data) <= start: return None
+    position = np.where(indicators.sma(sma_fast) > indicators.sma(sma_slow), 1, -1)
+    previous = position[start - 1:-1]; current = position[start:]
+    data = pd.DataFrame({'Close': base_data['Close'].to_numpy()[start:], 'Signal': np.where(current > previous, 1, np.where(current < previous, -1, 0))},
+                        index=base_data.index[start:])
+    final_value, pnl, return_pct, num_trades, trades, portfolio = simulate_strategy(
+        data_with_signals=data, initial_cash=INITIAL_CASH, commission_rate=COMMISSION_RATE
+    )
+    result = {'SMA_Fast': sma_fast, 'SMA_Slow': sma_slow, 'Final_Value': final_value, 'Pnl': pnl, 'Return_Pct': return_pct, 'Num_Trades': num_trades,
+              'Buy_Signals': int((data['Signal'] == 1).sum()), 'Sell_Signals': int((data['Signal'] == -1).sum())}
+    return result, trades, portfolio
+
+def _evaluate_shared(descriptor: dict, sma_fast: int, sma_slow: int) -> tuple[dict, list, None] | None:
+    """Tarefa do pool: avalia a combinação sobre os preços/indicadores do bloco compartilhado. A curva de capital não volta
+    ao processo principal (só é refeita para o top-K no estágio de relatórios)."""
+    data, indicators = attach_price_data(descriptor)
+    outcome = evaluate_combination(data, sma_fast, sma_slow, indicators)
+    return (outcome[0], outcome[1], None) if outcome is not None else None
+
+# --- Carga de Dados ---
+def load_base_data(redis_handler: RedisHandler, interval: str, start_ts_ms: int, end_ts_ms: int, symbol: str = SYMBOL) -> pd.DataFrame | None:
+    logger.info(f"Buscando dados históricos {symbol} {interval} do Redis (Range: {start_ts_ms} a {end_ts_ms})...")
+    base_data = redis_handler.get_hist_klines_range(
+        symbol=symbol, interval=interval, start_ts_ms=start_ts_ms, end_ts_ms=end_ts_ms
+    )
+    if base_data is None or base_data.empty:
+        logger.critical(f"Não foi possível obter dados históricos {symbol} {interval} do Redis para o período {START_DATE_STR} - {END_DATE_STR}. Verifique se populate_history cobriu este range.")
+        return None
+    base_data = base_data[list(SHARED_COLUMNS)].dropna() # Só as colunas que a varredura usa (as mesmas do bloco compartilhado)
+    logger.info(f"Total de {len(base_data)} velas históricas {symbol} {interval} obtidas do Redis ({base_data.index.min()} a {base_data.index.max()}).")
+    return base_data
+
+# --- Relatórios (estágio após a varredura) ---
+# Gráficos só para as REPORT_TOP_K melhores combinações + um resumo da varredura, renderizados no pool de processos;
+# trades de todas as combinações vão para um único arquivo colunar.
+REPORT_TOP_K = 5 # 0 = nenhum gráfico de curva de capital
+TRADES_FILE_BASENAME = "backtest_trades" # .parquet (pyarrow/fastparquet) ou .csv como fallback
+SUMMARY_CHART_FILE = "backtest_summary.png"
+
+def report_suffix_for(interval: str, sma_fast: int, sma_slow: int) -> str:
+    return f"SMA_{sma_fast}_{sma_slow}" if len(INTERVALS) == 1 else f"{interval}_SMA_{sma_fast}_{sma_slow}"
+
+def render_equity_curve(base_data: pd.DataFrame, indicators: IndicatorMatrix | None, interval: str, sma_fast: int, sma_slow: int) -> str | None:
+    """Refaz a simulação da combinação (barato com os indicadores prontos) e salva a curva de capital vs Buy & Hold em PNG."""
+    report_suffix = report_suffix_for(interval, sma_fast, sma_slow)
+    outcome = evaluate_combination(base_data, sma_fast, sma_slow, indicators)
+    portfolio = outcome[2] if outcome is not None else None
+    if portfolio is None or portfolio.empty: logger.warning(f"DF Portfólio vazio para {report_suffix}. Gráfico não gerado."); return None
+    try:
+        import matplotlib; matplotlib.use('Agg') # Workers sem display
+        import matplotlib.pyplot as plt
+        close = base_data['Close']
+        plt.style.use('seaborn-v0_8-darkgrid'); fig, ax = plt.subplots(figsize=(14, 7))
+        ax.plot(portfolio.index, portfolio['Value'], label=f'Estratégia SMA ({sma_fast}/{sma_slow})', color='blue', linewidth=1.5)
+        buy_hold_start_price = close.loc[portfolio.index[0]]
+        buy_hold_value = (close.loc[portfolio.index] / buy_hold_start_price) * INITIAL_CASH
+        ax.plot(buy_hold_value.index, buy_hold_value, label=f'Buy & Hold {SYMBOL}', color='orange', linestyle='--', alpha=0.8)
+        ax.set_title(f'Curva de Capital - {report_suffix} vs Buy & Hold', fontsize=14)
+        ax.legend(fontsize=10); ax.grid(True, linestyle=':', linewidth=0.5); ax.set_xlabel('Data', fontsize=12); ax.set_ylabel('Valor do Portfólio (USDT)', fontsize=12)
+        try: import matplotlib.ticker as mtick; fmt = '${x:,.0f}'; tick = mtick.StrMethodFormatter(fmt); ax.yaxis.set_major_formatter(tick)
+        except ImportError: logger.warning("Ticker não encontrado.")
+        plt.tight_layout(); chart_filename = f'equity_curve_{report_suffix}.png'; plt.savefig(chart_filename); plt.close(fig)
+        return chart_filename
+    except Exception as e: logger.error(f"Falha ao gerar gráfico para {report_suffix}.", exc_info=True); return None
+
+def _render_equity_curve_shared(descriptor: dict, interval: str, sma_fast: int, sma_slow: int) -> str | None:
+    """Tarefa do pool: gráfico de uma combinação do top-K, lendo preços/indicadores do bloco compartilhado."""
+    data, indicators = attach_price_data(descriptor)
+    return render_equity_curve(data, indicators, interval, sma_fast, sma_slow)
+
+def render_summary_chart(results_df: pd.DataFrame, filename: str = SUMMARY_CHART_FILE) -> str | None:
+    """Um gráfico para a varredura inteira: mapa de calor do retorno (%) por SMA Fast x SMA Slow, um painel por intervalo."""
+    if results_df.empty: return None
+    try:
+        import matplotlib; matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        intervals = list(dict.fromkeys(results_df['Interval']))
+        fig, axes = plt.subplots(1, len(intervals), figsize=(7 * len(intervals), 6), squeeze=False)
+        for ax, interval in zip(axes[0], intervals):
+            grid = results_df[results_df['Interval'] == interval].pivot_table(index='SMA_Fast', columns='SMA_Slow', values='Return_Pct')
+            image = ax.imshow(grid.to_numpy(), cmap='RdYlGn', aspect='auto', origin='lower')
+            ax.set_xticks(range(len(grid.columns)), [str(c) for c in grid.columns], rotation=90, fontsize=8); ax.set_yticks(range(len(grid.index)), [str(i) for i in grid.index], fontsize=8)
+            ax.set_xlabel('SMA Slow'); ax.set_ylabel('SMA Fast'); ax.set_title(f'Retorno (%) - {SYMBOL} {interval}')
+            fig.colorbar(image, ax=ax)
+        plt.tight_layout(); plt.savefig(filename); plt.close(fig)
+        return filename
+    except Exception as e: logger.error("Falha ao gerar gráfico resumo da varredura.", exc_info=True); return None
+
+def write_trades_file(trades_by_combination: list[tuple[str, int, int, list]], basename: str = TRADES_FILE_BASENAME) -> str | None:
+    """Trades de todas as combinações num único arquivo (colunas Interval/SMA_Fast/SMA_Slow + campos do trade)."""
+    frames = [pd.DataFrame(trades).assign(Interval=interval, SMA_Fast=sma_fast, SMA_Slow=sma_slow) for interval, sma_fast, sma_slow, trades in sorted(trades_by_combination, key=lambda t: t[:3]) if trades] # Ordem estável (o pool entrega fora de ordem)
+    if not frames: logger.info("Nenhum trade para salvar."); return None
+    trades_df = pd.concat(frames, ignore_index=True)
+    trades_df = trades_df[['Interval', 'SMA_Fast', 'SMA_Slow'] + [c for c in trades_df.columns if c not in ('Interval', 'SMA_Fast', 'SMA_Slow')]]
+    try:
+        filename = f"{basename}.parquet"; trades_df.to_parquet(filename, index=False)
+    except ImportError: # Sem pyarrow/fastparquet
+        filename = f"{basename}.csv"; trades_df.to_csv(filename, index=False)
+    logger.info(f"{len(trades_df)} trades de {len(frames)} combinações salvos em: {filename}")
+    return filename
+
+
 # --- Função Principal do Backtest com Otimização (Lendo do Redis) ---
 
 def run_backtest_optimization_redis():
     logger.info("==== INICIANDO OTIMIZAÇÃO BACKTEST (Leitura Redis) ====")
-    logger.info(f"Par: {SYMBOL}, Intervalo: {INTERVAL}")
+    logger.info(f"Par: {SYMBOL}, Intervalo(s): {', '.join(INTERVALS)}")
     logger.info(f"Período: Desde '{START_DATE_STR}' até '{END_DATE_STR if END_DATE_STR else 'Fim dos dados Redis'}'")
     logger.info(f"Capital Inicial: {INITIAL_CASH:.2f} USDT, Comissão: {COMMISSION_RATE*100:.2f}%")
     logger.info(f"Testando Combinações SMA Fast: {SMA_FAST_PERIODS}, SMA Slow: {SMA_SLOW_PERIODS}")
@@ -98,103 +307,114 @@ def run_backtest_optimization_redis():
             logger.info(f"Data fim convertida: {end_dt} -> {end_ts_ms} ms")
         else:
             logger.info("Data fim não especificada, buscando até o fim dos dados no Redis.")
-            # Para ZRANGEBYSCORE, podemos usar +inf, mas para garantir pegamos até 'agora'
-            # A função get_hist_klines_range pode precisar de ajuste se end_ts for muito no futuro
-            # Vamos passar o end_ts_ms calculado (agora)
 
     except Exception as e:
         logger.critical(f"Erro ao converter datas de início/fim. Use formatos como '1 Jan, 2024' ou 'YYYY-MM-DD'.", exc_info=True)
         return
 
-    # 3. Buscar Dados Históricos do Redis
-    logger.info(f"Buscando dados históricos do Redis (Range: {start_ts_ms} a {end_ts_ms})...")
-    base_data = redis_handler.get_hist_klines_range(
-        symbol=SYMBOL, interval=INTERVAL, start_ts_ms=start_ts_ms, end_ts_ms=end_ts_ms
-    )
-    if base_data is None or base_data.empty:
-        logger.critical(f"Não foi possível obter dados históricos do Redis para o período {START_DATE_STR} - {END_DATE_STR}. Verifique se populate_history cobriu este range. Encerrando.")
+    # 3. Buscar Dados Históricos do Redis (um DataFrame por intervalo)
+    base_data_by_interval = {}
+    for interval in INTERVALS:
+        base_data = load_base_data(redis_handler, interval, start_ts_ms, end_ts_ms)
+        if base_data is not None: base_data_by_interval[interval] = base_data
+    if not base_data_by_interval:
+        logger.critical("Nenhum intervalo com dados históricos. Encerrando.")
         return
-    logger.info(f"Total de {len(base_data)} velas históricas obtidas do Redis ({base_data.index.min()} a {base_data.index.max()}).")
-
 
     # Lista para armazenar os resultados de cada combinação
     results = []
+    tasks = [(interval, sma_fast, sma_slow) for interval in base_data_by_interval for sma_fast, sma_slow in param_combinations]
+    sweep_start = time.perf_counter()
+    sma_lengths = sweep_sma_lengths(param_combinations)
+    indicators_by_interval = {interval: IndicatorMatrix.from_close(base_data['Close'].to_numpy(), sma_lengths) for interval, base_data in base_data_by_interval.items()}
+    logger.info(f"Indicadores pré-calculados: {len(sma_lengths)} SMAs distintas p/ {len(param_combinations)} combinações por intervalo ({time.perf_counter() - sweep_start:.2f}s).")
+
+    # Cache: chave = (símbolo, intervalo, período, fingerprint dos dados, parâmetros, custos); pula o que já foi calculado
+    store = None; keys = {}; cached = {}
+    if RESULT_STORE_PATH:
+        try:
+            store = BacktestResultStore(RESULT_STORE_PATH)
+            fingerprints = {interval: data_fingerprint(base_data) for interval, base_data in base_data_by_interval.items()}
+            # Período efetivo (1ª/última vela carregada): com END_DATE_STR=None o fim pedido é "agora" e mudaria a chave a cada execução
+            spans = {interval: (base_data.index[0].value // 10**6, base_data.index[-1].value // 10**6) for interval, base_data in base_data_by_interval.items()}
+            keys = {(interval, f, s): combination_key(SYMBOL, interval, *spans[interval], fingerprints[interval], STRATEGY_NAME, {'sma_fast': f, 'sma_slow': s}, COMMISSION_RATE, INITIAL_CASH)
+                    for interval, f, s in tasks}
+            cached = store.get_many(list(keys.values()))
+            store.start_run(SYMBOL, list(base_data_by_interval), start_ts_ms, end_ts_ms, STRATEGY_NAME, len(tasks), len(cached)); store.link_run(list(cached))
+            logger.info(f"Cache de resultados ({RESULT_STORE_PATH}): {len(cached)}/{len(tasks)} combinações já calculadas.")
+        except Exception as e: logger.error("Falha ao abrir o cache de resultados. Seguindo sem cache.", exc_info=True); store = None; keys = {}; cached = {}
+    pending = [task for task in tasks if keys.get(task) not in cached]
+    computed = 0
+    workers = min(MAX_WORKERS or os.cpu_count() or 1, len(pending))
+    logger.info(f"{len(pending)} de {len(tasks)} combinações a calcular ({len(base_data_by_interval)} intervalo(s)) em {max(workers, 1)} processo(s)...")
+
+    trades_by_combination = []
+    def handle_result(interval: str, sma_fast: int, sma_slow: int, outcome, from_cache: bool = False):
+        nonlocal computed
+        if outcome is None: logger.warning(f"Sem dados após dropna/shift para SMAs {sma_fast}/{sma_slow} ({interval}). Pulando."); return
+        result, trades, _ = outcome
+        if store is not None and not from_cache: # Grava na chegada: uma varredura interrompida retoma daqui
+            try: store.put(keys[(interval, sma_fast, sma_slow)], SYMBOL, interval, *spans[interval], fingerprints[interval], STRATEGY_NAME,
+                           {'sma_fast': sma_fast, 'sma_slow': sma_slow}, COMMISSION_RATE, INITIAL_CASH, result, trades)
+            except Exception as e: logger.error(f"Falha ao gravar resultado {sma_fast}/{sma_slow} ({interval}) no cache.", exc_info=True)
+        computed += not from_cache
+        result = {'Interval': interval, **result}
+        logger.info(f"--- Concluído Teste Parâmetros ({interval}): SMA Fast={sma_fast}, SMA Slow={sma_slow} ---")
+        logger.info(f"Sinais: {result.pop('Buy_Signals')} BUYs, {result.pop('Sell_Signals')} SELLs. Resultado: P&L={result['Pnl']:.2f} USDT, Retorno={result['Return_Pct']:.2f}%")
+        results.append(result); trades_by_combination.append((interval, sma_fast, sma_slow, trades))
+
+    def top_combinations() -> list[tuple[str, int, int]]:
+        ranked = sorted(results, key=lambda r: r['Return_Pct'], reverse=True)[:REPORT_TOP_K]
+        return [(r['Interval'], int(r['SMA_Fast']), int(r['SMA_Slow'])) for r in ranked]
+
+    for interval, sma_fast, sma_slow in tasks:
+        hit = cached.get(keys.get((interval, sma_fast, sma_slow)))
+        if hit is not None: handle_result(interval, sma_fast, sma_slow, ({'SMA_Fast': sma_fast, 'SMA_Slow': sma_slow, **hit['result']}, hit['trades'], None), from_cache=True)
 
-    # --- Loop de Otimização ---
-    for sma_fast, sma_slow in param_combinations:
-        logger.info(f"\n--- Testando Parâmetros: SMA Fast={sma_fast}, SMA Slow={sma_slow} ---")
-        data = base_data.copy() # Trabalha com cópia dos dados base
-
-        # 3a. Calcular Indicadores
-        logger.info(f"Calculando SMA {sma_fast} e SMA {sma_slow}...")
-        sma_f_col = f'SMA_{sma_fast}'
-        sma_s_col = f'SMA_{sma_slow}'
-        data[sma_f_col] = data['Close'].rolling(window=sma_fast).mean()
-        data[sma_s_col] = data['Close'].rolling(window=sma_slow).mean()
-        data.dropna(inplace=True)
-        if data.empty: logger.warning(f"Sem dados após dropna para SMAs {sma_fast}/{sma_slow}. Pulando."); continue
-        logger.info("Indicadores calculados.")
-
-        # 4a. Gerar Sinais
-        logger.info("Gerando sinais de Crossover...")
-        data['Position'] = np.where(data[sma_f_col] > data[sma_s_col], 1, -1)
-        data['Signal'] = np.where(data['Position'] > data['Position'].shift(1), 1, np.where(data['Position'] < data['Position'].shift(1), -1, 0))
-        data = data.iloc[1:]
-        if data.empty: logger.warning(f"Sem dados após shift(1) para SMAs {sma_fast}/{sma_slow}. Pulando."); continue
-        buy_signals_count = (data['Signal'] == 1).sum(); sell_signals_count = (data['Signal'] == -1).sum()
-        logger.info(f"Sinais gerados: {buy_signals_count} BUYs, {sell_signals_count} SELLs.")
-
-        # 5a. Executar Simulação
-        final_value, pnl, return_pct, num_trades, trades, portfolio = simulate_strategy(
-            data_with_signals=data, initial_cash=INITIAL_CASH, commission_rate=COMMISSION_RATE
-        )
-
-        results.append({'SMA_Fast': sma_fast, 'SMA_Slow': sma_slow, 'Final_Value': final_value, 'Pnl': pnl, 'Return_Pct': return_pct, 'Num_Trades': num_trades})
-
-        # --- Geração de Relatórios e Gráficos (Opcional por combinação) ---
-        report_suffix = f"SMA_{sma_fast}_{sma_slow}"
-        # Relatório QuantStats (Comentado)
-        logger.warning(f"Geração do relatório QuantStats HTML desabilitada.")
-        # Gráfico da Curva de Capital
-        # ... (código para gerar e salvar gráfico PNG como antes, usando 'portfolio' e 'data') ...
-        if not portfolio.empty:
-             try:
-                logger.info(f"Gerando gráfico da Curva de Capital para {report_suffix}...")
-                # ... (código matplotlib como antes) ...
-                plt.style.use('seaborn-v0_8-darkgrid'); fig, ax = plt.subplots(figsize=(14, 7))
-                ax.plot(portfolio.index, portfolio['Value'], label=f'Estratégia SMA ({sma_fast}/{sma_slow})', color='blue', linewidth=1.5)
-                buy_hold_start_price = data['Close'].loc[portfolio.index[0]]
-                buy_hold_value = (data['Close'].loc[portfolio.index] / buy_hold_start_price) * INITIAL_CASH
-                ax.plot(buy_hold_value.index, buy_hold_value, label=f'Buy & Hold {SYMBOL}', color='orange', linestyle='--', alpha=0.8)
-                ax.set_title(f'Curva de Capital - {report_suffix} vs Buy & Hold', fontsize=14)
-                # ... (resto do código de plotagem) ...
-                ax.legend(fontsize=10); ax.grid(True, linestyle=':', linewidth=0.5); ax.set_xlabel('Data', fontsize=12); ax.set_ylabel('Valor do Portfólio (USDT)', fontsize=12)
-                try: import matplotlib.ticker as mtick; fmt = '${x:,.0f}'; tick = mtick.StrMethodFormatter(fmt); ax.yaxis.set_major_formatter(tick)
-                except ImportError: logger.warning("Ticker não encontrado.")
-                plt.tight_layout(); chart_filename = f'equity_curve_{report_suffix}.png'; plt.savefig(chart_filename); logger.info(f"Gráfico salvo em: {chart_filename}"); plt.close(fig)
-             except Exception as e: logger.error(f"Falha ao gerar gráfico para {report_suffix}.", exc_info=True)
-        else: logger.warning(f"DF Portfólio vazio para {report_suffix}. Gráfico não gerado.")
-
-        # Salvar Trades (Opcional por combinação)
-        # ... (código para salvar trades CSV como antes) ...
-        if trades:
-            try:
-                trades_df = pd.DataFrame(trades); trades_filename = f'backtest_trades_{report_suffix}.csv'; trades_df.to_csv(trades_filename, index=False); logger.info(f"Log de trades para {report_suffix} salvo em: {trades_filename}")
-            except Exception as e: logger.error(f"Falha ao salvar log de trades para {report_suffix}.", exc_info=True)
-
-        logger.info(f"--- Concluído Teste Parâmetros: SMA Fast={sma_fast}, SMA Slow={sma_slow} ---")
-        logger.info(f"Resultado: P&L={pnl:.2f} USDT, Retorno={return_pct:.2f}%")
+    # --- Loop de Otimização (pool de processos sobre memória compartilhada) + Estágio de Relatórios ---
+    charts = []
+    if workers <= 1:
+        for interval, sma_fast, sma_slow in pending: handle_result(interval, sma_fast, sma_slow, evaluate_combination(base_data_by_interval[interval], sma_fast, sma_slow, indicators_by_interval[interval]))
+        logger.info(f"Varredura concluída em {time.perf_counter() - sweep_start:.2f}s.")
+        report_start = time.perf_counter()
+        for interval, sma_fast, sma_slow in top_combinations(): charts.append(render_equity_curve(base_data_by_interval[interval], indicators_by_interval[interval], interval, sma_fast, sma_slow))
+        if results: charts.append(render_summary_chart(pd.DataFrame(results)))
+    else:
+        segments = {}
+        try:
+            for interval, base_data in base_data_by_interval.items(): segments[interval] = share_price_data(base_data, indicators_by_interval[interval])
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(_evaluate_shared, segments[interval][1], sma_fast, sma_slow): (interval, sma_fast, sma_slow) for interval, sma_fast, sma_slow in pending}
+                for future in as_completed(futures): # Coleta na ordem em que terminam
+                    interval, sma_fast, sma_slow = futures[future]
+                    try: outcome = future.result()
+                    except Exception as e: logger.error(f"Falha ao avaliar SMAs {sma_fast}/{sma_slow} ({interval}).", exc_info=True); continue
+                    handle_result(interval, sma_fast, sma_slow, outcome)
+                logger.info(f"Varredura concluída em {time.perf_counter() - sweep_start:.2f}s.")
+                report_start = time.perf_counter()
+                # Gráficos no mesmo pool (workers já anexados aos blocos compartilhados)
+                render_futures = [pool.submit(_render_equity_curve_shared, segments[interval][1], interval, sma_fast, sma_slow) for interval, sma_fast, sma_slow in top_combinations()]
+                if results: render_futures.append(pool.submit(render_summary_chart, pd.DataFrame(results)))
+                for future in as_completed(render_futures):
+                    try: charts.append(future.result())
+                    except Exception as e: logger.error("Falha ao renderizar gráfico do relatório.", exc_info=True)
+        finally:
+            for shm, _ in segments.values(): shm.close(); shm.unlink()
+    if store is not None: store.finish_run(computed); store.close()
+    write_trades_file(trades_by_combination)
+    charts = [c for c in charts if c]
+    logger.info(f"Relatórios: {len(charts)} gráfico(s) em {time.perf_counter() - report_start:.2f}s ({', '.join(sorted(charts)) if charts else 'nenhum'}).")
+    logger.warning(f"Geração do relatório QuantStats HTML desabilitada.")
 
 
     # --- Análise Final da Otimização ---
     logger.info("\n==== RESULTADOS DA OTIMIZAÇÃO DE PARÂMETROS ====")
-    # ... (código para exibir tabela de resultados e melhor combinação, como antes) ...
     if results:
         results_df = pd.DataFrame(results)
         results_df.sort_values(by='Return_Pct', ascending=False, inplace=True)
         logger.info(f"Resultados por combinação:\n{results_df.to_string()}")
         best_result = results_df.iloc[0]
-        logger.info("\n--- Melhor Combinação Encontrada ---"); logger.info(f"SMA Fast: {best_result['SMA_Fast']:.0f}"); logger.info(f"SMA Slow: {best_result['SMA_Slow']:.0f}"); logger.info(f"Valor Final: {best_result['Final_Value']:.2f} USDT")
+        logger.info("\n--- Melhor Combinação Encontrada ---"); logger.info(f"Intervalo: {best_result['Interval']}"); logger.info(f"SMA Fast: {best_result['SMA_Fast']:.0f}"); logger.info(f"SMA Slow: {best_result['SMA_Slow']:.0f}"); logger.info(f"Valor Final: {best_result['Final_Value']:.2f} USDT")
         logger.info(f"P&L Total: {best_result['Pnl']:.2f} USDT"); logger.info(f"Retorno Total: {best_result['Return_Pct']:.2f}%"); logger.info(f"Número de Trades: {best_result['Num_Trades']:.0f}")
     else: logger.warning("Nenhuma combinação produziu resultados.")
 
@@ -204,4 +424,4 @@ def run_backtest_optimization_redis():
 # --- Execução ---
 if __name__ == "__main__":
     # Chama a função de otimização que agora lê do Redis
-    run_backtest_optimization_redis()
\ No newline at end of file
+    run_backtest_optimization_redis()
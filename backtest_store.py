@@ -0,0 +1,176 @@
+# quantis_crypto_trader_gemini/backtest_store.py
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = "backtest_results.db"
+
+# --- Chaves Endereçadas por Conteúdo ---
+def data_fingerprint(data: pd.DataFrame, columns=('Close', 'High', 'Low')) -> str:
+    """sha256 dos bytes do índice de tempo + colunas de preço: muda se qualquer vela do dataset mudar."""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(data.index.values.view(np.int64)).tobytes())
+    for column in columns:
+        if column in data.columns: digest.update(column.encode('utf-8')); digest.update(np.ascontiguousarray(data[column].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+def combination_key(symbol: str, interval: str, start_ts_ms: int, end_ts_ms: int, data_fp: str, strategy: str, params: dict,
+                    commission_rate: float, initial_cash: float) -> str:
+    """sha256 de tudo que determina o resultado de uma combinação (mesma chave = mesmo resultado, pode reaproveitar)."""
+    payload = {'symbol': symbol, 'interval': interval, 'start_ts_ms': int(start_ts_ms), 'end_ts_ms': int(end_ts_ms), 'data': data_fp,
+               'strategy': strategy, 'params': params, 'commission_rate': commission_rate, 'initial_cash': initial_cash}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def _json_default(value):
+    if isinstance(value, pd.Timestamp): return value.isoformat()
+    if isinstance(value, np.generic): return value.item()
+    raise TypeError(f"Tipo não serializável: {type(value)}")
+
+
+class BacktestResultStore:
+    """
+    Resultados de backtest em SQLite, um por combinação, com chave = combination_key.
+
+    Cada resultado é gravado assim que chega (WAL + commit por linha): uma varredura interrompida retoma de onde
+    parou, e reexecuções com os mesmos dados/parâmetros pulam as combinações já calculadas. Índices por
+    (symbol, interval, strategy), parâmetros e retorno deixam rápidas as consultas de comparação entre execuções.
+
+    results.run_id é a execução que calculou o resultado pela primeira vez; quais resultados pertencem a cada
+    execução (calculados ou reaproveitados do cache) fica em run_results, usada por compare_runs.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT, started_ms INTEGER NOT NULL, finished_ms INTEGER, symbol TEXT, intervals TEXT,
+            start_ts_ms INTEGER, end_ts_ms INTEGER, strategy TEXT, total INTEGER, cached INTEGER, computed INTEGER, status TEXT);
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY, run_id INTEGER, created_ms INTEGER NOT NULL, symbol TEXT NOT NULL, interval TEXT NOT NULL,
+            start_ts_ms INTEGER, end_ts_ms INTEGER, data_fingerprint TEXT, strategy TEXT NOT NULL, params_json TEXT NOT NULL,
+            sma_fast INTEGER, sma_slow INTEGER, commission_rate REAL, initial_cash REAL,
+            final_value REAL, pnl REAL, return_pct REAL, num_trades INTEGER, buy_signals INTEGER, sell_signals INTEGER, trades_json TEXT);
+        CREATE INDEX IF NOT EXISTS ix_results_scope ON results (symbol, interval, strategy);
+        CREATE INDEX IF NOT EXISTS ix_results_params ON results (strategy, sma_fast, sma_slow);
+        CREATE INDEX IF NOT EXISTS ix_results_return ON results (return_pct);
+        CREATE INDEX IF NOT EXISTS ix_results_run ON results (run_id);
+        CREATE TABLE IF NOT EXISTS run_results (run_id INTEGER NOT NULL, key TEXT NOT NULL, PRIMARY KEY (run_id, key)) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS ix_run_results_key ON run_results (key);
+        CREATE TABLE IF NOT EXISTS walk_forward (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, run_id INTEGER, created_ms INTEGER NOT NULL, symbol TEXT NOT NULL, interval TEXT NOT NULL,
+            window INTEGER NOT NULL, train_start_ms INTEGER, train_end_ms INTEGER, test_start_ms INTEGER, test_end_ms INTEGER, strategy TEXT NOT NULL,
+            params_json TEXT, sma_fast INTEGER, sma_slow INTEGER, train_return_pct REAL, train_num_trades INTEGER, candidates INTEGER,
+            test_final_value REAL, test_pnl REAL, test_return_pct REAL, test_num_trades INTEGER, test_buy_hold_pct REAL);
+        CREATE INDEX IF NOT EXISTS ix_walk_forward_scope ON walk_forward (run_id, symbol, interval, window);
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL"); self.conn.execute("PRAGMA synchronous=NORMAL")
+        has_links = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'run_results'").fetchone() is not None
+        self.conn.executescript(self.SCHEMA)
+        if not has_links: # Banco anterior a run_results: cada resultado pertence ao menos à execução que o calculou
+            self.conn.execute("INSERT OR IGNORE INTO run_results (run_id, key) SELECT run_id, key FROM results WHERE run_id IS NOT NULL"); self.conn.commit()
+        self.run_id: int | None = None
+
+    def close(self):
+        self.conn.close()
+
+    # --- Execuções ---
+    def start_run(self, symbol: str, intervals: list[str], start_ts_ms: int, end_ts_ms: int, strategy: str, total: int, cached: int) -> int:
+        cursor = self.conn.execute("INSERT INTO runs (started_ms, symbol, intervals, start_ts_ms, end_ts_ms, strategy, total, cached, computed, status) VALUES (?,?,?,?,?,?,?,?,0,'running')",
+                                   (int(time.time() * 1000), symbol, ','.join(intervals), start_ts_ms, end_ts_ms, strategy, total, cached))
+        self.conn.commit(); self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def link_run(self, keys: list[str]):
+        """Associa à execução atual resultados já gravados (reaproveitados do cache), para aparecerem em compare_runs."""
+        if self.run_id is None or not keys: return
+        self.conn.executemany("INSERT OR IGNORE INTO run_results (run_id, key) VALUES (?, ?)", [(self.run_id, key) for key in keys])
+        self.conn.commit()
+
+    def finish_run(self, computed: int, status: str = "done"):
+        if self.run_id is None: return
+        self.conn.execute("UPDATE runs SET finished_ms = ?, computed = ?, status = ? WHERE run_id = ?", (int(time.time() * 1000), computed, status, self.run_id))
+        self.conn.commit()
+
+    # --- Resultados ---
+    def get_many(self, keys: list[str]) -> dict[str, dict]:
+        """Resultados já gravados para as chaves pedidas (chave -> {'params', 'result', 'trades'}), com os trades já como Timestamp."""
+        found = {}
+        for i in range(0, len(keys), 500): # Limite de parâmetros do SQLite
+            chunk = keys[i:i + 500]
+            rows = self.conn.execute(f"SELECT key, params_json, final_value, pnl, return_pct, num_trades, buy_signals, sell_signals, trades_json FROM results WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            for key, params_json, final_value, pnl, return_pct, num_trades, buy_signals, sell_signals, trades_json in rows:
+                trades = json.loads(trades_json) if trades_json else []
+                for trade in trades: trade['Timestamp'] = pd.Timestamp(trade['Timestamp'])
+                result = {'Final_Value': final_value, 'Pnl': pnl, 'Return_Pct': return_pct, 'Num_Trades': num_trades, 'Buy_Signals': buy_signals, 'Sell_Signals': sell_signals}
+                found[key] = {'params': json.loads(params_json), 'result': result, 'trades': trades}
+        return found
+
+    def put(self, key: str, symbol: str, interval: str, start_ts_ms: int, end_ts_ms: int, data_fp: str, strategy: str, params: dict,
+            commission_rate: float, initial_cash: float, result: dict, trades: list):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (key, run_id, created_ms, symbol, interval, start_ts_ms, end_ts_ms, data_fingerprint, strategy, params_json, sma_fast, sma_slow,"
+            " commission_rate, initial_cash, final_value, pnl, return_pct, num_trades, buy_signals, sell_signals, trades_json) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            (key, self.run_id, int(time.time() * 1000), symbol, interval, start_ts_ms, end_ts_ms, data_fp, strategy, json.dumps(params, sort_keys=True),
+             params.get('sma_fast'), params.get('sma_slow'), commission_rate, initial_cash, float(result['Final_Value']), float(result['Pnl']),
+             float(result['Return_Pct']), int(result['Num_Trades']), result.get('Buy_Signals'), result.get('Sell_Signals'), json.dumps(trades, default=_json_default)))
+        if self.run_id is not None: self.conn.execute("INSERT OR IGNORE INTO run_results (run_id, key) VALUES (?, ?)", (self.run_id, key))
+        self.conn.commit() # Por linha: interrupção perde no máximo a combinação em andamento
+
+    # --- Walk-Forward (uma linha por janela: parâmetros escolhidos no treino + desempenho fora da amostra) ---
+    WALK_FORWARD_COLUMNS = ('symbol', 'interval', 'window', 'train_start_ms', 'train_end_ms', 'test_start_ms', 'test_end_ms', 'strategy', 'params_json',
+                            'sma_fast', 'sma_slow', 'train_return_pct', 'train_num_trades', 'candidates', 'test_final_value', 'test_pnl', 'test_return_pct',
+                            'test_num_trades', 'test_buy_hold_pct')
+
+    def put_walk_forward(self, row: dict):
+        columns = ('run_id', 'created_ms') + self.WALK_FORWARD_COLUMNS
+        values = (self.run_id, int(time.time() * 1000)) + tuple(row.get(column) for column in self.WALK_FORWARD_COLUMNS)
+        self.conn.execute(f"INSERT INTO walk_forward ({', '.join(columns)}) VALUES ({','.join('?' * len(columns))})", values)
+        self.conn.commit()
+
+    def walk_forward(self, run_id: int | None = None) -> pd.DataFrame:
+        """Janelas de uma execução de walk-forward (padrão: a última gravada), por símbolo/intervalo/janela."""
+        if run_id is None:
+            row = self.conn.execute("SELECT MAX(run_id) FROM walk_forward").fetchone(); run_id = row[0] if row else None
+        return pd.read_sql_query("SELECT * FROM walk_forward WHERE run_id IS ? ORDER BY symbol, interval, window", self.conn, params=[run_id])
+
+    # --- Consultas de Comparação ---
+    def best(self, symbol: str | None = None, interval: str | None = None, strategy: str | None = None, limit: int = 20) -> pd.DataFrame:
+        """Melhores resultados gravados (todas as execuções), pelo retorno; run_id = execução que calculou cada um."""
+        where, args = self._scope(symbol, interval, strategy)
+        return pd.read_sql_query(f"SELECT run_id, symbol, interval, start_ts_ms, end_ts_ms, strategy, params_json, final_value, pnl, return_pct, num_trades"
+                                 f" FROM results {where} ORDER BY return_pct DESC LIMIT ?", self.conn, params=args + [limit])
+
+    def params_history(self, strategy: str, sma_fast: int, sma_slow: int, symbol: str | None = None) -> pd.DataFrame:
+        """Como um mesmo par de parâmetros se saiu em cada intervalo/período/dataset já testado."""
+        where, args = self._scope(symbol, None, strategy)
+        where += (" AND" if where else "WHERE") + " sma_fast = ? AND sma_slow = ?"
+        return pd.read_sql_query(f"SELECT interval, start_ts_ms, end_ts_ms, data_fingerprint, return_pct, num_trades, created_ms FROM results {where} ORDER BY start_ts_ms",
+                                 self.conn, params=args + [sma_fast, sma_slow])
+
+    def compare_runs(self, run_a: int, run_b: int) -> pd.DataFrame:
+        """Mesmos parâmetros/intervalo em duas execuções (ex: períodos diferentes), com a diferença de retorno. Inclui os
+        resultados que cada execução reaproveitou do cache (via run_results), não só os que ela calculou."""
+        return pd.read_sql_query(
+            "SELECT a.interval, a.params_json, a.return_pct AS return_a, b.return_pct AS return_b, b.return_pct - a.return_pct AS delta"
+            " FROM run_results la JOIN results a ON a.key = la.key"
+            " JOIN results b ON a.interval = b.interval AND a.strategy = b.strategy AND a.params_json = b.params_json"
+            " JOIN run_results lb ON lb.key = b.key AND lb.run_id = ?"
+            " WHERE la.run_id = ? ORDER BY delta DESC", self.conn, params=[run_b, run_a])
+
+    def runs(self, limit: int = 20) -> pd.DataFrame:
+        return pd.read_sql_query("SELECT * FROM runs ORDER BY run_id DESC LIMIT ?", self.conn, params=[limit])
+
+    @staticmethod
+    def _scope(symbol: str | None, interval: str | None, strategy: str | None) -> tuple[str, list]:
+        clauses, args = [], []
+        for column, value in (('symbol', symbol), ('interval', interval), ('strategy', strategy)):
+            if value is not None: clauses.append(f"{column} = ?"); args.append(value)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", args
@@ -0,0 +1,68 @@
+# quantis_crypto_trader_gemini/benchmark_backtest.py
+
+# Compara backtest.simulate_strategy (vetorizada) com simulate_strategy_loop (iterrows original) em séries longas; o CI
+# roda a mesma paridade com poucas velas em tests/test_backtest_parity.py.
+# Uso:
+#   python benchmark_backtest.py                      # 20k velas sintéticas de 15m, seed 42
+#   python benchmark_backtest.py --candles 500000     # ~1 ano de velas de 1m
+#   python benchmark_backtest.py --skip-loop          # só cronometra a versão vetorizada (séries muito longas)
+# Sai com código 1 se qualquer saída (valor final, P&L, trades, portfolio_df) divergir.
+
+import argparse
+import logging
+import sys
+import time
+import numpy as np
+import pandas as pd
+import backtest
+
+def synthetic_signals(candles: int, seed: int, sma_fast: int = 20, sma_slow: int = 50, freq: str = "15min") -> pd.DataFrame:
+    """Série de preços em random walk com os sinais de crossover gerados exatamente como no otimizador."""
+    rng = np.random.default_rng(seed)
+    close = 30_000 * np.exp(np.cumsum(rng.normal(0, 0.002, candles + sma_slow + 1)))
+    data = pd.DataFrame({'Close': close}, index=pd.date_range("2024-01-01", periods=len(close), freq=freq, name="Open time"))
+    data['SMA_F'] = data['Close'].rolling(window=sma_fast).mean(); data['SMA_S'] = data['Close'].rolling(window=sma_slow).mean(); data.dropna(inplace=True)
+    data['Position'] = np.where(data['SMA_F'] > data['SMA_S'], 1, -1)
+    data['Signal'] = np.where(data['Position'] > data['Position'].shift(1), 1, np.where(data['Position'] < data['Position'].shift(1), -1, 0))
+    return data.iloc[1:]
+
+def compare(loop_result: tuple, vector_result: tuple) -> list[str]:
+    """Lista de diferenças (vazia = idênticos). Floats comparados com ==, sem tolerância."""
+    problems = []
+    for name, a, b in zip(("final_value", "pnl", "return_pct", "num_trades"), loop_result[:4], vector_result[:4]):
+        if a != b: problems.append(f"{name}: {a!r} != {b!r}")
+    trades_a, trades_b = loop_result[4], vector_result[4]
+    if len(trades_a) != len(trades_b): problems.append(f"trades: {len(trades_a)} != {len(trades_b)}")
+    else:
+        for i, (ta, tb) in enumerate(zip(trades_a, trades_b)):
+            if ta != tb: problems.append(f"trade #{i}: {ta} != {tb}"); break
+    try: pd.testing.assert_frame_equal(loop_result[5], vector_result[5], check_exact=True)
+    except AssertionError as e: problems.append(f"portfolio_df: {str(e).splitlines()[0]}")
+    return problems
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Paridade e velocidade: simulate_strategy vetorizada x iterrows.")
+    parser.add_argument("--candles", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--skip-loop", action="store_true")
+    args = parser.parse_args()
+
+    logging.getLogger('backtester').setLevel(logging.WARNING) # Sem log por trade durante a medição
+    data = synthetic_signals(args.candles, args.seed)
+    vector_times = []
+    for _ in range(args.repeats):
+        start = time.perf_counter(); vector_result = backtest.simulate_strategy(data, backtest.INITIAL_CASH, backtest.COMMISSION_RATE); vector_times.append(time.perf_counter() - start)
+    vector_s = min(vector_times)
+    print(f"{len(data)} velas | {vector_result[3]} trades | vetorizada {vector_s * 1000:.1f} ms")
+    if args.skip_loop: return 0
+
+    start = time.perf_counter(); loop_result = backtest.simulate_strategy_loop(data, backtest.INITIAL_CASH, backtest.COMMISSION_RATE); loop_s = time.perf_counter() - start
+    print(f"iterrows {loop_s:.2f}s | ganho {loop_s / max(vector_s, 1e-9):.0f}x")
+    problems = compare(loop_result, vector_result)
+    if problems:
+        print("DIVERGÊNCIA:"); [print(f"  - {p}") for p in problems]; return 1
+    print("Paridade OK (bit a bit)."); return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
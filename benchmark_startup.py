@@ -0,0 +1,107 @@
+# quantis_crypto_trader_gemini/benchmark_startup.py
+
+# Mede o tempo de startup (import) dos pontos de entrada com `python -X importtime`.
+# Uso:
+#   python benchmark_startup.py                 # mede e compara com o baseline (se existir)
+#   python benchmark_startup.py --record        # mede e grava/atualiza o baseline
+#   python benchmark_startup.py --check         # como o padrão, mas sai com código 1 se regredir ou não importar (2 se não houver baseline)
+#   python benchmark_startup.py main backtest   # só alguns pontos de entrada
+# O baseline versionado (benchmark_startup_baseline.json) registra a máquina em que foi gravado (python, platform,
+# cpu_count, machine); tempos de import só são comparáveis na mesma máquina/ambiente.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+ENTRY_POINTS = ["main", "backtest", "populate_history", "dashboard"]
+BASELINE_FILE = os.path.join(REPO_DIR, "benchmark_startup_baseline.json")
+DEFAULT_REPEATS = 5
+DEFAULT_TOLERANCE = 0.25 # 25% acima do baseline = regressão
+TOP_IMPORTS = 10
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    """Converte a saída do -X importtime em {módulo: tempo cumulativo em us}."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line: continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3: continue
+        try: cumulative_us = int(parts[1].strip())
+        except ValueError: continue # Linha de cabeçalho
+        cumulative[parts[2].strip()] = cumulative_us
+    return cumulative
+
+def measure_entry_point(module: str, repeats: int) -> dict:
+    """Importa o módulo em subprocessos limpos e retorna medianas de wall time e import time."""
+    wall_ms = []; import_ms = []; last_imports = {}
+    env = dict(os.environ); env["PYTHONPATH"] = REPO_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    with tempfile.TemporaryDirectory() as workdir: # Logs/DB criados no import não sujam o repositório
+        for _ in range(repeats):
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=workdir, env=env, capture_output=True, text=True)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if proc.returncode != 0:
+                tail = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "sem stderr"
+                return {"ok": False, "error": tail}
+            imports = parse_importtime(proc.stderr)
+            wall_ms.append(elapsed_ms); import_ms.append(imports.get(module, 0) / 1000); last_imports = imports
+    heaviest = sorted(((name, us / 1000) for name, us in last_imports.items() if "." not in name and name != module), key=lambda item: item[1], reverse=True)[:TOP_IMPORTS]
+    return {"ok": True, "wall_ms": round(statistics.median(wall_ms), 1), "import_ms": round(statistics.median(import_ms), 1), "heaviest": [[name, round(ms, 1)] for name, ms in heaviest]}
+
+def machine_info() -> dict:
+    """Identificação da máquina gravada junto do baseline (os tempos só são comparáveis nela)."""
+    cpu_model = platform.processor() or None
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f: cpu_model = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu_model)
+    except OSError: pass # Fora do Linux
+    return {"python": sys.version.split()[0], "platform": sys.platform, "machine": platform.machine(), "cpu_model": cpu_model, "cpu_count": os.cpu_count()}
+
+def load_baseline() -> dict:
+    if not os.path.exists(BASELINE_FILE): return {}
+    with open(BASELINE_FILE, encoding="utf-8") as f: return json.load(f)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de startup (import) dos pontos de entrada.")
+    parser.add_argument("entry_points", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--record", action="store_true", help="Grava os resultados como novo baseline.")
+    parser.add_argument("--check", action="store_true", help="Sai com código 1 se algum ponto de entrada regredir ou falhar no import.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    baseline = load_baseline(); results = {}; regressions = []; failures = []
+    if args.check and not baseline.get("results") and not args.record:
+        print(f"Sem baseline em {BASELINE_FILE}: grave um com --record (na máquina de referência) antes de usar --check."); return 2
+    print(f"Python {sys.version.split()[0]} | {args.repeats} repetições por ponto de entrada")
+    if baseline: print(f"Baseline: {baseline.get('cpu_model')} x{baseline.get('cpu_count')}, Python {baseline.get('python')} ({baseline.get('recorded_at')})")
+    print()
+    for module in args.entry_points:
+        result = measure_entry_point(module, args.repeats); results[module] = result
+        if not result["ok"]: print(f"{module:18s} FALHOU: {result['error']}"); failures.append(module); continue
+        line = f"{module:18s} wall={result['wall_ms']:8.1f} ms  import={result['import_ms']:8.1f} ms"
+        base = baseline.get("results", {}).get(module)
+        if base and base.get("ok"):
+            delta = (result["import_ms"] - base["import_ms"]) / base["import_ms"] if base["import_ms"] else 0.0
+            line += f"  (baseline {base['import_ms']:.1f} ms, {delta:+.0%})"
+            if delta > args.tolerance: regressions.append(module); line += "  <-- REGRESSÃO"
+        print(line)
+        print("    mais pesados: " + ", ".join(f"{name} {ms:.0f}ms" for name, ms in result["heaviest"]))
+
+    if args.record:
+        payload = {**machine_info(), "repeats": args.repeats, "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f: json.dump(payload, f, indent=2)
+        print(f"\nBaseline gravado em {BASELINE_FILE}")
+    if regressions: print(f"\nRegressões acima de {args.tolerance:.0%}: {regressions}")
+    if failures: print(f"Falhas de import: {failures}")
+    return 1 if (args.check and (regressions or failures)) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
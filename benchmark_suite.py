@@ -0,0 +1,188 @@
+# quantis_crypto_trader_gemini/benchmark_suite.py
+
+# Benchmarks dos caminhos quentes sobre velas sintéticas (synthetic_data, seed fixa) e Redis em memória (fakeredis),
+# comparados com um baseline JSON com limite de regressão por caso.
+# Uso:
+#   python benchmark_suite.py                                 # todos os casos, compara com o baseline (se existir)
+#   python benchmark_suite.py --record                        # mede e grava/atualiza o baseline
+#   python benchmark_suite.py --check                         # como o padrão, mas sai com código 1 se regredir (2 se faltar baseline)
+#   python benchmark_suite.py simulate_strategy find_patterns_scan --repeats 10
+# Dependências extras: fakeredis (casos Redis e trade_cycle) e pandas_ta (indicadores e trade_cycle). Caso sem a
+# dependência aparece como PULADO e não conta como regressão.
+# O baseline versionado (benchmark_suite_baseline.json) registra a máquina em que foi gravado (benchmark_startup.machine_info);
+# os tempos só são comparáveis nela. --record só acrescenta/atualiza os casos que rodaram.
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import synthetic_data
+from benchmark_startup import machine_info
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(REPO_DIR, "benchmark_suite_baseline.json")
+DEFAULT_REPEATS = 5
+DEFAULT_TOLERANCE = 0.25 # 25% acima do baseline = regressão (casos podem ter limite próprio em CASES)
+SEED = 42
+SYMBOL = "BTCUSDT"
+
+class SkipCase(Exception):
+    """Dependência opcional ausente: o caso é pulado."""
+
+def _require(*modules: str):
+    missing = [m for m in modules if importlib.util.find_spec(m) is None]
+    if missing: raise SkipCase(f"{', '.join(missing)} não instalado")
+
+# --- Casos ---
+# Cada setup prepara os dados (fora da medição) e devolve a função medida, sem argumentos.
+def setup_add_klines(candles: int):
+    _require('fakeredis')
+    data = synthetic_data.generate_ohlcv(candles, "1m", seed=SEED); handler = synthetic_data.fake_redis_handler()
+    def run(): handler.client.flushdb(); handler.add_klines_to_hist(SYMBOL, "1m", data)
+    return run
+
+def setup_get_range(candles: int):
+    _require('fakeredis')
+    data = synthetic_data.generate_ohlcv(candles, "1m", seed=SEED); handler = synthetic_data.fake_redis_handler()
+    synthetic_data.load_history(handler, SYMBOL, {"1m": data})
+    start_ms, end_ms = data.index[0].value // 10**6, data.index[-1].value // 10**6
+    return lambda: handler.get_hist_klines_range(SYMBOL, "1m", start_ms, end_ms)
+
+def setup_calculate_indicators(candles: int):
+    _require('pandas_ta')
+    import main as live
+    data = synthetic_data.generate_ohlcv(candles, "15m", seed=SEED)
+    return lambda: live.calculate_indicators(data.copy(), live.SMA_PARAMS, live.ICHI_PARAMS, live.BBANDS_PARAMS, live.ATR_PARAMS, live.RSI_PARAMS, live.MACD_PARAMS)
+
+def setup_simulate_strategy(candles: int, sma_fast: int = 20, sma_slow: int = 50):
+    import backtest
+    close = synthetic_data.generate_ohlcv(candles + sma_slow + 1, "15m", seed=SEED)['Close']
+    position = np.where(close.rolling(sma_fast).mean() > close.rolling(sma_slow).mean(), 1, -1)
+    signal = np.where(position[1:] > position[:-1], 1, np.where(position[1:] < position[:-1], -1, 0)) # Crossover, como no otimizador
+    data = pd.DataFrame({'Close': close.to_numpy()[1:], 'Signal': signal}, index=close.index[1:]).iloc[sma_slow:]
+    return lambda: backtest.simulate_strategy(data, backtest.INITIAL_CASH, backtest.COMMISSION_RATE)
+
+def setup_find_patterns_scan(candles: int):
+    import find_patterns
+    data = synthetic_data.generate_ohlcv(candles, "15m", seed=SEED).drop(columns=['Close time'])
+    return lambda: find_patterns.scan_first_profitable_entries(data, find_patterns.PROFIT_TARGET, find_patterns.LOOKAHEAD_CANDLES)
+
+class SyntheticBinance:
+    """Binance offline para o trade_cycle: o histórico sintético já está completo (nenhuma vela nova) e o ticker é o último fechamento."""
+    def __init__(self, last_price: float): self.last_price = last_price
+    def get_klines(self, symbol: str, interval: str, start_str: str | None = None, limit: int = 1000, **kwargs) -> pd.DataFrame: return pd.DataFrame()
+    def get_ticker_price(self, symbol: str) -> float: return self.last_price
+
+def setup_trade_cycle(days: int):
+    """Ciclo completo do main.trade_cycle (atualização -> leitura Redis -> indicadores -> análise -> decisão) com Redis em
+    fakeredis, Binance sintética, analisador técnico e ordens num MatchingSimulator. Caches de janela/indicadores do main
+    são limpos a cada execução (ciclo frio); as pausas entre TFs (time.sleep) não entram na medição."""
+    _require('fakeredis', 'pandas_ta')
+    import main as live
+    import telegram_interface
+    from execution import MatchingSimulator, OrderExecutor
+    from portfolio import PortfolioEngine
+    from replay_engine import TechnicalAnalyzer
+    from strategy import StrategyManager
+    history = synthetic_data.generate_mta_history(days * 1440, list(live.MTA_INTERVALS_TO_UPDATE.values()), start="2024-01-25", seed=SEED)
+    redis_handler = synthetic_data.fake_redis_handler(); synthetic_data.load_history(redis_handler, SYMBOL, {i: df for i, df in history.items() if not df.empty})
+    venue = MatchingSimulator(slippage_bps=0.0, latency_seconds=0.0, fee_rate=0.001, balances={'USDT': 1000.0})
+    executor = OrderExecutor(venue, venue_name="benchmark", max_retries=0, sleep=lambda seconds: None); executor.start_user_stream()
+    portfolio = PortfolioEngine(redis_handler=redis_handler); executor.add_fill_listener(portfolio.on_order_fill)
+    strategy_manager = StrategyManager(redis_handler=redis_handler, binance_handler=None, order_executor=executor, order_fill_timeout=0.0, portfolio=portfolio)
+    strategy_manager.symbol = SYMBOL
+    live.redis_handler = redis_handler; live.binance_handler = SyntheticBinance(float(history["1m"]['Close'].iloc[-1]))
+    live.strategy_manager = strategy_manager; live.gemini_analyzer = TechnicalAnalyzer(strategy_manager)
+    def run():
+        live.kline_buffers.clear(); live.indicator_state.clear()
+        previous_sink = telegram_interface.set_message_sink(lambda text, disable_notification=False: None); sleep = time.sleep; time.sleep = lambda seconds: None
+        try: live.trade_cycle()
+        finally: time.sleep = sleep; telegram_interface.set_message_sink(previous_sink)
+    return run
+
+# nome -> (setup, parâmetros, tolerância). Tamanhos pensados para cada caso levar de milissegundos a poucos segundos.
+CASES = {
+    "add_klines_to_hist": (setup_add_klines, {'candles': 20_000}, DEFAULT_TOLERANCE),
+    "get_hist_klines_range": (setup_get_range, {'candles': 20_000}, DEFAULT_TOLERANCE),
+    "calculate_indicators": (setup_calculate_indicators, {'candles': 200}, DEFAULT_TOLERANCE),
+    "simulate_strategy": (setup_simulate_strategy, {'candles': 200_000}, DEFAULT_TOLERANCE),
+    "find_patterns_scan": (setup_find_patterns_scan, {'candles': 10_000}, DEFAULT_TOLERANCE),
+    "trade_cycle": (setup_trade_cycle, {'days': 10}, 0.5), # Mais ruidoso (threads de timeout, fakeredis, várias etapas)
+}
+
+# --- Medição ---
+def measure_case(name: str, repeats: int) -> dict:
+    setup, params, tolerance = CASES[name]
+    try:
+        started = time.perf_counter(); run = setup(**params); setup_s = time.perf_counter() - started
+        run() # Aquecimento (imports tardios, caches de primeira chamada)
+        times_ms = []
+        for _ in range(repeats):
+            started = time.perf_counter(); run(); times_ms.append((time.perf_counter() - started) * 1000)
+    except SkipCase as e: return {"ok": False, "skipped": True, "error": str(e), "params": params}
+    except Exception as e: return {"ok": False, "skipped": False, "error": f"{type(e).__name__}: {e}", "params": params}
+    return {"ok": True, "median_ms": round(statistics.median(times_ms), 3), "min_ms": round(min(times_ms), 3), "setup_s": round(setup_s, 2), "params": params, "tolerance": tolerance}
+
+def load_baseline() -> dict:
+    if not os.path.exists(BASELINE_FILE): return {}
+    with open(BASELINE_FILE, encoding="utf-8") as f: return json.load(f)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos quentes com dados sintéticos e baseline JSON.")
+    parser.add_argument("cases", nargs="*", default=list(CASES), help=f"Casos a rodar (padrão: todos): {', '.join(CASES)}")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--record", action="store_true", help="Grava os resultados como novo baseline.")
+    parser.add_argument("--check", action="store_true", help="Sai com código 1 se algum caso regredir.")
+    parser.add_argument("--tolerance", type=float, default=None, help="Sobrescreve o limite de regressão de todos os casos.")
+    args = parser.parse_args()
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown: parser.error(f"Casos desconhecidos: {unknown}")
+
+    baseline = load_baseline(); results = {}; regressions = []; failures = []; unbased = []
+    if args.check and not baseline.get("results") and not args.record:
+        print(f"Sem baseline em {BASELINE_FILE}: grave um com --record (na máquina de referência) antes de usar --check."); return 2
+    print(f"Python {sys.version.split()[0]} | {os.cpu_count()} CPU(s) | {args.repeats} repetições por caso")
+    if baseline: print(f"Baseline: {baseline.get('cpu_model')} x{baseline.get('cpu_count')}, Python {baseline.get('python')} ({baseline.get('recorded_at')})")
+    print()
+    cwd = os.getcwd(); previous_disable = logging.root.manager.disable
+    with tempfile.TemporaryDirectory() as workdir: # Logs/DBs criados nos imports não sujam o repositório
+        os.chdir(workdir); sys.path.insert(0, REPO_DIR); logging.disable(logging.WARNING) # Erros continuam aparecendo
+        try:
+            for name in args.cases:
+                result = measure_case(name, args.repeats); results[name] = result
+                if not result["ok"]:
+                    print(f"{name:22s} {'PULADO' if result['skipped'] else 'FALHOU'}: {result['error']}")
+                    if not result["skipped"]: failures.append(name)
+                    continue
+                line = f"{name:22s} mediana={result['median_ms']:10.2f} ms  min={result['min_ms']:10.2f} ms  (setup {result['setup_s']:.1f}s)"
+                base = baseline.get("results", {}).get(name); tolerance = args.tolerance if args.tolerance is not None else result["tolerance"]
+                if not (base and base.get("ok")): unbased.append(name); line += "  (sem baseline)"
+                elif base.get("params") != result["params"]: unbased.append(name); line += "  (parâmetros diferentes do baseline)"
+                else:
+                    delta = (result["median_ms"] - base["median_ms"]) / base["median_ms"] if base["median_ms"] else 0.0
+                    line += f"  (baseline {base['median_ms']:.2f} ms, {delta:+.0%})"
+                    if delta > tolerance: regressions.append(name); line += f"  <-- REGRESSÃO (limite {tolerance:.0%})"
+                print(line)
+        finally:
+            logging.disable(previous_disable); os.chdir(cwd)
+
+    if args.record:
+        payload = {**machine_info(), "repeats": args.repeats,
+                   "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"), "results": {**baseline.get("results", {}), **{name: result for name, result in results.items() if result["ok"]}}} # PULADO/FALHOU não substitui medição
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f: json.dump(payload, f, indent=2)
+        print(f"\nBaseline gravado em {BASELINE_FILE}")
+    if regressions: print(f"\nRegressões: {regressions}")
+    if failures: print(f"Falhas: {failures}")
+    if unbased and not args.record: print(f"Sem baseline comparável: {unbased}")
+    if args.check and (regressions or failures): return 1
+    return 2 if (args.check and unbased and not args.record) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
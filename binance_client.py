@@ -4,18 +4,21 @@ from binance.client import Client
 from binance.exceptions import BinanceAPIException, BinanceRequestException
 import pandas as pd
 import time
+import math
 import logging
+import metrics
 
 logger = logging.getLogger(__name__)
 
 class BinanceHandler:
-    def __init__(self, api_key: str, api_secret: str):
-        """Inicializa o cliente da Binance."""
+    def __init__(self, api_key: str, api_secret: str, request_timeout: float | None = None):
+        """Inicializa o cliente da Binance (request_timeout: timeout HTTP em segundos por requisição)."""
         # ... (init como antes, sem ';' e com try/except corretos) ...
         if not api_key or not api_secret: logger.error("API Key/Secret Binance não fornecidas."); raise ValueError("API Key/Secret Binance não podem ser vazias.")
-        self.api_key = api_key; self.api_secret = api_secret; self.client: Client | None = None
+        self.api_key = api_key; self.api_secret = api_secret; self.request_timeout = request_timeout; self.client: Client | None = None
+        self._lot_steps: dict[str, float] = {} # stepSize do LOT_SIZE por símbolo (round_quantity)
         try:
-            logger.info("Tentando conectar à API da Binance..."); self.client = Client(self.api_key, self.api_secret); self.client.ping()
+            logger.info("Tentando conectar à API da Binance..."); self.client = Client(self.api_key, self.api_secret, requests_params={'timeout': request_timeout} if request_timeout else None); self.client.ping()
             logger.info("Conexão API Binance estabelecida.")
         except (BinanceAPIException, BinanceRequestException) as e: logger.critical(f"Erro API/Request conectar Binance: Status {e.status_code}, Msg: {e.message}", exc_info=True); raise ConnectionError(f"Falha conectar/autenticar Binance: {e}") from e
         except Exception as e: logger.critical("Erro inesperado init BinanceHandler.", exc_info=True); raise e
@@ -23,7 +26,9 @@ class BinanceHandler:
     def get_server_time(self) -> int | None:
         # ... (função como antes) ...
         if not self.client: return None; 
-        try: server_time = self.client.get_server_time(); ts = server_time['serverTime']; logger.debug(f"Tempo servidor Binance: {ts}"); return ts
+        try:
+            with metrics.api_call("binance", "get_server_time"): server_time = self.client.get_server_time()
+            ts = server_time['serverTime']; logger.debug(f"Tempo servidor Binance: {ts}"); return ts
         except (BinanceAPIException, BinanceRequestException) as e: logger.error("Erro API Binance get server time.", exc_info=True); return None
         except Exception as e: logger.error("Erro inesperado get_server_time.", exc_info=True); return None
 
@@ -32,7 +37,7 @@ class BinanceHandler:
         if not self.client: return None; logger.info(f"Buscando {limit} klines {symbol} ({interval})..."); 
         try:
             start_time_ms = start_str if start_str else None; end_time_ms = end_str if end_str else None # Passa strings diretamente
-            klines = self.client.get_klines(symbol=symbol, interval=interval, limit=limit, startTime=start_time_ms, endTime=end_time_ms)
+            with metrics.api_call("binance", "get_klines"): klines = self.client.get_klines(symbol=symbol, interval=interval, limit=limit, startTime=start_time_ms, endTime=end_time_ms)
             if not klines: logger.warning(f"Nenhum klines retornado {symbol} ({interval}) params: start={start_str}, end={end_str}, limit={limit}."); return None
             columns = ['Open time', 'Open', 'High', 'Low', 'Close', 'Volume', 'Close time', 'Quote asset volume', 'Number of trades', 'Taker buy base asset volume', 'Taker buy quote asset volume', 'Ignore']
             df = pd.DataFrame(klines, columns=columns); numeric_columns = ['Open', 'High', 'Low', 'Close', 'Volume', 'Quote asset volume', 'Taker buy base asset volume', 'Taker buy quote asset volume']
@@ -48,7 +53,7 @@ class BinanceHandler:
         if not self.client: logger.error("Cliente Binance não init (hist)."); return None
         logger.info(f"Buscando klines históricos {symbol} ({interval}) de '{start_str}' até '{end_str if end_str else 'Agora'}'...")
         try:
-            klines = self.client.get_historical_klines(symbol, interval, start_str, end_str)
+            with metrics.api_call("binance", "get_historical_klines"): klines = self.client.get_historical_klines(symbol, interval, start_str, end_str)
             if not klines: logger.warning(f"Nenhum klines histórico retornado {symbol} ({interval})."); return None
             columns = ['Open time', 'Open', 'High', 'Low', 'Close', 'Volume', 'Close time', 'Quote asset volume', 'Number of trades', 'Taker buy base asset volume', 'Taker buy quote asset volume', 'Ignore']
             df = pd.DataFrame(klines, columns=columns); numeric_columns = ['Open', 'High', 'Low', 'Close', 'Volume', 'Quote asset volume', 'Taker buy base asset volume', 'Taker buy quote asset volume']
@@ -74,7 +79,7 @@ class BinanceHandler:
             return 0.0 # Retorna 0.0 em caso de erro de cliente
         logger.info(f"Verificando saldo para {asset}...")
         try:
-            balance_info = self.client.get_asset_balance(asset=asset)
+            with metrics.api_call("binance", "get_asset_balance"): balance_info = self.client.get_asset_balance(asset=asset)
             # Exemplo: {'asset': 'USDT', 'free': '100.00000000', 'locked': '0.00000000'}
             if balance_info and 'free' in balance_info:
                 try:
@@ -104,7 +109,7 @@ class BinanceHandler:
             return None
         logger.debug(f"Buscando preço ticker para {symbol}...")
         try:
-            ticker_info = self.client.get_symbol_ticker(symbol=symbol)
+            with metrics.api_call("binance", "get_symbol_ticker"): ticker_info = self.client.get_symbol_ticker(symbol=symbol)
             # Exemplo: {'symbol': 'BTCUSDT', 'price': '83000.50000000'}
             if ticker_info and 'price' in ticker_info:
                 price = float(ticker_info['price'])
@@ -124,5 +129,57 @@ class BinanceHandler:
             return None
 
 
-    # --- Adicionar funções de ordem (place_market_order, place_limit_order, etc.) aqui ---
+    # --- Ordens (usadas pelo execution.OrderExecutor) ---
+    # Diferente das consultas acima, os erros são propagados: o executor precisa distinguir recusa definitiva
+    # (BinanceAPIException) de falha de rede/timeout, em que a ordem pode ter chegado à corretora.
+    def place_order(self, symbol: str, side: str, order_type: str, client_order_id: str, quantity: float | None = None, quote_quantity: float | None = None,
+                    price: float | None = None, time_in_force: str | None = None) -> dict:
+        """Envia uma ordem MARKET (quantity ou quote_quantity) ou LIMIT com newClientOrderId. Resposta FULL (inclui fills)."""
+        if not self.client: raise ConnectionError("Cliente Binance não inicializado.")
+        params = {'symbol': symbol, 'side': side, 'type': order_type, 'newClientOrderId': client_order_id, 'newOrderRespType': 'FULL'}
+        if quantity is not None: params['quantity'] = self._format_decimal(quantity)
+        if quote_quantity is not None: params['quoteOrderQty'] = self._format_decimal(quote_quantity)
+        if order_type == 'LIMIT': params['price'] = self._format_decimal(price); params['timeInForce'] = time_in_force or 'GTC'
+        logger.info(f"Enviando ordem Binance: {params}")
+        return self.client.create_order(**params)
+
+    def get_order(self, symbol: str, client_order_id: str) -> dict | None:
+        """Consulta uma ordem pelo client order ID. None se a Binance não a conhece (-2013); outros erros são propagados."""
+        if not self.client: raise ConnectionError("Cliente Binance não inicializado.")
+        try: return self.client.get_order(symbol=symbol, origClientOrderId=client_order_id)
+        except BinanceAPIException as e:
+            if e.code == -2013: return None # Order does not exist
+            raise
+
+    def cancel_order(self, symbol: str, client_order_id: str) -> dict:
+        if not self.client: raise ConnectionError("Cliente Binance não inicializado.")
+        return self.client.cancel_order(symbol=symbol, origClientOrderId=client_order_id)
+
+    def round_quantity(self, symbol: str, quantity: float) -> float:
+        """Arredonda para baixo no stepSize do filtro LOT_SIZE do símbolo (consultado uma vez e guardado)."""
+        step = self._lot_steps.get(symbol)
+        if step is None:
+            try:
+                with metrics.api_call("binance", "get_symbol_info"): info = self.client.get_symbol_info(symbol) if self.client else None
+                lot = next((f for f in (info or {}).get('filters', []) if f.get('filterType') == 'LOT_SIZE'), None)
+                step = float(lot['stepSize']) if lot else 0.0
+            except (BinanceAPIException, BinanceRequestException): logger.error(f"Erro API Binance ao buscar LOT_SIZE de {symbol}.", exc_info=True); return quantity
+            self._lot_steps[symbol] = step
+        if step <= 0: return quantity
+        return round(math.floor(quantity / step + 1e-9) * step, 8)
+
+    @staticmethod
+    def _format_decimal(value: float) -> str:
+        return f"{value:.8f}".rstrip('0').rstrip('.') # Sem notação científica (a API recusa '1e-05')
+
+    def start_user_stream(self, callback):
+        """Abre o user-data stream (ThreadedWebsocketManager) e repassa cada mensagem a `callback`. Retorna o gerenciador."""
+        from binance import ThreadedWebsocketManager # Import tardio: só quem executa ordens abre websocket
+        manager = ThreadedWebsocketManager(api_key=self.api_key, api_secret=self.api_secret); manager.start()
+        manager.start_user_socket(callback=callback); logger.info("User-data stream Binance iniciado.")
+        return manager
+
+    def stop_user_stream(self, manager):
+        try: manager.stop(); logger.info("User-data stream Binance encerrado.")
+        except Exception: logger.error("Erro ao encerrar user-data stream.", exc_info=True)
     # (Manter comentado por enquanto)
\ No newline at end of file
@@ -1,10 +1,15 @@
 # quantis_crypto_trader_gemini/config.py
 
+from __future__ import annotations
 import os
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session
-from database import get_db, Setting # Importamos get_db e o modelo Setting
 import logging # Importa logging
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import Session
+# database (SQLAlchemy) é importado só dentro das funções de settings: scripts que apenas
+# leem o .env (dashboard, backtest, populate_history...) não pagam o import do SQLAlchemy.
 
 # Obtém um logger para este módulo
 logger = logging.getLogger(__name__)
@@ -41,11 +46,90 @@ except Exception as e:
      REDIS_PORT = 6379
      REDIS_DB = 0
 
+# --- Helpers de Leitura do .env (numéricos/booleanos com default) ---
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, 'true' if default else 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _env_number(name: str, default: float, cast=float):
+    try: return cast(os.getenv(name, str(default)))
+    except ValueError: print(f"ERRO CONFIG: Valor inválido para {name}. Usando padrão {default}."); return default
+
+# --- Métricas / Instrumentação (do .env com defaults) ---
+METRICS_ENABLED = _env_bool('METRICS_ENABLED', True)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = _env_number('METRICS_PORT', 9108, int)
+METRICS_REDIS_TIMESERIES = _env_bool('METRICS_REDIS_TIMESERIES', False)
+METRICS_REDIS_RETENTION_SECONDS = _env_number('METRICS_REDIS_RETENTION_SECONDS', 7 * 24 * 3600, int)
+
+# --- Deadlines e Timeouts (segundos) ---
+CYCLE_DEADLINE_SECONDS = _env_number('CYCLE_DEADLINE_SECONDS', 240.0) # Ciclo agendado a cada 5 min
+CYCLE_ANALYSIS_RESERVE_SECONDS = _env_number('CYCLE_ANALYSIS_RESERVE_SECONDS', 60.0) # Reservado p/ indicadores+AI+decisão
+BINANCE_TIMEOUT_SECONDS = _env_number('BINANCE_TIMEOUT_SECONDS', 10.0)
+GEMINI_TIMEOUT_SECONDS = _env_number('GEMINI_TIMEOUT_SECONDS', 45.0)
+GEMINI_MAX_CONCURRENCY = _env_number('GEMINI_MAX_CONCURRENCY', 4, int) # Requisições simultâneas no analyzer assíncrono
+GEMINI_BATCH_MAX_SYMBOLS = _env_number('GEMINI_BATCH_MAX_SYMBOLS', 8, int) # Símbolos por prompt no modo lote
+GEMINI_PROMPT_STYLE = os.getenv('GEMINI_PROMPT_STYLE', 'compact').strip().lower() # 'compact' (system_instruction + tabela) ou 'verbose'
+GEMINI_CALL_LOG_ENABLED = _env_bool('GEMINI_CALL_LOG_ENABLED', True) # Grava tokens/latência de cada chamada em gemini_call_log
+GEMINI_DECISION_LOG_ENABLED = _env_bool('GEMINI_DECISION_LOG_ENABLED', True) # Grava cada decisão (indicadores + sinal) p/ replay no backtest
+GEMINI_PRICE_INPUT_PER_MTOK = _env_number('GEMINI_PRICE_INPUT_PER_MTOK', 0.075) # USD por 1M tokens de entrada (estimativa de custo)
+GEMINI_PRICE_OUTPUT_PER_MTOK = _env_number('GEMINI_PRICE_OUTPUT_PER_MTOK', 0.30) # USD por 1M tokens de saída
+GEMINI_BREAKER_FAILURE_THRESHOLD = _env_number('GEMINI_BREAKER_FAILURE_THRESHOLD', 5, int) # Falhas seguidas p/ abrir o disjuntor
+GEMINI_BREAKER_RESET_SECONDS = _env_number('GEMINI_BREAKER_RESET_SECONDS', 120.0) # Tempo aberto antes da chamada de teste
+GEMINI_QUOTA_ENABLED = _env_bool('GEMINI_QUOTA_ENABLED', True)
+GEMINI_RPM_LIMIT = _env_number('GEMINI_RPM_LIMIT', 15, int) # Requisições por minuto (limite do plano)
+GEMINI_TPM_LIMIT = _env_number('GEMINI_TPM_LIMIT', 1_000_000, int) # Tokens por minuto (limite do plano)
+GEMINI_QUOTA_RESERVE_FRACTION = _env_number('GEMINI_QUOTA_RESERVE_FRACTION', 0.2) # Fração do limite reservada p/ alta prioridade
+GEMINI_QUOTA_MAX_WAIT_SECONDS = _env_number('GEMINI_QUOTA_MAX_WAIT_SECONDS', 10.0) # Espera máx. por cota (alta prioridade; normal espera metade)
+GEMINI_QUOTA_COOLDOWN_SECONDS = _env_number('GEMINI_QUOTA_COOLDOWN_SECONDS', 60.0) # Pausa após erro 429 (ResourceExhausted)
+REDIS_TIMEOUT_SECONDS = _env_number('REDIS_TIMEOUT_SECONDS', 5.0)
+# Comportamento se o sinal AI não chegar a tempo: 'technical' (só filtros 15m) ou 'hold'
+AI_DEADLINE_FALLBACK = os.getenv('AI_DEADLINE_FALLBACK', 'technical').strip().lower()
+# Gate pré-AI: só chama o Gemini se os filtros 15m (e a posição) permitirem uma ação confirmada
+AI_PREFILTER_GATE_ENABLED = _env_bool('AI_PREFILTER_GATE_ENABLED', True)
+
+# --- Cache Semântico de Sinais Gemini ---
+GEMINI_CACHE_ENABLED = _env_bool('GEMINI_CACHE_ENABLED', True)
+GEMINI_CACHE_MAX_ENTRIES = _env_number('GEMINI_CACHE_MAX_ENTRIES', 512, int)
+def _parse_ttl_by_timeframe(raw: str) -> dict:
+    ttls = {}
+    for part in raw.split(','):
+        if ':' not in part: continue
+        tf, ttl = part.split(':', 1)
+        try: ttls[tf.strip()] = float(ttl)
+        except ValueError: print(f"ERRO CONFIG: TTL inválido em GEMINI_CACHE_TTL_BY_TIMEFRAME ('{part}'). Ignorado.")
+    return ttls
+# Formato "tf:segundos,..."; a entrada vale pelo menor TTL entre os TFs usados no prompt
+GEMINI_CACHE_TTL_BY_TIMEFRAME = _parse_ttl_by_timeframe(os.getenv('GEMINI_CACHE_TTL_BY_TIMEFRAME', '1h:3600,15m:900,1m:600'))
+
+# --- Execução de Ordens ---
+# 'simulation' (padrão): só troca o estado da posição no Redis; 'paper': ordens no simulador local (execution.MatchingSimulator)
+# alimentado pelo ticker do ciclo; 'live': ordens reais na Binance.
+EXECUTION_MODE = os.getenv('EXECUTION_MODE', 'simulation').strip().lower()
+ORDER_MAX_RETRIES = _env_number('ORDER_MAX_RETRIES', 3, int) # Reenvios (idempotentes, mesmo client order ID) após falha sem resposta
+ORDER_RETRY_BACKOFF_SECONDS = _env_number('ORDER_RETRY_BACKOFF_SECONDS', 0.25) # Dobra a cada tentativa
+ORDER_FILL_TIMEOUT_SECONDS = _env_number('ORDER_FILL_TIMEOUT_SECONDS', 5.0) # Espera pelo fill da ordem a mercado antes de reconciliar por consulta
+PAPER_SLIPPAGE_BPS = _env_number('PAPER_SLIPPAGE_BPS', 5.0)
+PAPER_LATENCY_SECONDS = _env_number('PAPER_LATENCY_SECONDS', 0.0)
+PAPER_FEE_RATE = _env_number('PAPER_FEE_RATE', 0.001)
+PAPER_INITIAL_QUOTE_BALANCE = _env_number('PAPER_INITIAL_QUOTE_BALANCE', 1000.0) # Saldo USDT inicial do modo paper
+MAX_SYMBOL_EXPOSURE = _env_number('MAX_SYMBOL_EXPOSURE', 0.0) # Exposição máx. por símbolo (quote) nos modos paper/live; 0 = sem limite
+MAX_TOTAL_EXPOSURE = _env_number('MAX_TOTAL_EXPOSURE', 0.0) # Exposição máx. somando todos os símbolos; 0 = sem limite
+
+# --- Histórico Multi-Timeframe ---
+# Se True, só o 1m é buscado na Binance; os demais TFs são derivados localmente do 1m (resampler.py)
+DERIVE_TIMEFRAMES_FROM_1M = _env_bool('DERIVE_TIMEFRAMES_FROM_1M', False)
+
+# --- Warm Start (Snapshot) ---
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', 'quantis_snapshot.pkl')
+SNAPSHOT_INTERVAL_MINUTES = _env_number('SNAPSHOT_INTERVAL_MINUTES', 15, int)
+SNAPSHOT_MAX_AGE_SECONDS = _env_number('SNAPSHOT_MAX_AGE_SECONDS', 6 * 3600.0) # Mais velho que isso: partida a frio
+
 
 # --- Funções de Acesso ao Banco de Dados (Settings Table) ---
 
 def get_setting(db: Session, key: str, default: str | None = None) -> str | None:
     """Busca uma configuração no banco de dados pela chave."""
+    from database import Setting
     try:
         setting = db.query(Setting).filter(Setting.key == key).first()
         if setting:
@@ -59,6 +143,7 @@ def get_setting(db: Session, key: str, default: str | None = None) -> str | None
 
 def set_setting(db: Session, key: str, value: str):
     """Define ou atualiza uma configuração no banco de dados."""
+    from database import Setting
     try:
         setting = db.query(Setting).filter(Setting.key == key).first()
         if setting:
@@ -88,6 +173,7 @@ def load_or_set_initial_db_settings():
 
     logger.info("Verificando/Atualizando configurações (Redis) no banco de dados...")
     try:
+        from database import get_db
         with next(get_db()) as db_session:
             # Lê do DB ou usa o valor já carregado do .env/padrão como default
             db_redis_host = get_setting(db_session, 'redis_host', REDIS_HOST)
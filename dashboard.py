@@ -4,7 +4,7 @@ import streamlit as st
 import pandas as pd
 from redis_client import RedisHandler # Para ler estado e cache
 import config # Para configurações do Redis
-from binance.client import Client # Para constantes de intervalo se necessário
+import intervals # Constantes de intervalo (sem importar o SDK da Binance)
 import datetime
 from io import StringIO # Para corrigir o FutureWarning do pandas
 
@@ -71,7 +71,7 @@ st.caption(f"Última atualização: {datetime.datetime.now().strftime('%Y-%m-%d
 # --- Carregar Dados ---
 # Parâmetros hardcoded por enquanto, idealmente viriam de config ou UI
 symbol_display = "BTCUSDT"
-interval_display = Client.KLINE_INTERVAL_1HOUR # ou '1h'
+interval_display = intervals.KLINE_INTERVAL_1HOUR # ou '1h'
 
 klines_data, position_status = load_data_from_redis(redis_h, symbol_display, interval_display)
 
@@ -1,7 +1,8 @@
 # quantis_crypto_trader_gemini/database.py
 
 import os
-from sqlalchemy import create_engine, Column, Integer, String
+import json
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, BigInteger, Text, func
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 import logging # Importa logging
@@ -46,6 +47,45 @@ class Setting(Base):
     def __repr__(self):
         return f"<Setting(key='{self.key}', value='{self.value}')>"
 
+class GeminiCallLog(Base):
+    """Uma linha por chamada à API Gemini: tokens, latência e custo estimado (acompanhamento ao longo do tempo)."""
+    __tablename__ = "gemini_call_log"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ts_ms = Column(BigInteger, index=True, nullable=False) # Epoch ms do fim da chamada
+    endpoint = Column(String, nullable=False) # generate_content / generate_content_async / generate_content_batch
+    symbols = Column(String, nullable=True) # Símbolo(s) do prompt, separados por vírgula
+    prompt_style = Column(String, nullable=True) # compact / verbose
+    prompt_chars = Column(Integer, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    response_tokens = Column(Integer, nullable=True)
+    total_tokens = Column(Integer, nullable=True)
+    latency_ms = Column(Float, nullable=False)
+    cost_usd = Column(Float, nullable=True)
+    success = Column(Boolean, nullable=False, default=True)
+
+    def __repr__(self):
+        return f"<GeminiCallLog(ts_ms={self.ts_ms}, endpoint='{self.endpoint}', tokens={self.total_tokens}, latency_ms={self.latency_ms:.0f})>"
+
+class GeminiDecision(Base):
+    """Decisão do Gemini (requisição + resposta) chaveada por fingerprint do estado de mercado e timestamp, p/ replay offline."""
+    __tablename__ = "gemini_decisions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ts_ms = Column(BigInteger, index=True, nullable=False) # Epoch ms da decisão
+    symbol = Column(String, index=True, nullable=False)
+    fingerprint = Column(String, index=True, nullable=False) # signal_cache.market_fingerprint
+    price = Column(Float, nullable=True) # Preço do ticker enviado no prompt
+    indicators_json = Column(Text, nullable=False) # mta_indicators_data completo (JSON)
+    signal = Column(String, nullable=False)
+    justification = Column(Text, nullable=True)
+    prompt_style = Column(String, nullable=True)
+    endpoint = Column(String, nullable=True)
+    model_name = Column(String, nullable=True)
+
+    def __repr__(self):
+        return f"<GeminiDecision(ts_ms={self.ts_ms}, symbol='{self.symbol}', signal='{self.signal}')>"
+
 # Adicionar outros modelos aqui depois (Users, UserApiKeys, TradeHistory...)
 
 # --- Função para Inicializar o Banco de Dados ---
@@ -74,4 +114,57 @@ def get_db():
         raise # Re-levanta para que o erro seja tratado mais acima se necessário
     finally:
         logger.debug(f"Sessão DB {id(db)} fechada.")
-        db.close()
\ No newline at end of file
+        db.close()
+
+# --- Registro de Chamadas Gemini (Tokens/Latência) ---
+def log_gemini_call(**fields) -> bool:
+    """Grava uma linha em gemini_call_log. Falhas são logadas e não interrompem o robô."""
+    try:
+        with next(get_db()) as db:
+            db.add(GeminiCallLog(**fields)); db.commit()
+        return True
+    except Exception as e:
+        logger.error("Erro ao gravar GeminiCallLog.", exc_info=True)
+        return False
+
+def get_gemini_usage_summary(since_ms: int | None = None) -> dict | None:
+    """Totais de chamadas, tokens, custo e latência (média/máx) desde `since_ms`, agrupados por endpoint."""
+    try:
+        with next(get_db()) as db:
+            query = db.query(GeminiCallLog.endpoint, func.count(GeminiCallLog.id), func.sum(GeminiCallLog.prompt_tokens), func.sum(GeminiCallLog.response_tokens),
+                             func.sum(GeminiCallLog.cost_usd), func.avg(GeminiCallLog.latency_ms), func.max(GeminiCallLog.latency_ms))
+            if since_ms is not None: query = query.filter(GeminiCallLog.ts_ms >= since_ms)
+            rows = query.group_by(GeminiCallLog.endpoint).all()
+        return {endpoint: {'calls': calls, 'prompt_tokens': int(p_tok or 0), 'response_tokens': int(r_tok or 0), 'cost_usd': float(cost or 0.0),
+                           'avg_latency_ms': float(avg_lat or 0.0), 'max_latency_ms': float(max_lat or 0.0)}
+                for endpoint, calls, p_tok, r_tok, cost, avg_lat, max_lat in rows}
+    except Exception as e:
+        logger.error("Erro ao consultar resumo de uso do Gemini.", exc_info=True)
+        return None
+
+
+# --- Registro de Decisões Gemini (Record/Replay) ---
+def log_gemini_decision(**fields) -> bool:
+    """Grava uma decisão em gemini_decisions. Falhas são logadas e não interrompem o robô."""
+    try:
+        with next(get_db()) as db:
+            db.add(GeminiDecision(**fields)); db.commit()
+        return True
+    except Exception as e:
+        logger.error("Erro ao gravar GeminiDecision.", exc_info=True)
+        return False
+
+def load_gemini_decisions(symbol: str | None = None, since_ms: int | None = None, until_ms: int | None = None) -> list[dict]:
+    """Decisões gravadas (ordenadas por ts_ms) como dicts, com 'indicators' já decodificado do JSON."""
+    try:
+        with next(get_db()) as db:
+            query = db.query(GeminiDecision)
+            if symbol is not None: query = query.filter(GeminiDecision.symbol == symbol)
+            if since_ms is not None: query = query.filter(GeminiDecision.ts_ms >= since_ms)
+            if until_ms is not None: query = query.filter(GeminiDecision.ts_ms <= until_ms)
+            rows = query.order_by(GeminiDecision.ts_ms, GeminiDecision.id).all()
+            return [{'ts_ms': r.ts_ms, 'symbol': r.symbol, 'fingerprint': r.fingerprint, 'price': r.price, 'indicators': json.loads(r.indicators_json),
+                     'signal': r.signal, 'justification': r.justification, 'prompt_style': r.prompt_style, 'endpoint': r.endpoint} for r in rows]
+    except Exception as e:
+        logger.error("Erro ao carregar decisões Gemini gravadas.", exc_info=True)
+        return []
@@ -0,0 +1,109 @@
+# quantis_crypto_trader_gemini/decision_replay.py
+
+import bisect
+import logging
+import numpy as np
+import metrics
+from signal_cache import DEFAULT_QUANTIZATION, market_features, market_fingerprint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_DISTANCE = 1.0 # Distância RMS (em desvios-padrão por feature) acima da qual o vizinho é descartado
+
+class _SymbolBook:
+    """Decisões gravadas de um símbolo em arrays ordenados por tempo (busca exata por fingerprint + matriz p/ vizinho mais próximo)."""
+    def __init__(self, records: list[dict], quantization: dict):
+        records = sorted(records, key=lambda r: r['ts_ms'])
+        self.ts_ms = np.array([r['ts_ms'] for r in records], dtype=np.int64)
+        self.signals = [r['signal'] for r in records]; self.justifications = [r.get('justification') for r in records]
+        self.by_fingerprint: dict[str, list[int]] = {}
+        feature_rows = []
+        for i, r in enumerate(records):
+            fingerprint = r.get('fingerprint') or market_fingerprint(r['symbol'], r['indicators'], r.get('price'), quantization)
+            self.by_fingerprint.setdefault(fingerprint, []).append(i)
+            feature_rows.append(market_features(r['indicators'], r.get('price'), quantization))
+        self.columns = sorted({name for row in feature_rows for name in row}); col_index = {name: j for j, name in enumerate(self.columns)}
+        self.features = np.full((len(records), len(self.columns)), np.nan)
+        for i, row in enumerate(feature_rows):
+            for name, value in row.items(): self.features[i, col_index[name]] = value
+        self._scale_limit = -1; self._scale = np.ones(len(self.columns))
+
+    def scale_for(self, limit: int) -> np.ndarray:
+        """Desvio-padrão por feature só das `limit` primeiras decisões (as visíveis no instante simulado): decisões futuras
+        não podem influenciar a normalização da distância. Memorizado pelo último `limit` (o replay avança no tempo)."""
+        if limit != self._scale_limit:
+            with np.errstate(all='ignore'): scale = np.nanstd(self.features[:limit], axis=0) if limit > 1 else np.ones(len(self.columns))
+            self._scale = np.where(np.isfinite(scale) & (scale > 0), scale, 1.0); self._scale_limit = limit # Coluna constante/vazia: sem normalização
+        return self._scale
+
+    def vector(self, features: dict[str, float]) -> np.ndarray:
+        return np.array([features.get(name, np.nan) for name in self.columns])
+
+
+class ReplayGeminiAnalyzer:
+    """
+    Substituto offline e determinístico do GeminiAnalyzer para backtests da estratégia híbrida.
+
+    Para cada consulta devolve a decisão gravada com o mesmo fingerprint (a mais recente) ou, se não houver,
+    a do vizinho mais próximo no espaço de indicadores normalizados (distância RMS em desvios-padrão,
+    considerando só as features presentes nos dois lados). Com `set_time` definido, só decisões gravadas até
+    esse instante são candidatas (sem olhar o futuro), a menos que `allow_future=True`.
+    """
+    def __init__(self, decisions: list[dict], max_distance: float | None = DEFAULT_MAX_DISTANCE, allow_future: bool = False, quantization: dict | None = None):
+        self.quantization = quantization if quantization is not None else DEFAULT_QUANTIZATION
+        self.max_distance = max_distance; self.allow_future = allow_future; self.as_of_ms: int | None = None
+        by_symbol: dict[str, list[dict]] = {}
+        for record in decisions: by_symbol.setdefault(record['symbol'], []).append(record)
+        self._books = {symbol: _SymbolBook(records, self.quantization) for symbol, records in by_symbol.items()}
+        self.exact_hits = 0; self.neighbour_hits = 0; self.misses = 0
+        logger.info(f"Replay Gemini: {len(decisions)} decisões gravadas de {len(self._books)} símbolo(s) carregadas.")
+
+    @classmethod
+    def from_database(cls, symbol: str | None = None, since_ms: int | None = None, until_ms: int | None = None, **kwargs) -> 'ReplayGeminiAnalyzer':
+        from database import load_gemini_decisions # Import tardio (SQLAlchemy)
+        return cls(load_gemini_decisions(symbol=symbol, since_ms=since_ms, until_ms=until_ms), **kwargs)
+
+    def set_time(self, ts_ms: int | None):
+        """Instante simulado do backtest; decisões gravadas depois dele não são usadas."""
+        self.as_of_ms = ts_ms
+
+    def get_trade_signal_mta_indicators(self, mta_indicators_data: dict, symbol: str, current_ticker_price: float | None = None,
+                                        request_timeout: float | None = None, priority: int | None = None) -> tuple[str | None, str | None]:
+        """Mesma interface do GeminiAnalyzer. Retorna (sinal, justificativa) gravados ou (None, None)."""
+        book = self._books.get(symbol)
+        if book is None or not mta_indicators_data: return self._miss(symbol, "sem decisões gravadas")
+        limit = len(book.ts_ms) if (self.allow_future or self.as_of_ms is None) else int(np.searchsorted(book.ts_ms, self.as_of_ms, side='right'))
+        if limit == 0: return self._miss(symbol, "nenhuma decisão até o instante simulado")
+
+        # 1. Fingerprint exato: a decisão mais recente disponível
+        indices = book.by_fingerprint.get(market_fingerprint(symbol, mta_indicators_data, current_ticker_price, self.quantization))
+        if indices:
+            pos = bisect.bisect_left(indices, limit)
+            if pos > 0:
+                i = indices[pos - 1]; self.exact_hits += 1; metrics.inc("replay_decisions_total", match="exact")
+                return book.signals[i], book.justifications[i]
+
+        # 2. Vizinho mais próximo (empates: a decisão mais antiga, p/ ser determinístico)
+        query = book.vector(market_features(mta_indicators_data, current_ticker_price, self.quantization))
+        diff = (book.features[:limit] - query) / book.scale_for(limit)
+        valid = ~np.isnan(diff); counts = valid.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'): distances = np.sqrt(np.where(valid, diff * diff, 0.0).sum(axis=1) / counts)
+        distances[counts == 0] = np.inf
+        i = int(np.argmin(distances)); distance = float(distances[i])
+        if not np.isfinite(distance) or (self.max_distance is not None and distance > self.max_distance):
+            return self._miss(symbol, f"vizinho mais próximo a {distance:.2f} (máx {self.max_distance})")
+        self.neighbour_hits += 1; metrics.inc("replay_decisions_total", match="neighbour")
+        logger.debug(f"Replay {symbol}: vizinho #{i} a {distance:.3f} -> {book.signals[i]}")
+        justification = book.justifications[i]
+        return book.signals[i], f"[replay ~{distance:.2f}] {justification}" if justification else f"[replay ~{distance:.2f}]"
+
+    def get_trade_signals_batch(self, requests_by_symbol: dict[str, tuple[dict, float | None]], request_timeout: float | None = None, **kwargs) -> dict[str, tuple[str | None, str | None]]:
+        return {symbol: self.get_trade_signal_mta_indicators(mta, symbol, price) for symbol, (mta, price) in requests_by_symbol.items()}
+
+    def _miss(self, symbol: str, reason: str) -> tuple[None, None]:
+        self.misses += 1; metrics.inc("replay_decisions_total", match="miss")
+        logger.debug(f"Replay {symbol}: sem decisão ({reason}).")
+        return None, None
+
+    def stats(self) -> dict:
+        return {'exact': self.exact_hits, 'neighbour': self.neighbour_hits, 'miss': self.misses}
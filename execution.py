@@ -0,0 +1,440 @@
+# quantis_crypto_trader_gemini/execution.py
+
+import itertools
+import logging
+import math
+import threading
+import time
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Status de Ordem (mesmos nomes da Binance) ---
+STATUS_PENDING = "PENDING_NEW" # Enviada, ainda sem confirmação da corretora
+STATUS_NEW = "NEW"
+STATUS_PARTIALLY_FILLED = "PARTIALLY_FILLED"
+STATUS_FILLED = "FILLED"
+STATUS_CANCELED = "CANCELED"
+STATUS_REJECTED = "REJECTED"
+STATUS_EXPIRED = "EXPIRED"
+STATUS_UNKNOWN = "UNKNOWN" # Retentativas esgotadas sem saber se a ordem chegou à corretora
+FINAL_STATUSES = {STATUS_FILLED, STATUS_CANCELED, STATUS_REJECTED, STATUS_EXPIRED}
+
+# Códigos da Binance em que o destino da ordem é desconhecido (pode ter sido aceita): nunca reenviar sem consultar antes
+AMBIGUOUS_BINANCE_CODES = {-1001, -1006, -1007}
+_STATUS_RANK = {STATUS_UNKNOWN: 0, STATUS_PENDING: 0, STATUS_NEW: 1, STATUS_PARTIALLY_FILLED: 2, STATUS_FILLED: 3, STATUS_CANCELED: 3, STATUS_REJECTED: 3, STATUS_EXPIRED: 3}
+CLIENT_ORDER_ID_MAX_LEN = 36 # Limite da Binance p/ newClientOrderId
+
+
+QUOTE_ASSETS = ("USDT", "BUSD", "USDC", "BTC") # Ordem importa: sufixos mais específicos primeiro
+
+
+def split_symbol(symbol: str, quote_assets: tuple[str, ...] = QUOTE_ASSETS) -> tuple[str, str]:
+    """'BTCUSDT' -> ('BTC', 'USDT')."""
+    for quote in quote_assets:
+        if symbol.endswith(quote) and len(symbol) > len(quote): return symbol[:-len(quote)], quote
+    raise ValueError(f"Símbolo {symbol} sem ativo quote conhecido.")
+
+
+class OrderRejected(Exception):
+    """A corretora (ou o simulador) recusou a ordem de forma definitiva; reenviar não adianta."""
+    def __init__(self, message: str, code: int | None = None):
+        super().__init__(message); self.code = code; self.message = message
+
+
+def is_order_rejection(exc: BaseException) -> bool:
+    """
+    True se o erro é uma recusa definitiva (saldo, filtros, símbolo...). Falhas de rede/timeout e os
+    códigos de status desconhecido da Binance retornam False: a ordem pode ter sido aceita.
+    """
+    if isinstance(exc, OrderRejected): return True
+    if type(exc).__name__ != "BinanceAPIException": return False # BinanceRequestException, timeouts, ConnectionError...
+    code = getattr(exc, 'code', None)
+    if code in AMBIGUOUS_BINANCE_CODES or "duplicate order" in str(getattr(exc, 'message', exc)).lower(): return False
+    return (getattr(exc, 'status_code', 400) or 400) < 500
+
+
+class TrackedOrder:
+    """Estado local de uma ordem, atualizado pela resposta do envio e pelos eventos do user-data stream."""
+    def __init__(self, symbol: str, side: str, order_type: str, client_order_id: str, quantity: float | None = None,
+                 quote_quantity: float | None = None, price: float | None = None, time_in_force: str | None = None, decision_t: float | None = None):
+        self.symbol = symbol; self.side = side; self.order_type = order_type; self.client_order_id = client_order_id
+        self.quantity = quantity; self.quote_quantity = quote_quantity; self.price = price; self.time_in_force = time_in_force
+        self.status = STATUS_PENDING; self.order_id: int | None = None; self.reject_reason: str | None = None
+        self.executed_qty = 0.0; self.cumulative_quote = 0.0; self.commission: dict[str, float] = {}
+        self.fills_qty = 0.0; self.fills_quote = 0.0 # Soma das execuções vistas uma a uma (resposta FULL / stream)
+        self.notified_qty = 0.0; self.notified_quote = 0.0 # Quanto já foi repassado aos listeners de fill
+        self.trade_ids: set = set(); self.attempts = 0
+        self.decision_t = decision_t; self.submitted_t: float | None = None; self.ack_t: float | None = None; self.filled_t: float | None = None
+        self.done = threading.Event() # Sinalizado ao atingir um status final
+
+    @property
+    def avg_price(self) -> float | None:
+        return self.cumulative_quote / self.executed_qty if self.executed_qty > 0 else None
+
+    @property
+    def ack_latency(self) -> float | None:
+        return self.ack_t - self.decision_t if self.ack_t is not None and self.decision_t is not None else None
+
+    def request(self) -> dict:
+        """Parâmetros do envio (interface comum de BinanceHandler.place_order e MatchingSimulator.place_order)."""
+        return {'symbol': self.symbol, 'side': self.side, 'order_type': self.order_type, 'quantity': self.quantity, 'quote_quantity': self.quote_quantity,
+                'price': self.price, 'time_in_force': self.time_in_force, 'client_order_id': self.client_order_id}
+
+    def to_dict(self) -> dict:
+        return {'symbol': self.symbol, 'side': self.side, 'type': self.order_type, 'client_order_id': self.client_order_id, 'order_id': self.order_id,
+                'status': self.status, 'executed_qty': self.executed_qty, 'cumulative_quote': self.cumulative_quote, 'avg_price': self.avg_price,
+                'commission': dict(self.commission), 'attempts': self.attempts, 'ack_latency_s': self.ack_latency}
+
+
+class OrderExecutor:
+    """
+    Envio de ordens a mercado/limitadas com client order ID próprio e retentativas idempotentes.
+
+    O `venue` é o BinanceHandler (real) ou o MatchingSimulator (local); ambos expõem place_order, get_order,
+    cancel_order, get_asset_balance e start_user_stream. Quando o envio falha sem resposta definitiva, a ordem é
+    consultada pelo client order ID antes de qualquer reenvio: se chegou à corretora ela é adotada, senão é
+    reenviada com o mesmo ID. As execuções chegam pelo user-data stream (on_execution_report) e são repassadas
+    aos listeners de fill; a latência decisão -> confirmação vai para order_ack_latency_seconds. Se só a consulta
+    da ordem mostra a execução (eventos do stream perdidos; a consulta não traz `fills`), a diferença entre os
+    acumulados da corretora e o já repassado vira um fill sintético (preço médio, sem taxa), e as execuções que
+    chegarem depois só repassam o que exceder isso.
+    """
+    def __init__(self, venue, venue_name: str = "binance", max_retries: int = 3, retry_backoff_seconds: float = 0.25,
+                 id_prefix: str = "qct", clock=time.monotonic, sleep=time.sleep):
+        self.venue = venue; self.venue_name = venue_name; self.max_retries = max(0, max_retries); self.retry_backoff_seconds = retry_backoff_seconds
+        self.id_prefix = id_prefix; self._clock = clock; self._sleep = sleep
+        self._lock = threading.Lock(); self._orders: dict[str, TrackedOrder] = {}; self._sequence = itertools.count(1)
+        self._fill_listeners: list = []; self._stream = None
+
+    def now(self) -> float: return self._clock()
+
+    # --- IDs e Listeners ---
+    def new_client_order_id(self, symbol: str, side: str) -> str:
+        """ID único por processo: prefixo-símbolo-lado-ms-sequência (até 36 caracteres, charset aceito pela Binance)."""
+        client_order_id = f"{self.id_prefix}-{symbol}-{side[:1]}-{int(time.time() * 1000)}-{next(self._sequence)}"
+        return client_order_id[-CLIENT_ORDER_ID_MAX_LEN:]
+
+    def add_fill_listener(self, callback):
+        """callback(order: TrackedOrder, fill: dict) a cada nova execução (fill = qty, price, quote_qty, commission, commission_asset, trade_id, ts_ms)."""
+        self._fill_listeners.append(callback)
+
+    def get_order(self, client_order_id: str) -> TrackedOrder | None:
+        with self._lock: return self._orders.get(client_order_id)
+
+    def open_orders(self, symbol: str | None = None) -> list[TrackedOrder]:
+        with self._lock: return [o for o in self._orders.values() if o.status not in FINAL_STATUSES and (symbol is None or o.symbol == symbol)]
+
+    # --- Envio ---
+    def market_order(self, symbol: str, side: str, quantity: float | None = None, quote_quantity: float | None = None,
+                     decision_t: float | None = None, client_order_id: str | None = None) -> TrackedOrder | None:
+        """Ordem a mercado por quantidade do ativo base ou por valor em quote (quoteOrderQty)."""
+        if (quantity is None) == (quote_quantity is None): logger.error("market_order: informe quantity OU quote_quantity."); return None
+        if quantity is not None:
+            quantity = self._round_quantity(symbol, quantity)
+            if quantity <= 0: logger.warning(f"Quantidade {symbol} arredondada para zero. Ordem não enviada."); return None
+        return self._submit(TrackedOrder(symbol, side.upper(), "MARKET", client_order_id or self.new_client_order_id(symbol, side),
+                                         quantity=quantity, quote_quantity=quote_quantity, decision_t=decision_t if decision_t is not None else self._clock()))
+
+    def limit_order(self, symbol: str, side: str, quantity: float, price: float, time_in_force: str = "GTC",
+                    decision_t: float | None = None, client_order_id: str | None = None) -> TrackedOrder | None:
+        quantity = self._round_quantity(symbol, quantity)
+        if quantity <= 0: logger.warning(f"Quantidade {symbol} arredondada para zero. Ordem não enviada."); return None
+        return self._submit(TrackedOrder(symbol, side.upper(), "LIMIT", client_order_id or self.new_client_order_id(symbol, side),
+                                         quantity=quantity, price=price, time_in_force=time_in_force, decision_t=decision_t if decision_t is not None else self._clock()))
+
+    def _round_quantity(self, symbol: str, quantity: float) -> float:
+        round_quantity = getattr(self.venue, 'round_quantity', None)
+        return round_quantity(symbol, quantity) if round_quantity else quantity
+
+    def _submit(self, order: TrackedOrder) -> TrackedOrder:
+        with self._lock:
+            existing = self._orders.get(order.client_order_id)
+            if existing is not None: logger.info(f"Ordem {order.client_order_id} já enviada (status {existing.status}). Envio ignorado."); return existing
+            self._orders[order.client_order_id] = order
+        order.submitted_t = self._clock()
+        logger.info(f"Enviando ordem {order.order_type} {order.side} {order.symbol} (qty={order.quantity}, quote={order.quote_quantity}, preço={order.price}, id={order.client_order_id})...")
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self._sleep(self.retry_backoff_seconds * 2 ** (attempt - 1))
+                # Destino da tentativa anterior é desconhecido: consulta antes de reenviar (mesmo ID, sem ordem duplicada)
+                try:
+                    with metrics.api_call(self.venue_name, "get_order"): response = self.venue.get_order(order.symbol, order.client_order_id)
+                except Exception as e:
+                    logger.warning(f"Consulta da ordem {order.client_order_id} falhou ({e}). Tentando de novo sem reenviar."); continue
+                if response is not None: logger.info(f"Ordem {order.client_order_id} encontrada na corretora após falha no envio. Adotada."); break
+                metrics.inc("order_retries_total", venue=self.venue_name)
+            order.attempts += 1
+            try:
+                with metrics.api_call(self.venue_name, "place_order"): response = self.venue.place_order(**order.request())
+                break
+            except Exception as e:
+                if is_order_rejection(e): return self._reject(order, str(getattr(e, 'message', e)))
+                logger.warning(f"Envio da ordem {order.client_order_id} sem resposta definitiva (tentativa {attempt + 1}/{self.max_retries + 1}): {e}")
+        if response is None:
+            order.status = STATUS_UNKNOWN; metrics.inc("orders_total", venue=self.venue_name, side=order.side, status=STATUS_UNKNOWN)
+            logger.error(f"Ordem {order.client_order_id}: retentativas esgotadas sem confirmação. Status desconhecido; será reconciliada pelo stream/consulta.")
+            return order
+        self._apply_ack(order, response)
+        return order
+
+    def _reject(self, order: TrackedOrder, reason: str) -> TrackedOrder:
+        order.status = STATUS_REJECTED; order.reject_reason = reason; order.done.set()
+        metrics.inc("orders_total", venue=self.venue_name, side=order.side, status=STATUS_REJECTED)
+        logger.error(f"Ordem {order.client_order_id} REJEITADA: {reason}")
+        return order
+
+    def _apply_ack(self, order: TrackedOrder, response: dict):
+        """Confirmação do envio (ou consulta): status, orderId e as execuções já incluídas na resposta (FULL)."""
+        order.order_id = response.get('orderId') or order.order_id
+        if order.ack_t is None: # Primeira confirmação (resposta do envio ou evento do stream, o que chegar antes)
+            order.ack_t = self._clock(); labels = {'venue': self.venue_name, 'type': order.order_type}
+            if order.ack_latency is not None: metrics.observe("order_ack_latency_seconds", order.ack_latency, **labels)
+            if order.submitted_t is not None: metrics.observe("order_submit_latency_seconds", order.ack_t - order.submitted_t, **labels)
+            metrics.inc("orders_total", venue=self.venue_name, side=order.side, status=response.get('status') or STATUS_NEW)
+        ts_ms = response.get('transactTime') or response.get('updateTime')
+        for fill in response.get('fills') or []:
+            self._apply_fill(order, float(fill['qty']), float(fill['price']), float(fill.get('commission', 0.0)), fill.get('commissionAsset'), fill.get('tradeId'), ts_ms)
+        self._update_totals(order, response.get('status'), response.get('executedQty'), response.get('cummulativeQuoteQty'), ts_ms)
+        logger.info(f"Ordem {order.client_order_id} confirmada: {order.status}, executado {order.executed_qty} @ {order.avg_price} (decisão->ack {order.ack_latency * 1000 if order.ack_latency is not None else float('nan'):.1f} ms).")
+
+    # --- User-Data Stream ---
+    def start_user_stream(self) -> bool:
+        """Assina o user-data stream do venue; execuções passam a chegar por on_execution_report."""
+        try: self._stream = self.venue.start_user_stream(self.on_execution_report); return self._stream is not None
+        except Exception: logger.error("Falha ao iniciar user-data stream.", exc_info=True); return False
+
+    def stop_user_stream(self):
+        stop = getattr(self.venue, 'stop_user_stream', None)
+        if self._stream is not None and stop: stop(self._stream)
+        self._stream = None
+
+    def on_execution_report(self, event: dict):
+        """Callback do user-data stream (payload 'executionReport' da Binance). Eventos de outras ordens são ignorados."""
+        if event.get('e') == 'error': logger.error(f"Erro no user-data stream: {event.get('m')}"); return
+        if event.get('e') != 'executionReport': return
+        client_order_id = event.get('C') or event.get('c') # 'C' = ID original em cancelamentos
+        order = self.get_order(client_order_id)
+        if order is None: logger.debug(f"executionReport de ordem externa ignorado ({client_order_id})."); return
+        if order.order_id is None: order.order_id = event.get('i')
+        if order.ack_t is None: self._apply_ack(order, {'orderId': event.get('i'), 'status': event.get('X')}) # Stream chegou antes da resposta do envio
+        if event.get('x') == 'TRADE' and float(event.get('l', 0)) > 0:
+            self._apply_fill(order, float(event['l']), float(event['L']), float(event.get('n') or 0.0), event.get('N'), event.get('t'), event.get('T'))
+        if event.get('X') == STATUS_REJECTED: order.reject_reason = event.get('r')
+        self._update_totals(order, event.get('X'), event.get('z'), event.get('Z'), event.get('T'))
+
+    def _apply_fill(self, order: TrackedOrder, qty: float, price: float, commission: float, commission_asset: str | None, trade_id, ts_ms):
+        with self._lock:
+            if trade_id is not None:
+                if trade_id in order.trade_ids: return # Mesma execução vista na resposta do envio e no stream
+                order.trade_ids.add(trade_id)
+            order.fills_qty += qty; order.fills_quote += qty * price
+            order.executed_qty = max(order.executed_qty, order.fills_qty); order.cumulative_quote = max(order.cumulative_quote, order.fills_quote)
+            if commission and commission_asset: order.commission[commission_asset] = order.commission.get(commission_asset, 0.0) + commission
+            new_qty = min(qty, order.executed_qty - order.notified_qty) # O que uma reconciliação (_update_totals) já repassou não se repete
+            if new_qty > qty * 1e-9: order.notified_qty += new_qty; order.notified_quote += new_qty * price
+        if new_qty <= qty * 1e-9: logger.info(f"Execução {trade_id} da ordem {order.client_order_id} já repassada pela reconciliação. Ignorada."); return
+        metrics.inc("order_fills_total", venue=self.venue_name, side=order.side)
+        self._notify_fill(order, new_qty, price, commission * new_qty / qty if new_qty < qty else commission, commission_asset, trade_id, ts_ms)
+
+    def _notify_fill(self, order: TrackedOrder, qty: float, price: float, commission: float, commission_asset: str | None, trade_id, ts_ms):
+        fill = {'qty': qty, 'price': price, 'quote_qty': qty * price, 'commission': commission, 'commission_asset': commission_asset, 'trade_id': trade_id, 'ts_ms': ts_ms}
+        for listener in self._fill_listeners:
+            try: listener(order, fill)
+            except Exception: logger.error(f"Erro no listener de fill da ordem {order.client_order_id}.", exc_info=True)
+
+    def _update_totals(self, order: TrackedOrder, status: str | None, executed_qty=None, cumulative_quote=None, ts_ms=None):
+        """
+        Acumulados da corretora valem sobre a soma local (eventos perdidos): o que passar do já repassado aos listeners
+        vira um fill sintético (qty = diferença, preço = diferença de quote / qty, taxa desconhecida = 0), senão o
+        portfólio nunca vê a execução. Status final libera quem espera em wait_for_fill.
+        """
+        missed = None
+        with self._lock:
+            if executed_qty is not None and float(executed_qty) > order.executed_qty: order.executed_qty = float(executed_qty)
+            if cumulative_quote is not None and float(cumulative_quote) > order.cumulative_quote: order.cumulative_quote = float(cumulative_quote)
+            missed_qty = order.executed_qty - order.notified_qty
+            if missed_qty > order.executed_qty * 1e-9:
+                missed_quote = order.cumulative_quote - order.notified_quote
+                missed = (missed_qty, missed_quote / missed_qty if missed_quote > 0 else (order.avg_price or 0.0))
+                order.notified_qty = order.executed_qty; order.notified_quote = max(order.cumulative_quote, order.notified_quote)
+            if status and _STATUS_RANK.get(status, 0) >= _STATUS_RANK.get(order.status, 0) and order.status not in FINAL_STATUSES: order.status = status # Nunca regride (resposta atrasada após o stream)
+            just_filled = order.status == STATUS_FILLED and order.filled_t is None
+            if just_filled: order.filled_t = self._clock()
+        if missed is not None:
+            logger.warning(f"Ordem {order.client_order_id}: {missed[0]} executados sem evento de fill (só nos acumulados da corretora). Repassando como fill @ {missed[1]}.")
+            metrics.inc("order_fills_total", venue=self.venue_name, side=order.side); metrics.inc("order_fills_reconciled_total", venue=self.venue_name, side=order.side)
+            self._notify_fill(order, missed[0], missed[1], 0.0, None, None, ts_ms)
+        if just_filled and order.decision_t is not None:
+            metrics.observe("order_fill_latency_seconds", order.filled_t - order.decision_t, venue=self.venue_name, type=order.order_type)
+        if order.status in FINAL_STATUSES: order.done.set()
+
+    # --- Espera / Cancelamento ---
+    def wait_for_fill(self, client_order_id: str, timeout: float) -> TrackedOrder | None:
+        """Espera a ordem chegar a um status final; se o stream não avisar a tempo, reconcilia com uma consulta."""
+        order = self.get_order(client_order_id)
+        if order is None: return None
+        if not order.done.wait(timeout) and order.status != STATUS_REJECTED:
+            try:
+                with metrics.api_call(self.venue_name, "get_order"): response = self.venue.get_order(order.symbol, client_order_id)
+                if response is not None:
+                    self._apply_ack(order, response)
+            except Exception: logger.warning(f"Falha ao reconciliar ordem {client_order_id}.", exc_info=True)
+        return order
+
+    def cancel_order(self, client_order_id: str) -> bool:
+        order = self.get_order(client_order_id)
+        if order is None or order.status in FINAL_STATUSES: return False
+        try:
+            with metrics.api_call(self.venue_name, "cancel_order"): response = self.venue.cancel_order(order.symbol, client_order_id)
+        except Exception: logger.error(f"Falha ao cancelar ordem {client_order_id}.", exc_info=True); return False
+        self._update_totals(order, (response or {}).get('status', STATUS_CANCELED), (response or {}).get('executedQty'), (response or {}).get('cummulativeQuoteQty'))
+        logger.info(f"Ordem {client_order_id} cancelada ({order.status}, executado {order.executed_qty}).")
+        return True
+
+
+# --- Simulador Local (Matching Engine) ---
+class MatchingSimulator:
+    """
+    Corretora local para testes/paper trading: casa ordens contra klines reproduzidos (ou preços avulsos).
+
+    Uma ordem só fica ativa `latency_seconds` depois do envio (no relógio das velas). Ordens a mercado
+    executam no primeiro preço visto após ficarem ativas (abertura da vela, ou o preço atual se a latência
+    é zero) com `slippage_bps` contra o lado da ordem. Limitadas executam quando a vela cruza o preço (no
+    preço limite, ou na abertura se ela já estiver melhor). Com `max_volume_fraction` cada vela executa no
+    máximo essa fração do seu volume, gerando execuções parciais. Eventos saem no formato 'executionReport'
+    da Binance para o callback do user-data stream.
+    """
+    def __init__(self, slippage_bps: float = 5.0, latency_seconds: float = 0.0, fee_rate: float = 0.001, max_volume_fraction: float | None = None,
+                 balances: dict[str, float] | None = None, quote_assets: tuple[str, ...] = QUOTE_ASSETS, quantity_step: float = 1e-8):
+        self.slippage = slippage_bps / 10_000.0; self.latency_ms = int(round(latency_seconds * 1000)); self.fee_rate = fee_rate
+        self.max_volume_fraction = max_volume_fraction; self.quote_assets = quote_assets; self.quantity_step = quantity_step
+        self.balances: dict[str, float] = dict(balances) if balances else {}
+        self._lock = threading.RLock(); self._orders: dict[str, dict] = {}; self._pending: list[str] = []
+        self._last_price: dict[str, float] = {}; self._now_ms: dict[str, int] = {}
+        self._order_ids = itertools.count(1); self._trade_ids = itertools.count(1); self._callbacks: list = []
+
+    # --- Interface de Venue ---
+    def start_user_stream(self, callback):
+        self._callbacks.append(callback); return callback
+
+    def stop_user_stream(self, stream):
+        if stream in self._callbacks: self._callbacks.remove(stream)
+
+    def split_symbol(self, symbol: str) -> tuple[str, str]: return split_symbol(symbol, self.quote_assets)
+
+    def get_asset_balance(self, asset: str) -> float:
+        with self._lock: return self.balances.get(asset, 0.0)
+
+    def get_ticker_price(self, symbol: str) -> float | None:
+        return self._last_price.get(symbol)
+
+    def round_quantity(self, symbol: str, quantity: float) -> float:
+        return math.floor(quantity / self.quantity_step + 1e-9) * self.quantity_step
+
+    def place_order(self, symbol: str, side: str, order_type: str, client_order_id: str, quantity: float | None = None, quote_quantity: float | None = None,
+                    price: float | None = None, time_in_force: str | None = None) -> dict:
+        with self._lock:
+            if client_order_id in self._orders and self._orders[client_order_id]['status'] not in FINAL_STATUSES:
+                raise OrderRejected("Duplicate order sent.", code=-2010)
+            if order_type == "LIMIT" and (price is None or quantity is None): raise OrderRejected("Ordem LIMIT exige price e quantity.", code=-1102)
+            if order_type == "MARKET" and symbol not in self._last_price: raise OrderRejected(f"Sem preço para {symbol} no simulador.", code=-1121)
+            self._check_balance(symbol, side, quantity, quote_quantity, price if order_type == "LIMIT" else self._last_price[symbol])
+            now_ms = self._now_ms.get(symbol, int(time.time() * 1000))
+            order = {'symbol': symbol, 'orderId': next(self._order_ids), 'clientOrderId': client_order_id, 'side': side, 'type': order_type, 'price': price or 0.0,
+                     'origQty': quantity, 'quoteOrderQty': quote_quantity, 'timeInForce': time_in_force, 'status': STATUS_NEW, 'executedQty': 0.0,
+                     'cummulativeQuoteQty': 0.0, 'transactTime': now_ms, 'active_ms': now_ms + self.latency_ms, 'fills': []}
+            self._orders[client_order_id] = order; self._pending.append(client_order_id)
+            if order_type == "MARKET" and self.latency_ms == 0: self._fill(order, self._last_price[symbol], now_ms, None, market=True) # Executa na resposta (como newOrderRespType=FULL)
+            response = self._public(order); order['fills'] = []
+            return response
+
+    def get_order(self, symbol: str, client_order_id: str) -> dict | None:
+        with self._lock:
+            order = self._orders.get(client_order_id)
+            return self._public(order) if order is not None and order['symbol'] == symbol else None
+
+    def cancel_order(self, symbol: str, client_order_id: str) -> dict:
+        with self._lock:
+            order = self._orders.get(client_order_id)
+            if order is None or order['symbol'] != symbol: raise OrderRejected("Unknown order sent.", code=-2011)
+            if order['status'] in FINAL_STATUSES: raise OrderRejected(f"Ordem já finalizada ({order['status']}).", code=-2011)
+            order['status'] = STATUS_CANCELED; self._pending.remove(client_order_id)
+            self._emit(order, "CANCELED", 0.0, 0.0, 0.0, None, self._now_ms.get(symbol))
+            return self._public(order)
+
+    # --- Reprodução de Mercado ---
+    def on_price(self, symbol: str, price: float, ts_ms: int | None = None):
+        """Preço avulso (ex: ticker do ciclo): vira uma 'vela' degenerada O=H=L=C."""
+        self.on_kline(symbol, ts_ms if ts_ms is not None else int(time.time() * 1000), price, price, price, price, None)
+
+    def on_kline(self, symbol: str, open_time_ms: int, open_: float, high: float, low: float, close: float, volume: float | None = None):
+        """Avança o relógio do símbolo até a vela e casa as ordens ativas nela."""
+        with self._lock:
+            self._now_ms[symbol] = int(open_time_ms)
+            available = volume * self.max_volume_fraction if (self.max_volume_fraction and volume) else math.inf
+            for client_order_id in list(self._pending):
+                order = self._orders[client_order_id]
+                if order['symbol'] != symbol or order['active_ms'] > open_time_ms: continue
+                if order['type'] == "MARKET": available -= self._fill(order, open_, open_time_ms, available, market=True)
+                elif order['side'] == "BUY" and low <= order['price']: available -= self._fill(order, min(order['price'], open_), open_time_ms, available)
+                elif order['side'] == "SELL" and high >= order['price']: available -= self._fill(order, max(order['price'], open_), open_time_ms, available)
+                if available <= 0: break
+            self._last_price[symbol] = close
+
+    def replay_klines(self, symbol: str, klines_df):
+        """Reproduz as velas do DataFrame (índice 'Open time' ou coluna) casando as ordens ativas; gera (open_time_ms, close) a cada vela."""
+        times = klines_df['Open time'] if 'Open time' in klines_df.columns else klines_df.index.to_series()
+        open_ms = times.to_numpy().astype('datetime64[ms]').astype('int64') if str(times.dtype).startswith('datetime64') else times.to_numpy().astype('int64')
+        volumes = klines_df['Volume'].to_numpy(dtype=float) if 'Volume' in klines_df.columns else [None] * len(klines_df)
+        for ts, o, h, l, c, v in zip(open_ms, klines_df['Open'].to_numpy(dtype=float), klines_df['High'].to_numpy(dtype=float),
+                                     klines_df['Low'].to_numpy(dtype=float), klines_df['Close'].to_numpy(dtype=float), volumes):
+            self.on_kline(symbol, int(ts), o, h, l, c, v)
+            yield int(ts), float(c)
+
+    # --- Internos ---
+    def _check_balance(self, symbol: str, side: str, quantity: float | None, quote_quantity: float | None, price: float):
+        if not self.balances: return # Sem saldos configurados: saldo ilimitado
+        base, quote = self.split_symbol(symbol)
+        if side == "BUY":
+            needed = quote_quantity if quote_quantity is not None else quantity * price * (1 + self.slippage)
+            if needed > self.balances.get(quote, 0.0) + 1e-12: raise OrderRejected("Account has insufficient balance for requested action.", code=-2010)
+        elif (quantity or (quote_quantity or 0.0) / price) > self.balances.get(base, 0.0) + 1e-12:
+            raise OrderRejected("Account has insufficient balance for requested action.", code=-2010)
+
+    def _fill(self, order: dict, price: float, ts_ms: int, available: float | None, market: bool = False) -> float:
+        """Executa o que couber da ordem a `price` (com slippage se a mercado). Retorna a quantidade executada."""
+        if market: price = price * (1 + self.slippage) if order['side'] == "BUY" else price * (1 - self.slippage)
+        remaining = (order['origQty'] - order['executedQty']) if order['origQty'] is not None else (order['quoteOrderQty'] - order['cummulativeQuoteQty']) / price
+        qty = min(remaining, available) if available is not None else remaining
+        if qty <= 0: return 0.0
+        quote_qty = qty * price; commission = qty * self.fee_rate if order['side'] == "BUY" else quote_qty * self.fee_rate
+        base, quote = self.split_symbol(order['symbol'])
+        commission_asset = base if order['side'] == "BUY" else quote
+        if self.balances:
+            sign = 1 if order['side'] == "BUY" else -1
+            self.balances[base] = self.balances.get(base, 0.0) + sign * qty - (commission if order['side'] == "BUY" else 0.0)
+            self.balances[quote] = self.balances.get(quote, 0.0) - sign * quote_qty - (commission if order['side'] == "SELL" else 0.0)
+        order['executedQty'] += qty; order['cummulativeQuoteQty'] += quote_qty
+        filled = remaining - qty <= remaining * 1e-9
+        order['status'] = STATUS_FILLED if filled else STATUS_PARTIALLY_FILLED
+        trade_id = next(self._trade_ids)
+        order['fills'].append({'price': price, 'qty': qty, 'commission': commission, 'commissionAsset': commission_asset, 'tradeId': trade_id})
+        if filled: self._pending.remove(order['clientOrderId'])
+        self._emit(order, "TRADE", qty, price, commission, commission_asset, ts_ms, trade_id)
+        return qty
+
+    def _emit(self, order: dict, execution_type: str, last_qty: float, last_price: float, commission: float, commission_asset: str | None, ts_ms: int | None, trade_id=None):
+        event = {'e': 'executionReport', 'E': ts_ms, 's': order['symbol'], 'c': order['clientOrderId'], 'S': order['side'], 'o': order['type'],
+                 'q': order['origQty'], 'p': order['price'], 'x': execution_type, 'X': order['status'], 'i': order['orderId'], 'l': last_qty, 'L': last_price,
+                 'z': order['executedQty'], 'Z': order['cummulativeQuoteQty'], 'n': commission, 'N': commission_asset, 'T': ts_ms, 't': trade_id if trade_id is not None else -1}
+        if execution_type == "CANCELED": event['C'] = order['clientOrderId']
+        for callback in list(self._callbacks):
+            try: callback(event)
+            except Exception: logger.error("Erro no callback do user-data stream simulado.", exc_info=True)
+
+    @staticmethod
+    def _public(order: dict) -> dict:
+        public = {k: v for k, v in order.items() if k != 'active_ms'}; public['fills'] = list(order['fills'])
+        return public
@@ -3,13 +3,12 @@
 import logging
 import sys
 import pandas as pd
-import pandas_ta as ta
 import numpy as np
 import datetime
 import time
 import config
 from redis_client import RedisHandler
-from binance.client import Client
+import intervals
 import os # Para salvar CSV
 
 # --- Configuração do Logging ---
@@ -27,7 +26,7 @@ def setup_find_patterns_logging(level=logging.INFO):
 logger = setup_find_patterns_logging(level=logging.INFO)
 
 # --- Parâmetros da Análise ---
-SYMBOL = "BTCUSDT"; INTERVAL_CODE = Client.KLINE_INTERVAL_15MINUTE; INTERVAL_LABEL = "15m"
+SYMBOL = "BTCUSDT"; INTERVAL_CODE = intervals.KLINE_INTERVAL_15MINUTE; INTERVAL_LABEL = "15m"
 START_DATE_STR = "1 Jan, 2023"; END_DATE_STR = None
 PROFIT_TARGET = 1.02 # 2%
 LOOKAHEAD_CANDLES = 24 # 6 horas (15m * 24)
@@ -41,6 +40,34 @@ bbands_params = {'length': 20, 'std': 2.0}
 atr_params = {'length': 14}
 min_klines_needed_hist = max(sma_params['slow'], ichi_params['s'], 26, 20, 14) + 1
 
+# --- Varredura de Entradas ---
+def scan_first_profitable_entries(data: pd.DataFrame, profit_target: float = PROFIT_TARGET, lookahead_candles: int = LOOKAHEAD_CANDLES) -> list[dict]:
+    """
+    Snapshot (linha inteira + entry_timestamp) de cada vela que atinge o alvo em até `lookahead_candles` velas, só a PRIMEIRA de cada sequência.
+
+    Uma passada vetorizada em O(n): o máximo de High nas próximas `lookahead_candles` velas vem de um rolling max
+    sobre a série invertida (janela [i+1, i+L]), comparado com Close * profit_target; "primeira do grupo" é a vela
+    lucrativa cuja anterior não foi (máscara deslocada). Mesmas velas e snapshots da varredura vela a vela anterior.
+    """
+    n = len(data) - lookahead_candles # Velas com a janela futura inteira dentro dos dados
+    if n <= 0 or lookahead_candles <= 0: return []
+    high = data['High'].to_numpy(dtype=np.float64); close = data['Close'].to_numpy(dtype=np.float64)
+    # forward_max[j] = max(High[j : j+L]); min_periods=1 ignora NaN como o .any() da janela fazia
+    forward_max = pd.Series(high[::-1]).rolling(lookahead_candles, min_periods=1).max().to_numpy()[::-1]
+    is_profitable = forward_max[1:n + 1] >= close[:n] * profit_target # NaN (alvo ou janela) compara como False
+    is_first = is_profitable & ~np.concatenate(([False], is_profitable[:-1]))
+    positions = np.flatnonzero(is_first)
+    logger.info(f"Varredura vetorizada: {n} velas avaliadas, {int(is_profitable.sum())} lucrativas, {len(positions)} primeiras de grupo.")
+
+    successful_entries_indicators = []
+    for i in positions: # Só as entradas encontradas (poucas); snapshot idêntico ao da varredura vela a vela
+        entry_candle_time = data.index[i]
+        logger.debug(f"PRIMEIRA Entrada lucrativa em sequencia encontrada em {entry_candle_time} (Preço: {close[i]:.2f}, Alvo: {close[i] * profit_target:.2f})")
+        indicators_snapshot = data.iloc[i].to_dict()
+        indicators_snapshot['entry_timestamp'] = entry_candle_time
+        successful_entries_indicators.append(indicators_snapshot)
+    return successful_entries_indicators
+
 # --- Função Principal ---
 def find_profitable_entries():
     logger.info("==== INICIANDO ANÁLISE DE PADRÕES HISTÓRICOS (PRIMEIRO DO GRUPO) ====")
@@ -67,6 +94,7 @@ def find_profitable_entries():
 
     # 4. Calcular TODOS os Indicadores (CORRIGIDO para ATR absoluto)
     logger.info("Calculando indicadores técnicos para todo o período...")
+    import pandas_ta # noqa: F401 - registra o accessor data.ta
     try:
         data.ta.sma(length=sma_params['fast'], append=True)
         data.ta.sma(length=sma_params['slow'], append=True)
@@ -84,35 +112,7 @@ def find_profitable_entries():
 
     # 5. Iterar e Encontrar APENAS a PRIMEIRA Entrada Lucrativa de uma Sequência
     logger.info("Procurando por pontos de entrada (PRIMEIRO DO GRUPO) que atingiram >= 2% de lucro...")
-    successful_entries_indicators = []
-    processed_count = 0; log_interval = 10000
-    # <<< NOVO: Flag para rastrear se a vela anterior já foi uma entrada lucrativa >>>
-    is_prev_candle_profitable = False
-
-    # Itera do início dos dados válidos até (Total - Janela Futura)
-    for i in range(len(data) - LOOKAHEAD_CANDLES):
-        processed_count += 1
-        if processed_count % log_interval == 0: logger.info(f"Processando vela {processed_count}/{len(data) - LOOKAHEAD_CANDLES}...")
-
-        entry_candle_time = data.index[i]
-        entry_price = data['Close'].iloc[i]
-        target_price = entry_price * PROFIT_TARGET
-
-        lookahead_window = data['High'].iloc[i + 1 : i + 1 + LOOKAHEAD_CANDLES]
-
-        # Verifica se a vela ATUAL levaria ao lucro
-        is_current_candle_profitable = (lookahead_window >= target_price).any()
-
-        # <<< NOVA LÓGICA: Só registra se a ATUAL é lucrativa E a ANTERIOR NÃO foi >>>
-        if is_current_candle_profitable and not is_prev_candle_profitable:
-            logger.debug(f"PRIMEIRA Entrada lucrativa em sequencia encontrada em {entry_candle_time} (Preço: {entry_price:.2f}, Alvo: {target_price:.2f})")
-            indicators_snapshot = data.iloc[i].to_dict()
-            indicators_snapshot['entry_timestamp'] = entry_candle_time
-            successful_entries_indicators.append(indicators_snapshot)
-
-        # Atualiza o estado da vela anterior para a próxima iteração
-        is_prev_candle_profitable = is_current_candle_profitable
-        # <<< FIM DA NOVA LÓGICA >>>
+    successful_entries_indicators = scan_first_profitable_entries(data, PROFIT_TARGET, LOOKAHEAD_CANDLES)
 
     logger.info(f"Análise concluída. {len(successful_entries_indicators)} PONTOS DE ENTRADA *INICIAIS* LUCRATIVOS encontrados.")
 
@@ -1,24 +1,62 @@
 # quantis_crypto_trader_gemini/gemini_analyzer.py
 
-import google.generativeai as genai
-import pandas as pd
 import config
 import logging
+import metrics
 import json
 import re
+import time
+import asyncio
+import contextlib
+from resilience import CircuitBreaker
+from quota import QuotaManager, QuotaExhausted, PRIORITY_NORMAL, PRIORITY_LOW, is_quota_error
+from signal_cache import SignalCache, market_fingerprint
 
 logger = logging.getLogger(__name__)
 
+GENERATION_CONFIG = {'candidate_count': 1, 'temperature': 0.4}
+BATCH_GENERATION_CONFIG = {**GENERATION_CONFIG, 'response_mime_type': 'application/json'}
+VALID_SIGNALS = ("BUY", "SELL", "HOLD")
+
+# --- Prompt Compacto ---
+# Instrução estática enviada uma vez como system_instruction do modelo; cada requisição leva só a tabela de
+# indicadores (uma linha por TF) e uma linha de formato. Colunas: (chave do indicador, código curto na tabela).
+COMPACT_COLUMNS = [
+    ('sma_fast', 'smaF'), ('sma_slow', 'smaS'), ('rsi', 'rsi'), ('macd_line', 'macd'), ('macd_signal', 'macdS'), ('macd_hist', 'macdH'),
+    ('obv', 'obv'), ('ichi_tenkan', 'tk'), ('ichi_kijun', 'kj'), ('ichi_senkou_a', 'ssa'), ('ichi_senkou_b', 'ssb'),
+    ('bb_lower', 'bbL'), ('bb_middle', 'bbM'), ('bb_upper', 'bbU'), ('bbp', 'bbp'), ('atr', 'atr'), ('vwap', 'vwap'),
+]
+COMPACT_SYSTEM_INSTRUCTION = """Você é um assistente de análise técnica de cripto focado em trades de CURTO PRAZO (próximas horas) com Análise Multi-Timeframe Intraday. Seja DECISIVO quando houver sinais claros.
+Entrada: por símbolo, 'SYM <par> P=<preço atual do ticker>' seguido de uma tabela CSV com uma linha por timeframe (1h, 15m, 1m); '-' = indisponível.
+Colunas: smaF/smaS=SMA 30/60; rsi=RSI 14; macd/macdS/macdH=MACD linha/sinal/histograma; obv=OBV; tk/kj=Ichimoku Tenkan/Kijun; ssa/ssb=Senkou A/B (nuvem); bbL/bbM/bbU=Bollinger inferior/média/superior; bbp=%B Bollinger; atr=ATR; vwap=VWAP.
+Guia: tendência por SMAs e Ichimoku (foco 1h); momentum por RSI (<30 sobrevenda, >70 sobrecompra) e MACD (foco 1h/15m); extremos por Bollinger e ATR (foco 15m/1m); timing por OBV, VWAP e preço do ticker (foco 15m/1m).
+Tarefa: avalie a tendência no 1h; use 15m e 1m para momentum e pontos de entrada/saída vs preço atual; procure CONFLUÊNCIA entre indicadores e TFs. Seja menos conservador: sinal forte nos TFs curtos justifica entrada mesmo com 1h lateral, mas evite ir contra tendência MUITO FORTE no 1h. HOLD só se os sinais forem conflitantes ou fracos. Sinal para as PRÓXIMAS HORAS.
+Responda exatamente no formato pedido ao final da mensagem; justificativa MUITO BREVE (máx 15 palavras)."""
+COMPACT_SINGLE_FORMAT = "Resposta: linha 1 = BUY, SELL ou HOLD; linha 2 = justificativa."
+
 class GeminiAnalyzer:
-    def __init__(self, api_key: str):
-        """Inicializa o cliente Gemini (Google AI)."""
-        # ... (init como antes) ...
+    def __init__(self, api_key: str, request_timeout: float | None = None, signal_cache: SignalCache | None = None,
+                 circuit_breaker: CircuitBreaker | None = None, model=None, prompt_style: str | None = None, quota_manager: QuotaManager | None = None):
+        """
+        Inicializa o cliente Gemini (Google AI). request_timeout: timeout padrão (s) por requisição; signal_cache: cache
+        semântico opcional; circuit_breaker: disjuntor compartilhado (padrão: um novo com os limites do config);
+        model: modelo já construído (ex: stub local), dispensando a configuração do SDK; prompt_style: 'compact'
+        (system_instruction + tabela) ou 'verbose' (prompt completo por chamada), padrão config.GEMINI_PROMPT_STYLE.
+        Um model injetado com prompt compacto deve já ter COMPACT_SYSTEM_INSTRUCTION configurada. quota_manager:
+        orçamento RPM/TPM opcional; chamadas que não cabem são adiadas (até GEMINI_QUOTA_MAX_WAIT_SECONDS) ou puladas.
+        """
         if not api_key: logger.error("API Key Gemini não fornecida."); raise ValueError("API Key Gemini não pode ser vazia.")
-        self.api_key = api_key; self.model = None; self.model_name = "models/gemini-1.5-flash-latest"
+        self.api_key = api_key; self.request_timeout = request_timeout; self.signal_cache = signal_cache; self.quota_manager = quota_manager; self.model = None; self.model_name = "models/gemini-1.5-flash-latest"
+        self.prompt_style = (prompt_style or config.GEMINI_PROMPT_STYLE).lower()
+        if self.prompt_style not in ('compact', 'verbose'): logger.warning(f"GEMINI_PROMPT_STYLE '{self.prompt_style}' inválido. Usando 'compact'."); self.prompt_style = 'compact'
+        self.circuit_breaker = circuit_breaker or CircuitBreaker("gemini", failure_threshold=config.GEMINI_BREAKER_FAILURE_THRESHOLD, reset_timeout=config.GEMINI_BREAKER_RESET_SECONDS)
+        if model is not None: self.model = model; logger.info(f"Usando modelo Gemini injetado ({type(model).__name__})."); return
         try:
+            import google.generativeai as genai # Import pesado: só quando o analyzer é criado
             logger.info("Configurando API Google Generative AI..."); genai.configure(api_key=self.api_key)
             safety_settings = [{"category": c, "threshold": "BLOCK_MEDIUM_AND_ABOVE"} for c in ["HARM_CATEGORY_HARASSMENT", "HARM_CATEGORY_HATE_SPEECH", "HARM_CATEGORY_SEXUALLY_EXPLICIT", "HARM_CATEGORY_DANGEROUS_CONTENT"]]
-            logger.info(f"Inicializando modelo Gemini: {self.model_name}..."); self.model = genai.GenerativeModel(model_name=self.model_name, safety_settings=safety_settings)
+            system_instruction = COMPACT_SYSTEM_INSTRUCTION if self.prompt_style == 'compact' else None # Enviada uma vez por modelo, não repetida no prompt
+            logger.info(f"Inicializando modelo Gemini: {self.model_name} (prompt {self.prompt_style})..."); self.model = genai.GenerativeModel(model_name=self.model_name, safety_settings=safety_settings, system_instruction=system_instruction)
             logger.info(f"Modelo Gemini ('{self.model_name}') inicializado.")
         except Exception as e: logger.critical("Erro CRÍTICO ao inicializar modelo Gemini.", exc_info=True); raise ConnectionError(f"Falha init Gemini: {e}") from e
 
@@ -27,7 +65,9 @@ class GeminiAnalyzer:
     def get_trade_signal_mta_indicators(self,
                                         mta_indicators_data: dict,
                                         symbol: str,
-                                        current_ticker_price: float | None = None # NOVO ARGUMENTO
+                                        current_ticker_price: float | None = None, # NOVO ARGUMENTO
+                                        request_timeout: float | None = None,
+                                        priority: int = PRIORITY_NORMAL
                                         ) -> tuple[str | None, str | None]:
         """
         Analisa indicadores MTA Intraday e retorna sinal e justificativa via Gemini.
@@ -36,6 +76,8 @@ class GeminiAnalyzer:
             mta_indicators_data (dict): Dict[tf_label, dict_de_indicadores].
             symbol (str): Símbolo do par.
             current_ticker_price (float | None): Preço mais recente do ticker (opcional).
+            request_timeout (float | None): Timeout (s) desta requisição; None usa o padrão do analyzer.
+            priority (int): Prioridade no orçamento de cota (quota.PRIORITY_*).
 
         Returns:
             tuple[str | None, str | None]: (sinal, justificativa) ou (None, None).
@@ -45,40 +87,101 @@ class GeminiAnalyzer:
 
         logger.info(f"Iniciando análise Intraday+Indicadores com Gemini para {symbol} (Ticker: {current_ticker_price})...")
 
-        # --- 1. Preparação de Dados para o Prompt ---
+        # --- 0. Cache Semântico (estado de mercado quantizado) ---
+        cache_key, cached = self._cache_lookup(mta_indicators_data, symbol, current_ticker_price)
+        if cached is not None: return cached
+
+        prompt = self._build_prompt(mta_indicators_data, symbol, current_ticker_price)
+        if prompt is None: return None, None
+
+        logger.info("Enviando prompt Intraday+Ind+Ticker (com justif.) para o Gemini...")
+        logger.debug(f"Prompt Intraday+Ind Gemini para {symbol}:\n---\n{prompt}\n---")
+
+        # --- 3. Chamada da API e Parse (Helper Function) ---
+        call_start = time.perf_counter()
+        signal, justification = self._call_gemini_api_with_justification(prompt, timeout=request_timeout, symbol=symbol, priority=priority)
+        self._cache_store(cache_key, mta_indicators_data, signal, justification, time.perf_counter() - call_start)
+        self._record_decision(symbol, mta_indicators_data, current_ticker_price, signal, justification, "generate_content")
+        return signal, justification
+
+    # --- Helpers compartilhados (sync/async) ---
+    def _cache_lookup(self, mta_indicators_data: dict, symbol: str, current_ticker_price: float | None) -> tuple[str | None, tuple[str, str | None] | None]:
+        """Retorna (chave, (sinal, justificativa) em cache ou None). Sem cache configurado: (None, None)."""
+        if self.signal_cache is None: return None, None
+        cache_key = self.signal_cache.fingerprint(symbol, mta_indicators_data, current_ticker_price)
+        cached = self.signal_cache.get(cache_key)
+        if cached is not None: logger.info(f"Cache semântico HIT ({cache_key}): sinal {cached[0]} reutilizado sem chamada à API. Stats: {self.signal_cache.stats()}")
+        else: logger.debug(f"Cache semântico MISS ({cache_key}).")
+        return cache_key, cached
+
+    def _cache_store(self, cache_key: str | None, mta_indicators_data: dict, signal: str | None, justification: str | None, call_latency: float):
+        if cache_key is None or signal is None: return
+        self.signal_cache.put(cache_key, (signal, justification), self.signal_cache.ttl_for(mta_indicators_data), call_latency=call_latency)
+        logger.info(f"Cache semântico: {self.signal_cache.stats()}")
+
+    def _record_decision(self, symbol: str, mta_indicators_data: dict, current_ticker_price: float | None, signal: str | None, justification: str | None, endpoint: str):
+        """Grava a decisão vinda da API (não as do cache) em gemini_decisions, para replay offline no backtest."""
+        if signal is None or not config.GEMINI_DECISION_LOG_ENABLED: return
+        try:
+            from database import log_gemini_decision # Import tardio: SQLAlchemy só quando há decisão real
+            log_gemini_decision(ts_ms=int(time.time() * 1000), symbol=symbol, fingerprint=market_fingerprint(symbol, mta_indicators_data, current_ticker_price),
+                                price=current_ticker_price, indicators_json=json.dumps(mta_indicators_data, default=float), signal=signal, justification=justification,
+                                prompt_style=self.prompt_style, endpoint=endpoint, model_name=self.model_name)
+        except Exception as e: logger.error(f"Erro ao registrar decisão Gemini de {symbol}.", exc_info=True)
+
+    def _format_market_data(self, mta_indicators_data: dict, symbol: str, current_ticker_price: float | None) -> str:
+        """Bloco de contexto de um símbolo (preço do ticker + indicadores por TF) usado nos prompts."""
         data_str = f"Contexto de Mercado Intraday para {symbol}:\n"
+        price_display = f"{current_ticker_price:.2f}" if current_ticker_price is not None else "N/A"
+        current_price_str = f"Preco ATUAL Ticker ({symbol}): {price_display}\n"
+        ordered_tfs = ['1h', '15m', '1m'] # Foco Intraday
+        for tf_label in ordered_tfs:
+            if tf_label in mta_indicators_data:
+                indicators = mta_indicators_data[tf_label]
+                data_str += f"\n--- Timeframe {tf_label} ---\n"
+                if not indicators: data_str += "Indicadores indisponíveis.\n"; continue
+                indicator_parts = []
+                for key, value in indicators.items(): # Formata indicadores
+                    if value is not None:
+                        decimals = 0 if key in ['obv'] else 4 if key in ['atr', 'vwap'] else 2
+                        try: indicator_parts.append(f"{key.replace('_',' ').title()}={value:.{decimals}f}")
+                        except (TypeError, ValueError): indicator_parts.append(f"{key.replace('_',' ').title()}={value}")
+                if indicator_parts: data_str += ", ".join(indicator_parts) + "\n"
+                else: data_str += "Nenhum indicador calculado.\n"
+            else: # Log se um TF esperado não veio
+                 logger.warning(f"Dados para timeframe {tf_label} não encontrados em mta_indicators_data ({symbol}).")
+                 data_str += f"\n--- Timeframe {tf_label} ---\nDados indisponíveis.\n"
+        return current_price_str + data_str # Prepend o preço do ticker
+
+    @staticmethod
+    def _format_market_table(mta_indicators_data: dict, symbol: str, current_ticker_price: float | None) -> str:
+        """Codificação densa de um símbolo: cabeçalho 'SYM' + CSV (uma linha por TF, só colunas presentes)."""
+        def fmt(value) -> str:
+            if value is None: return "-"
+            try: return f"{value:.6g}"
+            except (TypeError, ValueError): return str(value)
+        tfs = [tf for tf in ('1h', '15m', '1m') if tf in mta_indicators_data] + [tf for tf in mta_indicators_data if tf not in ('1h', '15m', '1m')]
+        present = {key for tf in tfs for key, value in (mta_indicators_data[tf] or {}).items() if value is not None}
+        columns = [(key, code) for key, code in COMPACT_COLUMNS if key in present] + [(key, key) for key in sorted(present - {k for k, _ in COMPACT_COLUMNS})]
+        lines = [f"SYM {symbol} P={fmt(current_ticker_price) if current_ticker_price is not None else '-'}", ",".join(["tf"] + [code for _, code in columns])]
+        for tf in tfs:
+            indicators = mta_indicators_data[tf] or {}
+            lines.append(",".join([tf] + [fmt(indicators.get(key)) for key, _ in columns]))
+        return "\n".join(lines)
+
+    def _build_prompt(self, mta_indicators_data: dict, symbol: str, current_ticker_price: float | None) -> str | None:
+        """Monta o prompt Intraday+Indicadores+Ticker. Retorna None se a preparação dos dados falhar."""
+        if self.prompt_style == 'compact':
+            try: return f"{self._format_market_table(mta_indicators_data, symbol, current_ticker_price)}\n{COMPACT_SINGLE_FORMAT}"
+            except Exception as e: logger.error("Erro ao preparar tabela compacta para o Gemini.", exc_info=True); return None
+
+        # --- 1. Preparação de Dados para o Prompt ---
         try:
-            # *** USA O current_ticker_price RECEBIDO ***
-            price_display = f"{current_ticker_price:.2f}" if current_ticker_price is not None else "N/A"
-            current_price_str = f"Preco ATUAL Ticker ({symbol}): {price_display}\n"
-            # *** FIM DA MUDANÇA ***
-
-            ordered_tfs = ['1h', '15m', '1m'] # Foco Intraday
-            # latest_price = None # Removido, usamos o argumento
-
-            for tf_label in ordered_tfs:
-                if tf_label in mta_indicators_data:
-                    indicators = mta_indicators_data[tf_label]
-                    data_str += f"\n--- Timeframe {tf_label} ---\n"
-                    if not indicators: data_str += "Indicadores indisponíveis.\n"; continue
-                    indicator_parts = []
-                    for key, value in indicators.items(): # Formata indicadores
-                        if value is not None:
-                            decimals = 0 if key in ['obv'] else 4 if key in ['atr', 'vwap'] else 2
-                            try: indicator_parts.append(f"{key.replace('_',' ').title()}={value:.{decimals}f}")
-                            except (TypeError, ValueError): indicator_parts.append(f"{key.replace('_',' ').title()}={value}")
-                    if indicator_parts: data_str += ", ".join(indicator_parts) + "\n"
-                    else: data_str += "Nenhum indicador calculado.\n"
-                else: # Log se um TF esperado não veio
-                     logger.warning(f"Dados para timeframe {tf_label} não encontrados em mta_indicators_data.")
-                     data_str += f"\n--- Timeframe {tf_label} ---\nDados indisponíveis.\n"
-
-            data_str = current_price_str + data_str # Prepend o preço do ticker
+            data_str = self._format_market_data(mta_indicators_data, symbol, current_ticker_price)
             logger.debug(f"Dados Intraday+Ind preparados para prompt Gemini:\n{data_str}")
-
         except Exception as e:
             logger.error("Erro ao preparar dados Intraday+Ind para o Gemini.", exc_info=True)
-            return None, None
+            return None
 
         # --- 2. Engenharia do Prompt (Intraday, Menos Conservador) ---
         # O prompt em si não precisa mudar muito, pois já pede análise dos dados fornecidos
@@ -106,20 +209,85 @@ class GeminiAnalyzer:
         Linha 1: APENAS a palavra BUY, SELL, ou HOLD.
         Linha 2: Justificativa MUITO BREVE (máx 15 palavras), focada nos TFs/indicadores decisivos.
         """
+        return prompt
 
-        logger.info("Enviando prompt Intraday+Ind+Ticker (com justif.) para o Gemini...")
-        logger.debug(f"Prompt Intraday+Ind Gemini para {symbol}:\n---\n{prompt}\n---")
 
-        # --- 3. Chamada da API e Parse (Helper Function) ---
-        return self._call_gemini_api_with_justification(prompt)
+    def _call_gemini_api_with_justification(self, prompt: str, timeout: float | None = None, symbol: str | None = None, priority: int = PRIORITY_NORMAL) -> tuple[str | None, str | None]:
+        """Chama a API Gemini e tenta extrair Sinal e Justificativa."""
+        response = self._generate(prompt, timeout=timeout, symbols=symbol, priority=priority)
+        if response is None: logger.warning("Nao foi possivel validar/extrair sinal trade."); return None, None
+        return self._parse_signal_response(response)
 
+    def _generate(self, prompt: str, timeout: float | None = None, generation_config: dict = GENERATION_CONFIG, endpoint: str = "generate_content",
+                  symbols: str | None = None, priority: int = PRIORITY_NORMAL):
+        """Chamada síncrona crua ao modelo (com cota, circuit breaker, métricas e registro de tokens). Retorna a resposta ou None."""
+        if self.model is None: logger.error("Modelo Gemini não pronto."); return None
+        ticket = None
+        if self.quota_manager is not None:
+            try: ticket = self.quota_manager.acquire(priority, self.quota_manager.estimate_tokens(prompt), max_wait=self._quota_max_wait(priority))
+            except QuotaExhausted as e: logger.warning(f"{e} Chamada Gemini [{symbols or '-'}] pulada neste ciclo."); return None
+        if not self.circuit_breaker.allow():
+            logger.warning("Circuit breaker Gemini aberto. Chamada não enviada.")
+            if ticket is not None: self.quota_manager.release(ticket)
+            return None
+        start = time.perf_counter()
+        try:
+            request_timeout = timeout if timeout is not None else self.request_timeout; request_options = {'timeout': request_timeout} if request_timeout else None
+            with metrics.api_call("gemini", endpoint): response = self.model.generate_content(prompt, generation_config=generation_config, request_options=request_options)
+        except Exception as e:
+            if self.quota_manager is not None and is_quota_error(e): self.quota_manager.on_quota_error()
+            self.circuit_breaker.record_failure(); logger.error("Erro chamada API Gemini.", exc_info=True)
+            self._record_usage(endpoint, symbols, prompt, None, time.perf_counter() - start, success=False); return None
+        self.circuit_breaker.record_success()
+        self._record_usage(endpoint, symbols, prompt, response, time.perf_counter() - start, success=True, ticket=ticket)
+        return response
 
-    def _call_gemini_api_with_justification(self, prompt: str) -> tuple[str | None, str | None]:
-        """Chama a API Gemini e tenta extrair Sinal e Justificativa."""
-        # ... (código _call_gemini_api_with_justification como antes) ...
-        if self.model is None: logger.error("Modelo Gemini não pronto."); return None, None; signal = None; justification = None; 
+    def _quota_max_wait(self, priority: int) -> float:
+        """Baixa prioridade nunca espera (é pulada); normal espera metade e alta o máximo configurado."""
+        if priority <= PRIORITY_LOW: return 0.0
+        return config.GEMINI_QUOTA_MAX_WAIT_SECONDS if priority > PRIORITY_NORMAL else config.GEMINI_QUOTA_MAX_WAIT_SECONDS / 2
+
+    def _record_usage(self, endpoint: str, symbols: str | None, prompt: str, response, latency_s: float, success: bool, ticket: list | None = None,
+                      persist: bool = True) -> dict | None:
+        """
+        Contabiliza tokens (usage_metadata), latência e custo estimado da chamada: métricas + tabela gemini_call_log (+ acerto da cota).
+        Com persist=False não grava no banco e retorna a linha de gemini_call_log (None se desabilitado), para o caminho
+        assíncrono gravar fora do event loop (_persist_call_log via asyncio.to_thread).
+        """
+        usage = getattr(response, 'usage_metadata', None) if response is not None else None
+        prompt_tokens = getattr(usage, 'prompt_token_count', None); response_tokens = getattr(usage, 'candidates_token_count', None); total_tokens = getattr(usage, 'total_token_count', None)
+        if ticket is not None: self.quota_manager.settle(ticket, prompt_chars=len(prompt), prompt_tokens=prompt_tokens, total_tokens=total_tokens)
+        cost_usd = None
+        if prompt_tokens is not None or response_tokens is not None:
+            cost_usd = ((prompt_tokens or 0) * config.GEMINI_PRICE_INPUT_PER_MTOK + (response_tokens or 0) * config.GEMINI_PRICE_OUTPUT_PER_MTOK) / 1_000_000
+            metrics.inc("gemini_prompt_tokens_total", prompt_tokens or 0, style=self.prompt_style); metrics.inc("gemini_response_tokens_total", response_tokens or 0, style=self.prompt_style)
+            metrics.inc("gemini_cost_usd_total", cost_usd)
+        metrics.observe("gemini_call_latency_seconds", latency_s, endpoint=endpoint, style=self.prompt_style)
+        logger.info(f"Gemini {endpoint} [{symbols or '-'}]: {latency_s * 1000:.0f} ms, tokens prompt={prompt_tokens} resposta={response_tokens}, prompt {len(prompt)} chars ({self.prompt_style}).")
+        if not config.GEMINI_CALL_LOG_ENABLED: return None
+        row = {'ts_ms': int(time.time() * 1000), 'endpoint': endpoint, 'symbols': symbols, 'prompt_style': self.prompt_style, 'prompt_chars': len(prompt),
+               'prompt_tokens': prompt_tokens, 'response_tokens': response_tokens, 'total_tokens': total_tokens, 'latency_ms': latency_s * 1000, 'cost_usd': cost_usd, 'success': success}
+        if not persist: return row
+        self._persist_call_log(row); return None
+
+    @staticmethod
+    def _persist_call_log(row: dict | None):
+        """INSERT em gemini_call_log (síncrono: no caminho async roda numa thread, fora do event loop)."""
+        if row is None: return
+        try:
+            from database import log_gemini_call # Import tardio: SQLAlchemy só quando há chamada real
+            log_gemini_call(**row)
+        except Exception as e: logger.error("Erro ao registrar uso da chamada Gemini.", exc_info=True)
+
+    @staticmethod
+    def _response_text(response) -> str | None:
+        try: return "".join(part.text for part in response.parts).strip() if response and response.parts else None
+        except Exception: return None
+
+    def _parse_signal_response(self, response) -> tuple[str | None, str | None]:
+        """Extrai (sinal, justificativa) da resposta: Linha 1 = BUY/SELL/HOLD, Linha 2 = justificativa."""
+        signal = None; justification = None
         try:
-            generation_config = genai.types.GenerationConfig(candidate_count=1, temperature=0.4); response = self.model.generate_content(prompt, generation_config=generation_config)
             logger.debug(f"Resposta bruta Gemini: {response}")
             if response and response.parts:
                  full_text = "".join(part.text for part in response.parts).strip(); logger.info(f"Texto completo Gemini: '{full_text}'"); lines = full_text.split('\n', 1); potential_signal = lines[0].strip().upper(); potential_signal = re.sub(r'[`\*_]', '', potential_signal).strip()
@@ -135,6 +303,226 @@ class GeminiAnalyzer:
             else: logger.warning("Resposta Gemini vazia/bloqueada."); 
             try: logger.warning(f"Prompt Feedback: {response.prompt_feedback}") 
             except Exception: pass
-        except Exception as e: logger.error("Erro chamada/proc API Gemini.", exc_info=True)
+        except Exception as e: logger.error("Erro proc resposta API Gemini.", exc_info=True)
         if signal is None: logger.warning("Nao foi possivel validar/extrair sinal trade.")
-        return signal, justification
\ No newline at end of file
+        return signal, justification
+
+    # --- Modo Lote (vários símbolos num único prompt) ---
+    def get_trade_signals_batch(self, requests_by_symbol: dict[str, tuple[dict, float | None]], request_timeout: float | None = None,
+                                max_symbols_per_request: int | None = None, fallback_individual: bool = True, priorities: dict[str, int] | None = None) -> dict[str, tuple[str | None, str | None]]:
+        """
+        Analisa vários símbolos com um único prompt por lote, pedindo resposta JSON com um sinal por símbolo.
+
+        Args:
+            requests_by_symbol (dict): {symbol: (mta_indicators_data, current_ticker_price)}.
+            request_timeout (float | None): Timeout (s) de cada requisição; None usa o padrão do analyzer.
+            max_symbols_per_request (int | None): Tamanho máximo do lote (padrão: config.GEMINI_BATCH_MAX_SYMBOLS).
+            fallback_individual (bool): Se True, símbolos ausentes/inválidos na resposta do lote são
+                reanalisados com o prompt individual.
+            priorities (dict | None): {symbol: quota.PRIORITY_*}; símbolos mais prioritários vão nos primeiros lotes.
+
+        Returns:
+            dict: {symbol: (sinal, justificativa)}, com (None, None) nos símbolos sem sinal válido.
+        """
+        priorities = priorities or {}; results: dict[str, tuple[str | None, str | None]] = {}; pending: dict[str, tuple[dict, float | None, str | None]] = {}
+        for symbol, (mta, price) in requests_by_symbol.items():
+            if not mta: logger.warning(f"Nenhum dado MTA+Ind fornecido para {symbol}."); results[symbol] = (None, None); continue
+            cache_key, cached = self._cache_lookup(mta, symbol, price)
+            if cached is not None: results[symbol] = cached
+            else: pending[symbol] = (mta, price, cache_key)
+        if not pending: return results
+        if self.model is None: logger.error("Modelo Gemini não inicializado."); return {**results, **{symbol: (None, None) for symbol in pending}}
+
+        batch_size = max(1, max_symbols_per_request or config.GEMINI_BATCH_MAX_SYMBOLS)
+        symbols = sorted(pending, key=lambda symbol: -priorities.get(symbol, PRIORITY_NORMAL)) # Estável: mantém a ordem dentro da mesma prioridade
+        for i in range(0, len(symbols), batch_size):
+            chunk = symbols[i:i + batch_size]; chunk_priority = max(priorities.get(symbol, PRIORITY_NORMAL) for symbol in chunk)
+            prompt = self._build_batch_prompt({symbol: pending[symbol][:2] for symbol in chunk})
+            parsed = {}; call_latency = 0.0
+            if prompt is not None:
+                logger.info(f"Enviando prompt em lote para o Gemini ({len(chunk)} símbolos: {chunk})...")
+                call_start = time.perf_counter()
+                response = self._generate(prompt, timeout=request_timeout, generation_config=BATCH_GENERATION_CONFIG, endpoint="generate_content_batch", symbols=",".join(chunk), priority=chunk_priority)
+                call_latency = time.perf_counter() - call_start
+                parsed = self._parse_batch_response(self._response_text(response), chunk) if response is not None else {}
+            metrics.inc("gemini_batch_requests_total"); metrics.inc("gemini_batch_symbols_total", len(chunk))
+            for symbol in chunk:
+                mta, price, cache_key = pending[symbol]
+                signal, justification = parsed.get(symbol, (None, None))
+                if signal is not None:
+                    self._cache_store(cache_key, mta, signal, justification, call_latency / len(chunk)); self._record_decision(symbol, mta, price, signal, justification, "generate_content_batch")
+                    results[symbol] = (signal, justification); continue
+                metrics.inc("gemini_batch_fallbacks_total")
+                if fallback_individual and self.circuit_breaker.state != CircuitBreaker.OPEN:
+                    logger.warning(f"Sinal de {symbol} ausente/inválido na resposta em lote. Reanalisando individualmente...")
+                    results[symbol] = self.get_trade_signal_mta_indicators(mta, symbol, price, request_timeout=request_timeout, priority=priorities.get(symbol, PRIORITY_NORMAL))
+                else: results[symbol] = (None, None)
+        return results
+
+    def _build_batch_prompt(self, requests_by_symbol: dict[str, tuple[dict, float | None]]) -> str | None:
+        if self.prompt_style == 'compact':
+            try: tables = "\n\n".join(self._format_market_table(mta, symbol, price) for symbol, (mta, price) in requests_by_symbol.items())
+            except Exception as e: logger.error("Erro ao preparar tabelas compactas em lote para o Gemini.", exc_info=True); return None
+            return f'{tables}\nAnalise cada símbolo de forma independente. Resposta: APENAS JSON {{"<SYM>": {{"signal": "BUY|SELL|HOLD", "justification": "..."}}}} com todos os símbolos.'
+        try: blocks = "\n".join(f"=== {symbol} ===\n{self._format_market_data(mta, symbol, price)}" for symbol, (mta, price) in requests_by_symbol.items())
+        except Exception as e: logger.error("Erro ao preparar dados em lote para o Gemini.", exc_info=True); return None
+        symbols_list = ", ".join(requests_by_symbol)
+        example = json.dumps({symbol: {"signal": "HOLD", "justification": "..."} for symbol in list(requests_by_symbol)[:2]})
+        return f"""
+        Você é um assistente de análise técnica focado em identificar oportunidades de trade de CURTO PRAZO (próximas horas) usando Análise Multi-Timeframe Intraday. Seja DECISIVO quando houver sinais claros.
+        Analise CADA símbolo abaixo de forma INDEPENDENTE: {symbols_list}
+
+        Contexto de Mercado Fornecido (Indicadores recentes para 1h, 15m, 1m e Preço Atual do Ticker, por símbolo):
+        {blocks}
+
+        Guia Rápido de Indicadores:
+        - Tendência: SMAs (30/60), Ichimoku (Preço vs Nuvem, Tenkan vs Kijun). (Foco no 1h)
+        - Momentum: RSI (14) (<30 Sobrevenda, >70 Sobrecompra), MACD (Linha vs Sinal, Histograma). (Foco 1h/15m)
+        - Volatilidade/Extremos: Bollinger Bands (Preço vs Bandas), ATR (Valor). (Foco 15m/1m)
+        - Confirmação/Timing: OBV (Fluxo Volume), VWAP (Preço vs VWAP), Preço Ticker vs Últimos Fechamentos/Indicadores. (Foco 15m/1m)
+
+        Tarefa (para cada símbolo):
+        1. Avalie a tendência e o contexto principal no timeframe de 1h.
+        2. Analise os timeframes 15m e 1m para identificar momentum, condições de sobrecompra/venda e possíveis pontos de entrada/saída, comparando com o preço atual do ticker.
+        3. PROCURE POR CONFLUÊNCIA entre indicadores e TFs; use HOLD apenas se os sinais forem genuinamente conflitantes ou muito fracos.
+        4. Determine o sinal (BUY, SELL ou HOLD) para as PRÓXIMAS HORAS.
+
+        Formato OBRIGATÓRIO da Resposta: APENAS um objeto JSON, sem texto extra, com uma chave por símbolo:
+        {example}
+        "signal" deve ser BUY, SELL ou HOLD; "justification" MUITO BREVE (máx 15 palavras).
+        """
+
+    @staticmethod
+    def _parse_batch_response(text: str | None, symbols: list[str]) -> dict[str, tuple[str, str | None]]:
+        """
+        Extrai {symbol: (sinal, justificativa)} da resposta JSON do lote. Tolera cercas de código, texto
+        ao redor do JSON, lista de objetos com campo "symbol" e chaves em caixa diferente. Símbolos
+        ausentes ou com sinal inválido simplesmente não aparecem no retorno.
+        """
+        if not text: logger.warning("Resposta em lote do Gemini vazia/bloqueada."); return {}
+        cleaned = re.sub(r'^```(?:json)?\s*|\s*```$', '', text.strip(), flags=re.IGNORECASE)
+        data = None
+        try: data = json.loads(cleaned)
+        except ValueError:
+            match = re.search(r'(\{.*\}|\[.*\])', cleaned, flags=re.DOTALL) # Primeiro bloco JSON no meio do texto
+            if match:
+                try: data = json.loads(match.group(1))
+                except ValueError: pass
+        if data is None: logger.warning(f"Resposta em lote não é JSON válido: '{text[:200]}'"); return {}
+
+        if isinstance(data, dict) and isinstance(data.get('signals'), (list, dict)): data = data['signals']
+        entries: dict[str, object] = {}
+        if isinstance(data, list):
+            for item in data:
+                if isinstance(item, dict) and item.get('symbol'): entries[str(item['symbol'])] = item
+        elif isinstance(data, dict): entries = {str(k): v for k, v in data.items()}
+        by_upper = {k.strip().upper(): v for k, v in entries.items()}
+
+        parsed = {}
+        for symbol in symbols:
+            entry = by_upper.get(symbol.upper())
+            if entry is None: logger.warning(f"Símbolo {symbol} ausente na resposta em lote."); continue
+            if isinstance(entry, str): raw_signal, justification = entry, None
+            elif isinstance(entry, dict): raw_signal = entry.get('signal') or entry.get('sinal') or ''; justification = entry.get('justification') or entry.get('justificativa')
+            else: continue
+            signal = re.sub(r'[`\*_]', '', str(raw_signal)).strip().upper()
+            if signal not in VALID_SIGNALS: logger.warning(f"Sinal inválido para {symbol} na resposta em lote: '{raw_signal}'."); continue
+            parsed[symbol] = (signal, str(justification).strip() if justification else None)
+        logger.info(f"Resposta em lote: {len(parsed)}/{len(symbols)} sinais válidos ({parsed}).")
+        return parsed
+
+
+class AsyncGeminiAnalyzer(GeminiAnalyzer):
+    """
+    Variante assíncrona (generate_content_async) para analisar vários símbolos em paralelo.
+    Cada requisição tem timeout próprio (asyncio.wait_for) e a concorrência é limitada por semáforo;
+    cache semântico e circuit breaker são os mesmos do analyzer síncrono.
+    """
+    def __init__(self, api_key: str, request_timeout: float | None = None, signal_cache: SignalCache | None = None,
+                 circuit_breaker: CircuitBreaker | None = None, model=None, max_concurrency: int | None = None, prompt_style: str | None = None,
+                 quota_manager: QuotaManager | None = None):
+        super().__init__(api_key, request_timeout=request_timeout, signal_cache=signal_cache, circuit_breaker=circuit_breaker, model=model,
+                         prompt_style=prompt_style, quota_manager=quota_manager)
+        self.max_concurrency = max(1, max_concurrency if max_concurrency is not None else config.GEMINI_MAX_CONCURRENCY)
+
+    async def get_trade_signal_async(self, mta_indicators_data: dict, symbol: str, current_ticker_price: float | None = None,
+                                     request_timeout: float | None = None, semaphore: asyncio.Semaphore | None = None, priority: int = PRIORITY_NORMAL) -> tuple[str | None, str | None]:
+        """Igual a `get_trade_signal_mta_indicators`, mas sem bloquear o event loop. Nunca levanta: falhas viram (None, None)."""
+        if self.model is None: logger.error("Modelo Gemini não inicializado."); return None, None
+        if not mta_indicators_data: logger.warning(f"Nenhum dado MTA+Ind fornecido para {symbol}."); return None, None
+        cache_key, cached = self._cache_lookup(mta_indicators_data, symbol, current_ticker_price)
+        if cached is not None: return cached
+        prompt = self._build_prompt(mta_indicators_data, symbol, current_ticker_price)
+        if prompt is None: return None, None
+        async with (semaphore if semaphore is not None else contextlib.nullcontext()):
+            call_start = time.perf_counter()
+            signal, justification = await self._call_gemini_api_async(prompt, symbol, timeout=request_timeout, priority=priority)
+            call_latency = time.perf_counter() - call_start
+        self._cache_store(cache_key, mta_indicators_data, signal, justification, call_latency)
+        if signal is not None and config.GEMINI_DECISION_LOG_ENABLED: # INSERT fora do event loop: não segura as outras requisições em voo
+            await asyncio.to_thread(self._record_decision, symbol, mta_indicators_data, current_ticker_price, signal, justification, "generate_content_async")
+        return signal, justification
+
+    async def _call_gemini_api_async(self, prompt: str, symbol: str, timeout: float | None = None, priority: int = PRIORITY_NORMAL) -> tuple[str | None, str | None]:
+        ticket = None
+        if self.quota_manager is not None:
+            try: ticket = await self.quota_manager.acquire_async(priority, self.quota_manager.estimate_tokens(prompt), max_wait=self._quota_max_wait(priority))
+            except QuotaExhausted as e: logger.warning(f"{e} Chamada Gemini p/ {symbol} pulada neste ciclo."); return None, None
+        if not self.circuit_breaker.allow():
+            logger.warning(f"Circuit breaker Gemini aberto. Chamada p/ {symbol} não enviada.")
+            if ticket is not None: self.quota_manager.release(ticket)
+            return None, None
+        request_timeout = timeout if timeout is not None else self.request_timeout; request_options = {'timeout': request_timeout} if request_timeout else None
+        start = time.perf_counter()
+        try:
+            with metrics.api_call("gemini", "generate_content_async"):
+                call = self.model.generate_content_async(prompt, generation_config=GENERATION_CONFIG, request_options=request_options)
+                response = await (asyncio.wait_for(call, timeout=request_timeout) if request_timeout else call)
+        except asyncio.TimeoutError:
+            self.circuit_breaker.record_failure(); metrics.inc("deadline_misses_total", call="gemini.generate_content_async")
+            logger.warning(f"Gemini não respondeu em {request_timeout:.1f}s para {symbol}.")
+            await self._persist_call_log_async(self._record_usage("generate_content_async", symbol, prompt, None, time.perf_counter() - start, success=False, persist=False)); return None, None
+        except Exception as e:
+            if self.quota_manager is not None and is_quota_error(e): self.quota_manager.on_quota_error()
+            self.circuit_breaker.record_failure(); logger.error(f"Erro chamada API Gemini (async) para {symbol}.", exc_info=True)
+            await self._persist_call_log_async(self._record_usage("generate_content_async", symbol, prompt, None, time.perf_counter() - start, success=False, persist=False)); return None, None
+        self.circuit_breaker.record_success()
+        await self._persist_call_log_async(self._record_usage("generate_content_async", symbol, prompt, response, time.perf_counter() - start, success=True, ticket=ticket, persist=False))
+        logger.info(f"Resposta Gemini recebida para {symbol}.")
+        return self._parse_signal_response(response)
+
+    async def _persist_call_log_async(self, row: dict | None):
+        if row is not None: await asyncio.to_thread(self._persist_call_log, row)
+
+    async def get_trade_signals_async(self, requests_by_symbol: dict[str, tuple[dict, float | None]], request_timeout: float | None = None,
+                                      priorities: dict[str, int] | None = None) -> dict[str, tuple[str | None, str | None]]:
+        """
+        Analisa vários símbolos concorrentemente (no máximo `max_concurrency` requisições em voo).
+
+        Args:
+            requests_by_symbol (dict): {symbol: (mta_indicators_data, current_ticker_price)}.
+            request_timeout (float | None): Timeout (s) de cada requisição; None usa o padrão do analyzer.
+            priorities (dict | None): {symbol: quota.PRIORITY_*}; os mais prioritários entram primeiro no semáforo/cota.
+
+        Returns:
+            dict: {symbol: (sinal, justificativa)}, com (None, None) nos símbolos que falharam.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency) # Criado aqui p/ ficar preso ao loop corrente
+        priorities = priorities or {}; symbols = sorted(requests_by_symbol, key=lambda symbol: -priorities.get(symbol, PRIORITY_NORMAL))
+        tasks = [self.get_trade_signal_async(requests_by_symbol[symbol][0], symbol, requests_by_symbol[symbol][1], request_timeout=request_timeout, semaphore=semaphore,
+                                             priority=priorities.get(symbol, PRIORITY_NORMAL)) for symbol in symbols]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        signals = {}
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, BaseException): logger.error(f"Falha inesperada na análise async de {symbol}: {result!r}"); result = (None, None)
+            signals[symbol] = result
+        return signals
+
+    def get_trade_signals(self, requests_by_symbol: dict[str, tuple[dict, float | None]], request_timeout: float | None = None,
+                          priorities: dict[str, int] | None = None) -> dict[str, tuple[str | None, str | None]]:
+        """Wrapper síncrono de `get_trade_signals_async` (não chamar de dentro de um event loop em execução)."""
+        start = time.perf_counter()
+        with metrics.span("gemini_batch", symbols=str(len(requests_by_symbol))):
+            signals = asyncio.run(self.get_trade_signals_async(requests_by_symbol, request_timeout=request_timeout, priorities=priorities))
+        logger.info(f"{len(signals)} símbolo(s) analisados pelo Gemini em {time.perf_counter() - start:.2f}s (concorrência {self.max_concurrency}).")
+        return signals
@@ -0,0 +1,19 @@
+# quantis_crypto_trader_gemini/intervals.py
+
+# Constantes de intervalo de kline, com os mesmos valores de binance.client.Client.KLINE_INTERVAL_*.
+# Ficam aqui para que scripts que só precisam das constantes não importem o SDK da Binance.
+KLINE_INTERVAL_1MINUTE = '1m'
+KLINE_INTERVAL_3MINUTE = '3m'
+KLINE_INTERVAL_5MINUTE = '5m'
+KLINE_INTERVAL_15MINUTE = '15m'
+KLINE_INTERVAL_30MINUTE = '30m'
+KLINE_INTERVAL_1HOUR = '1h'
+KLINE_INTERVAL_2HOUR = '2h'
+KLINE_INTERVAL_4HOUR = '4h'
+KLINE_INTERVAL_6HOUR = '6h'
+KLINE_INTERVAL_8HOUR = '8h'
+KLINE_INTERVAL_12HOUR = '12h'
+KLINE_INTERVAL_1DAY = '1d'
+KLINE_INTERVAL_3DAY = '3d'
+KLINE_INTERVAL_1WEEK = '1w'
+KLINE_INTERVAL_1MONTH = '1M'
@@ -2,21 +2,29 @@
 # VERSÃO REVISADA EXAUSTIVAMENTE PARA SINTAXE - 13/Abr/2025
 
 # --- Imports Principais ---
+# SDKs pesados (binance, google.generativeai, pandas_ta, schedule, SQLAlchemy) são importados
+# só onde são usados (initialize_services, calculate_indicators, main), mantendo `import main` leve.
+from __future__ import annotations
 import config
-from database import init_db
-from binance_client import BinanceHandler
-from binance.client import Client
+import intervals
 from redis_client import RedisHandler
-from gemini_analyzer import GeminiAnalyzer
 from telegram_interface import send_telegram_message
 from strategy import StrategyManager
+import metrics
+from resilience import CycleDeadline, DeadlineExceeded, call_with_timeout
+import resampler
+from snapshot import KlineRingBuffer, save_snapshot, load_snapshot
 import pandas as pd
-import pandas_ta as ta
 import datetime
-import schedule
 import time
 import logging
+import signal
 import sys
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from binance_client import BinanceHandler
+    from gemini_analyzer import GeminiAnalyzer
 
 # --- Configuração do Logging ---
 LOG_FILE = "quantis_trader.log"
@@ -34,8 +42,22 @@ def setup_logging(level=logging.INFO):
 
 # --- Handlers Globais ---
 binance_handler: BinanceHandler | None = None; redis_handler: RedisHandler | None = None; gemini_analyzer: GeminiAnalyzer | None = None; strategy_manager: StrategyManager | None = None
+paper_venue = None # MatchingSimulator do modo paper (recebe o ticker de cada ciclo)
+portfolio = None # PortfolioEngine (modos paper/live)
 logger = logging.getLogger(__name__)
 
+# --- Estado Quente (restaurado/salvo via snapshot de warm start) ---
+kline_buffers: dict[str, KlineRingBuffer] = {} # tf_label -> janela das últimas velas
+indicator_state: dict[str, dict] = {} # tf_label -> {'last_ts_ms': int, 'indicators': dict}
+last_cycle_at_ms: int | None = None
+
+# --- Parâmetros do Pipeline de Análise (compartilhados com o replay_engine) ---
+ANALYSIS_INTERVAL = intervals.KLINE_INTERVAL_1HOUR # Ref
+MTA_INTERVALS_TO_UPDATE = {"1M": intervals.KLINE_INTERVAL_1MONTH, "1d": intervals.KLINE_INTERVAL_1DAY, "1h": intervals.KLINE_INTERVAL_1HOUR, "15m": intervals.KLINE_INTERVAL_15MINUTE, "1m": intervals.KLINE_INTERVAL_1MINUTE}
+TFS_FOR_ANALYSIS = {"1h": intervals.KLINE_INTERVAL_1HOUR, "15m": intervals.KLINE_INTERVAL_15MINUTE, "1m": intervals.KLINE_INTERVAL_1MINUTE}
+SMA_PARAMS = {'fast': 30, 'slow': 60}; ICHI_PARAMS = {'t': 21, 'k': 34, 's': 52}; BBANDS_PARAMS = {'length': 20, 'std': 2.0}; ATR_PARAMS = {'length': 14}; RSI_PARAMS = {'length': 14}; MACD_PARAMS = {'fast': 12, 'slow': 26, 'signal': 9}
+MIN_KLINES_NEEDED = max(SMA_PARAMS['slow'], ICHI_PARAMS['s'], MACD_PARAMS['slow'], BBANDS_PARAMS['length'], ATR_PARAMS['length']) + 50 # Janela de velas por TF
+
 # --- Função Auxiliar de Duração de Intervalo ---
 def get_interval_ms(interval: str) -> int | None:
     """Retorna a duração aproximada do intervalo em milissegundos."""
@@ -48,26 +70,88 @@ def get_interval_ms(interval: str) -> int | None:
             else: return value * multipliers[unit] * 1000
         else: logger.warning(f"Unidade intervalo desconhecida '{interval}'"); return None
     except Exception:
-        if interval == Client.KLINE_INTERVAL_1MINUTE: return 60*1000
-        elif interval == Client.KLINE_INTERVAL_15MINUTE: return 15*60*1000
-        elif interval == Client.KLINE_INTERVAL_1HOUR: return 60*60*1000
-        elif interval == Client.KLINE_INTERVAL_4HOUR: return 4*60*60*1000
-        elif interval == Client.KLINE_INTERVAL_1DAY: return 24*60*60*1000
-        elif interval == Client.KLINE_INTERVAL_1WEEK: return 7*24*60*60*1000
-        elif interval == Client.KLINE_INTERVAL_1MONTH: return 30*24*60*60*1000
+        if interval == intervals.KLINE_INTERVAL_1MINUTE: return 60*1000
+        elif interval == intervals.KLINE_INTERVAL_15MINUTE: return 15*60*1000
+        elif interval == intervals.KLINE_INTERVAL_1HOUR: return 60*60*1000
+        elif interval == intervals.KLINE_INTERVAL_4HOUR: return 4*60*60*1000
+        elif interval == intervals.KLINE_INTERVAL_1DAY: return 24*60*60*1000
+        elif interval == intervals.KLINE_INTERVAL_1WEEK: return 7*24*60*60*1000
+        elif interval == intervals.KLINE_INTERVAL_1MONTH: return 30*24*60*60*1000
         else: logger.warning(f"Duração ms desconhecida: {interval}"); return None
 
 # --- Funções de Inicialização e Ciclo de Trade ---
+def _build_order_executor(binance_handler: BinanceHandler):
+    """OrderExecutor conforme EXECUTION_MODE ('simulation' -> None, 'paper' -> simulador local, 'live' -> Binance)."""
+    global paper_venue
+    if config.EXECUTION_MODE not in ('paper', 'live'):
+        if config.EXECUTION_MODE != 'simulation': logger.warning(f"EXECUTION_MODE '{config.EXECUTION_MODE}' inválido. Usando 'simulation'.")
+        return None
+    from execution import OrderExecutor, MatchingSimulator
+    if config.EXECUTION_MODE == 'paper':
+        paper_venue = MatchingSimulator(slippage_bps=config.PAPER_SLIPPAGE_BPS, latency_seconds=config.PAPER_LATENCY_SECONDS, fee_rate=config.PAPER_FEE_RATE,
+                                        balances={'USDT': config.PAPER_INITIAL_QUOTE_BALANCE})
+        venue, venue_name = paper_venue, "paper"
+    else:
+        venue, venue_name = binance_handler, "binance"
+    executor = OrderExecutor(venue, venue_name=venue_name, max_retries=config.ORDER_MAX_RETRIES, retry_backoff_seconds=config.ORDER_RETRY_BACKOFF_SECONDS)
+    executor.start_user_stream()
+    logger.warning(f"Execução de ordens ATIVA (modo '{config.EXECUTION_MODE}').")
+    return executor
+
+def _paper_balances(portfolio, initial_quote_balance: float, initial_quote_asset: str = 'USDT') -> dict[str, float]:
+    """Saldos do simulador paper coerentes com o portfólio restaurado: base = posição; quote = saldo inicial + PnL
+    realizado - custo (médio, com taxas) das posições abertas. Sem isso um restart volta a só ter quote e toda VENDA é recusada."""
+    from execution import split_symbol
+    balances = {initial_quote_asset: initial_quote_balance}
+    for symbol in portfolio.symbols:
+        base_asset, quote_asset = split_symbol(symbol); position = portfolio.position(symbol)
+        balances[base_asset] = balances.get(base_asset, 0.0) + position['qty']
+        balances[quote_asset] = balances.get(quote_asset, 0.0) + position['realized_pnl'] - position['qty'] * position['avg_entry']
+    return {asset: max(0.0, balance) for asset, balance in balances.items()}
+
+def _build_portfolio(redis_handler: RedisHandler, order_executor, symbol: str):
+    """
+    PortfolioEngine restaurado do Redis (chave separada por EXECUTION_MODE) e ligado aos fills do executor. No paper,
+    os saldos do simulador são refeitos a partir do portfólio restaurado; no live, sem posição gravada, parte do saldo da conta.
+    """
+    global portfolio
+    from portfolio import PortfolioEngine
+    from execution import split_symbol
+    portfolio = PortfolioEngine.from_redis(redis_handler, namespace=config.EXECUTION_MODE)
+    order_executor.add_fill_listener(portfolio.on_order_fill)
+    if order_executor.venue is paper_venue and paper_venue is not None:
+        paper_venue.balances = _paper_balances(portfolio, config.PAPER_INITIAL_QUOTE_BALANCE)
+        logger.info(f"Saldos do simulador paper restaurados do portfólio: {paper_venue.balances}")
+    if symbol not in portfolio.symbols:
+        base_asset, _ = split_symbol(symbol)
+        base_balance = order_executor.venue.get_asset_balance(base_asset)
+        if base_balance >= portfolio.min_qty:
+            price = order_executor.venue.get_ticker_price(symbol)
+            if price: portfolio.seed_position(symbol, base_balance, price) # Custo real desconhecido: preço atual como médio
+    redis_handler.set_state(f"position_asset:{symbol}", portfolio.asset_held(symbol)) # Estado legado (dashboard) pode ser do outro modo
+    return portfolio
+
 def initialize_services():
     """Inicializa todos os serviços necessários."""
     global binance_handler, redis_handler, gemini_analyzer, strategy_manager
     logger.info("Inicializando serviços...")
     try:
+        from database import init_db
+        from binance_client import BinanceHandler
+        from gemini_analyzer import GeminiAnalyzer
+        from signal_cache import SignalCache
+        from quota import QuotaManager
         init_db(); config.load_or_set_initial_db_settings()
-        redis_handler = RedisHandler(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB)
-        binance_handler = BinanceHandler(api_key=config.BINANCE_API_KEY, api_secret=config.BINANCE_SECRET_KEY)
-        gemini_analyzer = GeminiAnalyzer(api_key=config.GEMINI_API_KEY)
-        strategy_manager = StrategyManager(redis_handler=redis_handler, binance_handler=binance_handler)
+        redis_handler = RedisHandler(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, socket_timeout=config.REDIS_TIMEOUT_SECONDS)
+        binance_handler = BinanceHandler(api_key=config.BINANCE_API_KEY, api_secret=config.BINANCE_SECRET_KEY, request_timeout=config.BINANCE_TIMEOUT_SECONDS)
+        signal_cache = SignalCache(max_entries=config.GEMINI_CACHE_MAX_ENTRIES, ttl_by_timeframe=config.GEMINI_CACHE_TTL_BY_TIMEFRAME) if config.GEMINI_CACHE_ENABLED else None
+        quota_manager = QuotaManager(rpm_limit=config.GEMINI_RPM_LIMIT, tpm_limit=config.GEMINI_TPM_LIMIT, reserve_fraction=config.GEMINI_QUOTA_RESERVE_FRACTION, cooldown_seconds=config.GEMINI_QUOTA_COOLDOWN_SECONDS) if config.GEMINI_QUOTA_ENABLED else None
+        gemini_analyzer = GeminiAnalyzer(api_key=config.GEMINI_API_KEY, request_timeout=config.GEMINI_TIMEOUT_SECONDS, signal_cache=signal_cache, quota_manager=quota_manager)
+        order_executor = _build_order_executor(binance_handler)
+        strategy_manager = StrategyManager(redis_handler=redis_handler, binance_handler=binance_handler, order_executor=order_executor, order_fill_timeout=config.ORDER_FILL_TIMEOUT_SECONDS,
+                                           max_symbol_exposure=config.MAX_SYMBOL_EXPOSURE, max_total_exposure=config.MAX_TOTAL_EXPOSURE)
+        if order_executor is not None: strategy_manager.portfolio = _build_portfolio(redis_handler, order_executor, strategy_manager.symbol)
+        if config.METRICS_REDIS_TIMESERIES: metrics.enable_redis_timeseries(redis_handler, config.METRICS_REDIS_RETENTION_SECONDS)
         logger.info("Todos serviços inicializados."); return True
     except Exception as e:
         logger.critical("Erro CRÍTICO inicialização.", exc_info=True)
@@ -79,37 +163,151 @@ def calculate_indicators(df: pd.DataFrame, sma_p: dict, ichi_p: dict, bb_p: dict
     """Calcula e retorna os últimos valores dos indicadores para um DataFrame."""
     indicators = {};
     if df is None or df.empty: return indicators
-    required_len = max(sma_p['slow'], ichi_p['s'], 26, 20, 14) + 1
+    required_len = indicator_required_len(sma_p, ichi_p)
     if len(df) < required_len: logger.warning(f"Dados insuficientes ({len(df)}) p/ inds (~{required_len})."); return {}
     logger.debug(f"Calculando inds DF {len(df)}L...");
+    import pandas_ta # noqa: F401 - registra o accessor df.ta (import pesado, só no primeiro cálculo)
     try:
-        df.ta.sma(length=sma_p['fast'], append=True); df.ta.sma(length=sma_p['slow'], append=True); df.ta.rsi(length=rsi_p['length'], append=True); df.ta.macd(fast=macd_p['fast'], slow=macd_p['slow'], signal=macd_p['signal'], append=True); df.ta.obv(append=True); df.ta.ichimoku(tenkan=ichi_p['t'], kijun=ichi_p['k'], senkou=ichi_p['s'], append=True); df.ta.bbands(length=bb_p['length'], std=bb_p['std'], append=True); df.ta.atr(length=atr_p['length'], append=True); df.ta.vwap(append=True)
-        last = df.iloc[-1]
-        def get_ind(row, key, decimals=2): return round(row[key], decimals) if pd.notna(row.get(key)) else None
-        indicators['sma_fast'] = get_ind(last, f"SMA_{sma_p['fast']}"); indicators['sma_slow'] = get_ind(last, f"SMA_{sma_p['slow']}"); indicators['rsi'] = get_ind(last, f"RSI_{rsi_p['length']}")
-        indicators['macd_line'] = get_ind(last, f'MACD_{macd_p["fast"]}_{macd_p["slow"]}_{macd_p["signal"]}'); indicators['macd_hist'] = get_ind(last, f'MACDh_{macd_p["fast"]}_{macd_p["slow"]}_{macd_p["signal"]}'); indicators['macd_signal'] = get_ind(last, f'MACDs_{macd_p["fast"]}_{macd_p["slow"]}_{macd_p["signal"]}'); indicators['obv'] = get_ind(last, "OBV", 0)
-        indicators['ichi_tenkan'] = get_ind(last, f'ITS_{ichi_p["t"]}'); indicators['ichi_kijun'] = get_ind(last, f'IKS_{ichi_p["k"]}'); indicators['ichi_senkou_a'] = get_ind(last, f'ISA_{ichi_p["t"]}'); indicators['ichi_senkou_b'] = get_ind(last, f'ISB_{ichi_p["s"]}'); indicators['bb_lower'] = get_ind(last, f'BBL_{bb_p["length"]}_{bb_p["std"]}'); indicators['bb_middle'] = get_ind(last, f'BBM_{bb_p["length"]}_{bb_p["std"]}'); indicators['bb_upper'] = get_ind(last, f'BBU_{bb_p["length"]}_{bb_p["std"]}'); indicators['bbp'] = get_ind(last, f'BBP_{bb_p["length"]}_{bb_p["std"]}', 4)
-        indicators['atr'] = get_ind(last, f'ATR_{atr_p["length"]}', 4); indicators['vwap'] = get_ind(last, 'VWAP_D')
+        append_indicator_columns(df, sma_p, ichi_p, bb_p, atr_p, rsi_p, macd_p)
+        final_indicators = extract_indicators(df.iloc[-1].get, sma_p, ichi_p, bb_p, atr_p, rsi_p, macd_p)
     except Exception as e: logger.error("Erro calcular inds TA.", exc_info=True); return {}
-    final_indicators = {k: v for k, v in indicators.items() if v is not None}; logger.debug(f"Inds calculados (nao nulos): {list(final_indicators.keys())}"); return final_indicators
+    logger.debug(f"Inds calculados (nao nulos): {list(final_indicators.keys())}"); return final_indicators
+
+def indicator_required_len(sma_p: dict, ichi_p: dict) -> int:
+    return max(sma_p['slow'], ichi_p['s'], 26, 20, 14) + 1
+
+def append_indicator_columns(df: pd.DataFrame, sma_p: dict, ichi_p: dict, bb_p: dict, atr_p: dict, rsi_p: dict, macd_p: dict) -> pd.DataFrame:
+    """Acrescenta ao DataFrame (in place) as colunas pandas_ta de todos os indicadores, para todas as linhas."""
+    import pandas_ta # noqa: F401
+    df.ta.sma(length=sma_p['fast'], append=True); df.ta.sma(length=sma_p['slow'], append=True); df.ta.rsi(length=rsi_p['length'], append=True); df.ta.macd(fast=macd_p['fast'], slow=macd_p['slow'], signal=macd_p['signal'], append=True); df.ta.obv(append=True); df.ta.ichimoku(tenkan=ichi_p['t'], kijun=ichi_p['k'], senkou=ichi_p['s'], append=True); df.ta.bbands(length=bb_p['length'], std=bb_p['std'], append=True); df.ta.atr(length=atr_p['length'], append=True); df.ta.vwap(append=True)
+    return df
+
+def extract_indicators(get, sma_p: dict, ichi_p: dict, bb_p: dict, atr_p: dict, rsi_p: dict, macd_p: dict) -> dict:
+    """Dict de indicadores (só os não nulos) de uma vela; `get(coluna)` devolve o valor da coluna pandas_ta nessa vela."""
+    indicators = {}
+    def get_ind(key, decimals=2): value = get(key); return round(value, decimals) if pd.notna(value) else None
+    indicators['sma_fast'] = get_ind(f"SMA_{sma_p['fast']}"); indicators['sma_slow'] = get_ind(f"SMA_{sma_p['slow']}"); indicators['rsi'] = get_ind(f"RSI_{rsi_p['length']}")
+    indicators['macd_line'] = get_ind(f'MACD_{macd_p["fast"]}_{macd_p["slow"]}_{macd_p["signal"]}'); indicators['macd_hist'] = get_ind(f'MACDh_{macd_p["fast"]}_{macd_p["slow"]}_{macd_p["signal"]}'); indicators['macd_signal'] = get_ind(f'MACDs_{macd_p["fast"]}_{macd_p["slow"]}_{macd_p["signal"]}'); indicators['obv'] = get_ind("OBV", 0)
+    indicators['ichi_tenkan'] = get_ind(f'ITS_{ichi_p["t"]}'); indicators['ichi_kijun'] = get_ind(f'IKS_{ichi_p["k"]}'); indicators['ichi_senkou_a'] = get_ind(f'ISA_{ichi_p["t"]}'); indicators['ichi_senkou_b'] = get_ind(f'ISB_{ichi_p["s"]}'); indicators['bb_lower'] = get_ind(f'BBL_{bb_p["length"]}_{bb_p["std"]}'); indicators['bb_middle'] = get_ind(f'BBM_{bb_p["length"]}_{bb_p["std"]}'); indicators['bb_upper'] = get_ind(f'BBU_{bb_p["length"]}_{bb_p["std"]}'); indicators['bbp'] = get_ind(f'BBP_{bb_p["length"]}_{bb_p["std"]}', 4)
+    indicators['atr'] = get_ind(f'ATR_{atr_p["length"]}', 4); indicators['vwap'] = get_ind('VWAP_D')
+    return {k: v for k, v in indicators.items() if v is not None}
+
+def _estimated_ai_call_savings() -> tuple[float | None, float | None]:
+    """Latência (s) e custo (USD) médios das chamadas Gemini já observadas, p/ estimar o que o gate pré-AI economiza."""
+    timing = metrics.get_timing("phase_duration_seconds", phase="gemini_call")
+    latency = timing['sum'] / timing['count'] if timing and timing['count'] else None
+    calls = metrics.get_counter("api_calls_total", service="gemini", endpoint="generate_content")
+    cost = metrics.get_counter("gemini_cost_usd_total") / calls if calls else None
+    return latency, cost
+
+def analyze_and_decide(strategy_manager: StrategyManager, gemini_analyzer, symbol: str, mta_data_for_gemini: dict, latest_price: float | None,
+                       all_data_available: bool, deadline: CycleDeadline | None = None) -> tuple[str | None, str]:
+    """
+    Passos 3 e 4 do ciclo (gate pré-AI -> sinal do analisador -> fallback -> Telegram -> decide_action), compartilhados
+    pelo trade_cycle e pelo replay_engine. Sem `deadline` o analisador é chamado direto (replay). Retorna (sinal, fonte).
+    """
+    # --- PASSO 3: Análise Gemini ---
+    trade_signal: str | None = None
+    justification: str | None = None
+    signal_source = "AI"
+    ai_deadline_missed = False
+    indicators_15m = mta_data_for_gemini.get('15m', {})
+
+    analysis_data_ok = all_data_available and all(mta_data_for_gemini.get(tf) for tf in TFS_FOR_ANALYSIS)
+    ai_needed, gate_reason = True, ""
+    if analysis_data_ok and config.AI_PREFILTER_GATE_ENABLED: # Gate pré-AI: mesmos filtros 15m + posição do decide_action
+        ai_needed, gate_reason = strategy_manager.ai_call_needed(indicators_15m.get('sma_fast'), indicators_15m.get('sma_slow'), indicators_15m.get('rsi'), indicators_15m.get('bbp'))
+
+    if analysis_data_ok and not ai_needed:
+        signal_source = "GATE"
+        saved_latency, saved_cost = _estimated_ai_call_savings()
+        metrics.inc("ai_gate_skips_total")
+        if saved_latency is not None: metrics.inc("ai_gate_saved_seconds_total", saved_latency)
+        if saved_cost is not None: metrics.inc("ai_gate_saved_usd_total", saved_cost)
+        latency_str = f"~{saved_latency:.2f}s" if saved_latency is not None else "n/d"; cost_str = f"~US$ {saved_cost:.6f}" if saved_cost is not None else "n/d"
+        logger.info(f"Gate pré-AI: chamada Gemini pulada ({gate_reason}). Economia estimada: latência {latency_str}, custo {cost_str}.")
+    elif analysis_data_ok:
+        if gate_reason: logger.info(f"Gate pré-AI: chamada Gemini necessária ({gate_reason}).")
+        logger.info(f"Enviando dados Intraday+Indicadores e Ticker={latest_price} para análise Gemini...")
+        ai_priority = strategy_manager.ai_call_priority(indicators_15m.get('sma_fast'), indicators_15m.get('sma_slow'), indicators_15m.get('rsi'), indicators_15m.get('bbp'))
+        try:
+            with metrics.span("gemini_call"):
+                if deadline is not None:
+                    # Guarda tempo p/ a decisão (saldo + Telegram); o SDK recebe uma folga p/ a thread abandonada encerrar logo depois
+                    gemini_timeout = deadline.timeout_for(config.GEMINI_TIMEOUT_SECONDS, reserve=config.BINANCE_TIMEOUT_SECONDS)
+                    signal_tuple = call_with_timeout(
+                        gemini_analyzer.get_trade_signal_mta_indicators, gemini_timeout, call_name="gemini.generate_content",
+                        mta_indicators_data=mta_data_for_gemini,
+                        symbol=symbol,
+                        current_ticker_price=latest_price, # Passa o ticker price para Gemini
+                        request_timeout=gemini_timeout + 1.0,
+                        priority=ai_priority
+                    )
+                else: # Replay: analisador local, sem thread nem timeout
+                    signal_tuple = gemini_analyzer.get_trade_signal_mta_indicators(mta_indicators_data=mta_data_for_gemini, symbol=symbol, current_ticker_price=latest_price, priority=ai_priority)
+            if signal_tuple:
+                trade_signal, justification = signal_tuple
+        except DeadlineExceeded:
+            ai_deadline_missed = True # Já contado em deadline_misses_total{call="gemini.generate_content"} pelo call_with_timeout
+            logger.warning(f"Sinal AI não chegou dentro do deadline ({gemini_timeout:.1f}s). Fallback: '{config.AI_DEADLINE_FALLBACK}'.")
+
+        if ai_deadline_missed and config.AI_DEADLINE_FALLBACK == 'technical':
+            signal_source = "TECNICO"
+            trade_signal = strategy_manager.technical_signal(indicators_15m.get('sma_fast'), indicators_15m.get('sma_slow'), indicators_15m.get('rsi'), indicators_15m.get('bbp'))
+            justification = "Fallback técnico: sinal AI excedeu o deadline do ciclo."
+            metrics.inc("ai_fallbacks_total", mode="technical")
+            logger.info(f"Sinal Técnico (fallback 15m): {trade_signal if trade_signal else 'Nenhum'}")
+        else:
+            logger.info(f"Sinal Obtido Gemini (Intraday+Ind): {trade_signal if trade_signal else 'Nenhum/Erro'}")
+        if justification:
+             logger.info(f"Justificativa {signal_source}: {justification}")
+
+        # *** CORREÇÃO TELEGRAM: Envia SÓ se não for HOLD ***
+        if trade_signal and trade_signal != "HOLD":
+            price_str = f"{latest_price:.2f}" if latest_price is not None else "N/A"
+            message = f"Sinal Intraday+Ind ({symbol} - {ANALYSIS_INTERVAL}): {trade_signal}\n" if signal_source == "AI" else f"Sinal Técnico/Fallback ({symbol} - 15m): {trade_signal}\n"
+            message += f"Preço Atual: {price_str}\n"
+            if justification:
+                message += f"Justif: {justification}"
+            send_telegram_message(message)
+        elif trade_signal == "HOLD":
+             logger.info(f"Sinal {signal_source} foi HOLD, nenhuma notificação de sinal enviada.")
+
+    else:
+        logger.warning("Análise Gemini ignorada: faltaram dados ou indicadores dos TFs Intraday.")
+        send_telegram_message(f"Alerta ({symbol}): Falha carregar/calcular TFs Intraday p/ analise.", disable_notification=True)
+
+    # --- PASSO 4: Decisão Estratégia Híbrida (COM FILTROS SMA/RSI/BBP 15m) ---
+    logger.info(f"Executando estratégia HÍBRIDA para {symbol} com sinal {signal_source} '{trade_signal}' e filtros 15m...")
+    # Usa as chaves geradas por calculate_indicators ('sma_fast', 'sma_slow', 'rsi', 'bbp')
+    with metrics.span("decision"):
+        strategy_manager.decide_action(
+            signal=trade_signal,
+            sma_fast_15m=indicators_15m.get('sma_fast'),
+            sma_slow_15m=indicators_15m.get('sma_slow'),
+            rsi_15m=indicators_15m.get('rsi'),
+            bbp_15m=indicators_15m.get('bbp'),
+            signal_source=signal_source
+        )
+    return trade_signal, signal_source
 
 def trade_cycle():
     """Executa um ciclo completo: Atualiza Histórico -> Busca Recente -> Calcula TAs -> Analisa -> Decide."""
-    global binance_handler, redis_handler, gemini_analyzer, strategy_manager
+    global binance_handler, redis_handler, gemini_analyzer, strategy_manager, last_cycle_at_ms
     if not all([binance_handler, redis_handler, gemini_analyzer, strategy_manager]):
         logger.error("Serviços não inicializados. Abortando ciclo.")
         return
 
     start_cycle_time = datetime.datetime.now()
+    deadline = CycleDeadline(config.CYCLE_DEADLINE_SECONDS)
+    analysis_reserve = config.CYCLE_ANALYSIS_RESERVE_SECONDS # Tempo guardado p/ indicadores + AI + decisão
     logger.info(f"--- Iniciando Ciclo de Trade (Híbrido AI+BB) em {start_cycle_time.strftime('%Y-%m-%d %H:%M:%S')} ---")
 
     symbol = strategy_manager.symbol
-    analysis_interval = Client.KLINE_INTERVAL_1HOUR # Ref
-
-    mta_intervals_to_update = {"1M": Client.KLINE_INTERVAL_1MONTH, "1d": Client.KLINE_INTERVAL_1DAY, "1h": Client.KLINE_INTERVAL_1HOUR, "15m": Client.KLINE_INTERVAL_15MINUTE, "1m": Client.KLINE_INTERVAL_1MINUTE}
-    tfs_for_gemini_analysis = {"1h": Client.KLINE_INTERVAL_1HOUR, "15m": Client.KLINE_INTERVAL_15MINUTE, "1m": Client.KLINE_INTERVAL_1MINUTE}
-    sma_params = {'fast': 30, 'slow': 60}; ichi_params = {'t': 21, 'k': 34, 's': 52}; bbands_params = {'length': 20, 'std': 2.0}; atr_params = {'length': 14}; rsi_params = {'length': 14}; macd_params = {'fast': 12, 'slow': 26, 'signal': 9}
-    min_klines_needed = max(sma_params['slow'], ichi_params['s'], macd_params['slow'], bbands_params['length'], atr_params['length']) + 50
+    mta_intervals_to_update = MTA_INTERVALS_TO_UPDATE
+    tfs_for_gemini_analysis = TFS_FOR_ANALYSIS
+    sma_params, ichi_params, bbands_params, atr_params, rsi_params, macd_params = SMA_PARAMS, ICHI_PARAMS, BBANDS_PARAMS, ATR_PARAMS, RSI_PARAMS, MACD_PARAMS
+    min_klines_needed = MIN_KLINES_NEEDED
 
     mta_data_for_gemini = {}
     all_data_available = True
@@ -118,51 +316,74 @@ def trade_cycle():
     try:
         # --- PASSO 1: Atualização Incremental (Todos TFs) ---
         logger.info("--- Iniciando Fase de Atualização do Histórico Redis (Todos TFs) ---")
-        for tf_label, tf_interval in mta_intervals_to_update.items():
-            logger.debug(f"Atualizando {symbol}/{tf_label}...")
-            last_ts_ms = redis_handler.get_last_hist_timestamp(symbol, tf_interval)
-            start_fetch_str = None
-            if last_ts_ms:
-                interval_ms = get_interval_ms(tf_interval)
-                if interval_ms:
-                    start_fetch_ts_ms = last_ts_ms + interval_ms
-                    now_ms = int(time.time() * 1000)
-                    if start_fetch_ts_ms < now_ms - 10000: # Buffer 10s
-                        start_fetch_str = str(start_fetch_ts_ms)
-                        logger.info(f"Verificando velas {tf_label} desde {pd.to_datetime(start_fetch_ts_ms, unit='ms')}...")
+        derive_from_1m = config.DERIVE_TIMEFRAMES_FROM_1M
+        # Com derivação local, só o 1m vem da Binance; os demais TFs são agregados a partir dele logo abaixo
+        binance_refresh_intervals = {"1m": intervals.KLINE_INTERVAL_1MINUTE} if derive_from_1m else mta_intervals_to_update
+        for tf_label, tf_interval in binance_refresh_intervals.items():
+            if deadline.remaining() <= analysis_reserve:
+                logger.warning(f"Deadline do ciclo: atualização de histórico interrompida antes de {tf_label} (restam {deadline.remaining():.1f}s).")
+                metrics.inc("deadline_misses_total", phase="history_refresh")
+                break
+            with metrics.span("history_refresh", tf=tf_label):
+                logger.debug(f"Atualizando {symbol}/{tf_label}...")
+                last_ts_ms = redis_handler.get_last_hist_timestamp(symbol, tf_interval)
+                start_fetch_str = None
+                if last_ts_ms:
+                    interval_ms = get_interval_ms(tf_interval)
+                    if interval_ms:
+                        start_fetch_ts_ms = last_ts_ms + interval_ms
+                        now_ms = int(time.time() * 1000)
+                        if start_fetch_ts_ms < now_ms - 10000: # Buffer 10s
+                            start_fetch_str = str(start_fetch_ts_ms)
+                            logger.info(f"Verificando velas {tf_label} desde {pd.to_datetime(start_fetch_ts_ms, unit='ms')}...")
+                        else:
+                            logger.info(f"Histórico {tf_label} já está atualizado.")
+                            continue
                     else:
-                        logger.info(f"Histórico {tf_label} já está atualizado.")
+                        logger.warning(f"Duração {tf_label} desconhecida.")
                         continue
                 else:
-                    logger.warning(f"Duração {tf_label} desconhecida.")
+                    logger.error(f"HISTÓRICO BASE {tf_label} NÃO ENCONTRADO!")
+                    all_data_available = False
                     continue
-            else:
-                logger.error(f"HISTÓRICO BASE {tf_label} NÃO ENCONTRADO!")
-                all_data_available = False
-                continue
 
-            if start_fetch_str:
-                try:
-                    new_klines_df = binance_handler.get_klines(symbol=symbol, interval=tf_interval, start_str=start_fetch_str, limit=1000)
-                    if new_klines_df is not None and not new_klines_df.empty:
-                        logger.info(f"{len(new_klines_df)} novas velas {tf_label} encontradas.")
-                        try:
-                            if not isinstance(new_klines_df.index, pd.DatetimeIndex):
-                                if 'Open time' in new_klines_df.columns:
-                                    new_klines_df['Open time'] = pd.to_datetime(new_klines_df['Open time'], unit='ms')
-                                    new_klines_df.set_index('Open time', inplace=True)
-                                else:
-                                    logger.error(f"Coluna 'Open time' nao encontrada {tf_label}.")
-                                    continue
-                            redis_handler.add_klines_to_hist(symbol, tf_interval, new_klines_df)
-                        except Exception as idx_err:
-                            logger.error(f"Erro ao processar/adicionar novas klines para {tf_label}.", exc_info=True)
-                    elif new_klines_df is not None:
-                        logger.info(f"Nenhuma vela nova para {tf_label}.")
-                except Exception as fetch_err:
-                    logger.error(f"Erro na busca/adição incremental para {tf_label}.", exc_info=True)
+                if start_fetch_str:
+                    try:
+                        fetch_timeout = deadline.timeout_for(config.BINANCE_TIMEOUT_SECONDS, reserve=analysis_reserve)
+                        new_klines_df = call_with_timeout(binance_handler.get_klines, fetch_timeout, call_name="binance.get_klines", symbol=symbol, interval=tf_interval, start_str=start_fetch_str, limit=1000)
+                        if new_klines_df is not None and not new_klines_df.empty:
+                            if derive_from_1m and 'Close time' in new_klines_df.columns:
+                                # Só velas fechadas: uma vela 1m parcial contaminaria todos os TFs derivados
+                                new_klines_df = new_klines_df[new_klines_df['Close time'] <= pd.to_datetime(int(time.time() * 1000), unit='ms')]
+                            logger.info(f"{len(new_klines_df)} novas velas {tf_label} encontradas.")
+                            try:
+                                if not isinstance(new_klines_df.index, pd.DatetimeIndex):
+                                    if 'Open time' in new_klines_df.columns:
+                                        new_klines_df['Open time'] = pd.to_datetime(new_klines_df['Open time'], unit='ms')
+                                        new_klines_df.set_index('Open time', inplace=True)
+                                    else:
+                                        logger.error(f"Coluna 'Open time' nao encontrada {tf_label}.")
+                                        continue
+                                redis_handler.add_klines_to_hist(symbol, tf_interval, new_klines_df)
+                            except Exception as idx_err:
+                                logger.error(f"Erro ao processar/adicionar novas klines para {tf_label}.", exc_info=True)
+                        elif new_klines_df is not None:
+                            logger.info(f"Nenhuma vela nova para {tf_label}.")
+                    except DeadlineExceeded:
+                        logger.warning(f"Busca incremental {tf_label} excedeu o tempo. Seguindo com o histórico atual.")
+                    except Exception as fetch_err:
+                        logger.error(f"Erro na busca/adição incremental para {tf_label}.", exc_info=True)
 
             time.sleep(0.1) # Pausa menor entre TFs
+
+        if derive_from_1m:
+            for tf_label, tf_interval in mta_intervals_to_update.items():
+                if tf_interval == intervals.KLINE_INTERVAL_1MINUTE: continue
+                try:
+                    with metrics.span("history_refresh", tf=tf_label):
+                        resampler.materialize_from_1m(redis_handler, symbol, tf_interval)
+                except Exception as derive_err:
+                    logger.error(f"Erro ao derivar {tf_label} a partir do 1m.", exc_info=True)
         logger.info("--- Concluída Fase de Atualização do Histórico Redis ---")
 
 
@@ -172,9 +393,20 @@ def trade_cycle():
             indicators = {}
             df = None
             try:
-                df = redis_handler.get_last_n_hist_klines(symbol, tf_interval, min_klines_needed)
+                buffer = kline_buffers.get(tf_label)
+                if buffer is None or buffer.capacity != min_klines_needed:
+                    buffer = KlineRingBuffer(min_klines_needed, buffer.df if buffer else None); kline_buffers[tf_label] = buffer
+                with metrics.span("redis_read", tf=tf_label):
+                    df = buffer.refresh(redis_handler, symbol, tf_interval)
                 if df is not None and not df.empty:
-                    indicators = calculate_indicators(df.copy(), sma_params, ichi_params, bbands_params, atr_params, rsi_params, macd_params)
+                    cached_state = indicator_state.get(tf_label)
+                    if cached_state and cached_state['last_ts_ms'] == buffer.last_ts_ms and len(df) >= min_klines_needed:
+                        indicators = cached_state['indicators'] # Nenhuma vela nova desde o último cálculo
+                        logger.debug(f"Indicadores {tf_label} reaproveitados (sem vela nova).")
+                    else:
+                        with metrics.span("indicators", tf=tf_label):
+                            indicators = calculate_indicators(df.copy(), sma_params, ichi_params, bbands_params, atr_params, rsi_params, macd_params)
+                        if indicators: indicator_state[tf_label] = {'last_ts_ms': buffer.last_ts_ms, 'indicators': indicators}
                     if not indicators and len(df) >= min_klines_needed:
                         logger.warning(f"Falha calc inds {tf_label} c/ {len(df)} velas.")
                         all_data_available = False
@@ -191,74 +423,87 @@ def trade_cycle():
         # --- PASSO 2.5: Busca Preço Atual do Ticker ---
         if binance_handler:
             logger.debug(f"Buscando preço atual ticker para {symbol}...")
-            latest_price = binance_handler.get_ticker_price(symbol) # Busca o preço aqui
+            try:
+                with metrics.span("ticker_fetch"):
+                    latest_price = call_with_timeout(binance_handler.get_ticker_price, deadline.timeout_for(config.BINANCE_TIMEOUT_SECONDS), symbol, call_name="binance.get_ticker_price") # Busca o preço aqui
+            except DeadlineExceeded:
+                latest_price = None
             if latest_price is None:
                  logger.warning(f"Não foi possível obter o preço atual do ticker para {symbol}.")
+            else:
+                if paper_venue is not None: paper_venue.on_price(symbol, latest_price)
+                if portfolio is not None: portfolio.mark_price(symbol, latest_price)
         else:
              logger.error("Binance handler não disponível para buscar ticker price.")
 
-        # --- PASSO 3: Análise Gemini ---
-        trade_signal: str | None = None
-        justification: str | None = None
-
-        if all_data_available and all(mta_data_for_gemini.get(tf) for tf in tfs_for_gemini_analysis):
-            logger.info(f"Enviando dados Intraday+Indicadores e Ticker={latest_price} para análise Gemini...")
-            signal_tuple = gemini_analyzer.get_trade_signal_mta_indicators(
-                mta_indicators_data=mta_data_for_gemini,
-                symbol=symbol,
-                current_ticker_price=latest_price # Passa o ticker price para Gemini
-            )
-            if signal_tuple:
-                trade_signal, justification = signal_tuple
-            logger.info(f"Sinal Obtido Gemini (Intraday+Ind): {trade_signal if trade_signal else 'Nenhum/Erro'}")
-            if justification:
-                 logger.info(f"Justificativa Gemini: {justification}")
-
-            # *** CORREÇÃO TELEGRAM: Envia SÓ se não for HOLD ***
-            if trade_signal and trade_signal != "HOLD":
-                price_str = f"{latest_price:.2f}" if latest_price is not None else "N/A"
-                message = f"Sinal Intraday+Ind ({symbol} - {analysis_interval}): {trade_signal}\n"
-                message += f"Preço Atual: {price_str}\n"
-                if justification:
-                    message += f"Justif: {justification}"
-                send_telegram_message(message)
-            elif trade_signal == "HOLD":
-                 logger.info("Sinal AI foi HOLD, nenhuma notificação de sinal enviada.")
-
-        else:
-            logger.warning("Análise Gemini ignorada: faltaram dados ou indicadores dos TFs Intraday.")
-            send_telegram_message(f"Alerta ({symbol}): Falha carregar/calcular TFs Intraday p/ analise.", disable_notification=True)
-
-        # --- PASSO 4: Decisão Estratégia Híbrida (COM FILTRO BBP 15m) ---
-        logger.info(f"Executando estratégia HÍBRIDA para {symbol} com sinal AI '{trade_signal}' e filtro BBP 15m...")
-        indicators_15m = mta_data_for_gemini.get('15m', {})
-        # Usa o nome exato da coluna BBP gerado pelo calculate_indicators
-        bbp_15m = indicators_15m.get('bbp') # 'bbp' foi a chave que definimos em calculate_indicators
-
-        # Chama decide_action passando o BBP de 15m
-        strategy_manager.decide_action(
-            signal=trade_signal,
-            bbp_15m=bbp_15m # Passa o valor do BBP de 15m
-        )
+        # --- PASSOS 3 e 4: Análise Gemini + Decisão Híbrida ---
+        analyze_and_decide(strategy_manager, gemini_analyzer, symbol, mta_data_for_gemini, latest_price, all_data_available, deadline)
+        if deadline.expired():
+            metrics.inc("deadline_misses_total", phase="cycle")
+            logger.warning(f"Ciclo excedeu o deadline de {config.CYCLE_DEADLINE_SECONDS:.0f}s ({deadline.elapsed():.1f}s).")
 
     # --- Tratamento de Erro do Ciclo e Finalização ---
     except Exception as e:
         logger.critical("Erro CRÍTICO inesperado durante ciclo de trade.", exc_info=True)
+        metrics.inc("cycle_errors_total")
         try:
             critical_message = f"ERRO CRITICO no Ciclo ({symbol}):\nVerifique {LOG_FILE}.\nErro: {str(e)}"
             send_telegram_message(critical_message[:4000])
         except Exception as telegram_err:
             logger.error("Falha enviar notificação erro ciclo.", exc_info=True)
     finally:
+        last_cycle_at_ms = int(time.time() * 1000)
         end_cycle_time = datetime.datetime.now()
         cycle_duration = end_cycle_time - start_cycle_time
+        metrics.inc("cycles_total"); metrics.observe("cycle_duration_seconds", cycle_duration.total_seconds())
+        metrics.flush_timeseries()
         logger.info(f"--- Ciclo concluído em {cycle_duration}. ({end_cycle_time.strftime('%Y-%m-%d %H:%M:%S')}) ---")
 
+# --- Warm Start (Snapshot) ---
+def write_warm_start_snapshot():
+    """Salva buffers de velas, indicadores, última vela por TF e posição para reinício rápido."""
+    if not strategy_manager: return False
+    position = redis_handler.get_state(strategy_manager.position_state_key) if redis_handler else None
+    state = {
+        'symbol': strategy_manager.symbol,
+        'buffers': {tf: {'capacity': buf.capacity, 'df': buf.df} for tf, buf in kline_buffers.items()},
+        'indicator_state': indicator_state,
+        'last_candle_ts_ms': {tf: buf.last_ts_ms for tf, buf in kline_buffers.items()},
+        'position_asset': position,
+        'last_cycle_at_ms': last_cycle_at_ms,
+    }
+    return save_snapshot(config.SNAPSHOT_PATH, state)
+
+def restore_warm_start_snapshot() -> bool:
+    """Restaura o estado quente do snapshot. Retorna True se o snapshot foi aplicado."""
+    global kline_buffers, indicator_state, last_cycle_at_ms
+    state = load_snapshot(config.SNAPSHOT_PATH, max_age_seconds=config.SNAPSHOT_MAX_AGE_SECONDS)
+    if not state: return False
+    if state.get('symbol') != strategy_manager.symbol:
+        logger.warning(f"Snapshot é de outro símbolo ({state.get('symbol')}). Ignorando."); return False
+    kline_buffers = {tf: KlineRingBuffer(buf['capacity'], buf['df']) for tf, buf in state.get('buffers', {}).items()}
+    indicator_state = state.get('indicator_state', {}); last_cycle_at_ms = state.get('last_cycle_at_ms')
+    # Redis continua sendo a fonte da verdade da posição; o snapshot só repõe se a chave sumiu
+    snapshot_position = state.get('position_asset')
+    current_position = redis_handler.get_state(strategy_manager.position_state_key)
+    if current_position is None and snapshot_position:
+        logger.warning(f"Posição ausente no Redis. Restaurando do snapshot: {snapshot_position}.")
+        redis_handler.set_state(strategy_manager.position_state_key, snapshot_position)
+    elif snapshot_position and current_position != snapshot_position:
+        logger.warning(f"Posição no Redis ({current_position}) difere do snapshot ({snapshot_position}). Mantendo Redis.")
+    logger.info(f"Warm start: buffers {[f'{tf}:{len(b.df) if b.df is not None else 0}' for tf, b in kline_buffers.items()]}, última vela {state.get('last_candle_ts_ms')}.")
+    return True
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt(f"Sinal {signum} recebido")
+
 # --- Função Principal ---
 def main():
+    import schedule
     setup_logging(level=logging.INFO) # Ou DEBUG
     main_logger = logging.getLogger('main_runner')
     main_logger.info("--- Iniciando Quantis Crypto Trader - Gemini Version (Híbrido AI+BB) ---")
+    if config.METRICS_ENABLED: metrics.start_metrics_server(config.METRICS_PORT, config.METRICS_HOST)
     send_telegram_message("Quantis Crypto Trader (Híbrido AI+BB) iniciando...")
 
     if not initialize_services():
@@ -266,6 +511,8 @@ def main():
         return
 
     main_logger.info("Inicialização concluída.")
+    try: warm_started = restore_warm_start_snapshot()
+    except Exception: main_logger.error("Erro ao restaurar snapshot de warm start. Seguindo a frio.", exc_info=True); warm_started = False
     # Bloco try/except para Saldo Inicial CORRIGIDO
     try:
         main_logger.info("Verificando saldos iniciais...")
@@ -298,11 +545,17 @@ def main():
         main_logger.info(f"Ciclo agendado a cada {job.interval} {job.unit if hasattr(job, 'unit') else 'minutes'}.")
     except IndexError:
         main_logger.error("Nenhum job agendado!")
+    schedule.every(config.SNAPSHOT_INTERVAL_MINUTES).minutes.do(write_warm_start_snapshot)
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt) # Deploy/stop: encerra pelo mesmo caminho do Ctrl+C (salva snapshot)
 
     # *** REMOVIDA Execução imediata do primeiro ciclo ***
     # main_logger.info("Executando primeiro ciclo imediatamente...")
     # trade_cycle()
     # *** FIM DA REMOÇÃO ***
+    # Warm start: se o último ciclo registrado é mais antigo que um intervalo, roda já para não perder o fechamento de vela
+    if warm_started and last_cycle_at_ms and time.time() * 1000 - last_cycle_at_ms >= main_cycle_interval_minutes * 60 * 1000:
+        main_logger.info("Último ciclo do snapshot está atrasado. Executando ciclo imediatamente...")
+        trade_cycle()
 
     main_logger.info("Agendamento configurado. Entrando no loop principal de espera...")
     send_telegram_message("Robo Híbrido AI+BB online e operando (modo simulado).") # Nome Atualizado
@@ -319,15 +572,18 @@ def main():
         main_logger.critical("Erro CRÍTICO loop principal.", exc_info=True)
         send_telegram_message(f"ERRO CRITICO LOOP PRINCIPAL (Híbrido AI+BB)! Encerrando.\nErro: {str(e)[:500]}")
     finally:
+         try: write_warm_start_snapshot()
+         except Exception: main_logger.error("Erro ao salvar snapshot no encerramento.", exc_info=True)
          main_logger.info("--- Quantis Crypto Trader (Híbrido AI+BB) Finalizado ---")
 
 
 if __name__ == "__main__":
     # Bloco try/except CORRIGIDO
     try:
-        # Garante que pandas_ta está disponível e importável
-        import pandas_ta as ta
-        logger.debug("Biblioteca pandas-ta importada com sucesso.")
+        # Garante que pandas_ta está instalado (sem importá-lo; o import fica para o primeiro cálculo)
+        import importlib.util
+        if importlib.util.find_spec("pandas_ta") is None: raise ImportError("pandas_ta")
+        logger.debug("Biblioteca pandas-ta encontrada.")
     except ImportError:
         print("\n!!! ERRO FATAL: Biblioteca pandas-ta não encontrada. !!!")
         print("Por favor, instale usando o comando abaixo no terminal com seu ambiente virtual ativo:")
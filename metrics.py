@@ -0,0 +1,159 @@
+# quantis_crypto_trader_gemini/metrics.py
+
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRICS_NAMESPACE = "quantis"
+
+class MetricsRegistry:
+    """Registro em memória de contadores, gauges e tempos (spans) do robô."""
+    def __init__(self, namespace: str = METRICS_NAMESPACE):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, float] = {}
+        self._gauges: dict[tuple, float] = {}
+        self._timings: dict[tuple, list] = {} # chave -> [count, sum, max, last]
+        self._pending_points: dict[str, float] = {} # Pontos p/ série temporal Redis (último valor por série)
+        self._ts_redis_handler = None; self._ts_retention_ms = 0
+
+    # --- Chaves e Labels ---
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    @staticmethod
+    def _format_labels(label_items: tuple) -> str:
+        if not label_items: return ""
+        parts = []
+        for k, v in label_items:
+            escaped = v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'); parts.append(f'{k}="{escaped}"')
+        return "{" + ",".join(parts) + "}"
+
+    def _series_name(self, name: str, label_items: tuple) -> str:
+        suffix = ",".join(f"{k}={v}" for k, v in label_items)
+        return f"{name}{{{suffix}}}" if suffix else name
+
+    # --- Registro de Valores ---
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """Incrementa um contador."""
+        key = self._key(name, labels)
+        with self._lock: self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Define o valor atual de um gauge."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = float(value)
+            if self._ts_redis_handler is not None: self._pending_points[self._series_name(name, key[1])] = float(value)
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Registra uma duração (em segundos) para o span/fase informado."""
+        key = self._key(name, labels)
+        with self._lock:
+            stats = self._timings.get(key)
+            if stats is None: stats = [0, 0.0, 0.0, 0.0]; self._timings[key] = stats
+            stats[0] += 1; stats[1] += seconds; stats[2] = max(stats[2], seconds); stats[3] = seconds
+            if self._ts_redis_handler is not None: self._pending_points[self._series_name(name, key[1])] = seconds
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Mede o tempo de execução do bloco e registra em `phase_duration_seconds`."""
+        start = time.perf_counter()
+        try: yield
+        finally: self.observe("phase_duration_seconds", time.perf_counter() - start, phase=name, **labels)
+
+    @contextmanager
+    def api_call(self, service: str, endpoint: str):
+        """Conta a chamada de API, sua latência e eventuais erros (a exceção é re-levantada)."""
+        self.inc("api_calls_total", service=service, endpoint=endpoint)
+        start = time.perf_counter()
+        try: yield
+        except Exception:
+            self.inc("api_errors_total", service=service, endpoint=endpoint); raise
+        finally: self.observe("api_latency_seconds", time.perf_counter() - start, service=service, endpoint=endpoint)
+
+    def get_counter(self, name: str, **labels) -> float:
+        with self._lock: return self._counters.get(self._key(name, labels), 0.0)
+
+    def get_timing(self, name: str, **labels) -> dict | None:
+        """Retorna {'count','sum','max','last'} de uma série de tempos, ou None."""
+        with self._lock: stats = self._timings.get(self._key(name, labels))
+        if stats is None: return None
+        return {'count': stats[0], 'sum': stats[1], 'max': stats[2], 'last': stats[3]}
+
+    # --- Exportação ---
+    def render_prometheus(self) -> str:
+        """Gera o texto no formato de exposição do Prometheus (v0.0.4)."""
+        with self._lock:
+            counters = dict(self._counters); gauges = dict(self._gauges); timings = {k: list(v) for k, v in self._timings.items()}
+        lines = []; ns = self.namespace
+        def grouped(items):
+            by_name: dict[str, list] = {}
+            for (name, label_items), value in sorted(items.items()): by_name.setdefault(name, []).append((label_items, value))
+            return by_name
+        for name, series in grouped(counters).items():
+            lines.append(f"# TYPE {ns}_{name} counter")
+            for label_items, value in series: lines.append(f"{ns}_{name}{self._format_labels(label_items)} {value:g}")
+        for name, series in grouped(gauges).items():
+            lines.append(f"# TYPE {ns}_{name} gauge")
+            for label_items, value in series: lines.append(f"{ns}_{name}{self._format_labels(label_items)} {value:g}")
+        for name, series in grouped(timings).items():
+            lines.append(f"# TYPE {ns}_{name} summary")
+            for label_items, (count, total, _, _) in series:
+                labels_str = self._format_labels(label_items)
+                lines.append(f"{ns}_{name}_count{labels_str} {count}"); lines.append(f"{ns}_{name}_sum{labels_str} {total:.6f}")
+            for suffix, idx in (("max", 2), ("last", 3)):
+                lines.append(f"# TYPE {ns}_{name}_{suffix} gauge")
+                for label_items, stats in series: lines.append(f"{ns}_{name}_{suffix}{self._format_labels(label_items)} {stats[idx]:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def enable_redis_timeseries(self, redis_handler, retention_seconds: int = 7 * 24 * 3600):
+        """Ativa a gravação opcional dos pontos em séries temporais no Redis."""
+        self._ts_redis_handler = redis_handler; self._ts_retention_ms = int(retention_seconds * 1000)
+        logger.info(f"Séries temporais de métricas no Redis ativadas (retenção {retention_seconds}s).")
+
+    def flush_timeseries(self):
+        """Grava no Redis os pontos acumulados desde o último flush (normalmente ao fim de cada ciclo)."""
+        if self._ts_redis_handler is None: return 0
+        with self._lock: points = self._pending_points; self._pending_points = {}
+        if not points: return 0
+        try: return self._ts_redis_handler.add_metric_points(points, int(time.time() * 1000), self._ts_retention_ms)
+        except Exception: logger.error("Erro ao gravar séries temporais de métricas no Redis.", exc_info=True); return 0
+
+
+# --- Registro Padrão e Atalhos ---
+REGISTRY = MetricsRegistry()
+inc = REGISTRY.inc; set_gauge = REGISTRY.set_gauge; observe = REGISTRY.observe; span = REGISTRY.span; api_call = REGISTRY.api_call
+get_counter = REGISTRY.get_counter; get_timing = REGISTRY.get_timing
+render_prometheus = REGISTRY.render_prometheus; enable_redis_timeseries = REGISTRY.enable_redis_timeseries; flush_timeseries = REGISTRY.flush_timeseries
+
+
+# --- Endpoint HTTP (Prometheus) ---
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ("/metrics", "/"):
+            self.send_error(404); return
+        body = self.registry.render_prometheus().encode('utf-8')
+        self.send_response(200); self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8"); self.send_header("Content-Length", str(len(body))); self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args): # Silencia o log padrão por requisição do http.server
+        logger.debug(f"Métricas HTTP: {format % args}")
+
+def start_metrics_server(port: int, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer | None:
+    """Sobe o endpoint /metrics (texto Prometheus) numa thread daemon. Retorna o servidor ou None."""
+    handler_cls = type("MetricsRequestHandler", (_MetricsRequestHandler,), {"registry": registry})
+    try:
+        server = ThreadingHTTPServer((host, port), handler_cls)
+        thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True); thread.start()
+        logger.info(f"Endpoint de métricas disponível em http://{host}:{port}/metrics")
+        return server
+    except OSError:
+        logger.error(f"Falha ao iniciar endpoint de métricas em {host}:{port}.", exc_info=True); return None
@@ -0,0 +1,289 @@
+# quantis_crypto_trader_gemini/optimizer.py
+
+# Busca adaptativa de parâmetros da estratégia técnica (SMA 15m + limiares RSI/BBP do StrategyManager) sobre o
+# histórico do Redis, no lugar da grade exaustiva do backtest.py.
+# Uso:
+#   python optimizer.py                          # 4 brackets x 27 configurações, intervalo/período do backtest.py
+#   python optimizer.py --brackets 8 --configs 81 --workers 4
+#   python optimizer.py --sampler random         # só successive halving (sem modelo substituto)
+
+import argparse
+import logging
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import backtest
+from indicator_cache import IndicatorMatrix, bollinger_percent, rsi
+from strategy import StrategyManager
+
+logger = logging.getLogger('backtester.optimizer') # Mesmos handlers/arquivo do backtester
+
+# --- Espaço de Parâmetros ---
+# nome -> (mínimo, máximo, passo); passo 1 = inteiro. Limiares iniciais do StrategyManager: RSI 45/55, BBP 0.2/0.8.
+PARAM_SPACE = {
+    'sma_fast': (5, 60, 1),
+    'sma_slow': (20, 200, 1),
+    'rsi_buy': (20.0, 60.0, 0.5),
+    'rsi_sell': (40.0, 80.0, 0.5),
+    'bbp_buy': (-0.2, 0.6, 0.01),
+    'bbp_sell': (0.4, 1.2, 0.01),
+}
+RSI_LENGTH = 14; BBANDS_LENGTH = 20; BBANDS_STD = 2.0 # Fixos, como no trade_cycle
+STRATEGY_NAME = "hybrid_filters/v1" # Chave do cache de resultados (backtest_store)
+
+# --- Parâmetros da Busca ---
+RUNG_FRACTIONS = (1 / 9, 1 / 3, 1.0) # Fatias crescentes do histórico (prefixos) avaliadas em cada rodada do successive halving
+HALVING_ETA = 3 # Cada rodada mantém 1/eta das configurações
+EARLY_STOP_RETURN_PCT = -25.0 # Abaixo disso (em qualquer fatia) a configuração é descartada na hora
+MIN_TRADES = 2 # Configurações com menos trades na fatia não avançam (retorno sem significado)
+RANDOM_FRACTION = 0.3 # Parte de cada bracket sorteada ao acaso mesmo com o modelo substituto (exploração)
+EI_CANDIDATES = 4000 # Pontos aleatórios onde o Expected Improvement é avaliado a cada proposta
+
+_NAMES = list(PARAM_SPACE); _LOW, _HIGH, _STEP = (np.array([spec[i] for spec in PARAM_SPACE.values()], dtype=float) for i in range(3))
+_PAIRS = [(_NAMES.index(a), _NAMES.index(b)) for a, b in (('sma_fast', 'sma_slow'), ('rsi_buy', 'rsi_sell'), ('bbp_buy', 'bbp_sell'))] # a < b
+
+def is_valid(params: dict) -> bool:
+    return all(params[_NAMES[a]] < params[_NAMES[b]] for a, b in _PAIRS)
+
+def _snap(X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Linhas em [0, 1]^d -> (valores arredondados ao passo de cada dimensão, máscara de configurações válidas)."""
+    values = np.round((_LOW + np.clip(X, 0.0, 1.0) * (_HIGH - _LOW)) / _STEP) * _STEP
+    valid = np.logical_and.reduce([values[:, a] < values[:, b] for a, b in _PAIRS])
+    return values, valid
+
+def decode(x: np.ndarray) -> dict:
+    """Vetor em [0, 1]^d -> parâmetros (arredondados ao passo de cada dimensão)."""
+    values = _snap(np.asarray(x, dtype=float)[None, :])[0][0]
+    return {name: int(round(v)) if step == 1 else round(float(v), 6) for name, v, step in zip(_NAMES, values, _STEP)}
+
+def encode(params: dict) -> np.ndarray:
+    return (np.array([params[name] for name in _NAMES], dtype=float) - _LOW) / (_HIGH - _LOW)
+
+def sample_params(rng: np.random.Generator, n: int) -> list[dict]:
+    """`n` configurações válidas sorteadas uniformemente no espaço."""
+    samples = []
+    while len(samples) < n:
+        X = rng.random((max(n * 4, 64), len(_NAMES))); _, valid = _snap(X)
+        samples.extend(decode(x) for x in X[valid][:n - len(samples)])
+    return samples
+
+
+# --- Indicadores e Avaliação ---
+def build_indicators(base_data: pd.DataFrame) -> IndicatorMatrix:
+    """Todas as SMAs do espaço + RSI + %B, calculados uma vez por dataset (vão para o bloco compartilhado do pool)."""
+    close = base_data['Close'].to_numpy()
+    lengths = range(PARAM_SPACE['sma_fast'][0], PARAM_SPACE['sma_slow'][1] + 1)
+    matrix = IndicatorMatrix.from_close(close, lengths)
+    return matrix.with_columns({('RSI', RSI_LENGTH): rsi(close, RSI_LENGTH), ('BBP', BBANDS_LENGTH): bollinger_percent(close, BBANDS_LENGTH, BBANDS_STD)})
+
+_strategy_manager: StrategyManager | None = None # Um por processo; só os limiares mudam entre avaliações
+
+def _manager_for(params: dict) -> StrategyManager:
+    global _strategy_manager
+    if _strategy_manager is None: _strategy_manager = StrategyManager(redis_handler=None, binance_handler=None)
+    manager = _strategy_manager
+    manager.filter_rsi_buy_threshold = params['rsi_buy']; manager.filter_rsi_sell_threshold = params['rsi_sell']
+    manager.filter_bbp_buy_threshold = params['bbp_buy']; manager.filter_bbp_sell_threshold = params['bbp_sell']
+    return manager
+
+def evaluate_params(base_data: pd.DataFrame, indicators: IndicatorMatrix, params: dict, fraction: float = 1.0) -> dict:
+    """
+    Backtest da configuração nas primeiras `fraction` velas: sinal técnico (filtros de compra/venda do StrategyManager),
+    posição por decide_actions_vectorized e simulação all-in/all-out do backtest.py.
+    """
+    rows = max(1, int(len(base_data) * fraction))
+    manager = _manager_for(params)
+    sma_f = indicators.sma(params['sma_fast'])[:rows]; sma_s = indicators.sma(params['sma_slow'])[:rows]
+    rsi_values = indicators.column('RSI', RSI_LENGTH)[:rows]; bbp_values = indicators.column('BBP', BBANDS_LENGTH)[:rows]
+    with np.errstate(invalid='ignore'):
+        buy = np.logical_and.reduce(manager._buy_filter_checks(sma_f, sma_s, rsi_values, bbp_values))
+        sell = np.logical_and.reduce(manager._sell_filter_checks(sma_f, sma_s, rsi_values, bbp_values))
+    signal = np.where(buy, 'BUY', np.where(sell, 'SELL', 'HOLD')).astype(object)
+    decisions = manager.decide_actions_vectorized(signal, sma_f, sma_s, rsi_values, bbp_values)
+    data = pd.DataFrame({'Close': base_data['Close'].to_numpy()[:rows], 'Signal': decisions['Signal'].to_numpy()}, index=base_data.index[:rows])
+    final_value, pnl, return_pct, num_trades, _, _ = backtest.simulate_strategy(data, backtest.INITIAL_CASH, backtest.COMMISSION_RATE)
+    return {'params': params, 'fraction': fraction, 'Final_Value': float(final_value), 'Pnl': float(pnl), 'Return_Pct': float(return_pct), 'Num_Trades': int(num_trades)}
+
+def _evaluate_params_shared(descriptor: dict, params: dict, fraction: float) -> dict:
+    """Tarefa do pool: avalia sobre os preços/indicadores do bloco compartilhado (backtest.attach_price_data)."""
+    data, indicators = backtest.attach_price_data(descriptor)
+    return evaluate_params(data, indicators, params, fraction)
+
+
+# --- Modelo Substituto (Processo Gaussiano + Expected Improvement) ---
+class GaussianProcess:
+    """GP com kernel RBF isotrópico sobre entradas em [0, 1]^d e saída padronizada; comprimento escolhido pela verossimilhança marginal."""
+    LENGTH_SCALES = (0.1, 0.2, 0.35, 0.6, 1.0)
+
+    def __init__(self, noise: float = 1e-2):
+        self.noise = noise; self.length_scale = None
+
+    def _kernel(self, a: np.ndarray, b: np.ndarray, length_scale: float) -> np.ndarray:
+        sq = (a * a).sum(1)[:, None] + (b * b).sum(1)[None, :] - 2.0 * a @ b.T
+        return np.exp(-0.5 * np.maximum(sq, 0.0) / length_scale ** 2)
+
+    def fit(self, X: np.ndarray, y: np.ndarray) -> 'GaussianProcess':
+        self.X = X; self.y_mean = float(y.mean()); self.y_std = float(y.std()) or 1.0; target = (y - self.y_mean) / self.y_std
+        best = None
+        for length_scale in self.LENGTH_SCALES:
+            try: L = np.linalg.cholesky(self._kernel(X, X, length_scale) + self.noise * np.eye(len(X)))
+            except np.linalg.LinAlgError: continue
+            alpha = np.linalg.solve(L.T, np.linalg.solve(L, target))
+            log_likelihood = -0.5 * target @ alpha - np.log(np.diag(L)).sum()
+            if best is None or log_likelihood > best[0]: best = (log_likelihood, length_scale, L, alpha)
+        _, self.length_scale, self._L, self._alpha = best
+        return self
+
+    def predict(self, Xs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        Ks = self._kernel(Xs, self.X, self.length_scale)
+        mean = Ks @ self._alpha; v = np.linalg.solve(self._L, Ks.T)
+        std = np.sqrt(np.maximum(1.0 - (v * v).sum(0), 1e-12))
+        return mean * self.y_std + self.y_mean, std * self.y_std
+
+_erf = np.vectorize(math.erf)
+
+def expected_improvement(mean: np.ndarray, std: np.ndarray, best: float, xi: float = 0.01) -> np.ndarray:
+    improvement = mean - best - xi; z = improvement / std
+    cdf = 0.5 * (1.0 + _erf(z / math.sqrt(2.0))); pdf = np.exp(-0.5 * z * z) / math.sqrt(2.0 * math.pi)
+    return improvement * cdf + std * pdf
+
+def propose_batch(observed: list[dict], rng: np.random.Generator, n: int) -> list[dict]:
+    """
+    `n` configurações pelo máximo de EI, uma de cada vez com "constant liar": cada proposta entra no modelo com o
+    retorno médio observado, o que empurra as seguintes para outras regiões (lote paralelo sem repetir o mesmo ponto).
+    """
+    X = np.array([encode(r['params']) for r in observed]); y = np.array([r['Return_Pct'] for r in observed]); best = float(y.max())
+    liar = float(y.mean()); proposals = []
+    for _ in range(n):
+        gp = GaussianProcess().fit(X, y)
+        values, valid = _snap(rng.random((EI_CANDIDATES, len(_NAMES))))
+        candidates = (values[valid] - _LOW) / (_HIGH - _LOW) # Já arredondados: o GP vê exatamente o ponto que será avaliado
+        if not len(candidates): break
+        mean, std = gp.predict(candidates)
+        choice = candidates[int(np.argmax(expected_improvement(mean, std, best)))]
+        proposals.append(decode(choice))
+        X = np.vstack([X, choice]); y = np.append(y, liar)
+    return proposals
+
+
+# --- Busca Adaptativa (successive halving + modelo substituto) ---
+class AdaptiveOptimizer:
+    """
+    Brackets de successive halving: cada bracket avalia `configs_per_bracket` configurações na menor fatia do histórico,
+    descarta na hora as que ficam abaixo de EARLY_STOP_RETURN_PCT (ou com menos de MIN_TRADES trades) e promove o melhor
+    1/eta para a fatia seguinte, até o histórico inteiro. A partir do segundo bracket as configurações vêm do GP ajustado
+    aos resultados no histórico inteiro (EI, com RANDOM_FRACTION sorteada ao acaso); `sampler='random'` desliga o modelo.
+    As avaliações de cada rodada rodam em paralelo no pool de processos sobre o bloco compartilhado do backtest.
+    """
+    def __init__(self, base_data: pd.DataFrame, workers: int | None = None, seed: int = 42, sampler: str = 'bayes', eta: int = HALVING_ETA,
+                 rung_fractions: tuple[float, ...] = RUNG_FRACTIONS, store=None, store_meta: dict | None = None):
+        self.base_data = base_data; self.workers = workers or os.cpu_count() or 1; self.rng = np.random.default_rng(seed); self.sampler = sampler
+        self.eta = eta; self.rung_fractions = rung_fractions; self.store = store; self.store_meta = store_meta or {}
+        self.indicators = build_indicators(base_data)
+        self.history: list[dict] = [] # Todas as avaliações (todas as fatias)
+        self.full_results: list[dict] = [] # Só as do histórico inteiro (alimentam o GP)
+        self.evaluations = 0; self.pruned = 0
+
+    def _evaluate(self, pool, descriptor, configs: list[dict], fraction: float) -> list[dict]:
+        if pool is None: outcomes = [evaluate_params(self.base_data, self.indicators, params, fraction) for params in configs]
+        else:
+            outcomes = []
+            futures = [pool.submit(_evaluate_params_shared, descriptor, params, fraction) for params in configs]
+            for future in as_completed(futures):
+                try: outcomes.append(future.result())
+                except Exception as e: logger.error("Falha ao avaliar configuração no pool.", exc_info=True)
+        self.evaluations += len(outcomes); self.history.extend(outcomes)
+        return outcomes
+
+    def _record_full(self, outcome: dict):
+        self.full_results.append(outcome)
+        if self.store is None: return
+        try:
+            from backtest_store import combination_key
+            meta = self.store_meta; params = outcome['params']
+            key = combination_key(meta['symbol'], meta['interval'], meta['start_ts_ms'], meta['end_ts_ms'], meta['data_fp'], STRATEGY_NAME, params, backtest.COMMISSION_RATE, backtest.INITIAL_CASH)
+            self.store.put(key, meta['symbol'], meta['interval'], meta['start_ts_ms'], meta['end_ts_ms'], meta['data_fp'], STRATEGY_NAME, params,
+                           backtest.COMMISSION_RATE, backtest.INITIAL_CASH, outcome, [])
+        except Exception as e: logger.error("Falha ao gravar resultado do otimizador no cache.", exc_info=True)
+
+    def _next_configs(self, n: int) -> list[dict]:
+        if self.sampler != 'bayes' or len(self.full_results) < 3: return sample_params(self.rng, n)
+        n_random = int(round(n * RANDOM_FRACTION))
+        return propose_batch(self.full_results, self.rng, n - n_random) + sample_params(self.rng, n_random)
+
+    def _successive_halving(self, pool, descriptor, configs: list[dict], bracket: int):
+        for rung, fraction in enumerate(self.rung_fractions):
+            outcomes = self._evaluate(pool, descriptor, configs, fraction)
+            last_rung = rung == len(self.rung_fractions) - 1
+            if last_rung:
+                for outcome in outcomes: self._record_full(outcome)
+                break
+            alive = [o for o in outcomes if o['Return_Pct'] > EARLY_STOP_RETURN_PCT and o['Num_Trades'] >= MIN_TRADES] # Parada antecipada
+            self.pruned += len(outcomes) - len(alive)
+            keep = max(1, len(outcomes) // self.eta) if alive else 0
+            survivors = sorted(alive, key=lambda o: o['Return_Pct'], reverse=True)[:keep]
+            logger.info(f"Bracket {bracket} rodada {rung} ({fraction:.0%} do histórico): {len(outcomes)} avaliadas, {len(outcomes) - len(alive)} descartadas, {len(survivors)} promovidas"
+                        + (f" (melhor {survivors[0]['Return_Pct']:.2f}%)." if survivors else "."))
+            if not survivors: return
+            configs = [o['params'] for o in survivors]
+
+    def run(self, brackets: int = 4, configs_per_bracket: int = 27) -> pd.DataFrame:
+        """Roda os brackets e retorna os resultados no histórico inteiro, do melhor para o pior."""
+        started = time.perf_counter(); segment = None; pool = None
+        workers = min(self.workers, configs_per_bracket)
+        try:
+            if workers > 1:
+                segment = backtest.share_price_data(self.base_data, self.indicators)
+                pool = ProcessPoolExecutor(max_workers=workers)
+            for bracket in range(brackets):
+                self._successive_halving(pool, segment[1] if segment else None, self._next_configs(configs_per_bracket), bracket)
+                if self.full_results:
+                    best = max(self.full_results, key=lambda o: o['Return_Pct'])
+                    logger.info(f"Após bracket {bracket}: melhor {best['Return_Pct']:.2f}% ({best['Num_Trades']} trades) com {best['params']}")
+        finally:
+            if pool is not None: pool.shutdown()
+            if segment is not None: segment[0].close(); segment[0].unlink()
+        elapsed = time.perf_counter() - started
+        spent = sum(o['fraction'] for o in self.history)
+        logger.info(f"Otimização: {self.evaluations} avaliações ({spent:.1f} históricos inteiros equivalentes; {len(self.full_results)} no histórico inteiro, "
+                    f"{self.pruned} descartadas cedo) em {elapsed:.1f}s.")
+        if not self.full_results: return pd.DataFrame()
+        results = pd.DataFrame([{**o['params'], 'Final_Value': o['Final_Value'], 'Pnl': o['Pnl'], 'Return_Pct': o['Return_Pct'], 'Num_Trades': o['Num_Trades']} for o in self.full_results])
+        return results.sort_values('Return_Pct', ascending=False, ignore_index=True)
+
+
+# --- Execução via Linha de Comando ---
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Busca adaptativa (successive halving + GP/EI) dos parâmetros SMA/RSI/BBP.")
+    parser.add_argument("--interval", default=backtest.INTERVAL)
+    parser.add_argument("--brackets", type=int, default=4)
+    parser.add_argument("--configs", type=int, default=27, help="Configurações por bracket (na menor fatia)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sampler", choices=('bayes', 'random'), default='bayes')
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import config
+    from redis_client import RedisHandler
+    from backtest_store import BacktestResultStore, data_fingerprint
+    start_ts_ms = int(pd.to_datetime(backtest.START_DATE_STR, utc=True).timestamp() * 1000)
+    end_ts_ms = int(pd.to_datetime(backtest.END_DATE_STR, utc=True).timestamp() * 1000) if backtest.END_DATE_STR else int(time.time() * 1000)
+    base_data = backtest.load_base_data(RedisHandler(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB), args.interval, start_ts_ms, end_ts_ms)
+    if base_data is None: return 1
+
+    store = BacktestResultStore(backtest.RESULT_STORE_PATH) if backtest.RESULT_STORE_PATH else None
+    meta = {'symbol': backtest.SYMBOL, 'interval': args.interval, 'start_ts_ms': base_data.index[0].value // 10**6, 'end_ts_ms': base_data.index[-1].value // 10**6,
+            'data_fp': data_fingerprint(base_data)}
+    optimizer = AdaptiveOptimizer(base_data, workers=args.workers, seed=args.seed, sampler=args.sampler, store=store, store_meta=meta)
+    results = optimizer.run(brackets=args.brackets, configs_per_bracket=args.configs)
+    if store is not None: store.close()
+    if results.empty: logger.warning("Nenhuma configuração chegou ao histórico inteiro."); return 1
+    logger.info(f"Melhores configurações ({backtest.SYMBOL} {args.interval}):\n{results.head(10).to_string()}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
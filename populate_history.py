@@ -5,10 +5,10 @@ import sys
 import time
 import datetime
 import pandas as pd
-from binance.client import Client # Importa Client para constantes de intervalo
+import intervals # Constantes de intervalo (sem carregar o SDK da Binance)
 import config
-from binance_client import BinanceHandler
 from redis_client import RedisHandler
+import resampler
 
 # --- Configuração do Logging ---
 LOG_FILE_POPULATE = "populate_history.log"
@@ -42,13 +42,13 @@ OVERALL_START_DATE_STR = "1 Jan, 2017" # Data inicial para buscar se não houver
 SYMBOLS = ["BTCUSDT"] # Lista de símbolos a popular
 # Mapeia nome amigável para constante da Binance
 INTERVALS_TO_POPULATE = {
-    "1M": Client.KLINE_INTERVAL_1MONTH,
-    "1w": Client.KLINE_INTERVAL_1WEEK,
-    "1d": Client.KLINE_INTERVAL_1DAY,
-    "4h": Client.KLINE_INTERVAL_4HOUR,
-    "1h": Client.KLINE_INTERVAL_1HOUR,
-    "15m": Client.KLINE_INTERVAL_15MINUTE,
-    "1m": Client.KLINE_INTERVAL_1MINUTE,
+    "1M": intervals.KLINE_INTERVAL_1MONTH,
+    "1w": intervals.KLINE_INTERVAL_1WEEK,
+    "1d": intervals.KLINE_INTERVAL_1DAY,
+    "4h": intervals.KLINE_INTERVAL_4HOUR,
+    "1h": intervals.KLINE_INTERVAL_1HOUR,
+    "15m": intervals.KLINE_INTERVAL_15MINUTE,
+    "1m": intervals.KLINE_INTERVAL_1MINUTE,
 }
 # Delay entre o processamento de cada par/intervalo para evitar rate limit
 SLEEP_BETWEEN_TASKS = 2 # Segundos
@@ -73,13 +73,13 @@ def get_interval_ms(interval: str) -> int | None:
                  return seconds * 1000
     except Exception:
         # Fallback para constantes da binance (se usadas diretamente)
-        if interval == Client.KLINE_INTERVAL_1MINUTE: return 60 * 1000
-        if interval == Client.KLINE_INTERVAL_15MINUTE: return 15 * 60 * 1000
-        if interval == Client.KLINE_INTERVAL_1HOUR: return 60 * 60 * 1000
-        if interval == Client.KLINE_INTERVAL_4HOUR: return 4 * 60 * 60 * 1000 # <-- Adicionado
-        if interval == Client.KLINE_INTERVAL_1DAY: return 24 * 60 * 60 * 1000
-        if interval == Client.KLINE_INTERVAL_1WEEK: return 7 * 24 * 60 * 60 * 1000 # <-- Adicionado
-        if interval == Client.KLINE_INTERVAL_1MONTH: return 30 * 24 * 60 * 60 * 1000 # Aproximação
+        if interval == intervals.KLINE_INTERVAL_1MINUTE: return 60 * 1000
+        if interval == intervals.KLINE_INTERVAL_15MINUTE: return 15 * 60 * 1000
+        if interval == intervals.KLINE_INTERVAL_1HOUR: return 60 * 60 * 1000
+        if interval == intervals.KLINE_INTERVAL_4HOUR: return 4 * 60 * 60 * 1000 # <-- Adicionado
+        if interval == intervals.KLINE_INTERVAL_1DAY: return 24 * 60 * 60 * 1000
+        if interval == intervals.KLINE_INTERVAL_1WEEK: return 7 * 24 * 60 * 60 * 1000 # <-- Adicionado
+        if interval == intervals.KLINE_INTERVAL_1MONTH: return 30 * 24 * 60 * 60 * 1000 # Aproximação
 
     logger.warning(f"Duração em ms desconhecida para intervalo: {interval}")
     return None
@@ -93,6 +93,7 @@ def populate_all_history():
 
     # 1. Inicializar Clientes
     try:
+        from binance_client import BinanceHandler
         logger.info("Inicializando Redis Handler...")
         redis_h = RedisHandler(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB)
         logger.info("Inicializando Binance Handler...")
@@ -105,8 +106,12 @@ def populate_all_history():
     total_candles_added = 0
     start_time_total = time.time()
 
+    derive_from_1m = config.DERIVE_TIMEFRAMES_FROM_1M
+    if derive_from_1m: logger.info("Modo derivação ativo: apenas 1m será buscado na Binance; demais TFs agregados localmente.")
+
     for symbol in SYMBOLS:
         for interval_label, interval_code in INTERVALS_TO_POPULATE.items():
+            if derive_from_1m and interval_code != intervals.KLINE_INTERVAL_1MINUTE: continue
             logger.info(f"\n--- Processando: {symbol} / {interval_label} ({interval_code}) ---")
             task_start_time = time.time()
 
@@ -163,6 +168,19 @@ def populate_all_history():
             logger.debug(f"Aguardando {SLEEP_BETWEEN_TASKS} segundos antes da próxima tarefa...")
             time.sleep(SLEEP_BETWEEN_TASKS)
 
+        # 2e. Deriva os TFs maiores a partir do 1m (sem chamadas REST)
+        if derive_from_1m:
+            default_start_ms = int(pd.to_datetime(OVERALL_START_DATE_STR, utc=True).timestamp() * 1000)
+            for interval_label, interval_code in INTERVALS_TO_POPULATE.items():
+                if interval_code == intervals.KLINE_INTERVAL_1MINUTE: continue
+                task_start_time = time.time()
+                try:
+                    added_count = resampler.materialize_from_1m(redis_h, symbol, interval_code, default_start_ms=default_start_ms)
+                    total_candles_added += added_count
+                    logger.info(f"Derivação de {symbol}/{interval_label} concluída em {time.time() - task_start_time:.2f} segundos ({added_count} velas).")
+                except Exception as e:
+                    logger.error(f"Erro ao derivar {symbol}/{interval_label} a partir do 1m.", exc_info=True)
+
 
     # 3. Conclusão
     total_duration = time.time() - start_time_total
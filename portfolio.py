@@ -0,0 +1,178 @@
+# quantis_crypto_trader_gemini/portfolio.py
+
+import json
+import logging
+import threading
+import time
+import numpy as np
+import metrics
+from execution import QUOTE_ASSETS, split_symbol
+
+logger = logging.getLogger(__name__)
+
+# --- Colunas da Matriz de Posições (uma linha por símbolo) ---
+QTY, AVG_ENTRY, REALIZED_PNL, FEES_QUOTE, LAST_PRICE, UPDATED_MS = range(6)
+FIELDS = ('qty', 'avg_entry', 'realized_pnl', 'fees_quote', 'last_price', 'updated_ms')
+DEFAULT_MIN_QTY = 0.0001 # Abaixo disso a posição conta como zerada (poeira), igual ao min_base_balance_to_sell
+
+
+class PortfolioEngine:
+    """
+    Posições spot de todos os símbolos numa única matriz numpy em memória (linha = símbolo, colunas = FIELDS).
+
+    Fills (apply_fill / on_order_fill, listener do OrderExecutor) atualizam quantidade, preço médio e PnL
+    realizado incrementalmente; ticks (mark_price) só trocam o último preço. Exposição e PnL não realizado
+    são calculados sobre a matriz inteira, então checagens de risco com muitos símbolos não fazem I/O.
+    Cada fill é gravado no Redis numa transação que também atualiza a chave legada
+    state:position_asset:{símbolo} usada pelo StrategyManager. `namespace` (ex: o EXECUTION_MODE) separa a chave
+    do portfólio no Redis, para posições do paper e do live nunca se misturarem.
+    """
+    def __init__(self, redis_handler=None, quote_assets: tuple[str, ...] = QUOTE_ASSETS, min_qty: float = DEFAULT_MIN_QTY, capacity: int = 16,
+                 namespace: str | None = None):
+        self.redis_handler = redis_handler; self.quote_assets = quote_assets; self.min_qty = min_qty; self.namespace = namespace
+        self._lock = threading.RLock(); self._index: dict[str, int] = {}; self._symbols: list[str] = []
+        self._data = np.zeros((capacity, len(FIELDS))); self._data[:, LAST_PRICE] = np.nan
+        self._dirty: set[str] = set()
+
+    # --- Linhas ---
+    def _row(self, symbol: str) -> int:
+        row = self._index.get(symbol)
+        if row is not None: return row
+        split_symbol(symbol, self.quote_assets) # Valida o símbolo antes de alocar a linha
+        if len(self._symbols) == len(self._data): # Dobra a capacidade
+            grown = np.zeros((len(self._data) * 2, len(FIELDS))); grown[:, LAST_PRICE] = np.nan; grown[:len(self._data)] = self._data; self._data = grown
+        row = len(self._symbols); self._symbols.append(symbol); self._index[symbol] = row
+        return row
+
+    @property
+    def symbols(self) -> list[str]: return list(self._symbols)
+
+    # --- Atualizações Incrementais ---
+    def apply_fill(self, symbol: str, side: str, qty: float, price: float, commission: float = 0.0, commission_asset: str | None = None,
+                   ts_ms: int | None = None, persist: bool = True):
+        """
+        Aplica uma execução. Compra: preço médio ponderado (taxa em quote entra no custo; em base reduz a quantidade
+        recebida). Venda: realiza (preço - médio) * qty menos a taxa. Taxas em outros ativos (ex: BNB) não entram no PnL.
+        """
+        base, quote = split_symbol(symbol, self.quote_assets)
+        with self._lock:
+            row = self._row(symbol); data = self._data[row]
+            fee_quote = commission if commission_asset == quote else (commission * price if commission_asset == base else 0.0)
+            if side == "BUY":
+                received = qty - (commission if commission_asset == base else 0.0)
+                cost = qty * price + (commission if commission_asset == quote else 0.0)
+                new_qty = data[QTY] + received
+                if new_qty > 0: data[AVG_ENTRY] = (data[QTY] * data[AVG_ENTRY] + cost) / new_qty
+                data[QTY] = new_qty
+            else:
+                sold = min(qty, data[QTY])
+                if qty - sold > self.min_qty: logger.warning(f"Venda de {qty} {base} maior que a posição registrada ({data[QTY]}). Excesso ignorado (spot, sem short).")
+                data[REALIZED_PNL] += sold * (price - data[AVG_ENTRY]) - (commission if commission_asset == quote else 0.0)
+                data[QTY] = max(0.0, data[QTY] - sold - (commission if commission_asset == base else 0.0))
+                if data[QTY] < self.min_qty * 1e-3: data[QTY] = 0.0; data[AVG_ENTRY] = 0.0 # Zerada (resíduo de arredondamento)
+            data[FEES_QUOTE] += fee_quote; data[LAST_PRICE] = price; data[UPDATED_MS] = ts_ms if ts_ms is not None else time.time() * 1000
+            self._dirty.add(symbol)
+        logger.info(f"Portfólio {symbol}: {side} {qty:.8f} @ {price:.2f} -> posição {self._data[row, QTY]:.8f} (médio {self._data[row, AVG_ENTRY]:.2f}, realizado {self._data[row, REALIZED_PNL]:.2f} {quote}).")
+        self._publish(symbol)
+        if persist: self.persist()
+
+    def seed_position(self, symbol: str, qty: float, avg_entry: float, persist: bool = True):
+        """Posição pré-existente sem histórico de fills (ex: saldo da conta na primeira partida com o portfólio)."""
+        with self._lock:
+            row = self._row(symbol); self._data[row, QTY] = qty; self._data[row, AVG_ENTRY] = avg_entry; self._data[row, LAST_PRICE] = avg_entry
+            self._data[row, UPDATED_MS] = time.time() * 1000; self._dirty.add(symbol)
+        logger.info(f"Portfólio {symbol}: posição inicial {qty:.8f} @ {avg_entry:.2f}.")
+        if persist: self.persist()
+
+    def on_order_fill(self, order, fill: dict):
+        """Listener de OrderExecutor.add_fill_listener."""
+        self.apply_fill(order.symbol, order.side, fill['qty'], fill['price'], fill.get('commission') or 0.0, fill.get('commission_asset'), fill.get('ts_ms'))
+
+    def mark_price(self, symbol: str, price: float):
+        """Tick de preço: só atualiza o último preço (PnL não realizado é derivado; nada é gravado)."""
+        with self._lock: row = self._row(symbol); self._data[row, LAST_PRICE] = price # _row pode realocar a matriz: indexa depois
+        self._publish(symbol)
+
+    def mark_prices(self, prices: dict[str, float]):
+        with self._lock:
+            for symbol, price in prices.items(): row = self._row(symbol); self._data[row, LAST_PRICE] = price
+
+    # --- Consultas (sem I/O) ---
+    def _view(self) -> np.ndarray:
+        return self._data[:len(self._symbols)]
+
+    def position(self, symbol: str) -> dict:
+        with self._lock:
+            row = self._index.get(symbol)
+            values = self._data[row] if row is not None else np.array([0.0, 0.0, 0.0, 0.0, np.nan, 0.0])
+            result = dict(zip(FIELDS, (float(v) for v in values)))
+        last_price = result['last_price']
+        result['exposure'] = result['qty'] * last_price if np.isfinite(last_price) else 0.0
+        result['unrealized_pnl'] = result['qty'] * (last_price - result['avg_entry']) if np.isfinite(last_price) and result['qty'] > 0 else 0.0
+        return result
+
+    def asset_held(self, symbol: str) -> str:
+        """Equivalente ao estado legado position_asset: o ativo base se há posição acima da poeira, senão o quote."""
+        base, quote = split_symbol(symbol, self.quote_assets)
+        with self._lock:
+            row = self._index.get(symbol)
+            return base if row is not None and self._data[row, QTY] >= self.min_qty else quote
+
+    def exposures(self) -> dict[str, float]:
+        """Exposição (qty * último preço) por símbolo, no quote de cada símbolo."""
+        with self._lock:
+            view = self._view(); exposure = np.nan_to_num(view[:, QTY] * view[:, LAST_PRICE])
+            return dict(zip(self._symbols, exposure.tolist()))
+
+    def total_exposure(self) -> float:
+        with self._lock: view = self._view(); return float(np.nansum(view[:, QTY] * view[:, LAST_PRICE]))
+
+    def unrealized_pnl(self) -> float:
+        with self._lock: view = self._view(); return float(np.nansum(view[:, QTY] * (view[:, LAST_PRICE] - view[:, AVG_ENTRY])))
+
+    def realized_pnl(self) -> float:
+        with self._lock: return float(self._view()[:, REALIZED_PNL].sum())
+
+    def can_open(self, symbol: str, notional: float, max_symbol_exposure: float | None = None, max_total_exposure: float | None = None) -> tuple[bool, str]:
+        """Checa se uma compra de `notional` cabe nos limites de exposição (por símbolo e total). Limites None/0 = sem limite."""
+        symbol_exposure = self.position(symbol)['exposure']; total = self.total_exposure()
+        if max_symbol_exposure and symbol_exposure + notional > max_symbol_exposure:
+            return False, f"exposição {symbol} {symbol_exposure + notional:.2f} > limite {max_symbol_exposure:.2f}"
+        if max_total_exposure and total + notional > max_total_exposure:
+            return False, f"exposição total {total + notional:.2f} > limite {max_total_exposure:.2f}"
+        return True, "dentro dos limites"
+
+    def summary(self) -> dict:
+        return {'symbols': len(self._symbols), 'exposure': self.total_exposure(), 'unrealized_pnl': self.unrealized_pnl(), 'realized_pnl': self.realized_pnl()}
+
+    # --- Persistência (Redis) ---
+    def persist(self, symbols: list[str] | None = None) -> bool:
+        """Grava os símbolos alterados (ou os informados) e os estados position_asset legados numa única transação."""
+        if self.redis_handler is None: self._dirty.clear(); return True
+        with self._lock:
+            symbols = list(self._dirty) if symbols is None else symbols
+            if not symbols: return True
+            positions = {symbol: json.dumps(dict(zip(FIELDS, (None if np.isnan(v) else float(v) for v in self._data[self._index[symbol]])))) for symbol in symbols}
+            states = {f"position_asset:{symbol}": self.asset_held(symbol) for symbol in symbols}
+        if not self.redis_handler.save_portfolio(positions, states, namespace=self.namespace): return False
+        with self._lock: self._dirty.difference_update(symbols)
+        return True
+
+    @classmethod
+    def from_redis(cls, redis_handler, **kwargs) -> 'PortfolioEngine':
+        """Reconstrói o portfólio gravado no mesmo `namespace` (sem consultar saldos na corretora)."""
+        engine = cls(redis_handler=redis_handler, **kwargs)
+        for symbol, payload in redis_handler.load_portfolio(namespace=engine.namespace).items():
+            try:
+                values = json.loads(payload); row = engine._row(symbol)
+                engine._data[row] = [np.nan if values.get(field) is None else float(values[field]) for field in FIELDS]
+            except (ValueError, TypeError, KeyError): logger.error(f"Posição inválida no Redis para {symbol}: {payload!r}. Ignorada.")
+        logger.info(f"Portfólio carregado do Redis: {len(engine._symbols)} símbolo(s) (namespace {engine.namespace or 'padrão'}).")
+        return engine
+
+    def _publish(self, symbol: str):
+        position = self.position(symbol)
+        metrics.set_gauge("portfolio_position_qty", position['qty'], symbol=symbol)
+        metrics.set_gauge("portfolio_exposure", position['exposure'], symbol=symbol)
+        metrics.set_gauge("portfolio_unrealized_pnl", position['unrealized_pnl'], symbol=symbol)
+        metrics.set_gauge("portfolio_realized_pnl", position['realized_pnl'], symbol=symbol)
@@ -0,0 +1,132 @@
+# quantis_crypto_trader_gemini/quota.py
+
+import asyncio
+import collections
+import logging
+import math
+import threading
+import time
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Prioridades de Chamada ---
+PRIORITY_LOW = 0    # Sem posição e longe dos limiares dos filtros: pode ser adiada/pulada
+PRIORITY_NORMAL = 1 # Perto dos limiares dos filtros 15m
+PRIORITY_HIGH = 2   # Símbolo em posição: precisa de resposta (saída)
+PRIORITY_NAMES = {PRIORITY_LOW: "low", PRIORITY_NORMAL: "normal", PRIORITY_HIGH: "high"}
+
+CHARS_PER_TOKEN = 4.0 # Estimativa inicial; recalibrada com o usage_metadata das respostas
+
+
+class QuotaExhausted(Exception):
+    """A chamada não coube no orçamento de requisições/tokens do minuto (ou a API está em cooldown por 429)."""
+    pass
+
+
+class QuotaManager:
+    """
+    Orçamento de requisições (RPM) e tokens (TPM) do Gemini em janela deslizante, com prioridade.
+
+    Cada prioridade só pode usar uma fração do limite: chamadas de baixa prioridade param em
+    (1 - reserve_fraction) e as normais na metade da reserva, deixando folga para as de alta
+    prioridade (símbolos em posição) chegarem até 100% do limite. Um ResourceExhausted (429) da
+    API coloca todas as chamadas em cooldown.
+    """
+    def __init__(self, rpm_limit: int, tpm_limit: int, reserve_fraction: float = 0.2, window_seconds: float = 60.0,
+                 cooldown_seconds: float = 60.0, clock=time.monotonic):
+        self.rpm_limit = rpm_limit; self.tpm_limit = tpm_limit; self.window_seconds = window_seconds; self.cooldown_seconds = cooldown_seconds
+        reserve_fraction = min(max(reserve_fraction, 0.0), 0.9)
+        self.caps = {PRIORITY_HIGH: 1.0, PRIORITY_NORMAL: 1.0 - reserve_fraction / 2, PRIORITY_LOW: 1.0 - reserve_fraction}
+        self._clock = clock; self._lock = threading.Lock()
+        self._window: collections.deque[list] = collections.deque() # [t, tokens] por requisição concedida
+        self._cooldown_until = 0.0; self._chars_per_token = CHARS_PER_TOKEN
+
+    # --- Estimativa de Tokens ---
+    def estimate_tokens(self, prompt: str, expected_output_tokens: int = 64) -> int:
+        return int(math.ceil(len(prompt) / self._chars_per_token)) + expected_output_tokens
+
+    def _evict(self, now: float):
+        while self._window and now - self._window[0][0] >= self.window_seconds: self._window.popleft()
+
+    def usage(self) -> dict:
+        with self._lock:
+            self._evict(self._clock())
+            return {'requests': len(self._window), 'tokens': int(sum(tokens for _, tokens in self._window)), 'rpm_limit': self.rpm_limit, 'tpm_limit': self.tpm_limit}
+
+    # --- Reserva ---
+    def try_reserve(self, priority: int, tokens: int) -> tuple[list | None, float]:
+        """
+        Tenta reservar uma requisição de `tokens` tokens.
+
+        Returns:
+            tuple: (ticket, 0.0) se concedida; (None, espera) caso contrário, com a espera estimada
+            em segundos até caber (math.inf se nunca cabe no limite desta prioridade).
+        """
+        cap = self.caps.get(priority, self.caps[PRIORITY_LOW])
+        rpm_cap = self.rpm_limit * cap if self.rpm_limit else math.inf; tpm_cap = self.tpm_limit * cap if self.tpm_limit else math.inf
+        if tokens > tpm_cap or rpm_cap < 1: return None, math.inf
+        with self._lock:
+            now = self._clock(); self._evict(now)
+            if now < self._cooldown_until: return None, self._cooldown_until - now
+            used_tokens = sum(t for _, t in self._window)
+            if len(self._window) + 1 <= rpm_cap and used_tokens + tokens <= tpm_cap:
+                ticket = [now, tokens]; self._window.append(ticket)
+                self._publish(len(self._window), used_tokens + tokens)
+                return ticket, 0.0
+            # Espera até expirarem requisições antigas suficientes p/ caber (RPM e TPM)
+            requests_left = len(self._window); tokens_left = used_tokens
+            for t, t_tokens in self._window:
+                requests_left -= 1; tokens_left -= t_tokens
+                if requests_left + 1 <= rpm_cap and tokens_left + tokens <= tpm_cap: return None, max(0.0, t + self.window_seconds - now)
+            return None, math.inf
+
+    def acquire(self, priority: int, tokens: int, max_wait: float = 0.0) -> list:
+        """Reserva bloqueando até `max_wait` segundos. Levanta QuotaExhausted se não couber a tempo."""
+        deadline = self._clock() + max_wait
+        while True:
+            ticket, wait = self.try_reserve(priority, tokens)
+            if ticket is not None: return ticket
+            if self._clock() + wait > deadline: self._reject(priority, wait)
+            time.sleep(wait + 0.01)
+
+    async def acquire_async(self, priority: int, tokens: int, max_wait: float = 0.0) -> list:
+        """Versão assíncrona de `acquire` (espera com asyncio.sleep, sem bloquear o loop)."""
+        deadline = self._clock() + max_wait
+        while True:
+            ticket, wait = self.try_reserve(priority, tokens)
+            if ticket is not None: return ticket
+            if self._clock() + wait > deadline: self._reject(priority, wait)
+            await asyncio.sleep(wait + 0.01)
+
+    def _reject(self, priority: int, wait: float):
+        name = PRIORITY_NAMES.get(priority, str(priority)); metrics.inc("gemini_quota_rejections_total", priority=name)
+        raise QuotaExhausted(f"Cota Gemini sem espaço p/ prioridade '{name}' (espera estimada {wait:.1f}s).")
+
+    def release(self, ticket: list):
+        """Devolve uma reserva que não virou chamada (ex: circuit breaker aberto)."""
+        with self._lock:
+            try: self._window.remove(ticket)
+            except ValueError: pass
+
+    # --- Ajustes pós-chamada ---
+    def settle(self, ticket: list, prompt_chars: int | None = None, prompt_tokens: int | None = None, total_tokens: int | None = None):
+        """Troca a estimativa de tokens do ticket pelo uso real e recalibra a razão caracteres/token."""
+        with self._lock:
+            if total_tokens is not None: ticket[1] = total_tokens
+            if prompt_chars and prompt_tokens: self._chars_per_token = 0.8 * self._chars_per_token + 0.2 * (prompt_chars / prompt_tokens)
+
+    def on_quota_error(self, retry_after: float | None = None):
+        """Chamado quando a API responde ResourceExhausted (429): bloqueia novas chamadas por um cooldown."""
+        cooldown = retry_after if retry_after is not None else self.cooldown_seconds
+        with self._lock: self._cooldown_until = max(self._cooldown_until, self._clock() + cooldown)
+        metrics.inc("gemini_quota_errors_total")
+        logger.warning(f"Gemini retornou erro de cota (429). Novas chamadas suspensas por {cooldown:.0f}s.")
+
+    def _publish(self, requests: int, tokens: float):
+        metrics.set_gauge("gemini_quota_requests_in_window", requests); metrics.set_gauge("gemini_quota_tokens_in_window", tokens)
+
+
+def is_quota_error(exc: BaseException) -> bool:
+    """True para ResourceExhausted/429 do SDK (google.api_core), sem precisar importar o SDK."""
+    return type(exc).__name__ in ("ResourceExhausted", "TooManyRequests") or getattr(exc, 'code', None) == 429
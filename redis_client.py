@@ -10,11 +10,12 @@ import time
 logger = logging.getLogger(__name__)
 
 class RedisHandler:
-    def __init__(self, host: str, port: int, db: int):
-        """Inicializa o cliente Redis."""
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, socket_timeout: float | None = None, client: redis.Redis | None = None):
+        """Inicializa o cliente Redis (socket_timeout: timeout em segundos por operação). `client` usa um cliente já criado
+        com a mesma API do redis-py e decode_responses=False (ex: fakeredis.FakeRedis() em benchmarks/testes offline)."""
         self.host = host; self.port = port; self.db_num = db; self.client: redis.Redis | None = None
         try:
-            self.client = redis.Redis(host=self.host, port=self.port, db=self.db_num, decode_responses=False)
+            self.client = client if client is not None else redis.Redis(host=self.host, port=self.port, db=self.db_num, decode_responses=False, socket_timeout=socket_timeout, socket_connect_timeout=socket_timeout)
             self.client.ping()
             logger.info(f"Conexão Redis OK (Host: {self.host}, Port: {self.port}, DB: {self.db_num}).")
         except redis.exceptions.ConnectionError as e:
@@ -164,4 +165,48 @@ class RedisHandler:
             for col in numeric_cols:
                  if col in df.columns: df[col] = pd.to_numeric(df[col], errors='coerce')
             logger.info(f"{len(df)} klines recuperados range '{key}'."); return df
-        except Exception as e: logger.error(f"Erro buscar hist range '{key}'.", exc_info=True); return None
\ No newline at end of file
+        except Exception as e: logger.error(f"Erro buscar hist range '{key}'.", exc_info=True); return None
+    # --- Funções de Séries Temporais de Métricas (Sorted Set) ---
+    def _generate_metric_ts_key(self, series: str) -> str: key = f"metrics:ts:{series}"; return key
+    def add_metric_points(self, points: dict[str, float], ts_ms: int, retention_ms: int = 0) -> int:
+        """Grava um ponto (ts_ms, valor) por série e descarta pontos mais velhos que a retenção."""
+        if not self.client: logger.error("Cliente Redis não inicializado (métricas)."); return 0
+        if not points: return 0
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for series, value in points.items():
+                    key = self._generate_metric_ts_key(series); pipe.zadd(key, {f"{ts_ms}:{value:.6g}".encode('utf-8'): ts_ms})
+                    if retention_ms: pipe.zremrangebyscore(key, 0, ts_ms - retention_ms)
+                pipe.execute()
+            logger.debug(f"{len(points)} pontos de métricas gravados no Redis (ts {ts_ms}).")
+            return len(points)
+        except Exception as e: logger.error("Erro gravar pontos de métricas Redis.", exc_info=True); return 0
+    def get_metric_points(self, series: str, start_ts_ms: int, end_ts_ms: int) -> list[tuple[int, float]]:
+        """Lê os pontos (ts_ms, valor) de uma série de métricas num range."""
+        key = self._generate_metric_ts_key(series)
+        try:
+            points = []
+            for member, score in self.client.zrangebyscore(key, start_ts_ms, end_ts_ms, withscores=True):
+                value_str = member.decode('utf-8').split(':', 1)[1]; points.append((int(score), float(value_str)))
+            return points
+        except Exception as e: logger.error(f"Erro ler pontos de métricas '{key}'.", exc_info=True); return []
+    # --- Funções de Portfólio (Hash + estados legados, gravados numa transação) ---
+    def _generate_portfolio_key(self, namespace: str | None = None) -> str: key = f"state:portfolio:{namespace}" if namespace else "state:portfolio"; return key
+    def save_portfolio(self, positions: dict[str, str], states: dict[str, str] | None = None, namespace: str | None = None) -> bool:
+        """Grava posições serializadas (símbolo -> JSON) e estados simples (contexto -> valor) num único MULTI/EXEC.
+        `namespace` separa portfólios que não podem se misturar (ex: EXECUTION_MODE 'paper' x 'live')."""
+        if not self.client: logger.error("Cliente Redis não inicializado (portfólio)."); return False
+        if not positions and not states: return True
+        try:
+            with self.client.pipeline(transaction=True) as pipe:
+                if positions: pipe.hset(self._generate_portfolio_key(namespace), mapping={symbol: payload.encode('utf-8') for symbol, payload in positions.items()})
+                for context, value in (states or {}).items(): pipe.set(self._generate_state_key(context), value.encode('utf-8'))
+                pipe.execute()
+            logger.debug(f"Portfólio gravado no Redis ({len(positions)} posição(ões), {len(states or {})} estado(s)).")
+            return True
+        except Exception as e: logger.error("Erro gravar portfólio Redis.", exc_info=True); return False
+    def load_portfolio(self, namespace: str | None = None) -> dict[str, str]:
+        """Lê as posições serializadas (símbolo -> JSON) gravadas por save_portfolio no mesmo `namespace`."""
+        key = self._generate_portfolio_key(namespace)
+        try: return {symbol.decode('utf-8'): payload.decode('utf-8') for symbol, payload in (self.client.hgetall(key) or {}).items()}
+        except Exception as e: logger.error(f"Erro ler portfólio '{key}'.", exc_info=True); return {}
@@ -0,0 +1,276 @@
+# quantis_crypto_trader_gemini/replay_engine.py
+
+# Replay acelerado: velas 1m históricas passam pelo mesmo pipeline do trade_cycle (indicadores multi-timeframe ->
+# gate pré-AI -> analisador -> decide_action -> OrderExecutor), com relógio simulado e Redis/Telegram em memória.
+# Uso:
+#   python replay_engine.py --start "1 Mar, 2025" --end "1 Apr, 2025"            # sinal técnico 15m como analisador
+#   python replay_engine.py --start "1 Mar, 2025" --analyzer recorded            # decisões Gemini gravadas (decision_replay)
+#   python replay_engine.py --start "1 Mar, 2025" --indicators window            # janela por ciclo, idêntica ao ciclo ao vivo (lento)
+
+import argparse
+import logging
+import sys
+import time
+import numpy as np
+import pandas as pd
+import config
+import main as live
+import metrics
+import resampler
+import telegram_interface
+from execution import MatchingSimulator, OrderExecutor, split_symbol
+from portfolio import PortfolioEngine
+from strategy import StrategyManager
+
+logger = logging.getLogger(__name__)
+
+CYCLE_MINUTES = 5 # Mesmo agendamento do main()
+INDICATOR_MODES = ('tape', 'window')
+
+# --- Sinks e Relógio do Replay ---
+class SimulatedClock:
+    """Relógio do replay: instante de fechamento da última vela 1m processada."""
+    def __init__(self, now_ms: int = 0): self.now_ms = int(now_ms)
+    def set_ms(self, ts_ms: int): self.now_ms = int(ts_ms)
+    def time(self) -> float: return self.now_ms / 1000.0
+
+
+class MemoryRedis:
+    """No lugar do RedisHandler: estado de posição e portfólio em dicts (mesmos métodos usados pelo StrategyManager/PortfolioEngine)."""
+    def __init__(self): self.state: dict[str, str] = {}; self.portfolio: dict[str, str] = {}; self.writes = 0
+    def get_state(self, context: str) -> str | None: return self.state.get(context)
+    def set_state(self, context: str, value: str, ttl_seconds: int | None = None): self.state[context] = value; self.writes += 1; return True
+    def save_portfolio(self, positions: dict[str, str], states: dict[str, str] | None = None, namespace: str | None = None) -> bool:
+        self.portfolio.update(positions); self.state.update(states or {}); self.writes += 1; return True
+    def load_portfolio(self, namespace: str | None = None) -> dict[str, str]: return dict(self.portfolio)
+
+
+class MessageSink:
+    """No lugar da API do Telegram (telegram_interface.set_message_sink): guarda (instante simulado, texto)."""
+    def __init__(self, clock: SimulatedClock): self.clock = clock; self.messages: list[tuple[int, str]] = []
+    def __call__(self, text: str, disable_notification: bool = False): self.messages.append((self.clock.now_ms, text))
+
+
+class DataFrameSource:
+    """Fonte de velas em memória com a interface de leitura do RedisHandler (get_hist_klines_range)."""
+    def __init__(self, klines_by_interval: dict[str, pd.DataFrame]): self.klines_by_interval = klines_by_interval
+    def get_hist_klines_range(self, symbol: str, interval: str, start_ts_ms: int, end_ts_ms: int) -> pd.DataFrame | None:
+        df = self.klines_by_interval.get(interval)
+        if df is None: return None
+        return df[(df.index >= pd.to_datetime(start_ts_ms, unit='ms')) & (df.index <= pd.to_datetime(end_ts_ms, unit='ms'))]
+
+
+class TechnicalAnalyzer:
+    """Analisador determinístico sem API: o sinal técnico 15m do StrategyManager (o mesmo do fallback por deadline)."""
+    def __init__(self, strategy_manager: StrategyManager): self.strategy_manager = strategy_manager
+    def get_trade_signal_mta_indicators(self, mta_indicators_data: dict, symbol: str, current_ticker_price: float | None = None, **kwargs) -> tuple[str | None, str | None]:
+        ind = mta_indicators_data.get('15m', {})
+        return self.strategy_manager.technical_signal(ind.get('sma_fast'), ind.get('sma_slow'), ind.get('rsi'), ind.get('bbp')), "Sinal técnico 15m (replay)."
+
+
+# --- Indicadores por Timeframe ---
+def _ewm_alpha(com: float) -> float:
+    return 1.0 / (1.0 + com) # Mesma conversão do pandas (span/alpha -> com -> alpha)
+
+def _ewm_step(weighted: np.ndarray, x: np.ndarray, alpha: float) -> np.ndarray:
+    """Um passo de Series.ewm(alpha=..., adjust=False).mean() por janela, com a aritmética do pandas (NaN = ainda sem valor)."""
+    factor = 1.0 - alpha; blended = np.where(weighted != x, (factor * weighted + alpha * x) / (factor + alpha), weighted)
+    return np.where(np.isnan(x), weighted, np.where(np.isnan(weighted), x, blended))
+
+def _presma_ema_step(weighted: np.ndarray, count: np.ndarray, total: np.ndarray, x: np.ndarray, length: int, alpha: float, active: np.ndarray):
+    """Um passo do ema/atr do pandas_ta com presma: NaN até `length` valores, semente = média deles, depois ewm(adjust=False)."""
+    count = count + active; total = np.where(active & (count <= length), total + np.nan_to_num(x), total)
+    seeded = np.where(active & (count == length), total / length, weighted)
+    return np.where(active & (count > length), _ewm_step(weighted, x, alpha), seeded), count, total
+
+def window_indicator_columns(frame: pd.DataFrame, window: int, atr_p: dict, rsi_p: dict, macd_p: dict) -> dict[str, np.ndarray]:
+    """
+    Colunas que dependem do início da série (RSI/MACD/ATR suavizados exponencialmente, OBV acumulado, VWAP ancorado no
+    dia), com o valor que o pandas_ta dá na vela i quando a série começa na janela de `window` velas terminando em i,
+    como no ciclo ao vivo. Todas as janelas avançam juntas em `window` passos vetorizados (uma linha por vela), repetindo
+    as fórmulas do pandas_ta sem TA-Lib; replay_parity.py e tests/test_replay_parity.py conferem contra calculate_indicators.
+    """
+    n = len(frame); rows = np.arange(n); start = np.maximum(0, rows + 1 - window)
+    pad = lambda values, fill=np.nan: np.concatenate([np.full(window - 1, fill), values]) # Passo k lê a vela i - window + 1 + k de cada linha
+    close, high, low, volume = (pad(frame[column].to_numpy(dtype=float)) for column in ('Close', 'High', 'Low', 'Volume'))
+    day = pad(frame.index.values.astype('datetime64[D]').astype(np.int64), -1)
+    rsi_alpha = _ewm_alpha((1 - 1 / rsi_p['length']) / (1 / rsi_p['length'])); atr_alpha = _ewm_alpha((1 - 1 / atr_p['length']) / (1 / atr_p['length']))
+    fast_alpha, slow_alpha, signal_alpha = (_ewm_alpha((macd_p[key] - 1) / 2) for key in ('fast', 'slow', 'signal'))
+    nan = lambda: np.full(n, np.nan); zeros = lambda: np.zeros(n)
+    gain, loss, fast, slow, signal, atr = nan(), nan(), nan(), nan(), nan(), nan(); macd = nan(); obv = nan(); vwap = nan()
+    fast_n, fast_sum, slow_n, slow_sum, signal_n, signal_sum, atr_n, atr_sum = (zeros() for _ in range(8)); obv_sum, wp_sum, volume_sum = zeros(), zeros(), zeros()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for k in range(window):
+            at = slice(k, k + n); position = rows - window + 1 + k; active = position >= start; first = position == start
+            c, h, l, v = close[at], high[at], low[at], volume[at]
+            previous = np.where(active & ~first, close[k - 1:k - 1 + n] if k else np.nan, np.nan) # Fora da janela/1ª vela: diff NaN
+            diff = c - previous
+            gain = _ewm_step(gain, np.where(diff < 0, 0.0, diff), rsi_alpha); loss = _ewm_step(loss, np.where(diff > 0, 0.0, diff), rsi_alpha)
+            fast, fast_n, fast_sum = _presma_ema_step(fast, fast_n, fast_sum, c, macd_p['fast'], fast_alpha, active)
+            slow, slow_n, slow_sum = _presma_ema_step(slow, slow_n, slow_sum, c, macd_p['slow'], slow_alpha, active)
+            macd = fast - slow
+            signal, signal_n, signal_sum = _presma_ema_step(signal, signal_n, signal_sum, macd, macd_p['signal'], signal_alpha, active & ~np.isnan(macd))
+            true_range = np.where(first, h - l, np.fmax(h - l, np.fmax(np.abs(h - previous), np.abs(previous - l))))
+            atr, atr_n, atr_sum = _presma_ema_step(atr, atr_n, atr_sum, true_range, atr_p['length'], atr_alpha, active)
+            obv_sum = np.where(active, obv_sum + np.nan_to_num(np.sign(diff) * v), obv_sum); obv = np.where(active & ~first, obv_sum, np.nan) # 1ª vela sem sinal (NaN)
+            new_day = first | (day[at] != day[k - 1:k - 1 + n] if k else True); typical = (h + l + c) / 3.0
+            wp_sum = np.where(active, np.where(new_day, 0.0, wp_sum) + typical * v, wp_sum); volume_sum = np.where(active, np.where(new_day, 0.0, volume_sum) + v, volume_sum)
+            vwap = np.where(active, wp_sum / volume_sum, np.nan)
+        rsi = 100 * gain / (gain + np.abs(loss))
+    suffix = f"_{macd_p['fast']}_{macd_p['slow']}_{macd_p['signal']}"
+    return {f"RSI_{rsi_p['length']}": rsi, f"MACD{suffix}": macd, f"MACDh{suffix}": macd - signal, f"MACDs{suffix}": signal, "OBV": obv,
+            f"ATRr_{atr_p['length']}": atr, "VWAP_D": vwap}
+
+class _TimeframeTape:
+    """
+    Velas fechadas de um TF + indicadores da última vela fechada em cada instante.
+
+    'tape': as colunas pandas_ta são calculadas uma vez sobre o histórico inteiro e cada ciclo só lê a linha (O(1));
+    SMA/BB/Ichimoku (janelas fixas) saem iguais aos do ciclo ao vivo. RSI/MACD/ATR/OBV/VWAP dependem do início da
+    série e vêm de window_indicator_columns, já calculados sobre a janela de MIN_KLINES_NEEDED velas de cada vela.
+    'window': calculate_indicators inteiro sobre a janela a cada vela nova; referência exata, porém lenta
+    (replay_parity.py compara os dois modos).
+    """
+    def __init__(self, frame: pd.DataFrame, interval: str, mode: str, columns_fn, indicators_fn, window_columns_fn=window_indicator_columns):
+        self.frame = frame; self.mode = mode; self.indicators_fn = indicators_fn
+        self.ends_ms = frame.index.values.astype('datetime64[ms]').astype(np.int64) + resampler.FIXED_INTERVAL_MS[interval]
+        self.required_len = live.indicator_required_len(live.SMA_PARAMS, live.ICHI_PARAMS)
+        self._last_index = None; self._last_indicators: dict = {}
+        if mode == 'tape':
+            columns = columns_fn(frame.copy(), live.SMA_PARAMS, live.ICHI_PARAMS, live.BBANDS_PARAMS, live.ATR_PARAMS, live.RSI_PARAMS, live.MACD_PARAMS)
+            self._arrays = {name: columns[name].to_numpy(dtype=float) for name in columns.columns if name not in frame.columns}
+            self._arrays.update(window_columns_fn(frame, live.MIN_KLINES_NEEDED, live.ATR_PARAMS, live.RSI_PARAMS, live.MACD_PARAMS))
+
+    def last_closed(self, now_ms: int) -> int:
+        return int(np.searchsorted(self.ends_ms, now_ms, side='right')) - 1
+
+    def indicators_at(self, i: int) -> dict:
+        if i == self._last_index: return self._last_indicators # Nenhuma vela nova desde o último ciclo (como o indicator_state ao vivo)
+        if i + 1 < self.required_len: indicators = {}
+        elif self.mode == 'tape':
+            arrays = self._arrays
+            indicators = live.extract_indicators(lambda key: arrays[key][i] if key in arrays else None, live.SMA_PARAMS, live.ICHI_PARAMS, live.BBANDS_PARAMS, live.ATR_PARAMS, live.RSI_PARAMS, live.MACD_PARAMS)
+        else:
+            window = self.frame.iloc[max(0, i + 1 - live.MIN_KLINES_NEEDED):i + 1].copy()
+            indicators = self.indicators_fn(window, live.SMA_PARAMS, live.ICHI_PARAMS, live.BBANDS_PARAMS, live.ATR_PARAMS, live.RSI_PARAMS, live.MACD_PARAMS)
+        self._last_index = i; self._last_indicators = indicators
+        return indicators
+
+
+# --- Motor ---
+class ReplayEngine:
+    """
+    Reproduz velas 1m pelo pipeline do trade_cycle a cada `cycle_minutes`, em tempo simulado.
+
+    O que muda em relação ao ciclo ao vivo é só a borda: as velas vêm de `data_source` (RedisHandler ou
+    DataFrameSource; os TFs de análise são derivados do 1m pelo resampler, como em DERIVE_TIMEFRAMES_FROM_1M),
+    o ticker é o fechamento da última vela 1m, as ordens vão para um MatchingSimulator e o estado/Telegram para
+    sinks em memória. Indicadores, gate, analisador, decisão, executor e portfólio são os mesmos objetos/funções.
+    """
+    def __init__(self, data_source, symbol: str = "BTCUSDT", analyzer=None, clock: SimulatedClock | None = None, cycle_minutes: int = CYCLE_MINUTES,
+                 indicator_mode: str = 'tape', initial_quote_balance: float = config.PAPER_INITIAL_QUOTE_BALANCE, slippage_bps: float = config.PAPER_SLIPPAGE_BPS,
+                 fee_rate: float = config.PAPER_FEE_RATE, columns_fn=live.append_indicator_columns, indicators_fn=live.calculate_indicators,
+                 window_columns_fn=window_indicator_columns, quiet: bool = True):
+        if indicator_mode not in INDICATOR_MODES: raise ValueError(f"indicator_mode deve ser um de {INDICATOR_MODES}.")
+        self.data_source = data_source; self.symbol = symbol; self.cycle_minutes = max(1, int(cycle_minutes)); self.indicator_mode = indicator_mode
+        self.columns_fn = columns_fn; self.indicators_fn = indicators_fn; self.window_columns_fn = window_columns_fn; self.quiet = quiet
+        self.clock = clock or SimulatedClock(); self.redis = MemoryRedis(); self.messages = MessageSink(self.clock)
+        self.base_asset, self.quote_asset = split_symbol(symbol); self.initial_quote_balance = initial_quote_balance
+        self.venue = MatchingSimulator(slippage_bps=slippage_bps, latency_seconds=0.0, fee_rate=fee_rate, balances={self.quote_asset: initial_quote_balance})
+        self.executor = OrderExecutor(self.venue, venue_name="replay", max_retries=0, clock=self.clock.time, sleep=lambda seconds: None)
+        self.executor.start_user_stream()
+        self.portfolio = PortfolioEngine(redis_handler=self.redis)
+        self.executor.add_fill_listener(self.portfolio.on_order_fill)
+        self.strategy_manager = StrategyManager(redis_handler=self.redis, binance_handler=None, order_executor=self.executor, order_fill_timeout=0.0, portfolio=self.portfolio)
+        self.strategy_manager.base_asset, self.strategy_manager.quote_asset = self.base_asset, self.quote_asset
+        self.strategy_manager.symbol = symbol; self.strategy_manager.position_state_key = f"position_asset:{symbol}"
+        self.analyzer = analyzer if analyzer is not None else TechnicalAnalyzer(self.strategy_manager)
+        self.trades: list[dict] = []
+        self.executor.add_fill_listener(lambda order, fill: self.trades.append({'Timestamp': pd.to_datetime(fill['ts_ms'], unit='ms'), 'Side': order.side, 'Qty': fill['qty'],
+                                                                               'Price': fill['price'], 'Commission': fill['commission'], 'Commission_Asset': fill['commission_asset']}))
+
+    def load(self, start_ms: int, end_ms: int, warmup_minutes: int | None = None) -> pd.DataFrame | None:
+        """Velas 1m de [start - aquecimento, end]. O aquecimento padrão cobre MIN_KLINES_NEEDED velas do maior TF de análise."""
+        if warmup_minutes is None: warmup_minutes = live.MIN_KLINES_NEEDED * max(resampler.FIXED_INTERVAL_MS[tf] for tf in live.TFS_FOR_ANALYSIS.values()) // 60_000
+        df = self.data_source.get_hist_klines_range(self.symbol, "1m", start_ms - warmup_minutes * 60_000, end_ms)
+        if df is None or df.empty: logger.error(f"Sem velas 1m de {self.symbol} no período do replay."); return None
+        return df.sort_index()[~df.index.duplicated(keep='last')]
+
+    def run(self, klines_1m: pd.DataFrame, start_ms: int | None = None) -> dict:
+        """Roda os ciclos de `start_ms` (padrão: primeiro instante com a janela de todos os TFs completa) até a última vela."""
+        klines_1m = klines_1m[list(resampler.OHLCV_AGG)]
+        tapes = {label: _TimeframeTape(klines_1m if interval == "1m" else resampler.resample_ohlcv(klines_1m, interval), interval, self.indicator_mode, self.columns_fn, self.indicators_fn,
+                                     self.window_columns_fn)
+                 for label, interval in live.TFS_FOR_ANALYSIS.items()}
+        open_ms = klines_1m.index.values.astype('datetime64[ms]').astype(np.int64); close_ms = open_ms + 60_000
+        values = {column: klines_1m[column].to_numpy(dtype=float) for column in resampler.OHLCV_AGG}
+        if start_ms is None: start_ms = max(int(tape.ends_ms[min(live.MIN_KLINES_NEEDED, len(tape.ends_ms)) - 1]) for tape in tapes.values() if len(tape.ends_ms))
+        cycle_rows = np.flatnonzero((close_ms >= start_ms) & ((close_ms // 60_000) % self.cycle_minutes == 0)) # Ciclos alinhados ao relógio (xx:00, xx:05...)
+        equity = np.empty(len(cycle_rows)); sources: dict[tuple[str, str | None], int] = {}
+        logger.info(f"Replay {self.symbol}: {len(klines_1m)} velas 1m, {len(cycle_rows)} ciclos de {self.cycle_minutes} min (indicadores '{self.indicator_mode}').")
+
+        previous_sink = telegram_interface.set_message_sink(self.messages); previous_disable = logging.root.manager.disable
+        if self.quiet: logging.disable(logging.INFO) # decide_action/analyze_and_decide logam várias linhas por ciclo
+        started = time.perf_counter(); fed = 0
+        try:
+            for k, row in enumerate(cycle_rows):
+                now_ms = int(close_ms[row]); self.clock.set_ms(now_ms)
+                for j in range(fed, row + 1): # Mercado até o fechamento da vela: casa ordens pendentes e atualiza o "ticker"
+                    self.venue.on_kline(self.symbol, int(open_ms[j]), values['Open'][j], values['High'][j], values['Low'][j], values['Close'][j], values['Volume'][j])
+                fed = row + 1; latest_price = float(values['Close'][row])
+                self.portfolio.mark_price(self.symbol, latest_price)
+                if hasattr(self.analyzer, 'set_time'): self.analyzer.set_time(now_ms) # ReplayGeminiAnalyzer: sem decisões do futuro
+                mta_data = {}; all_data_available = True
+                for label, tape in tapes.items():
+                    i = tape.last_closed(now_ms); indicators = tape.indicators_at(i) if i >= 0 else {}
+                    if not indicators and i + 1 >= live.MIN_KLINES_NEEDED: all_data_available = False
+                    mta_data[label] = indicators
+                signal, source = live.analyze_and_decide(self.strategy_manager, self.analyzer, self.symbol, mta_data, latest_price, all_data_available, deadline=None)
+                sources[(source, signal)] = sources.get((source, signal), 0) + 1
+                equity[k] = self.venue.get_asset_balance(self.quote_asset) + self.venue.get_asset_balance(self.base_asset) * latest_price
+        finally:
+            logging.disable(previous_disable); telegram_interface.set_message_sink(previous_sink)
+        elapsed = time.perf_counter() - started
+
+        final_value = float(equity[-1]) if len(equity) else self.initial_quote_balance
+        result = {'cycles': len(cycle_rows), 'elapsed_seconds': elapsed, 'cycles_per_second': len(cycle_rows) / elapsed if elapsed > 0 else float('inf'),
+                  'final_value': final_value, 'pnl': final_value - self.initial_quote_balance, 'return_pct': (final_value / self.initial_quote_balance - 1) * 100,
+                  'num_fills': len(self.trades), 'signals': sources, 'messages': len(self.messages.messages), 'state_writes': self.redis.writes,
+                  'equity': pd.Series(equity, index=pd.to_datetime(close_ms[cycle_rows], unit='ms'), name='Value'), 'trades': pd.DataFrame(self.trades)}
+        metrics.observe("replay_cycles_per_second", result['cycles_per_second'])
+        logger.info(f"Replay concluído: {result['cycles']} ciclos em {elapsed:.2f}s ({result['cycles_per_second']:.0f} ciclos/s), {result['num_fills']} fills, "
+                    f"valor final {final_value:.2f} {self.quote_asset} ({result['return_pct']:+.2f}%).")
+        return result
+
+
+# --- Execução via Linha de Comando ---
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay acelerado do pipeline do trade_cycle sobre velas 1m do Redis.")
+    parser.add_argument("--symbol", default="BTCUSDT")
+    parser.add_argument("--start", required=True, help="Início dos ciclos (ex: '1 Mar, 2025')")
+    parser.add_argument("--end", default=None, help="Fim (padrão: agora)")
+    parser.add_argument("--cycle-minutes", type=int, default=CYCLE_MINUTES)
+    parser.add_argument("--indicators", choices=INDICATOR_MODES, default='tape')
+    parser.add_argument("--analyzer", choices=('technical', 'recorded'), default='technical')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+    from redis_client import RedisHandler
+    start_ms = int(pd.to_datetime(args.start, utc=True).timestamp() * 1000)
+    end_ms = int(pd.to_datetime(args.end, utc=True).timestamp() * 1000) if args.end else int(time.time() * 1000)
+    analyzer = None
+    if args.analyzer == 'recorded':
+        from decision_replay import ReplayGeminiAnalyzer
+        analyzer = ReplayGeminiAnalyzer.from_database(symbol=args.symbol, until_ms=end_ms)
+    engine = ReplayEngine(RedisHandler(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB), symbol=args.symbol, analyzer=analyzer,
+                          cycle_minutes=args.cycle_minutes, indicator_mode=args.indicators)
+    klines = engine.load(start_ms, end_ms)
+    if klines is None: return 1
+    result = engine.run(klines, start_ms=start_ms)
+    print(f"{result['cycles']} ciclos | {result['cycles_per_second']:.0f} ciclos/s | {result['num_fills']} fills | retorno {result['return_pct']:+.2f}%")
+    for (source, signal), count in sorted(result['signals'].items(), key=lambda item: -item[1]): print(f"  {source:8s} {str(signal):5s} {count}")
+    if not result['trades'].empty: print(result['trades'].to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
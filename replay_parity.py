@@ -0,0 +1,59 @@
+# quantis_crypto_trader_gemini/replay_parity.py
+
+# Confere que o modo 'tape' do replay_engine entrega ao filtro 15m (sma_fast, sma_slow, rsi, bbp) os mesmos valores
+# do modo 'window' (calculate_indicators sobre a janela de MIN_KLINES_NEEDED velas, como no ciclo ao vivo), vela a vela.
+# O CI roda a mesma comparação com poucas velas em tests/test_replay_parity.py.
+# Uso:
+#   python replay_parity.py                        # 20 dias de velas 1m sintéticas, seed 42, TF 15m
+#   python replay_parity.py --days 60 --seed 7 --interval 1h
+#   python replay_parity.py --all-keys             # todos os indicadores (MACD, OBV, ATR, VWAP, Ichimoku, BB...), não só o filtro
+# Sai com código 1 se alguma vela divergir além do arredondamento de extract_indicators.
+
+import argparse
+import logging
+import sys
+import time
+import main as live
+import resampler
+import synthetic_data
+from replay_engine import _TimeframeTape
+
+FILTER_KEYS = ('sma_fast', 'sma_slow', 'rsi', 'bbp')
+TOLERANCE = {'bbp': 0.0001, 'atr': 0.0001, 'obv': 1.0} # Uma casa do arredondamento de extract_indicators (somas rolantes x janela); demais 0.01
+
+def compare(frame, interval: str, keys: tuple[str, ...] | None = FILTER_KEYS) -> tuple[int, list[tuple[int, str, float | None, float | None]], float, float]:
+    """(velas comparadas, divergências (índice, chave, tape, window), segundos no tape, segundos no window). keys=None: todas."""
+    args = (live.append_indicator_columns, live.calculate_indicators)
+    started = time.perf_counter(); tape = _TimeframeTape(frame, interval, 'tape', *args); tape_s = time.perf_counter() - started
+    window = _TimeframeTape(frame, interval, 'window', *args); window_s = 0.0; mismatches = []; compared = 0
+    for i in range(tape.required_len - 1, len(frame)):
+        started = time.perf_counter(); from_tape = tape.indicators_at(i); tape_s += time.perf_counter() - started
+        started = time.perf_counter(); from_window = window.indicators_at(i); window_s += time.perf_counter() - started
+        compared += 1
+        for key in keys or sorted(set(from_tape) | set(from_window)):
+            a, b = from_tape.get(key), from_window.get(key)
+            if (a is None) != (b is None) or (a is not None and abs(a - b) > TOLERANCE.get(key, 0.01) + 1e-9): mismatches.append((i, key, a, b))
+    return compared, mismatches, tape_s, window_s
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Paridade dos indicadores do filtro 15m entre os modos 'tape' e 'window' do replay_engine.")
+    parser.add_argument("--days", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--interval", default="15m", choices=sorted(set(live.TFS_FOR_ANALYSIS.values())))
+    parser.add_argument("--all-keys", action="store_true")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    klines_1m = synthetic_data.generate_ohlcv(args.days * 1440, "1m", seed=args.seed)[list(resampler.OHLCV_AGG)]
+    frame = klines_1m if args.interval == "1m" else resampler.resample_ohlcv(klines_1m, args.interval)
+    compared, mismatches, tape_s, window_s = compare(frame, args.interval, None if args.all_keys else FILTER_KEYS)
+    logging.disable(logging.NOTSET)
+
+    print(f"{compared} velas {args.interval} comparadas | tape {tape_s:.2f}s | window {window_s:.2f}s")
+    if mismatches:
+        i, key, a, b = mismatches[0]
+        print(f"DIVERGÊNCIA em {len(mismatches)} valores; primeira na vela {i} ({frame.index[i]}): {key} tape={a} window={b}."); return 1
+    print("Paridade OK."); return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
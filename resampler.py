@@ -0,0 +1,122 @@
+# quantis_crypto_trader_gemini/resampler.py
+
+import logging
+import time
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# --- Regras de Intervalo (alinhadas às velas da Binance, UTC) ---
+# Intervalos fixos são alinhados ao epoch (00:00 UTC); semana começa na segunda; mês no dia 1.
+SOURCE_INTERVAL = "1m"
+FIXED_INTERVAL_MS = {
+    "1m": 60_000, "3m": 3 * 60_000, "5m": 5 * 60_000, "15m": 15 * 60_000, "30m": 30 * 60_000,
+    "1h": 3_600_000, "2h": 2 * 3_600_000, "4h": 4 * 3_600_000, "6h": 6 * 3_600_000, "8h": 8 * 3_600_000, "12h": 12 * 3_600_000,
+    "1d": 86_400_000,
+}
+CALENDAR_INTERVALS = ("1w", "1M")
+OHLCV_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+CHUNK_TARGET_MS = 30 * 86_400_000 # ~30 dias de velas 1m (~43k linhas) por leitura do Redis
+
+def is_supported(interval: str) -> bool:
+    return interval in FIXED_INTERVAL_MS or interval in CALENDAR_INTERVALS
+
+def bucket_start(ts: pd.Timestamp, interval: str) -> pd.Timestamp:
+    """Início (Open time) da vela `interval` que contém `ts`."""
+    if interval in FIXED_INTERVAL_MS: return ts.floor(pd.Timedelta(milliseconds=FIXED_INTERVAL_MS[interval]))
+    day = ts.normalize()
+    if interval == "1w": return day - pd.Timedelta(days=day.dayofweek)
+    if interval == "1M": return day.replace(day=1)
+    raise ValueError(f"Intervalo não suportado pelo resampler: {interval}")
+
+def bucket_starts(index: pd.DatetimeIndex, interval: str) -> pd.DatetimeIndex:
+    """Versão vetorizada de `bucket_start` para um DatetimeIndex inteiro."""
+    if interval in FIXED_INTERVAL_MS: return index.floor(pd.Timedelta(milliseconds=FIXED_INTERVAL_MS[interval]))
+    days = index.normalize()
+    if interval == "1w": return days - pd.to_timedelta(days.dayofweek, unit='D')
+    if interval == "1M": return days - pd.to_timedelta(days.day - 1, unit='D')
+    raise ValueError(f"Intervalo não suportado pelo resampler: {interval}")
+
+def next_bucket_start(start: pd.Timestamp, interval: str, n: int = 1) -> pd.Timestamp:
+    """Início da vela `n` posições depois de `start` (que deve estar alinhado)."""
+    if interval in FIXED_INTERVAL_MS: return start + pd.Timedelta(milliseconds=FIXED_INTERVAL_MS[interval] * n)
+    if interval == "1w": return start + pd.Timedelta(weeks=n)
+    if interval == "1M": return start + pd.DateOffset(months=n)
+    raise ValueError(f"Intervalo não suportado pelo resampler: {interval}")
+
+def _bucket_ends(starts: pd.DatetimeIndex, interval: str) -> pd.DatetimeIndex:
+    if interval in FIXED_INTERVAL_MS: return starts + pd.Timedelta(milliseconds=FIXED_INTERVAL_MS[interval])
+    if interval == "1w": return starts + pd.Timedelta(weeks=1)
+    return starts + pd.offsets.MonthBegin(1)
+
+
+def resample_ohlcv(df_1m: pd.DataFrame, interval: str, closed_only: bool = True, source_end: pd.Timestamp | None = None) -> pd.DataFrame:
+    """
+    Agrega velas de 1m (index 'Open time') em velas de `interval`, no formato do histórico Redis.
+
+    Args:
+        df_1m (pd.DataFrame): Velas 1m com colunas Open/High/Low/Close/Volume e DatetimeIndex (UTC naive).
+        interval (str): Intervalo alvo (ex: '15m', '4h', '1d', '1w', '1M').
+        closed_only (bool): Se True, descarta a última vela se ela ainda não fechou.
+        source_end (pd.Timestamp | None): Fim dos dados de origem (fechamento da última vela 1m).
+            Padrão: Open time da última vela 1m + 1 minuto.
+
+    Returns:
+        pd.DataFrame: Colunas Open/High/Low/Close/Volume/Close time, index 'Open time'. Buckets sem
+        nenhuma vela 1m (ex: manutenção da exchange) não geram vela.
+    """
+    if df_1m is None or df_1m.empty: return pd.DataFrame(columns=list(OHLCV_AGG) + ['Close time'])
+    if not is_supported(interval): raise ValueError(f"Intervalo não suportado pelo resampler: {interval}")
+    if not isinstance(df_1m.index, pd.DatetimeIndex): raise ValueError("df_1m precisa de DatetimeIndex ('Open time').")
+    source = df_1m[list(OHLCV_AGG)]
+    if not source.index.is_monotonic_increasing: source = source.sort_index()
+    resampled = source.groupby(bucket_starts(source.index, interval), sort=True).agg(OHLCV_AGG)
+    ends = _bucket_ends(resampled.index, interval)
+    resampled['Close time'] = ends - pd.Timedelta(milliseconds=1)
+    if closed_only and len(resampled):
+        if source_end is None: source_end = source.index[-1] + pd.Timedelta(minutes=1)
+        resampled = resampled[ends <= source_end]
+    resampled.index.name = 'Open time'
+    return resampled
+
+
+def materialize_from_1m(redis_handler, symbol: str, interval: str, default_start_ms: int | None = None, now_ms: int | None = None) -> int:
+    """
+    Deriva incrementalmente o histórico `interval` a partir do histórico 1m do Redis.
+
+    Começa na vela seguinte à última já presente em hist:klines:{symbol}:{interval} (ou em
+    `default_start_ms` se o set estiver vazio), lê o 1m em blocos alinhados às velas alvo e
+    grava apenas velas fechadas, então nunca sobrescreve uma vela parcial.
+
+    Returns:
+        int: Número de velas adicionadas/atualizadas no Redis.
+    """
+    if interval == SOURCE_INTERVAL: return 0
+    if not is_supported(interval): logger.warning(f"Intervalo {interval} não suportado p/ derivação a partir de 1m."); return 0
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    last_1m_ms = redis_handler.get_last_hist_timestamp(symbol, SOURCE_INTERVAL)
+    if last_1m_ms is None: logger.warning(f"Histórico {symbol}/{SOURCE_INTERVAL} vazio. Impossível derivar {interval}."); return 0
+    source_end = pd.to_datetime(min(last_1m_ms + FIXED_INTERVAL_MS[SOURCE_INTERVAL], now_ms), unit='ms') # Fechamento da última vela 1m
+    last_ts_ms = redis_handler.get_last_hist_timestamp(symbol, interval)
+    if last_ts_ms is not None:
+        start = next_bucket_start(bucket_start(pd.to_datetime(last_ts_ms, unit='ms'), interval), interval)
+    elif default_start_ms is not None:
+        start = bucket_start(pd.to_datetime(default_start_ms, unit='ms'), interval)
+    else:
+        logger.warning(f"Histórico {symbol}/{interval} vazio e sem data inicial p/ derivação."); return 0
+    if next_bucket_start(start, interval) > source_end: logger.debug(f"Histórico derivado {symbol}/{interval} já atualizado."); return 0
+
+    if interval in FIXED_INTERVAL_MS: buckets_per_chunk = max(1, CHUNK_TARGET_MS // FIXED_INTERVAL_MS[interval])
+    else: buckets_per_chunk = 4 if interval == "1w" else 1
+    logger.info(f"Derivando {symbol}/{interval} a partir de 1m desde {start}...")
+    total_added = 0; chunk_start = start
+    while chunk_start < source_end:
+        chunk_end = next_bucket_start(chunk_start, interval, buckets_per_chunk)
+        start_ms = int(chunk_start.timestamp() * 1000); end_ms = int(min(chunk_end, source_end).timestamp() * 1000) - 1
+        df_1m = redis_handler.get_hist_klines_range(symbol, SOURCE_INTERVAL, start_ms, end_ms)
+        if df_1m is not None and not df_1m.empty:
+            derived = resample_ohlcv(df_1m, interval, closed_only=True, source_end=source_end)
+            if not derived.empty: total_added += redis_handler.add_klines_to_hist(symbol, interval, derived) or 0
+        chunk_start = chunk_end
+    logger.info(f"Derivação {symbol}/{interval} concluída: {total_added} velas adicionadas/atualizadas.")
+    return total_added
@@ -0,0 +1,100 @@
+# quantis_crypto_trader_gemini/resilience.py
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import metrics
+
+logger = logging.getLogger(__name__)
+
+class DeadlineExceeded(TimeoutError):
+    """Levantada quando uma chamada externa ou fase do ciclo estoura o tempo disponível."""
+    pass
+
+class CycleDeadline:
+    """Orçamento de tempo de um ciclo de trade (relógio monotônico)."""
+    def __init__(self, budget_seconds: float, clock=time.monotonic):
+        self.budget_seconds = budget_seconds; self._clock = clock; self.started_at = clock()
+        self.expires_at = self.started_at + budget_seconds
+
+    def elapsed(self) -> float: return self._clock() - self.started_at
+    def remaining(self) -> float: return max(0.0, self.expires_at - self._clock())
+    def expired(self) -> bool: return self.remaining() <= 0.0
+
+    def timeout_for(self, max_timeout: float | None, reserve: float = 0.0) -> float:
+        """Timeout de uma chamada: o menor entre `max_timeout` e o que resta do ciclo (menos `reserve`)."""
+        available = self.remaining() - reserve
+        if max_timeout is not None: available = min(available, max_timeout)
+        return max(0.0, available)
+
+
+# --- Execução com Timeout ---
+# Threads de chamadas abandonadas terminam sozinhas quando o timeout do próprio SDK estoura,
+# por isso cada cliente (Binance/Gemini/Redis) também recebe timeout de rede.
+_CALL_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ext-call")
+
+def call_with_timeout(func, timeout: float, *args, call_name: str | None = None, **kwargs):
+    """
+    Executa `func(*args, **kwargs)` numa thread auxiliar e espera no máximo `timeout` segundos.
+
+    Returns:
+        O retorno de `func`.
+
+    Raises:
+        DeadlineExceeded: Se o tempo acabar (ou já tiver acabado) antes do retorno. A chamada é
+            cancelada se ainda não começou; se já começou, seu resultado é descartado.
+    """
+    name = call_name or getattr(func, '__name__', 'call')
+    if timeout <= 0:
+        metrics.inc("deadline_misses_total", call=name)
+        raise DeadlineExceeded(f"Sem tempo restante para '{name}'.")
+    future = _CALL_EXECUTOR.submit(func, *args, **kwargs)
+    try: return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel(); metrics.inc("deadline_misses_total", call=name)
+        logger.warning(f"Chamada '{name}' excedeu o timeout de {timeout:.1f}s e foi abandonada.")
+        raise DeadlineExceeded(f"'{name}' excedeu {timeout:.1f}s.") from None
+
+
+# --- Circuit Breaker ---
+class CircuitBreaker:
+    """
+    Disjuntor para APIs externas: após `failure_threshold` falhas seguidas passa a rejeitar chamadas
+    (aberto) por `reset_timeout` segundos; depois libera uma única chamada de teste (meio-aberto).
+    Sucesso no teste fecha o disjuntor; falha o reabre.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    _STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 60.0, clock=time.monotonic):
+        self.name = name; self.failure_threshold = max(1, failure_threshold); self.reset_timeout = reset_timeout; self._clock = clock
+        self._lock = threading.Lock(); self._state = self.CLOSED; self._failures = 0; self._opened_at = 0.0; self._probe_in_flight = False
+        metrics.set_gauge("circuit_state", self._STATE_GAUGE[self._state], breaker=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock: return self._state
+
+    def _set_state(self, state: str):
+        if state == self._state: return
+        logger.warning(f"Circuit breaker '{self.name}': {self._state} -> {state} (falhas seguidas: {self._failures}).")
+        self._state = state; metrics.set_gauge("circuit_state", self._STATE_GAUGE[state], breaker=self.name)
+        if state == self.OPEN: self._opened_at = self._clock(); metrics.inc("circuit_opens_total", breaker=self.name)
+
+    def allow(self) -> bool:
+        """True se a chamada pode seguir. Com o disjuntor aberto conta a rejeição e retorna False."""
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout: self._set_state(self.HALF_OPEN)
+            if self._state == self.CLOSED: return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight: self._probe_in_flight = True; return True
+        metrics.inc("circuit_rejections_total", breaker=self.name)
+        return False
+
+    def record_success(self):
+        with self._lock: self._failures = 0; self._probe_in_flight = False; self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1; probe_failed = self._state == self.HALF_OPEN; self._probe_in_flight = False
+            if probe_failed or self._failures >= self.failure_threshold: self._set_state(self.OPEN) # Teste falhou: reabre e reinicia a espera
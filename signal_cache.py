@@ -0,0 +1,104 @@
+# quantis_crypto_trader_gemini/signal_cache.py
+
+import hashlib
+import threading
+import time
+import logging
+from collections import OrderedDict
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- Quantização do Estado de Mercado ---
+# ('abs', passo): valor absoluto em buckets (ex: RSI de 2 em 2 pontos).
+# ('rel', passo): valor relativo ao preço de referência (ex: SMA 0.2% acima do preço).
+# Indicadores fora do mapa (ex: OBV, acumulado sem escala) não entram no fingerprint.
+DEFAULT_QUANTIZATION = {
+    'rsi': ('abs', 2.0), 'bbp': ('abs', 0.05),
+    'sma_fast': ('rel', 0.002), 'sma_slow': ('rel', 0.002), 'vwap': ('rel', 0.002),
+    'ichi_tenkan': ('rel', 0.002), 'ichi_kijun': ('rel', 0.002), 'ichi_senkou_a': ('rel', 0.002), 'ichi_senkou_b': ('rel', 0.002),
+    'bb_lower': ('rel', 0.002), 'bb_middle': ('rel', 0.002), 'bb_upper': ('rel', 0.002),
+    'macd_line': ('rel', 0.0002), 'macd_signal': ('rel', 0.0002), 'macd_hist': ('rel', 0.0002),
+    'atr': ('rel', 0.0005),
+}
+# TTL (s) por timeframe; a entrada vale pelo menor TTL entre os TFs presentes no fingerprint
+DEFAULT_TTL_BY_TIMEFRAME = {'1h': 3600, '15m': 900, '1m': 600}
+DEFAULT_TTL_SECONDS = 300
+
+def market_features(mta_indicators_data: dict, reference_price: float | None, quantization: dict = DEFAULT_QUANTIZATION) -> dict[str, float]:
+    """Indicadores normalizados {'tf:indicador': valor}: 'abs' como estão, 'rel' como desvio relativo ao preço de referência."""
+    features = {}
+    for tf_label in sorted(mta_indicators_data):
+        indicators = mta_indicators_data[tf_label] or {}
+        ref = reference_price or indicators.get('bb_middle') or indicators.get('sma_fast')
+        for key in sorted(indicators):
+            rule = quantization.get(key); value = indicators[key]
+            if rule is None or value is None: continue
+            if rule[0] == 'rel':
+                if not ref: continue
+                value = value / ref - 1.0
+            features[f"{tf_label}:{key}"] = float(value)
+    return features
+
+def quantize_market_state(mta_indicators_data: dict, reference_price: float | None, quantization: dict = DEFAULT_QUANTIZATION) -> tuple:
+    """Retorna uma tupla ordenada (tf, indicador, bucket) que ignora variações dentro de um mesmo bucket."""
+    items = []
+    for name, value in market_features(mta_indicators_data, reference_price, quantization).items():
+        tf_label, key = name.split(':', 1)
+        items.append((tf_label, key, int(value // quantization[key][1])))
+    return tuple(items)
+
+def market_fingerprint(symbol: str, mta_indicators_data: dict, reference_price: float | None, quantization: dict = DEFAULT_QUANTIZATION) -> str:
+    """Chave estável 'SYMBOL:hash' do estado de mercado quantizado (usada pelo cache e pelo registro de decisões)."""
+    state = quantize_market_state(mta_indicators_data, reference_price, quantization)
+    digest = hashlib.sha1(repr(state).encode('utf-8')).hexdigest()[:16]
+    return f"{symbol}:{digest}"
+
+class SignalCache:
+    """Cache em memória (LRU + TTL) de sinais Gemini, chaveado pelo estado de mercado quantizado."""
+    def __init__(self, max_entries: int = 512, ttl_by_timeframe: dict | None = None, quantization: dict | None = None):
+        self.max_entries = max_entries
+        self.ttl_by_timeframe = ttl_by_timeframe if ttl_by_timeframe is not None else dict(DEFAULT_TTL_BY_TIMEFRAME)
+        self.quantization = quantization if quantization is not None else DEFAULT_QUANTIZATION
+        self._entries: OrderedDict[str, tuple[float, tuple[str, str | None]]] = OrderedDict() # key -> (expira_em, (sinal, justificativa))
+        self._lock = threading.Lock()
+        self.hits = 0; self.misses = 0; self.saved_seconds = 0.0; self._avg_call_latency: float | None = None
+
+    def fingerprint(self, symbol: str, mta_indicators_data: dict, reference_price: float | None) -> str:
+        return market_fingerprint(symbol, mta_indicators_data, reference_price, self.quantization)
+
+    def ttl_for(self, mta_indicators_data: dict) -> float:
+        ttls = [self.ttl_by_timeframe.get(tf, DEFAULT_TTL_SECONDS) for tf, inds in mta_indicators_data.items() if inds]
+        return min(ttls) if ttls else DEFAULT_TTL_SECONDS
+
+    def get(self, key: str) -> tuple[str, str | None] | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key); self.hits += 1
+                saved = self._avg_call_latency or 0.0; self.saved_seconds += saved
+                result = entry[1]
+            else:
+                if entry is not None: del self._entries[key] # Expirada
+                self.misses += 1; result = None; saved = 0.0
+        if result is not None:
+            metrics.inc("gemini_cache_hits_total"); metrics.inc("gemini_cache_saved_seconds_total", saved)
+        else: metrics.inc("gemini_cache_misses_total")
+        metrics.set_gauge("gemini_cache_hit_rate", self.hit_rate)
+        return result
+
+    def put(self, key: str, result: tuple[str, str | None], ttl_seconds: float, call_latency: float | None = None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, result); self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+            if call_latency is not None: # Média móvel da latência real, usada p/ estimar o tempo poupado por hit
+                self._avg_call_latency = call_latency if self._avg_call_latency is None else 0.8 * self._avg_call_latency + 0.2 * call_latency
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hit_rate, 4), 'saved_seconds': round(self.saved_seconds, 2), 'entries': len(self._entries)}
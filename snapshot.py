@@ -0,0 +1,76 @@
+# quantis_crypto_trader_gemini/snapshot.py
+
+import os
+import pickle
+import time
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+class KlineRingBuffer:
+    """Janela fixa das últimas N velas de um TF, atualizada de forma incremental a partir do Redis."""
+    def __init__(self, capacity: int, df: pd.DataFrame | None = None):
+        self.capacity = capacity
+        self.df: pd.DataFrame | None = df.tail(capacity) if df is not None and not df.empty else None
+
+    @property
+    def last_ts_ms(self) -> int | None:
+        if self.df is None or self.df.empty: return None
+        return int(self.df.index[-1].timestamp() * 1000)
+
+    def refresh(self, redis_handler, symbol: str, interval: str) -> pd.DataFrame | None:
+        """
+        Atualiza a janela lendo do Redis só as velas posteriores à última conhecida.
+        Na primeira chamada (buffer vazio) faz a leitura completa das N últimas velas.
+        """
+        last_ts_ms = self.last_ts_ms
+        if last_ts_ms is None:
+            self.df = redis_handler.get_last_n_hist_klines(symbol, interval, self.capacity)
+            return self.df
+        now_ms = int(time.time() * 1000)
+        new_df = redis_handler.get_hist_klines_range(symbol, interval, last_ts_ms + 1, now_ms)
+        if new_df is not None and not new_df.empty:
+            merged = pd.concat([self.df, new_df])
+            merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+            self.df = merged.tail(self.capacity)
+            logger.debug(f"Buffer {symbol}/{interval}: +{len(new_df)} velas (total {len(self.df)}).")
+        return self.df
+
+
+def save_snapshot(path: str, state: dict) -> bool:
+    """Grava o snapshot de warm start de forma atômica (arquivo temporário + os.replace)."""
+    start = time.perf_counter()
+    payload = dict(state); payload['version'] = SNAPSHOT_VERSION; payload['saved_at_ms'] = int(time.time() * 1000)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f: pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        logger.info(f"Snapshot de warm start salvo em '{path}' ({(time.perf_counter() - start) * 1000:.1f} ms).")
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao salvar snapshot em '{path}'.", exc_info=True)
+        try: os.remove(tmp_path)
+        except OSError: pass
+        return False
+
+def load_snapshot(path: str, max_age_seconds: float | None = None) -> dict | None:
+    """
+    Carrega o snapshot de warm start. Retorna None se não existir, for de outra versão ou velho demais.
+    O arquivo é um pickle local escrito pelo próprio robô; não carregue snapshots de origem desconhecida.
+    """
+    if not os.path.exists(path): logger.info(f"Nenhum snapshot encontrado em '{path}'. Partida a frio."); return None
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f: state = pickle.load(f)
+    except Exception as e:
+        logger.error(f"Snapshot '{path}' ilegível. Ignorando.", exc_info=True); return None
+    if not isinstance(state, dict) or state.get('version') != SNAPSHOT_VERSION:
+        logger.warning(f"Snapshot '{path}' de versão incompatível. Ignorando."); return None
+    age_seconds = (time.time() * 1000 - state.get('saved_at_ms', 0)) / 1000
+    if max_age_seconds is not None and age_seconds > max_age_seconds:
+        logger.warning(f"Snapshot '{path}' tem {age_seconds:.0f}s (máx {max_age_seconds:.0f}s). Ignorando."); return None
+    logger.info(f"Snapshot carregado de '{path}' em {(time.perf_counter() - start) * 1000:.1f} ms (idade {age_seconds:.0f}s).")
+    return state
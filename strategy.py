@@ -1,17 +1,36 @@
 # quantis_crypto_trader_gemini/strategy.py
 
+from __future__ import annotations
 from redis_client import RedisHandler
-from binance_client import BinanceHandler
 from telegram_interface import send_telegram_message
+from quota import PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH
 import logging
+import numpy as np
+import pandas as pd
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from binance_client import BinanceHandler # Só para type hints; evita carregar o SDK da Binance no import
+    from execution import OrderExecutor
+    from portfolio import PortfolioEngine
 
 logger = logging.getLogger(__name__)
 
 class StrategyManager:
-    def __init__(self, redis_handler: RedisHandler, binance_handler: BinanceHandler):
-        """Inicializa o gerenciador de estratégia."""
+    def __init__(self, redis_handler: RedisHandler, binance_handler: BinanceHandler, order_executor: OrderExecutor | None = None, order_fill_timeout: float = 5.0,
+                 portfolio: PortfolioEngine | None = None, max_symbol_exposure: float | None = None, max_total_exposure: float | None = None):
+        """
+        Inicializa o gerenciador de estratégia (order_executor=None: execução simulada, só troca o estado da posição).
+        Com `portfolio` (alimentado pelos fills do order_executor), a posição atual, o tamanho da venda e os
+        limites de exposição vêm do PortfolioEngine em memória, sem I/O.
+        """
         self.redis_handler = redis_handler
         self.binance_handler = binance_handler
+        self.order_executor = order_executor
+        self.order_fill_timeout = order_fill_timeout
+        self.portfolio = portfolio
+        self.max_symbol_exposure = max_symbol_exposure
+        self.max_total_exposure = max_total_exposure
         self.base_asset = "BTC"
         self.quote_asset = "USDT"
         self.symbol = f"{self.base_asset}{self.quote_asset}"
@@ -25,24 +44,131 @@ class StrategyManager:
         self.filter_rsi_sell_threshold = 55.0 # Vender se RSI > 55
         self.filter_bbp_buy_threshold = 0.2  # Comprar se BBP < 0.2
         self.filter_bbp_sell_threshold = 0.8 # Vender se BBP > 0.8
+        # Margens p/ considerar o mercado "perto" dos limiares de compra (prioridade da chamada AI na cota)
+        self.near_sma_margin = 0.002 # SMA rápida até 0.2% abaixo da lenta
+        self.near_rsi_margin = 5.0
+        self.near_bbp_margin = 0.1
 
         logger.info(f"StrategyManager inicializado para {self.symbol}.")
         logger.info(f"  - Filtro Híbrido Ativo: AI + SMA_15m(30/60) + RSI_15m({self.filter_rsi_buy_threshold}/{self.filter_rsi_sell_threshold}) + BBP_15m({self.filter_bbp_buy_threshold}/{self.filter_bbp_sell_threshold})")
 
 
+    # --- Filtros Técnicos 15m (compartilhados pela decisão e pelo fallback técnico) ---
+    def _buy_filter_checks(self, sma_fast_15m: float, sma_slow_15m: float, rsi_15m: float, bbp_15m: float) -> tuple[bool, bool, bool]:
+        """CONDIÇÃO DE COMPRA: SMA Bullish, RSI não sobrecomprado, BBP baixo. Retorna (sma, rsi, bbp)."""
+        return sma_fast_15m > sma_slow_15m, rsi_15m < self.filter_rsi_buy_threshold, bbp_15m < self.filter_bbp_buy_threshold
+
+    def _sell_filter_checks(self, sma_fast_15m: float, sma_slow_15m: float, rsi_15m: float, bbp_15m: float) -> tuple[bool, bool, bool]:
+        """CONDIÇÃO DE VENDA: SMA Bearish, RSI não sobrevendido, BBP alto. Retorna (sma, rsi, bbp)."""
+        return sma_fast_15m < sma_slow_15m, rsi_15m > self.filter_rsi_sell_threshold, bbp_15m > self.filter_bbp_sell_threshold
+
+    def technical_signal(self,
+                         sma_fast_15m: float | None,
+                         sma_slow_15m: float | None,
+                         rsi_15m: float | None,
+                         bbp_15m: float | None) -> str | None:
+        """
+        Sinal puramente técnico com os mesmos filtros 15m da estratégia híbrida.
+        Usado como fallback quando o sinal da IA não chega dentro do deadline do ciclo.
+
+        Returns:
+            str | None: 'BUY', 'SELL', 'HOLD', ou None se faltar algum valor de filtro.
+        """
+        if any(v is None for v in [sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m]): return None
+        if all(self._buy_filter_checks(sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m)): return "BUY"
+        if all(self._sell_filter_checks(sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m)): return "SELL"
+        return "HOLD"
+
+    def ai_call_priority(self,
+                         sma_fast_15m: float | None,
+                         sma_slow_15m: float | None,
+                         rsi_15m: float | None,
+                         bbp_15m: float | None) -> int:
+        """
+        Prioridade da chamada AI no orçamento de cota do Gemini (quota.PRIORITY_*).
+        Alta se há posição aberta (um SELL pode ser executado); normal se os filtros de compra 15m estão
+        satisfeitos ou perto dos limiares (ou se faltam dados p/ avaliar); baixa caso contrário, pois
+        nem um BUY da AI passaria nos filtros.
+        """
+        if self._current_asset_held() == self.base_asset: return PRIORITY_HIGH
+        if any(v is None for v in [sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m]): return PRIORITY_NORMAL
+        near_buy = (sma_fast_15m > sma_slow_15m * (1 - self.near_sma_margin) and rsi_15m < self.filter_rsi_buy_threshold + self.near_rsi_margin
+                    and bbp_15m < self.filter_bbp_buy_threshold + self.near_bbp_margin)
+        return PRIORITY_NORMAL if near_buy else PRIORITY_LOW
+
+    def ai_call_needed(self,
+                       sma_fast_15m: float | None,
+                       sma_slow_15m: float | None,
+                       rsi_15m: float | None,
+                       bbp_15m: float | None) -> tuple[bool, str]:
+        """
+        Gate pré-AI: avalia os filtros 15m e a posição atual ANTES de chamar o Gemini, com as mesmas
+        regras de `decide_action`. Só vale chamar a AI se uma ação confirmada for possível: sem posição,
+        os filtros de COMPRA precisam passar; em posição, os de VENDA.
+
+        Returns:
+            tuple[bool, str]: (chamar a AI?, motivo).
+        """
+        if any(v is None for v in [sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m]): return False, "dados do filtro 15m ausentes (sinal AI seria ignorado)"
+        current_asset_held = self._current_asset_held() or self.quote_asset
+        if current_asset_held == self.quote_asset:
+            sma_ok, rsi_ok, bbp_ok = self._buy_filter_checks(sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m)
+            if sma_ok and rsi_ok and bbp_ok: return True, "sem posição e filtros de COMPRA 15m satisfeitos"
+            return False, f"sem posição e filtros de COMPRA não passam (SMA OK? {sma_ok}, RSI OK? {rsi_ok}, BBP OK? {bbp_ok})"
+        if current_asset_held == self.base_asset:
+            sma_ok, rsi_ok, bbp_ok = self._sell_filter_checks(sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m)
+            if sma_ok and rsi_ok and bbp_ok: return True, "em posição e filtros de VENDA 15m satisfeitos"
+            return False, f"em posição e filtros de VENDA não passam (SMA OK? {sma_ok}, RSI OK? {rsi_ok}, BBP OK? {bbp_ok})"
+        return True, f"estado de posição desconhecido ({current_asset_held})"
+
+    # --- Versão Vetorizada (backtest sobre histórico inteiro) ---
+    def decide_actions_vectorized(self, signal, sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m, start_in_position: bool = False) -> pd.DataFrame:
+        """
+        Aplica as regras de `decide_action` a uma série histórica inteira de uma vez.
+
+        Os candidatos de compra/venda são máscaras (sinal AI + os 3 filtros 15m); a posição sai do
+        forward-fill desses eventos (compra -> 1, venda -> 0), que reproduz o estado do Redis: um BUY
+        em posição ou um SELL fora dela não muda nada. Assume saldo suficiente em toda ordem
+        (o caminho escalar cancela a ordem se o saldo da Binance for baixo).
+
+        Args:
+            signal: Sinais AI por vela ('BUY'/'SELL'/'HOLD'/None).
+            sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m: Arrays/Series alinhados ao sinal (NaN/None = dado ausente).
+            start_in_position (bool): Se a série começa com o ativo base em carteira.
+
+        Returns:
+            pd.DataFrame: 'Decision' ('BUY'/'SELL'/'HOLD'), 'Signal' (1 entrada, -1 saída, 0 nada) e
+            'Position' (True se em posição após a vela), com o index do `signal` se for Series.
+        """
+        index = signal.index if isinstance(signal, pd.Series) else None
+        signal_arr = np.asarray(pd.Series(signal, dtype=object).fillna(''), dtype=str)
+        sma_f, sma_s, rsi, bbp = (np.asarray(pd.to_numeric(pd.Series(np.asarray(v, dtype=object)), errors='coerce'), dtype=float) for v in (sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m))
+        filter_data_ok = ~(np.isnan(sma_f) | np.isnan(sma_s) | np.isnan(rsi) | np.isnan(bbp)) # Sem dados: sinal AI ignorado
+        with np.errstate(invalid='ignore'):
+            buy_candidate = filter_data_ok & (signal_arr == 'BUY') & np.logical_and.reduce(self._buy_filter_checks(sma_f, sma_s, rsi, bbp))
+            sell_candidate = filter_data_ok & (signal_arr == 'SELL') & np.logical_and.reduce(self._sell_filter_checks(sma_f, sma_s, rsi, bbp))
+        events = pd.Series(np.where(buy_candidate, 1.0, np.where(sell_candidate, 0.0, np.nan)))
+        position = events.ffill().fillna(1.0 if start_in_position else 0.0).to_numpy().astype(bool)
+        previous = np.concatenate(([start_in_position], position[:-1]))
+        entries = position & ~previous; exits = ~position & previous
+        result = pd.DataFrame({'Decision': np.where(entries, 'BUY', np.where(exits, 'SELL', 'HOLD')), 'Signal': entries.astype(np.int8) - exits.astype(np.int8), 'Position': position})
+        if index is not None: result.index = index
+        return result
+
     # *** FUNÇÃO DECIDE_ACTION MODIFICADA PARA MULTI-FILTRO 15m ***
     def decide_action(self,
                       signal: str | None,
                       sma_fast_15m: float | None = None, # Recebe SMA rápida de 15m
                       sma_slow_15m: float | None = None, # Recebe SMA lenta de 15m
                       rsi_15m: float | None = None,      # Recebe RSI de 15m
-                      bbp_15m: float | None = None):     # Recebe BBP de 15m
+                      bbp_15m: float | None = None,      # Recebe BBP de 15m
+                      signal_source: str = "AI"):        # "AI" ou "TECNICO" (fallback por deadline)
         """
         Decide qual ação tomar com base no sinal da IA e múltiplos filtros técnicos de 15m.
         Simula ordens.
         """
         logger.info(f"--- Iniciando decisão de estratégia HÍBRIDA MULTI-FILTRO para {self.symbol} ---")
-        logger.info(f"Sinal AI recebido: {signal}")
+        logger.info(f"Sinal {signal_source} recebido: {signal}")
 
         # Verifica se temos todos os dados do filtro
         filter_data_ok = all(v is not None for v in [sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m])
@@ -54,7 +180,7 @@ class StrategyManager:
             logger.warning("Sinal da IA ignorado devido à falta de dados para o filtro técnico.")
 
         # Obtém o estado atual da posição
-        current_asset_held = self.redis_handler.get_state(self.position_state_key)
+        current_asset_held = self._current_asset_held()
         if current_asset_held is None:
             logger.info(f"Nenhum estado de posição encontrado. Assumindo {self.quote_asset}.")
             current_asset_held = self.quote_asset
@@ -69,9 +195,7 @@ class StrategyManager:
             logger.info("Sinal AI é BUY. Verificando filtros técnicos 15m...")
             if filter_data_ok:
                 # CONDIÇÃO DE COMPRA: SMA Bullish E RSI não sobrecomprado E BBP baixo
-                sma_confirm = sma_fast_15m > sma_slow_15m
-                rsi_confirm = rsi_15m < self.filter_rsi_buy_threshold
-                bbp_confirm = bbp_15m < self.filter_bbp_buy_threshold
+                sma_confirm, rsi_confirm, bbp_confirm = self._buy_filter_checks(sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m)
                 logger.info(f"Filtro BUY: SMA OK? {sma_confirm}, RSI OK? {rsi_confirm}, BBP OK? {bbp_confirm}")
 
                 if sma_confirm and rsi_confirm and bbp_confirm:
@@ -85,9 +209,7 @@ class StrategyManager:
             logger.info(f"Sinal AI é SELL. Verificando filtros técnicos 15m...")
             if filter_data_ok:
                  # CONDIÇÃO DE VENDA: SMA Bearish E RSI não sobrevendido E BBP alto
-                sma_confirm = sma_fast_15m < sma_slow_15m
-                rsi_confirm = rsi_15m > self.filter_rsi_sell_threshold
-                bbp_confirm = bbp_15m > self.filter_bbp_sell_threshold
+                sma_confirm, rsi_confirm, bbp_confirm = self._sell_filter_checks(sma_fast_15m, sma_slow_15m, rsi_15m, bbp_15m)
                 logger.info(f"Filtro SELL: SMA OK? {sma_confirm}, RSI OK? {rsi_confirm}, BBP OK? {bbp_confirm}")
 
                 if sma_confirm and rsi_confirm and bbp_confirm:
@@ -105,31 +227,42 @@ class StrategyManager:
              logger.info(f"Nenhuma ação necessária (Sinal AI: {signal}, Posição: {current_asset_held}).")
              final_decision = "HOLD"
 
-        # --- Execução da Ação (Simulada) ---
+        # --- Execução da Ação (simulada, ou via OrderExecutor se configurado) ---
+        decision_t = self.order_executor.now() if self.order_executor is not None else None # Início da latência decisão -> ack
         logger.info(f"Decisão Final da Estratégia Híbrida (AI+MultiFiltro): {final_decision}")
         try:
             if final_decision == "BUY":
-                logger.info(f"Ação: Executando COMPRA simulada de {self.base_asset}...")
-                quote_balance = self.binance_handler.get_asset_balance(self.quote_asset)
+                logger.info(f"Ação: Executando COMPRA {'simulada ' if self.order_executor is None else ''}de {self.base_asset}...")
+                quote_balance = self._balance_source().get_asset_balance(self.quote_asset)
                 if quote_balance is not None and quote_balance >= self.min_quote_balance_to_buy:
                     order_size_quote = quote_balance * self.risk_percentage
-                    logger.info(f"SIMULANDO ORDEM COMPRA mercado {self.symbol} (aprox {order_size_quote:.2f} {self.quote_asset}).")
-                    self.redis_handler.set_state(self.position_state_key, self.base_asset)
-                    message = f"✅ Ação Simulada ({self.symbol}):\nCOMPRA (AI+Filtros) (usando {order_size_quote:.2f} {self.quote_asset}).\nPosição: {self.base_asset}"
-                    send_telegram_message(message)
+                    exposure_ok, exposure_reason = self.portfolio.can_open(self.symbol, order_size_quote, self.max_symbol_exposure, self.max_total_exposure) if self.portfolio is not None else (True, "")
+                    if not exposure_ok:
+                        logger.warning(f"Compra bloqueada pelo limite de exposição: {exposure_reason}.")
+                        send_telegram_message(f"⚠️ Alerta ({self.symbol}): Sinal COMPRA confirmado, mas bloqueado pelo risco ({exposure_reason}).", disable_notification=True)
+                    elif self.order_executor is not None:
+                        self._execute_order("BUY", signal_source, decision_t, quote_quantity=round(order_size_quote, 2))
+                    else:
+                        logger.info(f"SIMULANDO ORDEM COMPRA mercado {self.symbol} (aprox {order_size_quote:.2f} {self.quote_asset}).")
+                        self.redis_handler.set_state(self.position_state_key, self.base_asset)
+                        message = f"✅ Ação Simulada ({self.symbol}):\nCOMPRA ({signal_source}+Filtros) (usando {order_size_quote:.2f} {self.quote_asset}).\nPosição: {self.base_asset}"
+                        send_telegram_message(message)
                 else:
                     logger.warning(f"Saldo {self.quote_asset} ({quote_balance}) insuficiente. Compra cancelada.")
                     send_telegram_message(f"⚠️ Alerta ({self.symbol}): Sinal COMPRA confirmado, mas saldo {self.quote_asset} baixo ({quote_balance}).", disable_notification=True)
 
             elif final_decision == "SELL":
-                logger.info(f"Ação: Executando VENDA simulada de {self.base_asset}...")
-                base_balance = self.binance_handler.get_asset_balance(self.base_asset)
+                logger.info(f"Ação: Executando VENDA {'simulada ' if self.order_executor is None else ''}de {self.base_asset}...")
+                base_balance = self.portfolio.position(self.symbol)['qty'] if self.portfolio is not None else self._balance_source().get_asset_balance(self.base_asset)
                 if base_balance is not None and base_balance >= self.min_base_balance_to_sell:
                     order_size_base = base_balance
-                    logger.info(f"SIMULANDO ORDEM VENDA mercado {self.symbol} de {order_size_base:.8f} {self.base_asset}.")
-                    self.redis_handler.set_state(self.position_state_key, self.quote_asset)
-                    message = f"💰 Ação Simulada ({self.symbol}):\nVENDA (AI+Filtros) ({order_size_base:.8f} {self.base_asset}).\nPosição: {self.quote_asset}"
-                    send_telegram_message(message)
+                    if self.order_executor is not None:
+                        self._execute_order("SELL", signal_source, decision_t, quantity=order_size_base)
+                    else:
+                        logger.info(f"SIMULANDO ORDEM VENDA mercado {self.symbol} de {order_size_base:.8f} {self.base_asset}.")
+                        self.redis_handler.set_state(self.position_state_key, self.quote_asset)
+                        message = f"💰 Ação Simulada ({self.symbol}):\nVENDA ({signal_source}+Filtros) ({order_size_base:.8f} {self.base_asset}).\nPosição: {self.quote_asset}"
+                        send_telegram_message(message)
                 else:
                     logger.warning(f"Saldo {self.base_asset} ({base_balance}) insuficiente. Venda cancelada.")
                     send_telegram_message(f"⚠️ Alerta ({self.symbol}): Sinal VENDA confirmado, mas saldo {self.base_asset} baixo ({base_balance}).", disable_notification=True)
@@ -141,4 +274,33 @@ class StrategyManager:
             logger.error("Erro inesperado durante execução da ação da estratégia.", exc_info=True)
             send_telegram_message(f"ERRO ESTRATEGIA ({self.symbol}): Falha executar ação {final_decision}.\nErro: {str(e)[:100]}", disable_notification=False)
 
-        logger.info(f"--- Decisão de estratégia HÍBRIDA MULTI-FILTRO concluída ---")
\ No newline at end of file
+        logger.info(f"--- Decisão de estratégia HÍBRIDA MULTI-FILTRO concluída ---")
+
+    def _current_asset_held(self) -> str | None:
+        """Ativo em posição: do PortfolioEngine em memória se houver, senão do estado legado no Redis."""
+        if self.portfolio is not None: return self.portfolio.asset_held(self.symbol)
+        return self.redis_handler.get_state(self.position_state_key)
+
+    # --- Execução Real/Paper (OrderExecutor) ---
+    def _balance_source(self):
+        """Saldos vêm do venue do executor (Binance ou simulador paper); sem executor, do BinanceHandler."""
+        return self.order_executor.venue if self.order_executor is not None else self.binance_handler
+
+    def _execute_order(self, side: str, signal_source: str, decision_t: float | None, quantity: float | None = None, quote_quantity: float | None = None) -> bool:
+        """Envia a ordem a mercado, espera o fill e só então troca o estado da posição. Retorna True se executou."""
+        executor = self.order_executor
+        order = executor.market_order(self.symbol, side, quantity=quantity, quote_quantity=quote_quantity, decision_t=decision_t)
+        if order is None or order.status == "REJECTED":
+            reason = order.reject_reason if order is not None else "quantidade inválida"
+            logger.error(f"Ordem {side} {self.symbol} não executada: {reason}")
+            send_telegram_message(f"❌ Ordem {side} ({self.symbol}) recusada: {str(reason)[:200]}", disable_notification=False); return False
+        order = executor.wait_for_fill(order.client_order_id, self.order_fill_timeout) or order
+        if order.executed_qty <= 0:
+            logger.warning(f"Ordem {order.client_order_id} sem execução após {self.order_fill_timeout:.1f}s (status {order.status}). Posição mantida.")
+            send_telegram_message(f"⚠️ Ordem {side} ({self.symbol}) sem execução (status {order.status}, id {order.client_order_id}).", disable_notification=False); return False
+        new_asset = self.base_asset if side == "BUY" else self.quote_asset
+        self.redis_handler.set_state(self.position_state_key, new_asset)
+        latency_str = f"{order.ack_latency * 1000:.0f} ms" if order.ack_latency is not None else "n/d"
+        icon = "✅" if side == "BUY" else "💰"
+        send_telegram_message(f"{icon} Ordem Executada ({self.symbol}):\n{'COMPRA' if side == 'BUY' else 'VENDA'} ({signal_source}+Filtros) {order.executed_qty:.8f} {self.base_asset} @ {order.avg_price:.2f} ({order.status}).\nLatência decisão->ack: {latency_str}\nPosição: {new_asset}")
+        return True
\ No newline at end of file
@@ -0,0 +1,67 @@
+# quantis_crypto_trader_gemini/strategy_parity.py
+
+# Confere que StrategyManager.decide_actions_vectorized reproduz decide_action vela a vela (séries longas; o CI roda
+# a mesma checagem com poucas velas em tests/test_strategy_parity.py).
+# Uso:
+#   python strategy_parity.py                  # 20k velas sintéticas, seed 42
+#   python strategy_parity.py --candles 200000 --seed 7
+# Sai com código 1 se alguma vela divergir.
+
+import argparse
+import logging
+import sys
+import time
+import numpy as np
+import config
+from strategy import StrategyManager
+
+class _MemoryState:
+    """Estado de posição em memória no lugar do Redis (mesma interface usada pelo StrategyManager)."""
+    def __init__(self): self.state = {}
+    def get_state(self, key: str): return self.state.get(key)
+    def set_state(self, key: str, value: str): self.state[key] = value; return True
+
+class _AmpleBalance:
+    """Saldo sempre suficiente: a versão vetorizada assume que toda ordem confirmada é executada."""
+    def get_asset_balance(self, asset: str): return 1e12
+
+def synthetic_inputs(candles: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    signal = rng.choice(np.array(['BUY', 'SELL', 'HOLD', None], dtype=object), size=candles, p=[0.3, 0.3, 0.3, 0.1])
+    sma_slow = 100 + rng.normal(0, 1, candles).cumsum(); sma_fast = sma_slow + rng.normal(0, 0.5, candles)
+    rsi = rng.uniform(10, 90, candles); bbp = rng.uniform(-0.3, 1.3, candles)
+    for arr in (sma_fast, rsi, bbp): arr[rng.random(candles) < 0.02] = np.nan # Falhas de cálculo de indicador
+    return {'signal': signal, 'sma_fast_15m': sma_fast, 'sma_slow_15m': sma_slow, 'rsi_15m': rsi, 'bbp_15m': bbp}
+
+def run_scalar(manager: StrategyManager, inputs: dict) -> np.ndarray:
+    positions = np.zeros(len(inputs['signal']), dtype=bool)
+    for i in range(len(positions)):
+        values = [None if isinstance(v, float) and np.isnan(v) else v for v in (float(inputs[k][i]) for k in ('sma_fast_15m', 'sma_slow_15m', 'rsi_15m', 'bbp_15m'))]
+        manager.decide_action(inputs['signal'][i], *values)
+        positions[i] = manager.redis_handler.get_state(manager.position_state_key) == manager.base_asset
+    return positions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Paridade decide_action (escalar) x decide_actions_vectorized.")
+    parser.add_argument("--candles", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    config.TELEGRAM_BOT_TOKEN = None # Nenhuma notificação real durante a checagem
+    logging.disable(logging.CRITICAL) # decide_action loga várias linhas por vela
+    inputs = synthetic_inputs(args.candles, args.seed)
+    manager = StrategyManager(redis_handler=_MemoryState(), binance_handler=_AmpleBalance())
+
+    start = time.perf_counter(); scalar_positions = run_scalar(manager, inputs); scalar_s = time.perf_counter() - start
+    start = time.perf_counter(); vectorized = manager.decide_actions_vectorized(**inputs); vector_s = time.perf_counter() - start
+    logging.disable(logging.NOTSET)
+
+    mismatches = np.flatnonzero(scalar_positions != vectorized['Position'].to_numpy())
+    print(f"{args.candles} velas | escalar {scalar_s:.2f}s | vetorizado {vector_s * 1000:.1f} ms ({scalar_s / max(vector_s, 1e-9):.0f}x)")
+    print(f"Entradas: {(vectorized['Signal'] == 1).sum()} | Saídas: {(vectorized['Signal'] == -1).sum()}")
+    if len(mismatches):
+        print(f"DIVERGÊNCIA em {len(mismatches)} velas; primeira no índice {mismatches[0]}."); return 1
+    print("Paridade OK."); return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# quantis_crypto_trader_gemini/stub_model_server.py
+
+# Servidor local que imita o modelo Gemini, para testes/desenvolvimento sem API: responde por socket TCP (uma linha
+# JSON por conexão) com atraso e falhas configuráveis e conta a concorrência observada. StubModelClient tem a
+# interface usada pelo GeminiAnalyzer (generate_content / generate_content_async) e entra pelo parâmetro `model=`.
+# Uso:
+#   with StubModelServer(delay=0.2) as server:
+#       analyzer = AsyncGeminiAnalyzer(api_key="stub", model=StubModelClient(server.address))
+
+import asyncio
+import json
+import logging
+import socket
+import socketserver
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLY = "BUY\nResposta do modelo stub."
+
+# --- Servidor ---
+class _StubHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server: 'StubModelServer' = self.server.stub
+        line = self.rfile.readline()
+        if not line: return
+        request = json.loads(line)
+        server._enter()
+        try:
+            if server.delay > 0: time.sleep(server.delay)
+            if server.fail: payload = {'error': 'stub: falha simulada'}
+            else: payload = {'text': server.reply, 'prompt_tokens': len(request.get('prompt', '')) // 4, 'response_tokens': len(server.reply) // 4}
+        finally: server._leave()
+        try: self.wfile.write((json.dumps(payload) + "\n").encode('utf-8'))
+        except OSError: pass # Cliente já desistiu (timeout)
+
+
+class StubModelServer:
+    """
+    Modelo falso em 127.0.0.1 (porta livre). `delay` (s), `fail` e `reply` podem ser trocados a qualquer momento;
+    `requests`, `in_flight` e `max_in_flight` registram o que chegou ao servidor.
+    """
+    def __init__(self, delay: float = 0.0, fail: bool = False, reply: str = DEFAULT_REPLY, host: str = "127.0.0.1", port: int = 0):
+        self.delay = delay; self.fail = fail; self.reply = reply
+        self._lock = threading.Lock(); self.requests = 0; self.in_flight = 0; self.max_in_flight = 0
+        self._server = socketserver.ThreadingTCPServer((host, port), _StubHandler, bind_and_activate=True)
+        self._server.daemon_threads = True; self._server.stub = self; self._thread: threading.Thread | None = None
+
+    @property
+    def address(self) -> tuple[str, int]: return self._server.server_address[:2]
+
+    def _enter(self):
+        with self._lock: self.requests += 1; self.in_flight += 1; self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _leave(self):
+        with self._lock: self.in_flight -= 1
+
+    def start(self) -> 'StubModelServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-model-server", daemon=True); self._thread.start()
+        logger.info(f"Servidor de modelo stub em {self.address[0]}:{self.address[1]}.")
+        return self
+
+    def stop(self):
+        self._server.shutdown(); self._server.server_close()
+        if self._thread is not None: self._thread.join(timeout=5)
+
+    def __enter__(self) -> 'StubModelServer': return self.start()
+    def __exit__(self, *exc): self.stop()
+
+
+# --- Cliente (modelo injetável no GeminiAnalyzer) ---
+class _Part:
+    def __init__(self, text: str): self.text = text
+
+class _Usage:
+    def __init__(self, prompt_tokens: int, response_tokens: int):
+        self.prompt_token_count = prompt_tokens; self.candidates_token_count = response_tokens; self.total_token_count = prompt_tokens + response_tokens
+
+class StubResponse:
+    """Mesmos atributos lidos pelo GeminiAnalyzer na resposta do SDK: parts[].text, usage_metadata e prompt_feedback."""
+    def __init__(self, payload: dict):
+        self.parts = [_Part(payload['text'])]; self.usage_metadata = _Usage(payload['prompt_tokens'], payload['response_tokens']); self.prompt_feedback = None
+
+
+class StubModelClient:
+    """Fala com o StubModelServer pelo socket; erros do servidor viram RuntimeError (como uma exceção da API)."""
+    def __init__(self, address: tuple[str, int]): self.address = tuple(address)
+
+    @staticmethod
+    def _response(raw: bytes) -> StubResponse:
+        if not raw: raise RuntimeError("stub: conexão encerrada sem resposta")
+        payload = json.loads(raw)
+        if 'error' in payload: raise RuntimeError(payload['error'])
+        return StubResponse(payload)
+
+    def generate_content(self, prompt: str, generation_config: dict | None = None, request_options: dict | None = None) -> StubResponse:
+        timeout = (request_options or {}).get('timeout')
+        with socket.create_connection(self.address, timeout=timeout) as sock, sock.makefile('rwb') as stream:
+            stream.write((json.dumps({'prompt': prompt}) + "\n").encode('utf-8')); stream.flush()
+            return self._response(stream.readline())
+
+    async def generate_content_async(self, prompt: str, generation_config: dict | None = None, request_options: dict | None = None) -> StubResponse:
+        reader, writer = await asyncio.open_connection(*self.address)
+        try:
+            writer.write((json.dumps({'prompt': prompt}) + "\n").encode('utf-8')); await writer.drain()
+            return self._response(await reader.readline())
+        finally: writer.close()
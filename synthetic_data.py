@@ -0,0 +1,73 @@
+# quantis_crypto_trader_gemini/synthetic_data.py
+
+# Velas OHLCV sintéticas e reprodutíveis (mesma seed = mesmas velas) para benchmarks e execuções offline:
+# GBM cujo drift/volatilidade trocam de regime em blocos de duração aleatória, no formato do histórico Redis
+# (index 'Open time', colunas Open/High/Low/Close/Volume/Close time).
+
+import numpy as np
+import pandas as pd
+import resampler
+
+# --- Regimes de Volatilidade ---
+# nome -> (drift anual, volatilidade anual, peso no sorteio). Valores na ordem de grandeza do BTC.
+REGIMES = {
+    'calmo': (0.10, 0.35, 0.35),
+    'normal': (0.05, 0.65, 0.45),
+    'volatil': (-0.30, 1.40, 0.20),
+}
+REGIME_MEAN_DURATION = "5D" # Duração média de um regime (geométrica), em tempo de mercado
+WEEK_MS = 7 * 86_400_000
+YEAR_MS = 365 * 86_400_000 # Cripto negocia 24/7
+
+def interval_ms(interval: str) -> int:
+    """Duração de uma vela (intervalos fixos do resampler + '1w'; '1M' não tem duração fixa e não é suportado)."""
+    if interval in resampler.FIXED_INTERVAL_MS: return resampler.FIXED_INTERVAL_MS[interval]
+    if interval == "1w": return WEEK_MS
+    raise ValueError(f"Intervalo não suportado para dados sintéticos: {interval}")
+
+def regime_path(candles: int, interval: str, rng: np.random.Generator, mean_duration: str = REGIME_MEAN_DURATION) -> np.ndarray:
+    """Índice do regime (posição em REGIMES) de cada vela: blocos com duração geométrica, regime sorteado pelos pesos."""
+    p_switch = min(1.0, interval_ms(interval) / (pd.Timedelta(mean_duration).value // 10**6))
+    lengths = []; total = 0
+    while total < candles: # Blocos em lotes: poucos sorteios mesmo para milhões de velas
+        batch = rng.geometric(p_switch, size=max(16, int((candles - total) * p_switch * 1.2) + 1)); lengths.append(batch); total += int(batch.sum())
+    lengths = np.concatenate(lengths)
+    weights = np.array([spec[2] for spec in REGIMES.values()]); regimes = rng.choice(len(REGIMES), size=len(lengths), p=weights / weights.sum())
+    return np.repeat(regimes, lengths)[:candles]
+
+def generate_ohlcv(candles: int, interval: str = "1m", start: str = "2024-01-01", seed: int = 42, start_price: float = 30_000.0,
+                   mean_duration: str = REGIME_MEAN_DURATION) -> pd.DataFrame:
+    """
+    `candles` velas de `interval` a partir de `start` (UTC naive, como o histórico Redis).
+
+    Close segue um GBM com drift/volatilidade do regime de cada vela; Open é o Close anterior; High/Low se afastam
+    de max/min(Open, Close) por |N(0, σ√dt)|/2; o volume cresce com a volatilidade do regime. Close time segue a
+    convenção da Binance (Open time + intervalo - 1 ms).
+    """
+    rng = np.random.default_rng(seed); step_ms = interval_ms(interval); dt = step_ms / YEAR_MS
+    regimes = regime_path(candles, interval, rng, mean_duration)
+    drift = np.array([spec[0] for spec in REGIMES.values()])[regimes]; vol = np.array([spec[1] for spec in REGIMES.values()])[regimes]
+    sigma = vol * np.sqrt(dt)
+    close = start_price * np.exp(np.cumsum((drift - 0.5 * vol ** 2) * dt + sigma * rng.standard_normal(candles)))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.standard_normal(candles)) * sigma * 0.5)
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.standard_normal(candles)) * sigma * 0.5)
+    volume = rng.lognormal(mean=0.0, sigma=0.5, size=candles) * (vol / vol.mean()) * 10.0 * (step_ms / 60_000)
+    index = pd.DatetimeIndex(pd.Timestamp(start) + pd.to_timedelta(np.arange(candles, dtype=np.int64) * step_ms, unit='ms'), name='Open time')
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume, 'Close time': index + pd.Timedelta(milliseconds=step_ms - 1)}, index=index)
+
+def generate_mta_history(minutes: int, intervals_to_build, start: str = "2024-01-01", seed: int = 42, start_price: float = 30_000.0) -> dict[str, pd.DataFrame]:
+    """Velas 1m sintéticas + os demais intervalos agregados delas pelo resampler (TFs consistentes entre si, como no live com DERIVE_TIMEFRAMES_FROM_1M)."""
+    klines_1m = generate_ohlcv(minutes, "1m", start=start, seed=seed, start_price=start_price)
+    return {interval: klines_1m if interval == "1m" else resampler.resample_ohlcv(klines_1m, interval) for interval in intervals_to_build}
+
+# --- Redis em Memória ---
+def fake_redis_handler():
+    """RedisHandler sobre fakeredis (mesmos comandos, sem servidor). fakeredis é dependência só de benchmarks/testes."""
+    import fakeredis
+    from redis_client import RedisHandler
+    return RedisHandler(host="fakeredis", port=0, db=0, client=fakeredis.FakeRedis())
+
+def load_history(redis_handler, symbol: str, frames: dict[str, pd.DataFrame], chunk_size: int = 50_000) -> int:
+    """Grava os DataFrames (intervalo -> velas) no histórico do RedisHandler; retorna o total de velas gravadas."""
+    return sum(redis_handler.add_klines_to_hist(symbol, interval, df, chunk_size=chunk_size) for interval, df in frames.items())
@@ -3,6 +3,7 @@
 import requests
 import config # Para pegar o Token e Chat ID
 import logging
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -10,10 +11,20 @@ TELEGRAM_API_URL = "https://api.telegram.org/bot{token}/{method}"
 
 # Removida a função escape_markdown_v2
 
+# --- Destino Alternativo (replay/testes) ---
+_message_sink = None # callable(texto, disable_notification); quando definido, nenhuma mensagem vai para a API
+
+def set_message_sink(sink):
+    """Redireciona as mensagens para `sink(texto, disable_notification)` (None volta para a API). Retorna o destino anterior."""
+    global _message_sink
+    previous = _message_sink; _message_sink = sink
+    return previous
+
 def send_telegram_message(message_text: str, disable_notification: bool = False):
     """
     Envia uma mensagem de texto simples para o Chat ID configurado via Telegram Bot API.
     """
+    if _message_sink is not None: _message_sink(message_text, disable_notification); return True
     bot_token = config.TELEGRAM_BOT_TOKEN
     chat_id = config.TELEGRAM_CHAT_ID
 
@@ -41,8 +52,9 @@ def send_telegram_message(message_text: str, disable_notification: bool = False)
     logger.debug(f"Enviando mensagem Telegram (simples) para Chat ID {chat_id}: '{message_text[:70]}...'")
 
     try:
-        response = requests.post(url, data=payload, timeout=10)
-        response.raise_for_status() # Levanta erro para status HTTP 4xx/5xx
+        with metrics.span("telegram_send"), metrics.api_call("telegram", "sendMessage"):
+            response = requests.post(url, data=payload, timeout=10)
+            response.raise_for_status() # Levanta erro para status HTTP 4xx/5xx
 
         response_json = response.json()
         if response_json.get("ok"):
@@ -51,6 +63,7 @@ def send_telegram_message(message_text: str, disable_notification: bool = False)
         else:
             error_desc = response_json.get('description', 'Sem descrição')
             error_code = response_json.get('error_code', 'N/A')
+            metrics.inc("api_errors_total", service="telegram", endpoint="sendMessage")
             logger.error(f"Erro da API Telegram ao enviar mensagem: Código {error_code} - {error_desc}")
             logger.debug(f"Payload que causou erro: {payload}") # Log do payload ajuda a depurar 400
             return False
@@ -0,0 +1,6 @@
+# quantis_crypto_trader_gemini/tests/conftest.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Módulos do projeto ficam na raiz (layout plano)
@@ -0,0 +1,90 @@
+# quantis_crypto_trader_gemini/tests/test_async_gemini.py
+
+# AsyncGeminiAnalyzer contra o servidor de modelo stub (stub_model_server.py), por socket local: limite de
+# concorrência, timeout por requisição e ciclo do circuit breaker (aberto -> meio-aberto -> fechado).
+
+import asyncio
+import pytest
+import config
+from gemini_analyzer import AsyncGeminiAnalyzer
+from resilience import CircuitBreaker
+from stub_model_server import StubModelClient, StubModelServer
+
+MTA = {'1h': {'sma_fast': 100.0, 'sma_slow': 99.0, 'rsi': 55.0}, '15m': {'sma_fast': 101.0, 'sma_slow': 100.5, 'rsi': 48.0, 'bbp': 0.4}, '1m': {'rsi': 51.0}}
+
+class FakeClock:
+    def __init__(self): self.now = 1000.0
+    def __call__(self) -> float: return self.now
+
+@pytest.fixture(autouse=True)
+def no_database_logs(monkeypatch):
+    monkeypatch.setattr(config, 'GEMINI_CALL_LOG_ENABLED', False); monkeypatch.setattr(config, 'GEMINI_DECISION_LOG_ENABLED', False)
+
+@pytest.fixture
+def server():
+    with StubModelServer() as stub: yield stub
+
+def make_analyzer(server: StubModelServer, max_concurrency: int = 4, failure_threshold: int = 3, reset_timeout: float = 30.0, clock=None) -> AsyncGeminiAnalyzer:
+    breaker = CircuitBreaker("gemini-test", failure_threshold=failure_threshold, reset_timeout=reset_timeout, clock=clock or FakeClock())
+    return AsyncGeminiAnalyzer(api_key="stub", model=StubModelClient(server.address), circuit_breaker=breaker, max_concurrency=max_concurrency, prompt_style='compact')
+
+def basket(n: int) -> dict:
+    return {f"SYM{i}USDT": (MTA, 100.0 + i) for i in range(n)}
+
+def test_concurrency_cap_is_never_exceeded(server):
+    server.delay = 0.1
+    analyzer = make_analyzer(server, max_concurrency=3)
+    signals = analyzer.get_trade_signals(basket(10), request_timeout=5.0)
+    assert server.requests == 10
+    assert server.max_in_flight <= 3
+    assert server.max_in_flight == 3 # Houve paralelismo de fato
+    assert all(signal == ("BUY", "Resposta do modelo stub.") for signal in signals.values())
+
+def test_request_timeout_returns_none_and_counts_as_breaker_failure(server):
+    server.delay = 1.0
+    analyzer = make_analyzer(server, failure_threshold=5)
+    result = asyncio.run(analyzer.get_trade_signal_async(MTA, "BTCUSDT", 100.0, request_timeout=0.1))
+    assert result == (None, None)
+    assert analyzer.circuit_breaker._failures == 1
+    assert analyzer.circuit_breaker.state == CircuitBreaker.CLOSED
+
+def test_breaker_opens_after_n_failures(server):
+    server.fail = True
+    analyzer = make_analyzer(server, failure_threshold=3)
+    for _ in range(3): assert asyncio.run(analyzer.get_trade_signal_async(MTA, "BTCUSDT", 100.0, request_timeout=2.0)) == (None, None)
+    assert analyzer.circuit_breaker.state == CircuitBreaker.OPEN
+    server.fail = False # Mesmo com o modelo de volta, o disjuntor aberto não deixa a chamada sair
+    assert asyncio.run(analyzer.get_trade_signal_async(MTA, "BTCUSDT", 100.0, request_timeout=2.0)) == (None, None)
+    assert server.requests == 3
+
+def test_half_open_allows_single_probe_and_closes_on_success(server):
+    clock = FakeClock(); server.fail = True
+    analyzer = make_analyzer(server, max_concurrency=4, failure_threshold=2, reset_timeout=30.0, clock=clock)
+    for _ in range(2): asyncio.run(analyzer.get_trade_signal_async(MTA, "BTCUSDT", 100.0, request_timeout=2.0))
+    assert analyzer.circuit_breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 10.0 # Antes do reset: continua rejeitando
+    assert analyzer.get_trade_signals(basket(2), request_timeout=2.0) == {symbol: (None, None) for symbol in basket(2)}
+    assert server.requests == 2
+
+    clock.now += 25.0; server.fail = False; server.delay = 0.1 # Depois do reset: um único teste entre as requisições simultâneas
+    signals = analyzer.get_trade_signals(basket(4), request_timeout=2.0)
+    assert server.requests == 3
+    assert sum(signal == ("BUY", "Resposta do modelo stub.") for signal in signals.values()) == 1
+    assert analyzer.circuit_breaker.state == CircuitBreaker.CLOSED
+
+    assert all(signal[0] == "BUY" for signal in analyzer.get_trade_signals(basket(3), request_timeout=2.0).values())
+    assert server.requests == 6
+
+def test_database_logs_run_off_the_event_loop(server, monkeypatch):
+    import sys, threading, time, types
+    writes = []
+    def slow_insert(**fields): writes.append(threading.current_thread().name); time.sleep(0.3) # INSERT lento (banco remoto/ocupado)
+    monkeypatch.setitem(sys.modules, 'database', types.SimpleNamespace(log_gemini_call=slow_insert, log_gemini_decision=slow_insert))
+    monkeypatch.setattr(config, 'GEMINI_CALL_LOG_ENABLED', True); monkeypatch.setattr(config, 'GEMINI_DECISION_LOG_ENABLED', True)
+    server.delay = 0.1
+    analyzer = make_analyzer(server, max_concurrency=4)
+    started = time.perf_counter(); signals = analyzer.get_trade_signals(basket(4), request_timeout=5.0); elapsed = time.perf_counter() - started
+    assert all(signal[0] == "BUY" for signal in signals.values())
+    assert len(writes) == 8 and threading.main_thread().name not in writes # 4 chamadas + 4 decisões, todas fora da thread do loop
+    assert elapsed < 1.5 # No event loop seriam 8 x 0.3s em série
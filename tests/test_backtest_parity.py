@@ -0,0 +1,22 @@
+# quantis_crypto_trader_gemini/tests/test_backtest_parity.py
+
+# backtest.simulate_strategy (vetorizada) tem que reproduzir simulate_strategy_loop (iterrows) bit a bit. Poucas velas
+# para rodar no CI; séries longas e a medição de tempo ficam no benchmark_backtest.py.
+
+import logging
+import pytest
+import backtest
+from benchmark_backtest import compare, synthetic_signals
+
+@pytest.fixture(autouse=True)
+def quiet_backtester():
+    logger = logging.getLogger('backtester'); level = logger.level
+    logger.setLevel(logging.WARNING); yield; logger.setLevel(level) # Sem log por trade
+
+@pytest.mark.parametrize("seed, sma_fast, sma_slow", [(42, 20, 50), (7, 5, 13), (2024, 30, 60)])
+def test_vectorized_simulation_matches_iterrows_loop(seed, sma_fast, sma_slow):
+    data = synthetic_signals(3_000, seed, sma_fast=sma_fast, sma_slow=sma_slow)
+    loop_result = backtest.simulate_strategy_loop(data, backtest.INITIAL_CASH, backtest.COMMISSION_RATE)
+    vector_result = backtest.simulate_strategy(data, backtest.INITIAL_CASH, backtest.COMMISSION_RATE)
+    assert compare(loop_result, vector_result) == []
+    assert vector_result[3] > 0 # A série gera trades
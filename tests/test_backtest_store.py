@@ -0,0 +1,36 @@
+# quantis_crypto_trader_gemini/tests/test_backtest_store.py
+
+# BacktestResultStore: combinações reaproveitadas do cache pertencem também à execução que as reaproveitou
+# (run_results), então compare_runs as inclui.
+
+from backtest_store import BacktestResultStore, combination_key
+
+PARAMS = {'sma_fast': 10, 'sma_slow': 50}
+
+def put(store: BacktestResultStore, start_ts_ms: int, return_pct: float) -> str:
+    key = combination_key("BTCUSDT", "15m", start_ts_ms, start_ts_ms + 1_000, "fp", "sma_cross", PARAMS, 0.001, 1000.0)
+    result = {'Final_Value': 1000.0 + return_pct * 10, 'Pnl': return_pct * 10, 'Return_Pct': return_pct, 'Num_Trades': 4, 'Buy_Signals': 2, 'Sell_Signals': 2}
+    store.put(key, "BTCUSDT", "15m", start_ts_ms, start_ts_ms + 1_000, "fp", "sma_cross", PARAMS, 0.001, 1000.0, result, [])
+    return key
+
+def start(store: BacktestResultStore, start_ts_ms: int, cached: int = 0) -> int:
+    return store.start_run("BTCUSDT", ["15m"], start_ts_ms, start_ts_ms + 1_000, "sma_cross", 1, cached)
+
+def test_compare_runs_includes_results_reused_from_cache(tmp_path):
+    store = BacktestResultStore(str(tmp_path / "results.db"))
+    run_a = start(store, 0); key_a = put(store, 0, 5.0); store.finish_run(1)
+    run_b = start(store, 10_000); put(store, 10_000, 2.0); store.finish_run(1)
+    run_c = start(store, 0, cached=1); store.link_run(list(store.get_many([key_a]))); store.finish_run(0) # Período de run_a, tudo do cache
+
+    assert store.compare_runs(run_a, run_b)[['return_a', 'return_b']].values.tolist() == [[5.0, 2.0]]
+    assert store.compare_runs(run_c, run_b)[['return_a', 'return_b']].values.tolist() == [[5.0, 2.0]]
+    assert store.compare_runs(run_a, run_c)['delta'].tolist() == [0.0]
+    store.close()
+
+def test_existing_results_are_linked_to_the_run_that_computed_them(tmp_path):
+    path = str(tmp_path / "results.db")
+    store = BacktestResultStore(path); run_a = start(store, 0); put(store, 0, 5.0); run_b = start(store, 10_000); put(store, 10_000, 2.0)
+    store.conn.execute("DROP TABLE run_results"); store.conn.commit(); store.close() # Banco gravado antes de run_results existir
+    store = BacktestResultStore(path)
+    assert store.compare_runs(run_a, run_b)['delta'].tolist() == [-3.0]
+    store.close()
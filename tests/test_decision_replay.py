@@ -0,0 +1,26 @@
+# quantis_crypto_trader_gemini/tests/test_decision_replay.py
+
+# ReplayGeminiAnalyzer sem olhar o futuro: decisões gravadas depois do instante simulado não podem mudar a resposta,
+# nem como candidatas nem pela normalização (desvio-padrão) da distância do vizinho mais próximo.
+
+from decision_replay import ReplayGeminiAnalyzer
+
+def record(ts_ms: int, rsi: float, signal: str) -> dict:
+    return {'ts_ms': ts_ms, 'symbol': 'BTCUSDT', 'signal': signal, 'justification': f"rsi {rsi}", 'indicators': {'15m': {'rsi': rsi}}, 'price': 30_000.0}
+
+PAST = [record(1_000, 50.0, 'BUY'), record(2_000, 52.0, 'SELL')]
+FUTURE = [record(9_000, 90.0, 'HOLD'), record(9_500, 10.0, 'HOLD')]
+
+def replay(decisions: list[dict], rsi: float, **kwargs) -> tuple[str | None, str | None]:
+    analyzer = ReplayGeminiAnalyzer(decisions, **kwargs); analyzer.set_time(5_000)
+    return analyzer.get_trade_signal_mta_indicators({'15m': {'rsi': rsi}}, 'BTCUSDT', 30_000.0)
+
+def test_future_decisions_do_not_change_neighbour_scale():
+    # Passado: desvio-padrão 1 -> rsi 55 está a 3 desvios do vizinho (acima do máximo); com o futuro na escala ficaria perto
+    assert replay(PAST, 55.0) == (None, None)
+    assert replay(PAST + FUTURE, 55.0) == (None, None)
+
+def test_neighbour_match_is_the_same_with_or_without_future_decisions():
+    # rsi 47 não cai no bucket de nenhuma decisão gravada: resposta vem do vizinho (50 -> BUY, a 3 desvios do passado)
+    assert replay(PAST, 47.0, max_distance=4.0) == ('BUY', "[replay ~3.00] rsi 50.0")
+    assert replay(PAST + FUTURE, 47.0, max_distance=4.0) == replay(PAST, 47.0, max_distance=4.0)
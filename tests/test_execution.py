@@ -0,0 +1,65 @@
+# quantis_crypto_trader_gemini/tests/test_execution.py
+
+# OrderExecutor + MatchingSimulator + PortfolioEngine: toda execução confirmada chega ao portfólio exatamente uma vez,
+# inclusive quando só a consulta da ordem (sem `fills`, como na Binance) mostra a execução.
+
+import pytest
+from execution import STATUS_FILLED, MatchingSimulator, OrderExecutor
+from portfolio import PortfolioEngine
+
+SYMBOL = "BTCUSDT"
+
+class QueryWithoutFills(MatchingSimulator):
+    """Consulta da ordem como na Binance: acumulados (executedQty/cummulativeQuoteQty) sem a lista de fills."""
+    def get_order(self, symbol: str, client_order_id: str) -> dict | None:
+        response = super().get_order(symbol, client_order_id)
+        if response is not None: response.pop('fills', None)
+        return response
+
+class LostResponse(QueryWithoutFills):
+    """A primeira ordem chega à corretora (e executa), mas a resposta do envio se perde na rede."""
+    def __init__(self, *args, **kwargs): super().__init__(*args, **kwargs); self.place_calls = 0
+    def place_order(self, *args, **kwargs) -> dict:
+        self.place_calls += 1; response = super().place_order(*args, **kwargs)
+        if self.place_calls == 1: raise ConnectionError("Read timed out.")
+        return response
+
+def make(venue: MatchingSimulator, stream: bool) -> tuple[OrderExecutor, PortfolioEngine]:
+    venue.on_price(SYMBOL, 200.0, ts_ms=0)
+    executor = OrderExecutor(venue, venue_name="test", max_retries=2, sleep=lambda seconds: None)
+    if stream: executor.start_user_stream()
+    portfolio = PortfolioEngine(); executor.add_fill_listener(portfolio.on_order_fill)
+    return executor, portfolio
+
+def test_fill_seen_only_by_order_query_reaches_portfolio():
+    venue = QueryWithoutFills(slippage_bps=0.0, latency_seconds=1.0, fee_rate=0.0, balances={'USDT': 1000.0})
+    executor, portfolio = make(venue, stream=False) # Stream fora do ar: nenhum executionReport chega ao executor
+    missed_events = []; venue.start_user_stream(missed_events.append)
+    order = executor.market_order(SYMBOL, "BUY", quote_quantity=999.5)
+    assert order.status == "NEW" and order.executed_qty == 0.0
+    venue.on_kline(SYMBOL, 60_000, 200.0, 201.0, 199.0, 200.0) # Executa na corretora depois da latência
+
+    executor.wait_for_fill(order.client_order_id, timeout=0.0) # Reconciliação pela consulta
+    assert order.status == STATUS_FILLED and order.executed_qty == pytest.approx(4.9975)
+    assert portfolio.position(SYMBOL)['qty'] == pytest.approx(4.9975) and portfolio.position(SYMBOL)['avg_entry'] == pytest.approx(200.0)
+    assert portfolio.asset_held(SYMBOL) == "BTC"
+
+    executor.wait_for_fill(order.client_order_id, timeout=0.0) # Nova consulta: nada a repassar
+    for event in missed_events: executor.on_execution_report(event) # Eventos atrasados do stream: já repassados
+    assert portfolio.position(SYMBOL)['qty'] == pytest.approx(venue.balances['BTC'])
+
+def test_retry_adopts_order_and_reports_its_fill_once():
+    venue = LostResponse(slippage_bps=0.0, latency_seconds=0.0, fee_rate=0.0, balances={'USDT': 1000.0})
+    executor, portfolio = make(venue, stream=False)
+    order = executor.market_order(SYMBOL, "BUY", quote_quantity=999.5)
+    assert venue.place_calls == 1 and order.attempts == 1 and len(venue._orders) == 1 # Adotada pela consulta, sem reenvio
+    assert order.status == STATUS_FILLED and order.executed_qty == pytest.approx(4.9975)
+    assert portfolio.position(SYMBOL)['qty'] == pytest.approx(venue.balances['BTC'])
+    assert portfolio.asset_held(SYMBOL) == "BTC"
+
+def test_adopted_order_with_stream_fill_is_not_reported_twice():
+    venue = LostResponse(slippage_bps=0.0, latency_seconds=0.0, fee_rate=0.001, balances={'USDT': 1000.0})
+    executor, portfolio = make(venue, stream=True) # O fill chega pelo stream antes da adoção pela consulta
+    order = executor.market_order(SYMBOL, "BUY", quote_quantity=999.5)
+    assert order.status == STATUS_FILLED and order.attempts == 1
+    assert portfolio.position(SYMBOL)['qty'] == pytest.approx(venue.balances['BTC']) # Taxa em BTC descontada uma vez
@@ -0,0 +1,41 @@
+# quantis_crypto_trader_gemini/tests/test_indicator_cache.py
+
+# As SMAs pré-calculadas (IndicatorMatrix) têm que dar as mesmas posições do cálculo por combinação com
+# rolling().mean(), inclusive em empates fast == slow de séries com preço parado (1m ilíquido arredondado ao tick).
+
+import numpy as np
+import pandas as pd
+import pytest
+import backtest
+from indicator_cache import IndicatorMatrix, sma_matrix
+
+LENGTHS = sorted({w for pair in backtest.param_combinations for w in pair} | {5, 13})
+
+def random_walk(candles: int, seed: int) -> np.ndarray:
+    return 30_000 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.002, candles)))
+
+def flat_ticks(candles: int, seed: int) -> np.ndarray:
+    """Preço arredondado a 0.01 que fica parado em ~2/3 das velas: muitas janelas constantes e médias empatadas."""
+    steps = np.random.default_rng(seed).choice([-1, 0, 0, 0, 0, 1], size=candles) * 0.01
+    return np.round(30_000 + np.cumsum(steps), 2)
+
+def legacy_position(close: np.ndarray, sma_fast: int, sma_slow: int) -> np.ndarray:
+    """Cálculo anterior ao IndicatorMatrix: rolling().mean() por combinação."""
+    series = pd.Series(close)
+    return np.where(series.rolling(sma_fast).mean() > series.rolling(sma_slow).mean(), 1, -1)
+
+@pytest.mark.parametrize("close", [random_walk(20_000, 42), flat_ticks(20_000, 1), np.full(500, 100.0)], ids=["random_walk", "flat_ticks", "constant"])
+def test_sma_matrix_matches_pandas_rolling_mean(close):
+    values = sma_matrix(close, LENGTHS)
+    for j, length in enumerate(LENGTHS):
+        np.testing.assert_array_equal(values[:, j], pd.Series(close).rolling(length).mean().to_numpy())
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_crossover_positions_match_legacy_on_flat_prices(seed):
+    close = flat_ticks(20_000, seed); matrix = IndicatorMatrix.from_close(close, LENGTHS)
+    ties = 0
+    for sma_fast, sma_slow in backtest.param_combinations:
+        position = np.where(matrix.sma(sma_fast) > matrix.sma(sma_slow), 1, -1)
+        np.testing.assert_array_equal(position[sma_slow:], legacy_position(close, sma_fast, sma_slow)[sma_slow:])
+        ties += int((matrix.sma(sma_fast)[sma_slow:] == matrix.sma(sma_slow)[sma_slow:]).sum())
+    assert ties > 0 # A série exercita empates fast == slow
@@ -0,0 +1,51 @@
+# quantis_crypto_trader_gemini/tests/test_portfolio_persistence.py
+
+# Portfólio no Redis separado por EXECUTION_MODE: um restart do paper retoma a posição com saldos coerentes no
+# simulador (a VENDA executa), e o live nunca carrega a posição do paper.
+
+import pytest
+import config
+import main
+import synthetic_data
+
+SYMBOL = "BTCUSDT"
+
+@pytest.fixture
+def redis_handler():
+    pytest.importorskip("fakeredis")
+    return synthetic_data.fake_redis_handler()
+
+def start(monkeypatch, redis_handler, mode: str):
+    """Mesma sequência do initialize_services: executor do modo + portfólio restaurado."""
+    monkeypatch.setattr(config, "EXECUTION_MODE", mode); monkeypatch.setattr(main, "paper_venue", None); monkeypatch.setattr(main, "portfolio", None)
+    executor = main._build_order_executor(binance_handler=None if mode == 'paper' else FlatAccount())
+    return executor, main._build_portfolio(redis_handler, executor, SYMBOL)
+
+class FlatAccount:
+    """Conta live sem BTC (só o necessário para o executor/portfólio na inicialização)."""
+    def start_user_stream(self, callback): return None
+    def get_asset_balance(self, asset: str) -> float: return 0.0
+    def get_ticker_price(self, symbol: str) -> float: return 200.0
+
+def test_paper_restart_restores_position_and_simulator_balances(monkeypatch, redis_handler):
+    executor, portfolio = start(monkeypatch, redis_handler, 'paper')
+    main.paper_venue.on_price(SYMBOL, 200.0, ts_ms=0)
+    bought = executor.market_order(SYMBOL, "BUY", quote_quantity=500.0)
+    assert portfolio.asset_held(SYMBOL) == "BTC"
+
+    executor, portfolio = start(monkeypatch, redis_handler, 'paper') # Restart: simulador novo
+    assert portfolio.position(SYMBOL)['qty'] == pytest.approx(main.paper_venue.balances['BTC'])
+    assert main.paper_venue.balances['USDT'] == pytest.approx(config.PAPER_INITIAL_QUOTE_BALANCE - 500.0)
+    main.paper_venue.on_price(SYMBOL, 210.0, ts_ms=60_000)
+    sold = executor.market_order(SYMBOL, "SELL", quantity=portfolio.position(SYMBOL)['qty'])
+    assert sold.status == "FILLED" and bought.status == "FILLED"
+    assert portfolio.asset_held(SYMBOL) == "USDT"
+
+def test_live_does_not_load_paper_position(monkeypatch, redis_handler):
+    executor, portfolio = start(monkeypatch, redis_handler, 'paper')
+    main.paper_venue.on_price(SYMBOL, 200.0, ts_ms=0); executor.market_order(SYMBOL, "BUY", quote_quantity=500.0)
+    assert portfolio.asset_held(SYMBOL) == "BTC"
+
+    _, live_portfolio = start(monkeypatch, redis_handler, 'live')
+    assert live_portfolio.symbols == [] and live_portfolio.asset_held(SYMBOL) == "USDT"
+    assert redis_handler.get_state(f"position_asset:{SYMBOL}") == "USDT"
@@ -0,0 +1,24 @@
+# quantis_crypto_trader_gemini/tests/test_replay_parity.py
+
+# O modo 'tape' do replay_engine tem que entregar os indicadores do modo 'window' (calculate_indicators sobre a janela
+# do ciclo ao vivo) vela a vela. Poucas velas para rodar no CI; séries longas e tempos ficam no replay_parity.py.
+
+import logging
+import pytest
+import resampler
+import synthetic_data
+from replay_parity import FILTER_KEYS, compare
+
+pytest.importorskip("pandas_ta")
+
+@pytest.fixture(autouse=True)
+def quiet_indicators():
+    logging.disable(logging.WARNING); yield; logging.disable(logging.NOTSET)
+
+@pytest.mark.parametrize("seed, interval, minutes, keys", [(42, "15m", 3 * 1440, FILTER_KEYS), (7, "15m", 3 * 1440, None), (2024, "1h", 7 * 1440, None), (3, "1m", 400, None)])
+def test_tape_indicators_match_live_window(seed, interval, minutes, keys):
+    klines_1m = synthetic_data.generate_ohlcv(minutes, "1m", seed=seed)[list(resampler.OHLCV_AGG)]
+    frame = klines_1m if interval == "1m" else resampler.resample_ohlcv(klines_1m, interval)
+    compared, mismatches, _, _ = compare(frame, interval, keys)
+    assert compared > 100
+    assert mismatches == []
@@ -0,0 +1,26 @@
+# quantis_crypto_trader_gemini/tests/test_strategy_parity.py
+
+# decide_actions_vectorized tem que reproduzir decide_action (escalar) vela a vela. Poucas velas e seeds fixas para
+# rodar no CI; séries longas ficam no strategy_parity.py.
+
+import logging
+import numpy as np
+import pytest
+import config
+from strategy import StrategyManager
+from strategy_parity import _AmpleBalance, _MemoryState, run_scalar, synthetic_inputs
+
+@pytest.fixture(autouse=True)
+def no_telegram(monkeypatch):
+    monkeypatch.setattr(config, "TELEGRAM_BOT_TOKEN", None) # Nenhuma notificação real
+    logging.disable(logging.CRITICAL); yield; logging.disable(logging.NOTSET) # decide_action loga várias linhas por vela
+
+@pytest.mark.parametrize("seed", [42, 7, 2024])
+def test_vectorized_positions_match_scalar_decide_action(seed):
+    inputs = synthetic_inputs(1_500, seed)
+    manager = StrategyManager(redis_handler=_MemoryState(), binance_handler=_AmpleBalance())
+    scalar_positions = run_scalar(manager, inputs)
+    vectorized = manager.decide_actions_vectorized(**inputs)
+    mismatches = np.flatnonzero(scalar_positions != vectorized['Position'].to_numpy())
+    assert len(mismatches) == 0, f"{len(mismatches)} velas divergentes; primeira no índice {mismatches[0]}"
+    assert (vectorized['Signal'] == 1).sum() > 0 and (vectorized['Signal'] == -1).sum() > 0 # A série exercita entradas e saídas
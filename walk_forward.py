@@ -0,0 +1,187 @@
+# quantis_crypto_trader_gemini/walk_forward.py
+
+# Walk-forward em lote: para cada símbolo/intervalo, janelas rolantes em que a grade SMA do backtest.py é otimizada
+# na janela de treino k e os parâmetros escolhidos são testados (fora da amostra) na janela seguinte.
+# Uso:
+#   python walk_forward.py                                        # SYMBOLS x INTERVALS, período/janelas abaixo
+#   python walk_forward.py --symbols BTCUSDT ETHUSDT --intervals 1h 4h --train 90D --test 30D --workers 4
+# IMPORTANTE: populate_history.py precisa ter coberto todos os símbolos/intervalos do período.
+
+import argparse
+import json
+import os
+import sys
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import backtest
+from backtest_store import BacktestResultStore
+from indicator_cache import IndicatorMatrix
+
+logger = logging.getLogger('backtester.walk_forward') # Mesmos handlers/arquivo do backtester
+
+# --- Parâmetros do Walk-Forward ---
+SYMBOLS = ["BTCUSDT"] # Cesta de símbolos (ex: ["BTCUSDT", "ETHUSDT", "SOLUSDT"])
+INTERVALS = ["1h", "4h"]
+START_DATE_STR = "1 Jan, 2024"
+END_DATE_STR = backtest.END_DATE_STR # None = até o fim dos dados no Redis
+TRAIN_WINDOW = "90D" # Janela de otimização (pd.Timedelta)
+TEST_WINDOW = "30D" # Janela fora da amostra; o passo entre janelas é o próprio TEST_WINDOW (testes contíguos, sem sobreposição)
+MIN_TRAIN_TRADES = 2 # Combinações com menos trades no treino só são escolhidas se nenhuma outra chegar lá
+MAX_WORKERS = None # None = os.cpu_count(); 1 = roda no processo principal (sem pool)
+RESULTS_CSV = "walk_forward_results.csv" # Só quando backtest.RESULT_STORE_PATH = None (sem SQLite)
+
+# --- Janelas ---
+def build_windows(index: pd.DatetimeIndex, train_window: str = TRAIN_WINDOW, test_window: str = TEST_WINDOW) -> list[tuple[int, int, int, int]]:
+    """Posições (train_start, train_end, test_start, test_end), intervalos semiabertos, das janelas que cabem inteiras no índice."""
+    train, test = pd.Timedelta(train_window), pd.Timedelta(test_window)
+    windows = []; train_start_ts = index[0]
+    while train_start_ts + train + test <= index[-1]:
+        a, b, d = index.searchsorted([train_start_ts, train_start_ts + train, train_start_ts + train + test])
+        if b > a and d > b + 1: windows.append((int(a), int(b), int(b), int(d)))
+        train_start_ts += test
+    return windows
+
+def _evaluate_range(base_data: pd.DataFrame, indicators: IndicatorMatrix, start: int, stop: int, sma_fast: int, sma_slow: int):
+    """evaluate_combination só nas velas [start, stop): o recorte começa max(fast, slow) velas antes (aquecimento das SMAs,
+    já calculadas no dataset inteiro), que é exatamente o que evaluate_combination pula."""
+    lo = max(0, start - max(sma_fast, sma_slow))
+    return backtest.evaluate_combination(base_data.iloc[lo:stop], sma_fast, sma_slow, indicators.rows(lo, stop))
+
+def evaluate_window(base_data: pd.DataFrame, indicators: IndicatorMatrix, window: tuple[int, int, int, int], combinations) -> dict | None:
+    """Otimiza a grade na janela de treino e testa a melhor combinação na janela de teste. None se o treino não produzir resultados."""
+    train_start, train_end, test_start, test_end = window
+    train_results = [outcome[0] for f, s in combinations if (outcome := _evaluate_range(base_data, indicators, train_start, train_end, f, s)) is not None]
+    if not train_results: return None
+    eligible = [r for r in train_results if r['Num_Trades'] >= MIN_TRAIN_TRADES] or train_results
+    best = max(eligible, key=lambda r: r['Return_Pct'])
+    sma_fast, sma_slow = int(best['SMA_Fast']), int(best['SMA_Slow'])
+    test = _evaluate_range(base_data, indicators, test_start, test_end, sma_fast, sma_slow)
+    close = base_data['Close'].to_numpy(); index = base_data.index
+    row = {'train_start_ms': index[train_start].value // 10**6, 'train_end_ms': index[train_end - 1].value // 10**6,
+           'test_start_ms': index[test_start].value // 10**6, 'test_end_ms': index[test_end - 1].value // 10**6,
+           'params_json': json.dumps({'sma_fast': sma_fast, 'sma_slow': sma_slow}, sort_keys=True), 'sma_fast': sma_fast, 'sma_slow': sma_slow,
+           'train_return_pct': float(best['Return_Pct']), 'train_num_trades': int(best['Num_Trades']), 'candidates': len(train_results),
+           'test_buy_hold_pct': float((close[test_end - 1] / close[test_start] - 1) * 100)}
+    if test is not None:
+        row.update({'test_final_value': float(test[0]['Final_Value']), 'test_pnl': float(test[0]['Pnl']), 'test_return_pct': float(test[0]['Return_Pct']),
+                    'test_num_trades': int(test[0]['Num_Trades'])})
+    return row
+
+def _evaluate_window_shared(descriptor: dict, window: tuple[int, int, int, int], combinations) -> dict | None:
+    """Tarefa do pool: janela avaliada sobre os preços/indicadores do bloco compartilhado do dataset."""
+    data, indicators = backtest.attach_price_data(descriptor)
+    return evaluate_window(data, indicators, window, combinations)
+
+# --- Resumo ---
+def summarize(results: pd.DataFrame) -> pd.DataFrame:
+    """Por símbolo/intervalo: retorno fora da amostra (médio, composto, % de janelas positivas) contra treino e buy & hold."""
+    if results.empty: return results
+    grouped = results.groupby(['symbol', 'interval'])
+    return pd.DataFrame({
+        'Windows': grouped.size(),
+        'Train_Mean_Pct': grouped['train_return_pct'].mean(),
+        'Test_Mean_Pct': grouped['test_return_pct'].mean(),
+        'Test_Compound_Pct': grouped['test_return_pct'].apply(lambda r: (np.prod(1 + r.dropna() / 100) - 1) * 100),
+        'Test_Positive_Pct': grouped['test_return_pct'].apply(lambda r: (r.dropna() > 0).mean() * 100),
+        'Buy_Hold_Compound_Pct': grouped['test_buy_hold_pct'].apply(lambda r: (np.prod(1 + r / 100) - 1) * 100),
+        'Distinct_Params': grouped['params_json'].nunique(),
+    }).reset_index()
+
+# --- Execução em Lote ---
+def run_walk_forward(redis_handler, symbols: list[str] = SYMBOLS, intervals: list[str] = INTERVALS, start_date: str = START_DATE_STR,
+                     end_date: str | None = END_DATE_STR, train_window: str = TRAIN_WINDOW, test_window: str = TEST_WINDOW,
+                     workers: int | None = MAX_WORKERS, store_path: str | None = backtest.RESULT_STORE_PATH) -> pd.DataFrame:
+    """
+    Carrega cada símbolo/intervalo uma vez (com as SMAs da grade calculadas no dataset inteiro, que também servem de
+    aquecimento para o início de cada janela) e distribui as janelas de todos os datasets no mesmo pool de processos.
+    Cada janela concluída vira uma linha da tabela walk_forward do BacktestResultStore (ou do RESULTS_CSV sem SQLite).
+    """
+    start_ts_ms = int(pd.to_datetime(start_date, utc=True).timestamp() * 1000)
+    end_ts_ms = int(pd.to_datetime(end_date, utc=True).timestamp() * 1000) if end_date else int(time.time() * 1000)
+    combinations = backtest.param_combinations; sma_lengths = backtest.sweep_sma_lengths(combinations)
+    logger.info(f"==== WALK-FORWARD: {len(symbols)} símbolo(s) x {len(intervals)} intervalo(s), treino {train_window} / teste {test_window}, "
+                f"{len(combinations)} combinações SMA por janela ====")
+
+    started = time.perf_counter(); datasets = {}; tasks = []
+    for symbol in symbols:
+        for interval in intervals:
+            base_data = backtest.load_base_data(redis_handler, interval, start_ts_ms, end_ts_ms, symbol=symbol)
+            if base_data is None: continue
+            windows = build_windows(base_data.index, train_window, test_window)
+            if not windows: logger.warning(f"{symbol} {interval}: histórico curto demais para treino {train_window} + teste {test_window}. Pulando."); continue
+            datasets[(symbol, interval)] = (base_data, IndicatorMatrix.from_close(base_data['Close'].to_numpy(), sma_lengths))
+            tasks.extend((symbol, interval, k, window) for k, window in enumerate(windows))
+    if not tasks: logger.critical("Nenhum símbolo/intervalo com janelas de walk-forward. Encerrando."); return pd.DataFrame()
+    logger.info(f"Dados carregados ({len(datasets)} dataset(s), {len(tasks)} janelas) em {time.perf_counter() - started:.2f}s.")
+
+    store = None
+    if store_path:
+        try:
+            store = BacktestResultStore(store_path)
+            store.start_run(','.join(symbols), list(intervals), start_ts_ms, end_ts_ms, f"walk_forward/{backtest.STRATEGY_NAME}", len(tasks), 0)
+        except Exception as e: logger.error("Falha ao abrir o banco de resultados. Seguindo só com o CSV.", exc_info=True); store = None
+
+    rows = []
+    def handle_row(symbol: str, interval: str, k: int, row: dict | None):
+        if row is None: logger.warning(f"{symbol} {interval} janela {k}: treino sem resultados. Pulando."); return
+        row = {'symbol': symbol, 'interval': interval, 'window': k, 'strategy': backtest.STRATEGY_NAME, **row}
+        if store is not None: # Grava na chegada: uma execução interrompida mantém as janelas já concluídas
+            try: store.put_walk_forward(row)
+            except Exception as e: logger.error(f"Falha ao gravar janela {k} de {symbol} {interval}.", exc_info=True)
+        logger.info(f"{symbol} {interval} janela {k}: SMA {row['sma_fast']}/{row['sma_slow']} (treino {row['train_return_pct']:.2f}%) -> "
+                    f"teste {row.get('test_return_pct', float('nan')):.2f}% (buy & hold {row['test_buy_hold_pct']:.2f}%)")
+        rows.append(row)
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        for symbol, interval, k, window in tasks: handle_row(symbol, interval, k, evaluate_window(*datasets[(symbol, interval)], window, combinations))
+    else:
+        segments = {}
+        try:
+            for dataset_key, (base_data, indicators) in datasets.items(): segments[dataset_key] = backtest.share_price_data(base_data, indicators)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(_evaluate_window_shared, segments[(symbol, interval)][1], window, combinations): (symbol, interval, k)
+                           for symbol, interval, k, window in tasks}
+                for future in as_completed(futures):
+                    symbol, interval, k = futures[future]
+                    try: row = future.result()
+                    except Exception as e: logger.error(f"Falha ao avaliar janela {k} de {symbol} {interval}.", exc_info=True); continue
+                    handle_row(symbol, interval, k, row)
+        finally:
+            for shm, _ in segments.values(): shm.close(); shm.unlink()
+    if store is not None: store.finish_run(len(rows)); store.close()
+
+    results = pd.DataFrame(rows)
+    if not results.empty:
+        results = results.sort_values(['symbol', 'interval', 'window'], ignore_index=True)
+        if store is None: results.to_csv(RESULTS_CSV, index=False); logger.info(f"Janelas gravadas em {RESULTS_CSV}.")
+    logger.info(f"Walk-forward: {len(results)} de {len(tasks)} janelas em {time.perf_counter() - started:.2f}s ({max(workers, 1)} processo(s)).")
+    return results
+
+
+# --- Execução via Linha de Comando ---
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Walk-forward (otimiza na janela k, testa na k+1) em lote por símbolos/intervalos.")
+    parser.add_argument("--symbols", nargs='+', default=SYMBOLS)
+    parser.add_argument("--intervals", nargs='+', default=INTERVALS)
+    parser.add_argument("--start", default=START_DATE_STR)
+    parser.add_argument("--end", default=END_DATE_STR)
+    parser.add_argument("--train", default=TRAIN_WINDOW, help="Janela de treino (ex: 90D)")
+    parser.add_argument("--test", default=TEST_WINDOW, help="Janela de teste e passo entre janelas (ex: 30D)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+
+    import config
+    from redis_client import RedisHandler
+    try: redis_handler = RedisHandler(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB)
+    except Exception as e: logger.critical("Falha ao inicializar RedisHandler.", exc_info=True); return 1
+    results = run_walk_forward(redis_handler, args.symbols, args.intervals, args.start, args.end, args.train, args.test, args.workers)
+    if results.empty: return 1
+    logger.info(f"Resumo fora da amostra por símbolo/intervalo:\n{summarize(results).to_string(index=False)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())